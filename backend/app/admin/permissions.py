@@ -1,8 +1,8 @@
 from fastapi import Depends, HTTPException, Request
 from app.core.security import oauth2_scheme
+from app.core.auth_cache import activity_recorder
 from app.db.database import db
 from bson import ObjectId
-from datetime import datetime
 import jwt
 from app.core.config import settings
 import os
@@ -53,14 +53,10 @@ async def get_current_admin_user(request: Request):
             detail={"message": "Пользователь не найден", "hint": "Сессия устарела или удалена"}
         )
 
-    # Обновляем активность
-    await db.admins.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": {
-            "active_session.last_activity": datetime.utcnow(),
-            "active_session.ip": request.client.host,
-            "active_session.user_agent": request.headers.get("User-Agent", "unknown")
-        }}
+    # Обновляем активность (пакетно, фоновой задачей)
+    activity_recorder.record(
+        "admins", admin["_id"], request.client.host, request.headers.get("User-Agent", "unknown"),
+        field_prefix="active_session."
     )
 
     return {
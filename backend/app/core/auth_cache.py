@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.core.redis_client import get_multiplayer_redis_connection
+from app.db.database import db
+from app.logging import get_logger, LogSection, LogSubsection
+
+logger = get_logger(__name__)
+
+
+def token_hash(token: str) -> str:
+    """Ключ кэша - хэш токена: сам токен не хранится и не публикуется в Redis."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class AuthCache:
+    """
+    Процессный кэш проверенных токенов: хэш токена -> principal (словарь,
+    который возвращает get_current_actor) и документ, в который пишутся
+    метки активности. Записи живут недолго, а отзыв токена (выход, бан,
+    новая сессия администратора) рассылается всем воркерам через Redis pub/sub.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[str, Tuple[float, str, dict, tuple]]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+
+    def _drop(self, key: str) -> None:
+        item = self._items.pop(key, None)
+        if item is None:
+            return
+        user_keys = self._by_user.get(item[1])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._by_user[item[1]]
+
+    def get(self, token: str) -> Optional[Tuple[dict, tuple]]:
+        """Возвращает (копия principal, цель для меток активности) или None."""
+        key = token_hash(token)
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, _, principal, activity_target = item
+        if time.monotonic() > expires_at:
+            self._drop(key)
+            return None
+        self._items.move_to_end(key)
+        return dict(principal), activity_target
+
+    def put(
+        self,
+        token: str,
+        principal: dict,
+        activity_target: tuple,
+        token_expires_at: Optional[datetime] = None
+    ) -> None:
+        """
+        activity_target - (коллекция, _id, префикс полей) для ActivityRecorder.record.
+        """
+        key = token_hash(token)
+        ttl = self.ttl_seconds
+        if token_expires_at is not None:
+            # Запись не должна пережить сам токен
+            ttl = min(ttl, max(0.0, (token_expires_at - datetime.utcnow()).total_seconds()))
+        if ttl <= 0:
+            return
+        user_id = str(principal.get("id"))
+        self._drop(key)
+        self._items[key] = (time.monotonic() + ttl, user_id, dict(principal), activity_target)
+        self._by_user.setdefault(user_id, set()).add(key)
+        while len(self._items) > self.max_size:
+            self._drop(next(iter(self._items)))
+
+    def drop_token_hash(self, key: str) -> None:
+        self._drop(key)
+
+    def drop_user(self, user_id: str) -> None:
+        for key in list(self._by_user.get(str(user_id), ())):
+            self._drop(key)
+
+    async def _publish(self, message: dict) -> None:
+        try:
+            redis_conn = await get_multiplayer_redis_connection()
+            await redis_conn.publish(settings.AUTH_CACHE_INVALIDATION_CHANNEL, json.dumps(message))
+        except Exception as e:
+            # Остальные воркеры увидят изменение не позже чем через TTL записи
+            logger.error(
+                section=LogSection.REDIS,
+                subsection=LogSubsection.REDIS.CACHE,
+                message=f"Не удалось разослать сброс кэша авторизации {message}: {str(e)}"
+            )
+
+    async def invalidate_token(self, token: str) -> None:
+        """Сбросить запись токена во всех воркерах (выход, отзыв токена)."""
+        key = token_hash(token)
+        self._drop(key)
+        await self._publish({"token_hash": key})
+
+    async def invalidate_user(self, user_id) -> None:
+        """Сбросить все записи пользователя во всех воркерах (бан, смена сессии, изменение баланса)."""
+        user_id = str(user_id)
+        self.drop_user(user_id)
+        await self._publish({"user_id": user_id})
+
+    async def listen_invalidations(self) -> None:
+        """Фоновая задача: применяет сбросы, опубликованные другими воркерами."""
+        while True:
+            pubsub = None
+            try:
+                redis_conn = await get_multiplayer_redis_connection()
+                pubsub = redis_conn.pubsub()
+                await pubsub.subscribe(settings.AUTH_CACHE_INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    if data.get("token_hash"):
+                        self.drop_token_hash(data["token_hash"])
+                    if data.get("user_id"):
+                        self.drop_user(data["user_id"])
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                # Пока подписки нет, записи могли пропустить сброс - очищаем кэш целиком
+                self._items.clear()
+                self._by_user.clear()
+                logger.error(
+                    section=LogSection.REDIS,
+                    subsection=LogSubsection.REDIS.CACHE,
+                    message=f"Ошибка подписки на сброс кэша авторизации: {str(e)}"
+                )
+                await asyncio.sleep(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+
+
+class ActivityRecorder:
+    """
+    Накопитель меток активности (last_activity, IP, User-Agent).
+    Вместо update_one на каждый запрос последние значения по каждому документу
+    копятся в памяти и сбрасываются одним bulk_write на коллекцию.
+    """
+
+    def __init__(self, flush_interval: int):
+        self.flush_interval = flush_interval
+        self._pending: Dict[Tuple[str, object], dict] = {}
+
+    def record(self, collection: str, doc_id, ip: str, user_agent: str, field_prefix: str = "") -> None:
+        self._pending[(collection, doc_id)] = {
+            f"{field_prefix}last_activity": datetime.utcnow(),
+            f"{field_prefix}ip": ip,
+            f"{field_prefix}user_agent": user_agent
+        }
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        operations: Dict[str, list] = {}
+        for (collection, doc_id), fields in pending.items():
+            query = {"_id": doc_id}
+            # Вложенные поля (active_session.*) пишем, только пока сессия существует,
+            # чтобы запоздалый сброс не воссоздал закрытую сессию
+            for field in fields:
+                if "." in field:
+                    query[field.split(".", 1)[0]] = {"$type": "object"}
+            operations.setdefault(collection, []).append(UpdateOne(query, {"$set": fields}))
+        for collection, ops in operations.items():
+            try:
+                await db[collection].bulk_write(ops, ordered=False)
+            except Exception as e:
+                logger.error(
+                    section=LogSection.DATABASE,
+                    subsection=LogSubsection.DATABASE.QUERY,
+                    message=f"Ошибка записи меток активности в {collection} ({len(ops)} шт.): {str(e)}"
+                )
+        return len(pending)
+
+    async def run(self) -> None:
+        """Фоновая задача периодического сброса меток активности."""
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                await self.flush()
+                break
+
+
+# Глобальные экземпляры (один на процесс)
+auth_cache = AuthCache(
+    max_size=settings.AUTH_CACHE_MAX_SIZE,
+    ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS
+)
+activity_recorder = ActivityRecorder(flush_interval=settings.AUTH_ACTIVITY_FLUSH_SECONDS)
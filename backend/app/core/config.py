@@ -25,6 +25,22 @@ class Settings(BaseSettings):
     REDIS_RATE_LIMIT_PREFIX: str = "royal_rate_limit"
     REDIS_FAIL_OPEN: bool = True
     REDIS_WARNING_THRESHOLD: float = 0.8
+    LOBBY_CACHE_TTL_SECONDS: int = 30  # Время жизни кэша лобби в Redis мультиплеера
+    QUESTION_CACHE_MAX_SIZE: int = 5000  # Максимум вопросов в кэше процесса
+    QUESTION_CACHE_TTL_SECONDS: int = 300  # Время жизни вопроса в кэше процесса
+    QUESTION_CACHE_VERSION_CHECK_SECONDS: float = 1.0  # Как часто сверять кэш процесса с версией банка вопросов в Redis
+    LOBBY_EVENTS_STREAM: str = "lobby_events"  # Redis Stream событий лобби для backend_ws
+    LOBBY_EVENTS_STREAM_MAXLEN: int = 10000  # Примерная максимальная длина каждого шарда потока событий
+    LOBBY_EVENTS_SHARDS: int = 8  # Число шардов потока по lobby_id (совпадает с backend_ws): порядок событий лобби сохраняется
+    LOBBY_SCHEDULER_LEADER_TTL_SECONDS: int = 15  # Время жизни ключа лидера планировщика лобби
+    LOBBY_SCHEDULER_RECONCILE_SECONDS: int = 600  # Период сверки дедлайнов планировщика с MongoDB
+    LOBBY_SCHEDULER_BATCH_SIZE: int = 200  # Максимум лобби, завершаемых за один проход
+    AUTH_CACHE_TTL_SECONDS: int = 30  # Время жизни проверенного токена в кэше процесса
+    AUTH_CACHE_MAX_SIZE: int = 20000  # Максимум токенов в кэше процесса
+    AUTH_CACHE_INVALIDATION_CHANNEL: str = "auth_cache_invalidation"  # Канал Redis для сброса кэша авторизации
+    AUTH_ACTIVITY_FLUSH_SECONDS: int = 15  # Период пакетной записи last_activity токенов и сессий
+    PASSWORD_HASH_WORKERS: int = 4  # Потоков для bcrypt в каждом воркере
+    PASSWORD_HASH_MAX_PENDING: int = 32  # Максимум bcrypt-задач в работе и очереди, дальше - 429
 
     # Настройки безопасности / JWT
     SECRET_KEY: str
@@ -50,6 +66,9 @@ class Settings(BaseSettings):
     MEDIA_BASE_PATH: str = "video_test"  # Корневая папка для медиа файлов
     MEDIA_X_ACCEL_PREFIX: str = "/media"
     MEDIA_MAX_FILE_SIZE_MB: int = 50
+    MEDIA_MIGRATION_ENABLED: bool = True  # Фоновый перенос старых файлов из GridFS в MEDIA_BASE_PATH
+    MEDIA_MIGRATION_PAUSE_SECONDS: float = 0.5  # Пауза между файлами, чтобы не нагружать MongoDB и диск
+    MEDIA_MIGRATION_LOCK_TTL_SECONDS: int = 300  # Время жизни блокировки переноса (дольше копирования одного файла)
     MEDIA_ALLOWED_TYPES: List[str] = [
         "video/mp4", "video/avi", "video/mov", "video/wmv", "video/flv",
         "image/jpeg", "image/png", "image/gif", "image/webp",
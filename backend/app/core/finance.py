@@ -2,6 +2,7 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 from datetime import datetime
 from app.core.config import settings
+from app.core.auth_cache import auth_cache
 
 # Новая структурированная система логирования
 from app.logging import get_structured_logger, LogSection
@@ -87,6 +88,8 @@ async def process_referral(user_id, amount, description, db_instance=None):
                 {"$set": {"referred_use": True}},
                 session=session
             )
+    # Баланс владельца кода хранится в закэшированном principal
+    await auth_cache.invalidate_user(referral["owner_user_id"])
 
     logger.info(
         section=LogSection.PAYMENT,
@@ -132,6 +135,7 @@ async def update_user_balance(user_id, amount, description, db_instance=None):
                         subsection=LogSubsection.PAYMENT.BALANCE,
                         message=f"Баланс пользователя {user_id} успешно изменен на {amount} тг - {description}"
                     )
+                    await auth_cache.invalidate_user(user_id)
                 else:
                     logger.error(
                         section=LogSection.PAYMENT,
@@ -254,6 +258,7 @@ async def credit_user_balance(user_id, amount, description, admin_id=None, db_in
                         subsection=LogSubsection.PAYMENT.CREDIT,
                         message=f"Пополнение баланса: пользователю {user_id} начислено {amount} тг{f' администратором {admin_id}' if admin_id else ''} - {description}, баланс: {current_balance} → {current_balance + amount}"
                     )
+                    await auth_cache.invalidate_user(user_id)
                     return {"status": "ok", "details": "Транзакция успешна"}
                 else:
                     logger.error(
@@ -352,6 +357,7 @@ async def debit_user_balance(user_id, amount, description, admin_id=None, db_ins
                         subsection=LogSubsection.PAYMENT.DEBIT,
                         message=f"Списание с баланса: у пользователя {user_id} списано {amount} тг{f' администратором {admin_id}' if admin_id else ''} - {description}, баланс: {current_balance} → {current_balance - amount}"
                     )
+                    await auth_cache.invalidate_user(user_id)
                     return {"status": "ok", "details": "Транзакция успешна"}
                 else:
                     logger.error(
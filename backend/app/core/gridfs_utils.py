@@ -1,12 +1,18 @@
+from typing import AsyncIterator, Optional, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
-from fastapi import UploadFile
+from fastapi import UploadFile, Response
+from fastapi.responses import StreamingResponse
 from bson import ObjectId, errors
+from gridfs.errors import NoFile
 import base64
 import time
 from app.logging import get_logger, LogSection, LogSubsection
 
 logger = get_logger(__name__)
 
+# Максимальный объём, который читается из GridFS за один шаг при отдаче файла
+STREAM_READ_SIZE = 256 * 1024
+
 async def save_media_to_gridfs(file: UploadFile, db: AsyncIOMotorDatabase) -> ObjectId:
     """
     Сохраняет файл в GridFS и возвращает ID сохранённого файла.
@@ -26,7 +32,8 @@ async def save_media_to_gridfs(file: UploadFile, db: AsyncIOMotorDatabase) -> Ob
 
 async def get_media_file(file_id: str, db):
     """
-    Получает медиафайл из GridFS по его ID.
+    Получает медиафайл из GridFS по его ID целиком.
+    Для отдачи клиенту используйте gridfs_media_response: он не держит файл в памяти.
     
     Args:
         file_id: идентификатор файла в GridFS
@@ -40,50 +47,15 @@ async def get_media_file(file_id: str, db):
     """
     start_time = time.time()
     try:
-        # Преобразуем строковый ID в ObjectId
-        obj_id = ObjectId(file_id)
-        
-        # Находим информацию о файле
-        find_start_time = time.time()
-        file_info = await db.fs.files.find_one({"_id": obj_id})
-        find_time = time.time() - find_start_time
-
-        
-        if not file_info:
+        grid_out = await open_media_stream(file_id, db)
+        if grid_out is None:
             logger.warning(
                 section=LogSection.FILES,
                 subsection=LogSubsection.FILES.DOWNLOAD,
                 message=f"Файл с ID {file_id} не найден в GridFS - возможно файл был удален или ID указан неверно"
             )
             return None
-            
-        # Получаем чанки файла
-        chunks_start_time = time.time()
-        chunks = await db.fs.chunks.find({"files_id": obj_id}).sort("n", 1).to_list(length=None)
-        chunks_time = time.time() - chunks_start_time
-
-        
-        if not chunks:
-            logger.warning(
-                section=LogSection.FILES,
-                subsection=LogSubsection.FILES.DOWNLOAD,
-                message=f"Чанки для файла {file_id} не найдены в GridFS - файл поврежден или неполный"
-            )
-            return None
-            
-        # Собираем файл из чанков
-        assembly_start_time = time.time()
-        file_data = bytearray()
-        for chunk in chunks:
-            file_data.extend(chunk["data"])
-        
-        assembly_time = time.time() - assembly_start_time
-
-        
-        total_time = time.time() - start_time
-
-            
-        return bytes(file_data)
+        return await grid_out.read()
     except Exception as e:
         total_time = time.time() - start_time
         logger.error(
@@ -93,6 +65,116 @@ async def get_media_file(file_id: str, db):
         )
         raise RuntimeError(f"Не удалось прочитать файл: {e}")
 
+async def open_media_stream(file_id: str, db: AsyncIOMotorDatabase):
+    """
+    Открывает файл GridFS на чтение. Возвращает GridOut или None, если файла нет.
+    """
+    try:
+        obj_id = ObjectId(file_id)
+    except (errors.InvalidId, TypeError):
+        return None
+    fs = AsyncIOMotorGridFSBucket(db)
+    try:
+        return await fs.open_download_stream(obj_id)
+    except NoFile:
+        return None
+
+def parse_range_header(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разбирает заголовок Range вида bytes=start-end (один диапазон).
+    
+    Returns:
+        Tuple[int, int]: включительные границы диапазона или None, если Range не задан
+        
+    Raises:
+        ValueError: если диапазон некорректен или выходит за пределы файла
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.strip().partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        raise ValueError(f"Неподдерживаемый диапазон: {range_header}")
+    start_str, _, end_str = spec.strip().partition("-")
+    if start_str:
+        start = int(start_str)
+        end = int(end_str) if end_str else file_size - 1
+    else:
+        # bytes=-N: последние N байт
+        suffix = int(end_str)
+        if suffix <= 0:
+            raise ValueError(f"Некорректный диапазон: {range_header}")
+        start = max(file_size - suffix, 0)
+        end = file_size - 1
+    end = min(end, file_size - 1)
+    if start < 0 or start > end:
+        raise ValueError(f"Диапазон вне файла: {range_header}")
+    return start, end
+
+async def iter_media_stream(grid_out, start: int, end: int) -> AsyncIterator[bytes]:
+    """
+    Отдаёт байты [start, end] файла GridFS частями не больше STREAM_READ_SIZE:
+    в памяти одновременно находится только текущая часть.
+    """
+    grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = await grid_out.read(min(STREAM_READ_SIZE, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+async def gridfs_media_response(
+    file_id: str,
+    db: AsyncIOMotorDatabase,
+    range_header: Optional[str] = None,
+    headers: Optional[dict] = None
+) -> Optional[Response]:
+    """
+    Потоковый ответ с файлом из GridFS с поддержкой HTTP Range.
+    Возвращает None, если файла в GridFS нет.
+    """
+    grid_out = await open_media_stream(file_id, db)
+    if grid_out is None:
+        return None
+
+    file_size = grid_out.length
+    metadata = grid_out.metadata or {}
+    content_type = metadata.get("content_type") or "application/octet-stream"
+    response_headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=3600",
+        **(headers or {})
+    }
+
+    try:
+        byte_range = parse_range_header(range_header, file_size)
+    except ValueError:
+        return Response(
+            status_code=416,
+            headers={**response_headers, "Content-Range": f"bytes */{file_size}"}
+        )
+
+    if byte_range is None:
+        start, end, status_code = 0, file_size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    response_headers["Content-Length"] = str(max(end - start + 1, 0))
+
+    logger.info(
+        section=LogSection.FILES,
+        subsection=LogSubsection.FILES.GRIDFS,
+        message=f"Потоковая отдача файла {file_id} из GridFS: байты {start}-{end} из {file_size}"
+    )
+    return StreamingResponse(
+        iter_media_stream(grid_out, start, end),
+        status_code=status_code,
+        media_type=content_type,
+        headers=response_headers
+    )
+
 async def delete_media_file(file_id: str, db: AsyncIOMotorDatabase) -> bool:
     """
     Удаляет файл из GridFS.
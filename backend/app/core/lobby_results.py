@@ -0,0 +1,160 @@
+from datetime import datetime
+from typing import Dict, List
+
+# Доля правильных ответов для прохождения теста в результатах лобби
+PASSING_RATIO = 0.8
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    return value
+
+
+def lobby_duration_seconds(lobby: dict) -> float:
+    """Длительность теста: от создания лобби до завершения."""
+    start_time = _as_datetime(lobby.get("created_at"))
+    end_time = _as_datetime(lobby.get("finished_at")) or datetime.utcnow()
+    if not start_time:
+        return 0
+    return (end_time - start_time).total_seconds()
+
+
+def format_duration(duration: float) -> str:
+    return f"{int(duration // 60)}:{int(duration % 60):02d}"  # Формат мм:сс
+
+
+def answer_is_correct(user_answer, correct_answer_index) -> bool:
+    """Сравнение исходного ответа пользователя с индексом правильного ответа из лобби."""
+    if user_answer is None or correct_answer_index is None:
+        return False
+    try:
+        return int(user_answer) == int(correct_answer_index)
+    except (ValueError, TypeError):
+        return False
+
+
+def _percentage(part: int, total: int) -> float:
+    return round((part / total * 100), 2) if total > 0 else 0
+
+
+def _participant_result(
+    answers: Dict[str, bool],
+    raw_answers: dict,
+    question_ids: List[str],
+    questions: Dict[str, dict],
+    correct_answers: dict
+) -> dict:
+    total_questions = len(question_ids)
+    correct_count = sum(1 for is_correct in answers.values() if is_correct)
+    answered_count = len(answers)
+
+    # Разделы ПДД по зафиксированным при ответе результатам
+    section_stats: Dict[str, dict] = {}
+    for q_id, is_correct in answers.items():
+        question = questions.get(q_id)
+        if not question:
+            continue
+        section = question.get("pdd_section", "")
+        stats = section_stats.setdefault(section, {"section": section, "correct": 0, "total": 0, "questions": []})
+        stats["total"] += 1
+        if is_correct:
+            stats["correct"] += 1
+        stats["questions"].append(q_id)
+    for stats in section_stats.values():
+        stats["percentage"] = _percentage(stats["correct"], stats["total"])
+
+    # Разбор по исходным ответам и категориям вопросов
+    review_correct_count = 0
+    category_stats: Dict[str, dict] = {}
+    for q_id in question_ids:
+        is_correct = answer_is_correct(raw_answers.get(q_id), correct_answers.get(q_id))
+        if is_correct:
+            review_correct_count += 1
+        question = questions.get(q_id)
+        if not question:
+            continue
+        for category in question.get("categories", []):
+            stats = category_stats.setdefault(category, {"category": category, "correct": 0, "total": 0})
+            stats["total"] += 1
+            if is_correct:
+                stats["correct"] += 1
+    for stats in category_stats.values():
+        stats["percentage"] = _percentage(stats["correct"], stats["total"])
+
+    return {
+        "correct_count": correct_count,
+        "incorrect_count": answered_count - correct_count,
+        "answered_count": answered_count,
+        "not_answered_count": total_questions - answered_count,
+        "percentage": _percentage(correct_count, total_questions),
+        "passing_score": correct_count >= int(total_questions * PASSING_RATIO),
+        "sections": list(section_stats.values()),
+        "review_answered_count": len(raw_answers),
+        "review_correct_count": review_correct_count,
+        "categories": list(category_stats.values())
+    }
+
+
+def build_results_snapshot(lobby: dict, questions: Dict[str, dict]) -> dict:
+    """
+    Результаты завершённого лобби, которые считаются один раз и отдаются всем
+    эндпоинтам результатов: итоги каждого участника, статистика по разделам
+    и категориям, рейтинг. questions - записи пакета вопросов лобби.
+    Тексты вопросов в снимок не копируются: они уже есть в пакете лобби.
+    """
+    question_ids = [str(q_id) for q_id in lobby.get("question_ids", [])]
+    total_questions = len(question_ids)
+    correct_answers = lobby.get("correct_answers", {})
+    participants_answers = lobby.get("participants_answers", {})
+    participants_raw_answers = lobby.get("participants_raw_answers", {})
+
+    participants = {}
+    for participant_id in dict.fromkeys([*participants_answers, *participants_raw_answers]):
+        participants[participant_id] = _participant_result(
+            participants_answers.get(participant_id, {}),
+            participants_raw_answers.get(participant_id, {}),
+            question_ids,
+            questions,
+            correct_answers
+        )
+
+    # Рейтинг сортируется один раз: по числу правильных ответов
+    ranking = [
+        {
+            "user_id": participant_id,
+            "correct_count": participants[participant_id]["correct_count"],
+            "total": total_questions,
+            "percentage": participants[participant_id]["percentage"]
+        }
+        for participant_id in participants_answers
+    ]
+    ranking.sort(key=lambda item: item["correct_count"], reverse=True)
+
+    return {
+        "computed_at": datetime.utcnow(),
+        "total_questions": total_questions,
+        "duration_seconds": lobby_duration_seconds(lobby),
+        "participants": participants,
+        "ranking": ranking
+    }
+
+
+def participant_snapshot(snapshot: dict, user_id: str) -> dict:
+    """Итоги участника из снимка; для не отвечавших - нулевые значения."""
+    result = snapshot["participants"].get(user_id)
+    if result is not None:
+        return result
+    total_questions = snapshot["total_questions"]
+    return {
+        "correct_count": 0,
+        "incorrect_count": 0,
+        "answered_count": 0,
+        "not_answered_count": total_questions,
+        "percentage": 0,
+        "passing_score": total_questions == 0,
+        "sections": [],
+        "review_answered_count": 0,
+        "review_correct_count": 0,
+        "categories": []
+    }
@@ -1,10 +1,10 @@
 import os
-import shutil
+import asyncio
 import hashlib
 import mimetypes
 import uuid
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, BinaryIO, Tuple
 from pathlib import Path
 from fastapi import UploadFile, HTTPException
 from bson import ObjectId
@@ -14,6 +14,14 @@ from app.core.config import settings
 
 logger = get_logger(__name__)
 
+# Размер блока при копировании и хешировании файлов
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class _FileTooLarge(Exception):
+    """Загрузка превысила MEDIA_MAX_FILE_SIZE_MB во время копирования."""
+
+
 class MediaManager:
     """
     Модульная система для управления медиафайлами.
@@ -110,10 +118,47 @@ class MediaManager:
         """
         hash_sha256 = hashlib.sha256()
         with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+            for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b""):
                 hash_sha256.update(chunk)
         return hash_sha256.hexdigest()
     
+    @staticmethod
+    def _write_and_hash(source: BinaryIO, target_path: Path, max_size: int) -> Tuple[int, str]:
+        """
+        Копирует поток в файл, одновременно вычисляя SHA-256.
+        Выполняется в рабочем потоке: файл читается один раз, крупными блоками.
+        
+        Args:
+            source: Исходный поток (файл загрузки)
+            target_path: Путь к создаваемому файлу
+            max_size: Максимальный размер в байтах
+            
+        Returns:
+            Tuple[int, str]: Размер файла и его SHA-256 хеш
+        """
+        hash_sha256 = hashlib.sha256()
+        size = 0
+        buffer = bytearray(COPY_BUFFER_SIZE)
+        view = memoryview(buffer)
+        with open(target_path, "wb") as target:
+            while True:
+                read = source.readinto(view)
+                if not read:
+                    break
+                size += read
+                if size > max_size:
+                    raise _FileTooLarge()
+                hash_sha256.update(view[:read])
+                target.write(view[:read])
+        return size, hash_sha256.hexdigest()
+    
+    @staticmethod
+    def _remove_file(file_path: Path) -> None:
+        try:
+            file_path.unlink()
+        except FileNotFoundError:
+            pass
+    
     async def save_media_file(
         self, 
         file: UploadFile, 
@@ -152,30 +197,30 @@ class MediaManager:
         media_path = self._get_media_type_path(file.content_type)
         safe_filename = self._generate_safe_filename(file.filename, file.content_type)
         file_path = media_path / safe_filename
+        # Временный файл в той же директории: переименование в file_path атомарно
+        temp_path = media_path / f".{safe_filename}.part"
+        max_size = settings.MEDIA_MAX_FILE_SIZE_MB * 1024 * 1024
         
-        # Сохраняем файл локально
+        # Копируем загрузку во временный файл и считаем хеш в потоке,
+        # чтобы большие видео не блокировали event loop
         try:
             # Сбрасываем курсор чтения файла в начало (важно!)
             await file.seek(0)
+            file_size, file_hash = await asyncio.to_thread(
+                self._write_and_hash, file.file, temp_path, max_size
+            )
             
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            # Проверяем что файл действительно создался
-            if not file_path.exists():
-                raise Exception(f"Файл не был создан: {file_path}")
-            
-            file_size = file_path.stat().st_size
             if file_size == 0:
-                raise Exception(f"Файл создан но пустой: {file_path}")
+                raise Exception(f"Файл {file.filename} пустой")
                 
-            logger.info(
-                section=LogSection.FILES,
-                subsection=LogSubsection.FILES.UPLOAD,
-                message=f"Файл физически сохранен на диск: {file_path} ({file_size} байт)"
+        except _FileTooLarge:
+            await asyncio.to_thread(self._remove_file, temp_path)
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Превышен допустимый размер файла (макс. {settings.MEDIA_MAX_FILE_SIZE_MB} МБ)"
             )
-            
         except Exception as e:
+            await asyncio.to_thread(self._remove_file, temp_path)
             logger.error(
                 section=LogSection.FILES,
                 subsection=LogSubsection.FILES.ERROR,
@@ -183,15 +228,10 @@ class MediaManager:
             )
             raise HTTPException(status_code=500, detail=f"Ошибка сохранения файла: {e}")
         
-        # Вычисляем хеш файла
-        file_hash = self._calculate_file_hash(file_path)
-        
-        # Проверяем, существует ли уже файл с таким хешем
+        # Проверяем дубликат до того, как файл попадёт в хранилище
         existing_file = await db.media_files.find_one({"file_hash": file_hash})
         if existing_file:
-            # Удаляем только что сохраненный файл, так как он дубликат
-            if file_path.exists():
-                file_path.unlink()
+            await asyncio.to_thread(self._remove_file, temp_path)
             
             logger.info(
                 section=LogSection.FILES,
@@ -212,6 +252,23 @@ class MediaManager:
                 "is_duplicate": True
             }
         
+        try:
+            os.replace(temp_path, file_path)
+        except OSError as e:
+            await asyncio.to_thread(self._remove_file, temp_path)
+            logger.error(
+                section=LogSection.FILES,
+                subsection=LogSubsection.FILES.ERROR,
+                message=f"Ошибка перемещения файла {file.filename} в хранилище: {str(e)}"
+            )
+            raise HTTPException(status_code=500, detail=f"Ошибка сохранения файла: {e}")
+        
+        logger.info(
+            section=LogSection.FILES,
+            subsection=LogSubsection.FILES.UPLOAD,
+            message=f"Файл физически сохранен на диск: {file_path} ({file_size} байт)"
+        )
+        
         # Определяем относительный путь для X-Accel-Redirect
         relative_path = file_path.relative_to(self.base_path)
         
@@ -220,7 +277,7 @@ class MediaManager:
             "original_filename": file.filename,
             "safe_filename": safe_filename,
             "content_type": file.content_type,
-            "file_size": file_path.stat().st_size,
+            "file_size": file_size,
             "file_hash": file_hash,
             "relative_path": str(relative_path).replace("\\", "/"),
             "created_by": created_by,
@@ -535,9 +592,9 @@ class MediaManager:
                 )
                 return None
             
-            # Читаем содержимое файла
-            with open(file_path, "rb") as f:
-                content = f.read()
+            # Читаем содержимое файла в рабочем потоке, не блокируя event loop.
+            # Для отдачи клиенту используйте X-Accel-Redirect (get_file_url)
+            content = await asyncio.to_thread(file_path.read_bytes)
             
             # Обновляем статистику доступа
             await db.media_files.update_one(
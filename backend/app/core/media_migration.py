@@ -0,0 +1,331 @@
+import asyncio
+import hashlib
+import os
+import socket
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.core.media_manager import media_manager, COPY_BUFFER_SIZE
+from app.core.question_cache import question_cache, bump_questions_version
+from app.core.redis_client import get_multiplayer_redis_connection
+from app.db.database import db
+from app.logging import get_logger, LogSection, LogSubsection
+
+logger = get_logger(__name__)
+
+# Документ с прогрессом переноса в коллекции media_migrations
+STATE_ID = "gridfs_to_local"
+# Перенос выполняет один воркер: ключ с TTL продлевается после каждого файла
+LOCK_KEY = "media_migration:lock"
+
+RENEW_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Поля вопроса, которые могут ссылаться на файл GridFS
+_MEDIA_REFERENCE_FIELDS = ("media_file_id", "after_answer_media_file_id", "after_answer_media_id")
+
+_MIGRATION_CREATOR = {"full_name": "GridFS migration", "iin": None, "role": "system"}
+
+
+def _write_chunk(target, hasher, data: bytes) -> None:
+    hasher.update(data)
+    target.write(data)
+
+
+async def _copy_to_temp(grid_out, temp_path: Path) -> Tuple[int, str]:
+    """
+    Копирует файл GridFS во временный файл частями, считая SHA-256 по пути.
+    Запись и хеширование выполняются в рабочем потоке.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    target = await asyncio.to_thread(open, temp_path, "wb")
+    try:
+        while True:
+            data = await grid_out.read(COPY_BUFFER_SIZE)
+            if not data:
+                break
+            size += len(data)
+            await asyncio.to_thread(_write_chunk, target, hasher, data)
+    finally:
+        await asyncio.to_thread(target.close)
+    return size, hasher.hexdigest()
+
+
+async def _rewrite_question_references(gridfs_id: ObjectId, media_id: str) -> int:
+    """Переключает ссылки вопросов с файла GridFS на запись media_files."""
+    ids = [gridfs_id, str(gridfs_id)]
+    updated = 0
+    for field in _MEDIA_REFERENCE_FIELDS:
+        question_ids = await db.questions.distinct("_id", {field: {"$in": ids}})
+        if not question_ids:
+            continue
+        result = await db.questions.update_many(
+            {"_id": {"$in": question_ids}, field: {"$in": ids}},
+            {"$set": {field: media_id}}
+        )
+        updated += result.modified_count
+        for question_id in question_ids:
+            question_cache.invalidate(question_id)
+    if updated:
+        # Остальные воркеры сбросят свои кэши вопросов по новой версии
+        await bump_questions_version()
+    return updated
+
+
+async def migrate_gridfs_file(file_doc: dict) -> str:
+    """
+    Переносит один файл GridFS в локальное хранилище MediaManager.
+    Повторный вызов для уже перенесённого файла только обновляет ссылки.
+    Файл в GridFS не удаляется: старые ссылки (например, в пакетах
+    вопросов активных лобби) продолжают работать.
+
+    Returns:
+        str: "migrated", "deduplicated" или "already_migrated"
+    """
+    gridfs_id = file_doc["_id"]
+    existing = await db.media_files.find_one({"legacy_gridfs_ids": gridfs_id}, {"_id": 1})
+    if existing:
+        await _rewrite_question_references(gridfs_id, str(existing["_id"]))
+        return "already_migrated"
+
+    metadata = file_doc.get("metadata") or {}
+    content_type = metadata.get("content_type") or file_doc.get("contentType") or "application/octet-stream"
+    original_filename = file_doc.get("filename") or "media_file"
+
+    media_path = media_manager._get_media_type_path(content_type)
+    safe_filename = media_manager._generate_safe_filename(original_filename, content_type)
+    file_path = media_path / safe_filename
+    temp_path = media_path / f".{safe_filename}.part"
+
+    fs = AsyncIOMotorGridFSBucket(db)
+    grid_out = await fs.open_download_stream(gridfs_id)
+    try:
+        file_size, file_hash = await _copy_to_temp(grid_out, temp_path)
+    except Exception:
+        await asyncio.to_thread(media_manager._remove_file, temp_path)
+        raise
+
+    duplicate = await db.media_files.find_one({"file_hash": file_hash}, {"_id": 1})
+    if duplicate:
+        await asyncio.to_thread(media_manager._remove_file, temp_path)
+        media_id = duplicate["_id"]
+        await db.media_files.update_one({"_id": media_id}, {"$addToSet": {"legacy_gridfs_ids": gridfs_id}})
+        outcome = "deduplicated"
+    else:
+        os.replace(temp_path, file_path)
+        now = datetime.utcnow()
+        relative_path = str(file_path.relative_to(media_manager.base_path)).replace("\\", "/")
+        try:
+            result = await db.media_files.insert_one({
+                "original_filename": original_filename,
+                "safe_filename": safe_filename,
+                "content_type": content_type,
+                "file_size": file_size,
+                "file_hash": file_hash,
+                "relative_path": relative_path,
+                "created_by": _MIGRATION_CREATOR,
+                "created_at": file_doc.get("uploadDate") or now,
+                "updated_at": now,
+                "is_hidden": False,
+                "is_deleted": False,
+                "download_count": 0,
+                "last_accessed": None,
+                "tags": [],
+                "description": "",
+                "category": "",
+                "legacy_gridfs_ids": [gridfs_id],
+            })
+        except Exception:
+            await asyncio.to_thread(media_manager._remove_file, file_path)
+            raise
+        media_id = result.inserted_id
+        outcome = "migrated"
+
+    questions_updated = await _rewrite_question_references(gridfs_id, str(media_id))
+    logger.info(
+        section=LogSection.FILES,
+        subsection=LogSubsection.FILES.GRIDFS,
+        message=f"Файл GridFS {gridfs_id} перенесён в медиахранилище как {media_id} ({outcome}, {file_size} байт), обновлено вопросов: {questions_updated}"
+    )
+    return outcome
+
+
+class MediaMigrator:
+    """
+    Фоновый перенос файлов из GridFS в локальное хранилище, которое nginx
+    отдаёт через X-Accel-Redirect. Файлы обрабатываются по возрастанию _id,
+    позиция сохраняется в media_migrations после каждого файла, поэтому после
+    перезапуска перенос продолжается с места остановки. Между файлами
+    выдерживается пауза MEDIA_MIGRATION_PAUSE_SECONDS. Файлы, которые не
+    удалось перенести, копятся в failed_ids и повторяются при каждом запуске;
+    перенос считается завершённым, только когда этот список пуст.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    async def _hold_lock(self, redis_conn, acquire: bool = False) -> bool:
+        ttl_ms = settings.MEDIA_MIGRATION_LOCK_TTL_SECONDS * 1000
+        if acquire:
+            return bool(await redis_conn.set(LOCK_KEY, self.worker_id, nx=True, px=ttl_ms))
+        return bool(await redis_conn.eval(RENEW_LOCK_SCRIPT, 1, LOCK_KEY, self.worker_id, ttl_ms))
+
+    async def _next_file(self, last_id: Optional[ObjectId]) -> Optional[dict]:
+        query = {"_id": {"$gt": last_id}} if last_id else {}
+        return await db.fs.files.find_one(query, sort=[("_id", 1)])
+
+    async def _migrate(self, file_doc: dict) -> Optional[str]:
+        """Переносит файл и возвращает результат; None - перенос не удался."""
+        try:
+            return await migrate_gridfs_file(file_doc)
+        except Exception as e:
+            logger.error(
+                section=LogSection.FILES,
+                subsection=LogSubsection.FILES.ERROR,
+                message=f"Не удалось перенести файл GridFS {file_doc['_id']}: {str(e)}"
+            )
+            return None
+
+    async def _retry_failed(self, state: dict, redis_conn) -> Tuple[dict, bool]:
+        """
+        Повторяет перенос файлов из failed_ids. Успешные и удалённые из GridFS
+        файлы убираются из списка. Возвращает состояние и признак того,
+        что блокировка всё ещё у этого воркера.
+        """
+        for file_id in list(state.get("failed_ids", [])):
+            file_doc = await db.fs.files.find_one({"_id": file_id})
+            if file_doc is None:
+                # Файл удалили из GridFS - переносить больше нечего
+                update = {"$pull": {"failed_ids": file_id}, "$inc": {"failed": -1}}
+            else:
+                outcome = await self._migrate(file_doc)
+                if outcome is None:
+                    continue
+                update = {"$pull": {"failed_ids": file_id}, "$inc": {"failed": -1, outcome: 1}}
+            update.setdefault("$set", {})["updated_at"] = datetime.utcnow()
+            state = await db.media_migrations.find_one_and_update(
+                {"_id": STATE_ID},
+                update,
+                return_document=ReturnDocument.AFTER
+            )
+            if not await self._hold_lock(redis_conn):
+                return state, False
+            await asyncio.sleep(settings.MEDIA_MIGRATION_PAUSE_SECONDS)
+        return state, True
+
+    async def run_once(self) -> dict:
+        """
+        Переносит все ещё не обработанные файлы и повторяет неудачные.
+        Возвращает итоговое состояние; finished_at выставляется, только
+        когда в failed_ids не осталось файлов.
+        """
+        state = await db.media_migrations.find_one({"_id": STATE_ID}) or {"_id": STATE_ID}
+        if state.get("finished_at"):
+            return state
+
+        redis_conn = await get_multiplayer_redis_connection()
+        if not await self._hold_lock(redis_conn, acquire=True):
+            return state
+        # Позицию могли сдвинуть, пока блокировка была у другого воркера
+        state = await db.media_migrations.find_one({"_id": STATE_ID}) or {"_id": STATE_ID}
+
+        logger.info(
+            section=LogSection.FILES,
+            subsection=LogSubsection.FILES.GRIDFS,
+            message=f"Перенос GridFS в медиахранилище запущен воркером {self.worker_id} с позиции {state.get('last_id')}"
+        )
+        try:
+            while True:
+                file_doc = await self._next_file(state.get("last_id"))
+                if file_doc is None:
+                    break
+
+                update = {"$set": {"last_id": file_doc["_id"], "updated_at": datetime.utcnow()}}
+                outcome = await self._migrate(file_doc)
+                if outcome is None:
+                    # Позиция сдвигается, а файл остаётся в failed_ids для повтора
+                    update["$inc"] = {"processed": 1, "failed": 1}
+                    update["$addToSet"] = {"failed_ids": file_doc["_id"]}
+                else:
+                    update["$inc"] = {"processed": 1, outcome: 1}
+
+                state = await db.media_migrations.find_one_and_update(
+                    {"_id": STATE_ID},
+                    update,
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                if not await self._hold_lock(redis_conn):
+                    # Блокировку перехватил другой воркер - он продолжит с сохранённой позиции
+                    return state
+                await asyncio.sleep(settings.MEDIA_MIGRATION_PAUSE_SECONDS)
+
+            state, holds_lock = await self._retry_failed(state, redis_conn)
+            if not holds_lock:
+                return state
+            if state.get("failed_ids"):
+                logger.warning(
+                    section=LogSection.FILES,
+                    subsection=LogSubsection.FILES.GRIDFS,
+                    message=f"Перенос GridFS не завершён: {len(state['failed_ids'])} файлов с ошибками, повтор через {settings.MEDIA_MIGRATION_LOCK_TTL_SECONDS} с"
+                )
+                return state
+
+            state = await db.media_migrations.find_one_and_update(
+                {"_id": STATE_ID},
+                {"$set": {"finished_at": datetime.utcnow()}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            # Ссылки вопросов поменялись: списки вопросов в админке должны обновиться
+            await bump_questions_version()
+            logger.info(
+                section=LogSection.FILES,
+                subsection=LogSubsection.FILES.GRIDFS,
+                message=f"Перенос GridFS завершён: перенесено {state.get('migrated', 0)}, дубликатов {state.get('deduplicated', 0)}"
+            )
+            return state
+        finally:
+            await redis_conn.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_KEY, self.worker_id)
+
+    async def run(self):
+        """Фоновая задача: ждёт, пока перенос не будет завершён этим или другим воркером."""
+        if not settings.MEDIA_MIGRATION_ENABLED:
+            return
+        while True:
+            try:
+                state = await self.run_once()
+                if state.get("finished_at"):
+                    return
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(
+                    section=LogSection.FILES,
+                    subsection=LogSubsection.FILES.ERROR,
+                    message=f"Ошибка переноса GridFS в медиахранилище: {str(e)}"
+                )
+            await asyncio.sleep(settings.MEDIA_MIGRATION_LOCK_TTL_SECONDS)
+
+
+# Глобальный мигратор (один на процесс, работает только под блокировкой)
+media_migrator = MediaMigrator()
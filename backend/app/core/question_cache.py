@@ -0,0 +1,229 @@
+import copy
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+
+from app.core.config import settings
+from app.core.redis_client import get_multiplayer_redis_connection
+from app.db.database import db
+from app.logging import get_logger, LogSection, LogSubsection
+
+logger = get_logger(__name__)
+
+# Счётчик версий банка вопросов в Redis: растёт при каждом изменении вопроса
+QUESTIONS_VERSION_KEY = "questions:version"
+
+
+def _question_id_variants(question_id) -> List:
+    """
+    Возвращает варианты _id для поиска вопроса.
+    В базе встречаются вопросы как со строковым _id, так и с ObjectId.
+    """
+    variants = [question_id]
+    if isinstance(question_id, ObjectId):
+        variants.append(str(question_id))
+    elif isinstance(question_id, str) and ObjectId.is_valid(question_id):
+        variants.append(ObjectId(question_id))
+    return variants
+
+
+class QuestionCache:
+    """
+    Процессный LRU-кэш вопросов с ограничением по времени жизни.
+    Вопросы почти не меняются, поэтому пути ответа и просмотра вопроса
+    читают их отсюда, а не из MongoDB. Ключ - строковое представление _id.
+
+    Кэш привязан к версии банка вопросов в Redis (questions:version): не чаще
+    раза в QUESTION_CACHE_VERSION_CHECK_SECONDS версия сверяется, и если её
+    увеличил любой воркер, кэш процесса очищается.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: int, version_check_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.version_check_seconds = version_check_seconds
+        self._items: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.version_resets = 0
+
+    async def _sync_version(self) -> None:
+        """Очищает кэш, если версия банка вопросов изменилась в другом воркере."""
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_seconds:
+            return
+        self._version_checked_at = now
+        version = await get_questions_version()
+        if version is None:
+            # Redis недоступен: остаётся ограничение по TTL
+            return
+        if self._version is not None and version != self._version:
+            self._items.clear()
+            self.version_resets += 1
+        self._version = version
+
+    def _get_local(self, key: str) -> Optional[dict]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        stored_at, question = item
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return question
+
+    def _put_local(self, question: dict, version: Optional[int] = None) -> None:
+        # Документ прочитан до смены версии - он мог устареть, не кэшируем
+        if version != self._version:
+            return
+        key = str(question["_id"])
+        self._items[key] = (time.monotonic(), question)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    async def get_question(self, question_id) -> Optional[dict]:
+        """Получить вопрос по _id (строка или ObjectId). Возвращает копию документа."""
+        if not question_id:
+            return None
+        await self._sync_version()
+        key = str(question_id)
+        question = self._get_local(key)
+        if question is not None:
+            self.hits += 1
+            return copy.deepcopy(question)
+
+        self.misses += 1
+        version = self._version
+        for variant in _question_id_variants(question_id):
+            question = await db.questions.find_one({"_id": variant})
+            if question:
+                self._put_local(question, version)
+                return copy.deepcopy(question)
+        return None
+
+    async def get_questions(self, question_ids: Iterable) -> Dict[str, dict]:
+        """
+        Получить несколько вопросов сразу. Отсутствующие в кэше вопросы
+        загружаются одним запросом $in. Ключи результата - строковые _id.
+        """
+        await self._sync_version()
+        result: Dict[str, dict] = {}
+        missing = []
+        for question_id in question_ids:
+            if not question_id:
+                continue
+            key = str(question_id)
+            if key in result:
+                continue
+            question = self._get_local(key)
+            if question is not None:
+                self.hits += 1
+                result[key] = copy.deepcopy(question)
+            else:
+                missing.append(question_id)
+
+        if missing:
+            self.misses += len(missing)
+            lookup_ids = []
+            for question_id in missing:
+                lookup_ids.extend(_question_id_variants(question_id))
+            version = self._version
+            async for question in db.questions.find({"_id": {"$in": lookup_ids}}):
+                self._put_local(question, version)
+                result[str(question["_id"])] = copy.deepcopy(question)
+
+        return result
+
+    def put_many(self, questions: Iterable[dict]) -> None:
+        """Положить в кэш уже загруженные документы вопросов (например, выборку при создании лобби)."""
+        for question in questions:
+            if question and question.get("_id") is not None:
+                self._put_local(copy.deepcopy(question), self._version)
+
+    async def preload(self, question_ids: Iterable) -> int:
+        """Прогреть кэш вопросами лобби при его старте."""
+        question_ids = list(question_ids or [])
+        if not question_ids:
+            return 0
+        try:
+            loaded = await self.get_questions(question_ids)
+            return len(loaded)
+        except Exception as e:
+            logger.warning(
+                section=LogSection.DATABASE,
+                subsection=LogSubsection.DATABASE.QUERY,
+                message=f"Не удалось прогреть кэш вопросов ({len(question_ids)} шт.): {str(e)}"
+            )
+            return 0
+
+    def invalidate(self, question_id) -> None:
+        """
+        Удалить вопрос из кэша этого процесса. После изменения вопроса
+        используйте invalidate_question - она сбрасывает кэш во всех воркерах.
+        """
+        if question_id:
+            self._items.pop(str(question_id), None)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._items),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "version": self._version,
+            "version_resets": self.version_resets,
+        }
+
+
+# Глобальный экземпляр кэша вопросов (один на процесс)
+question_cache = QuestionCache(
+    max_size=settings.QUESTION_CACHE_MAX_SIZE,
+    ttl_seconds=settings.QUESTION_CACHE_TTL_SECONDS,
+    version_check_seconds=settings.QUESTION_CACHE_VERSION_CHECK_SECONDS
+)
+
+
+async def get_questions_version() -> Optional[int]:
+    """Текущая версия банка вопросов или None, если Redis недоступен."""
+    try:
+        redis_conn = await get_multiplayer_redis_connection()
+        return int(await redis_conn.get(QUESTIONS_VERSION_KEY) or 0)
+    except Exception as e:
+        logger.warning(
+            section=LogSection.REDIS,
+            subsection=LogSubsection.REDIS.CACHE,
+            message=f"Не удалось прочитать версию банка вопросов: {str(e)}"
+        )
+        return None
+
+
+async def bump_questions_version() -> None:
+    """Отметить изменение банка вопросов: сбрасывает ETag списков вопросов."""
+    try:
+        redis_conn = await get_multiplayer_redis_connection()
+        await redis_conn.incr(QUESTIONS_VERSION_KEY)
+    except Exception as e:
+        logger.warning(
+            section=LogSection.REDIS,
+            subsection=LogSubsection.REDIS.CACHE,
+            message=f"Не удалось увеличить версию банка вопросов: {str(e)}"
+        )
+
+
+async def invalidate_question(question_id) -> None:
+    """
+    Сбросить вопрос после изменения: сразу в этом процессе, в остальных
+    воркерах - через увеличение версии банка вопросов.
+    """
+    question_cache.invalidate(question_id)
+    await bump_questions_version()
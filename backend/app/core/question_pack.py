@@ -0,0 +1,94 @@
+from typing import Dict, Iterable, Optional
+
+from app.core.question_cache import question_cache
+
+# Расширения, по которым медиа считается видео
+VIDEO_EXTENSIONS = (".mp4", ".webm", ".mov")
+
+
+def correct_index_from_label(correct_answer_raw) -> int:
+    """Преобразует correct_label (A, B, C...) или число в индекс ответа."""
+    if isinstance(correct_answer_raw, str) and correct_answer_raw:
+        return ord(correct_answer_raw.upper()) - ord('A')
+    if isinstance(correct_answer_raw, int):
+        return correct_answer_raw
+    return 0
+
+
+def _media_type(filename) -> str:
+    if filename and isinstance(filename, str) and filename.lower().endswith(VIDEO_EXTENSIONS):
+        return "video"
+    return "image"
+
+
+def build_pack_entry(question: dict) -> dict:
+    """
+    Собирает компактную запись вопроса для пакета лобби: тексты на всех языках,
+    варианты ответа, объяснение, медиа и индекс правильного ответа.
+    """
+    media_file_id = question.get("media_file_id")
+    media_filename = question.get("media_filename")
+    after_answer_media_file_id = question.get("after_answer_media_file_id") or question.get("after_answer_media_id")
+    after_answer_media_filename = question.get("after_answer_media_filename")
+
+    return {
+        "_id": str(question["_id"]),
+        "question_text": question.get("question_text", {}),
+        "answers": [option.get("text") for option in question.get("options", [])],
+        "explanation": question.get("explanation", {}),
+        "correct_answer_index": correct_index_from_label(question.get("correct_label")),
+        "has_media": bool(question.get("has_media") or (media_file_id and media_filename)),
+        "media_type": _media_type(media_filename),
+        "media_file_id": str(media_file_id) if media_file_id else None,
+        "media_filename": media_filename,
+        "has_after_answer_media": bool(question.get("has_after_answer_media") or after_answer_media_file_id),
+        "after_answer_media_type": _media_type(after_answer_media_filename),
+        "after_answer_media_file_id": str(after_answer_media_file_id) if after_answer_media_file_id else None,
+        "after_answer_media_filename": after_answer_media_filename,
+        "categories": question.get("categories", []),
+        "pdd_section_uids": question.get("pdd_section_uids", [])
+    }
+
+
+def build_question_pack(questions: Iterable[dict]) -> Dict[str, dict]:
+    """Собирает неизменяемый пакет вопросов лобби, ключ - строковый _id вопроса."""
+    return {str(q["_id"]): build_pack_entry(q) for q in questions}
+
+
+async def get_packed_question(lobby: dict, question_id) -> Optional[dict]:
+    """
+    Возвращает вопрос из пакета лобби.
+    Для лобби, созданных до появления пакета, запись собирается из кэша вопросов.
+    """
+    entry = (lobby.get("question_pack") or {}).get(str(question_id))
+    if entry:
+        return entry
+    question = await question_cache.get_question(question_id)
+    return build_pack_entry(question) if question else None
+
+
+async def get_packed_questions(lobby: dict, question_ids: Optional[Iterable] = None) -> Dict[str, dict]:
+    """
+    Пакетная версия get_packed_question для построения результатов и статистики:
+    записи всех вопросов лобби (или только question_ids), ключ - строковый _id.
+    Вопросы, которых нет в пакете, догружаются одним запросом $in через кэш вопросов.
+    """
+    pack = lobby.get("question_pack") or {}
+    if question_ids is None:
+        question_ids = lobby.get("question_ids", [])
+
+    entries: Dict[str, dict] = {}
+    missing = []
+    for question_id in question_ids:
+        key = str(question_id)
+        entry = pack.get(key)
+        if entry:
+            entries[key] = entry
+        else:
+            missing.append(question_id)
+
+    if missing:
+        questions = await question_cache.get_questions(missing)
+        for key, question in questions.items():
+            entries[key] = build_pack_entry(question)
+    return entries
@@ -9,10 +9,11 @@ from app.core.response import error
 from app.db.database import db
 from app.core.config import settings
 from app.logging import get_logger, LogSection, LogSubsection
+from app.core.auth_cache import auth_cache, activity_recorder
 
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from app.db.database import get_database
 
 # Настройка логгера
 logger = get_logger(__name__)
@@ -20,6 +21,16 @@ logger = get_logger(__name__)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Отдельный ограниченный пул для bcrypt: хэширование занимает десятки-сотни мс
+# и не должно блокировать event loop воркера
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt"
+)
+# Статистика пула: задачи в работе и в очереди, пик и отказы по перегрузке
+_password_stats = {"in_flight": 0, "peak": 0, "rejected": 0}
+
+
 def hash_password(plain_password: str) -> str:
     return pwd_context.hash(plain_password)
 
@@ -28,6 +39,51 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def get_password_hash_stats() -> dict:
+    """Текущая глубина очереди bcrypt и счётчики пула."""
+    return {
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "max_pending": settings.PASSWORD_HASH_MAX_PENDING,
+        "queue_depth": max(0, _password_stats["in_flight"] - settings.PASSWORD_HASH_WORKERS),
+        **_password_stats
+    }
+
+
+async def _run_password_job(func, *args):
+    """
+    Выполняет bcrypt в выделенном пуле. Если очередь заполнена, сразу отвечает 429,
+    а не копит ожидающие запросы.
+    """
+    if _password_stats["in_flight"] >= settings.PASSWORD_HASH_MAX_PENDING:
+        _password_stats["rejected"] += 1
+        logger.warning(
+            section=LogSection.SECURITY,
+            subsection=LogSubsection.SECURITY.RATE_LIMIT,
+            message=f"Пул хэширования паролей перегружен: {get_password_hash_stats()}"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={"message": "Сервер перегружен, повторите попытку через несколько секунд"},
+            headers={"Retry-After": "2"}
+        )
+
+    _password_stats["in_flight"] += 1
+    _password_stats["peak"] = max(_password_stats["peak"], _password_stats["in_flight"])
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_password_executor, func, *args)
+    finally:
+        _password_stats["in_flight"] -= 1
+
+
+async def hash_password_async(plain_password: str) -> str:
+    return await _run_password_job(hash_password, plain_password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: timedelta = None) -> tuple[str, datetime]:
     expire = datetime.utcnow() + (expires_delta or timedelta(days=settings.ACCESS_TOKEN_EXPIRE_DAYS))
     to_encode = data.copy()
@@ -61,6 +117,7 @@ async def store_token_in_db(token: str, user_id, expires_at: datetime, ip: str,
         if len(active_tokens) >= 3:
             oldest = active_tokens[0]
             await db.tokens.update_one({"_id": oldest["_id"]}, {"$set": {"revoked": True}})
+            await auth_cache.invalidate_token(oldest["token"])
             logger.info(
                 section=LogSection.AUTH,
                 subsection=LogSubsection.AUTH.TOKEN_LIMIT,
@@ -181,14 +238,8 @@ async def get_current_user(request: Request):
             detail={"message": "Пользователь не найден"}
         )
 
-    await db.tokens.update_one(
-        {"_id": token_doc["_id"]},
-        {"$set": {
-            "last_activity": datetime.utcnow(),
-            "ip": request.client.host,
-            "user_agent": request.headers.get("User-Agent", "unknown")
-        }}
-    )
+    # Метки активности пишутся пакетно фоновой задачей
+    activity_recorder.record("tokens", token_doc["_id"], request.client.host, request.headers.get("User-Agent", "unknown"))
     
     logger.info(
         section=LogSection.AUTH,
@@ -257,6 +308,18 @@ async def get_current_actor(request: Request) -> dict:
             detail={"message": "Ошибка валидации токена", "hint": "Невозможно декодировать токен"}
         )
 
+    # ─────────────────────────── КЭШ ТОКЕНОВ ─────────────────────────────────
+    # Подпись и срок JWT проверены выше; недавно проверенный токен не требует
+    # обращений к MongoDB (отзыв сбрасывает кэш во всех воркерах)
+    cached = auth_cache.get(token)
+    if cached is not None:
+        principal, (collection, doc_id, field_prefix) = cached
+        activity_recorder.record(
+            collection, doc_id, request.client.host, request.headers.get("User-Agent", "unknown"),
+            field_prefix=field_prefix
+        )
+        return principal
+
     # ──────────────────────────── GUEST ──────────────────────────────────────
     if role == "guest":
         token_doc = await db.tokens.find_one({"token": token})
@@ -271,15 +334,8 @@ async def get_current_actor(request: Request) -> dict:
                 detail={"message": "Токен недействителен", "hint": "Он отозван или истёк"}
             )
 
-        # обновляем метки активности
-        await db.tokens.update_one(
-            {"_id": token_doc["_id"]},
-            {"$set": {
-                "last_activity": datetime.utcnow(),
-                "ip": request.client.host,
-                "user_agent": request.headers.get("User-Agent", "unknown")
-            }}
-        )
+        # обновляем метки активности (пакетно, фоновой задачей)
+        activity_recorder.record("tokens", token_doc["_id"], request.client.host, request.headers.get("User-Agent", "unknown"))
 
         guest = await db.guests.find_one({"_id": user_id})
         if not guest:
@@ -299,7 +355,7 @@ async def get_current_actor(request: Request) -> dict:
             message=f"Гость {guest.get('full_name', 'неизвестен')} ({user_id}) успешно аутентифицирован для лобби {guest.get('lobby_id')} с IP {request.client.host}"
         )
 
-        return {
+        principal = {
             "type": "guest",
             "id": guest["_id"],
             "role": role,
@@ -309,6 +365,8 @@ async def get_current_actor(request: Request) -> dict:
             "is_guest": True,
             "created_at": guest.get("created_at")
         }
+        auth_cache.put(token, principal, ("tokens", token_doc["_id"], ""), token_doc["expires_at"])
+        return principal
 
     # ──────────────────────────── USER ──────────────────────────────────────
     elif role == "user":
@@ -324,15 +382,8 @@ async def get_current_actor(request: Request) -> dict:
                 detail={"message": "Токен недействителен", "hint": "Он отозван или истёк"}
             )
 
-        # обновляем метки активности
-        await db.tokens.update_one(
-            {"_id": token_doc["_id"]},
-            {"$set": {
-                "last_activity": datetime.utcnow(),
-                "ip": request.client.host,
-                "user_agent": request.headers.get("User-Agent", "unknown")
-            }}
-        )
+        # обновляем метки активности (пакетно, фоновой задачей)
+        activity_recorder.record("tokens", token_doc["_id"], request.client.host, request.headers.get("User-Agent", "unknown"))
 
         # Проверяем, что это не гость (для роли user)
         if isinstance(user_id, str) and user_id.startswith("guest_"):
@@ -360,7 +411,7 @@ async def get_current_actor(request: Request) -> dict:
 
 
 
-        return {
+        principal = {
             "type": "user",
             "id": user["_id"],
             "role": role,
@@ -371,6 +422,8 @@ async def get_current_actor(request: Request) -> dict:
             "money": user.get("money"),
             "created_at": user.get("created_at")
         }
+        auth_cache.put(token, principal, ("tokens", token_doc["_id"], ""), token_doc["expires_at"])
+        return principal
 
     # ─────────────────────── ADMIN / MODER ──────────────────────────────────
     elif role in ("admin", "moderator", "tests_creator"):
@@ -410,14 +463,10 @@ async def get_current_actor(request: Request) -> dict:
                 detail={"message": "Сессия не активна или токен устарел"}
             )
 
-        # обновляем активность
-        await db.admins.update_one(
-            {"_id": admin["_id"]},
-            {"$set": {
-                "active_session.last_activity": datetime.utcnow(),
-                "active_session.ip": request.client.host,
-                "active_session.user_agent": request.headers.get("User-Agent", "unknown")
-            }}
+        # обновляем активность (пакетно, фоновой задачей)
+        activity_recorder.record(
+            "admins", admin["_id"], request.client.host, request.headers.get("User-Agent", "unknown"),
+            field_prefix="active_session."
         )
 
         logger.info(
@@ -426,13 +475,15 @@ async def get_current_actor(request: Request) -> dict:
             message=f"Администратор {admin.get('full_name', 'неизвестен')} ({user_id}) с ролью {role} успешно аутентифицирован с IP {request.client.host}"
         )
 
-        return {
+        principal = {
             "type": "admin",
             "id": admin["_id"],
             "role": role,                     # 'admin' или 'moder'
             "full_name": admin.get("full_name"),
             "iin": admin.get("iin"),
         }
+        auth_cache.put(token, principal, ("admins", admin["_id"], "active_session."))
+        return principal
 
     # ──────────────────────── НЕИЗВЕСТНАЯ РОЛЬ ──────────────────────────────
     logger.warning(
@@ -445,57 +496,6 @@ async def get_current_actor(request: Request) -> dict:
         detail={"message": "Неизвестная роль", "hint": "Роль не распознана"}
     )
 
-async def auto_close_expired_exams():
-    """Background task to automatically close expired exam lobbies"""
-    try:
-        # Get database connection
-        db = await get_database()
-        
-        # Find active exam lobbies with expired timers
-        expired_lobbies = await db.lobbies.find({
-            "status": "active",
-            "exam_mode": True,
-            "exam_timer.time_left": {"$lte": 0}
-        }).to_list(None)
-        
-        closed_count = 0
-        for lobby in expired_lobbies:
-            lobby_id = str(lobby["_id"])
-            
-            # Close the lobby
-            await db.lobbies.update_one(
-                {"_id": lobby["_id"]},
-                {
-                    "$set": {
-                        "status": "completed",
-                        "completed_at": datetime.utcnow(),
-                        "auto_closed": True,
-                        "auto_close_reason": "exam_time_expired_background"
-                    }
-                }
-            )
-            
-            logger.info(
-                section=LogSection.SECURITY,
-                subsection=LogSubsection.SECURITY.AUTO_TASK,
-                message=f"Автоматически закрыто экзаменационное лобби {lobby_id} по истечению времени"
-            )
-            closed_count += 1
-        
-        if closed_count > 0:
-            logger.info(
-                section=LogSection.SECURITY,
-                subsection=LogSubsection.SECURITY.AUTO_TASK,
-                message=f"Фоновая задача автозакрытия завершена: закрыто {closed_count} просроченных экзаменационных лобби"
-            )
-            
-    except Exception as e:
-        logger.error(
-            section=LogSection.SECURITY,
-            subsection=LogSubsection.SECURITY.AUTO_TASK,
-            message=f"Ошибка в фоновой задаче автозакрытия лобби: {str(e)}"
-        )
-
 async def cleanup_old_security_logs():
     """Clean up old security log entries"""
     try:
@@ -515,17 +515,14 @@ async def cleanup_old_security_logs():
 
 async def security_background_tasks():
     """Main security background tasks runner"""
+    # Автозакрытие просроченных экзаменов выполняет планировщик дедлайнов лобби
+    # (app.multiplayer.lobby_scheduler), здесь остаются только задачи безопасности
     while True:
         try:
-            # Run auto-close task every 30 seconds
-            await auto_close_expired_exams()
-            
             # Run cleanup every hour
-            current_minute = datetime.now().minute
-            if current_minute == 0:
-                await cleanup_old_security_logs()
+            await cleanup_old_security_logs()
                 
-            await asyncio.sleep(30)  # Wait 30 seconds before next check
+            await asyncio.sleep(3600)  # Wait an hour before next cleanup
             
         except Exception as e:
             logger.error(
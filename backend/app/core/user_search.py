@@ -0,0 +1,159 @@
+import re
+from typing import List
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.db.database import db
+from app.logging import get_logger, LogSection, LogSubsection
+
+logger = get_logger(__name__)
+
+# Сколько кандидатов выбирается из базы до ранжирования
+SEARCH_CANDIDATES = 200
+# Минимальная длина префикса для поиска по началу ИИН, телефона и email
+MIN_PREFIX_LENGTH = 3
+
+_BACKFILL_BATCH_SIZE = 500
+
+# Условия частичных индексов email_uniq и phone_uniq: без них префиксный запрос
+# не может использовать эти индексы
+_PARTIAL_STRING = {"$exists": True, "$type": "string", "$gt": ""}
+
+
+def normalize_name(value: str) -> str:
+    """ФИО в нижнем регистре, ё заменена на е, пробелы схлопнуты."""
+    return " ".join((value or "").lower().replace("ё", "е").split())
+
+
+def name_tokens(value: str) -> List[str]:
+    """Слова ФИО для поиска по префиксу: части через дефис индексируются и отдельно."""
+    tokens = []
+    for word in normalize_name(value).split(" "):
+        if not word:
+            continue
+        tokens.append(word)
+        tokens.extend(part for part in word.split("-") if part and part != word)
+    return list(dict.fromkeys(tokens))
+
+
+def name_search_fields(full_name: str) -> dict:
+    """Поля для индексированного поиска по ФИО; записываются вместе с full_name."""
+    return {
+        "full_name_lower": normalize_name(full_name),
+        "name_tokens": name_tokens(full_name)
+    }
+
+
+def _prefix(value: str) -> dict:
+    return {"$regex": "^" + re.escape(value)}
+
+
+def _phone_prefix(query: str):
+    """Начало номера в формате +7XXXXXXXXXX; 8 в начале трактуется как +7."""
+    digits = re.sub(r"[\s()\-]", "", query)
+    if not re.fullmatch(r"\+?\d+", digits):
+        return None
+    digits = digits.lstrip("+")
+    if digits.startswith("8"):
+        digits = "7" + digits[1:]
+    if not digits.startswith("7"):
+        digits = "7" + digits
+    return "+" + digits
+
+
+def build_user_search_filters(query: str) -> List[dict]:
+    """
+    Условия поиска пользователя. Все условия используют индексы: точное
+    совпадение, либо префиксное регулярное выражение с якорем ^.
+    """
+    filters = []
+    if ObjectId.is_valid(query):
+        filters.append({"_id": ObjectId(query)})
+
+    filters.extend([
+        {"iin": query},
+        {"email": query.lower()},
+        {"phone": query},
+        {"referred_by": query},
+        {"referral_code": query}
+    ])
+
+    if len(query) >= MIN_PREFIX_LENGTH:
+        if query.isdigit():
+            filters.append({"iin": _prefix(query)})
+        phone = _phone_prefix(query)
+        if phone and len(phone) > MIN_PREFIX_LENGTH:
+            filters.append({"phone": {**_PARTIAL_STRING, **_prefix(phone)}})
+        if "@" in query or re.fullmatch(r"[\w.+\-]+", query, flags=re.ASCII):
+            filters.append({"email": {**_PARTIAL_STRING, **_prefix(query.lower())}})
+
+    # ФИО: каждое слово запроса должно быть началом одного из слов имени
+    tokens = name_tokens(query)
+    if tokens:
+        filters.append({"$and": [{"name_tokens": _prefix(token)} for token in tokens]})
+    return filters
+
+
+def rank_user(user: dict, query: str) -> int:
+    """Чем больше, тем выше пользователь в выдаче."""
+    lowered = query.lower()
+    if str(user.get("_id")) == query or query in (
+        user.get("iin"), user.get("phone"), user.get("referral_code")
+    ) or lowered == (user.get("email") or ""):
+        return 100
+
+    full_name = user.get("full_name_lower") or normalize_name(user.get("full_name"))
+    normalized = normalize_name(query)
+    if normalized and full_name == normalized:
+        return 90
+
+    phone = _phone_prefix(query)
+    if (user.get("iin") or "").startswith(query) \
+            or (phone and (user.get("phone") or "").startswith(phone)) \
+            or (user.get("email") or "").startswith(lowered):
+        return 70
+    if normalized and full_name.startswith(normalized):
+        return 60
+    if user.get("referred_by") == query:
+        return 40
+    return 20
+
+
+async def backfill_name_search_fields() -> int:
+    """
+    Заполнить поля поиска по ФИО у пользователей, созданных до их появления.
+    Безопасно запускать повторно и из нескольких воркеров.
+    """
+    updated = 0
+    try:
+        while True:
+            users = await db.users.find(
+                {"name_tokens": {"$exists": False}},
+                {"full_name": 1}
+            ).limit(_BACKFILL_BATCH_SIZE).to_list(None)
+            if not users:
+                break
+            await db.users.bulk_write([
+                UpdateOne(
+                    {"_id": user["_id"]},
+                    {"$set": name_search_fields(user.get("full_name") or "")}
+                )
+                for user in users
+            ], ordered=False)
+            updated += len(users)
+    except Exception as e:
+        logger.error(
+            section=LogSection.DATABASE,
+            subsection=LogSubsection.DATABASE.ERROR,
+            message=f"Ошибка при заполнении полей поиска пользователей: {str(e)}"
+        )
+        return updated
+
+    if updated:
+        logger.info(
+            section=LogSection.DATABASE,
+            subsection=LogSubsection.DATABASE.UPDATE,
+            message=f"Поля поиска по ФИО заполнены у {updated} пользователей"
+        )
+    return updated
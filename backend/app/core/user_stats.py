@@ -0,0 +1,344 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core.question_cache import question_cache
+from app.db.database import db
+from app.logging import get_logger, LogSection, LogSubsection
+
+logger = get_logger(__name__)
+
+# Порог прохождения теста, % правильных ответов
+PASS_PERCENTAGE = 70
+
+# Версия формата сводки: 2 - категории и разделы ПДД ведутся и в дневных корзинах.
+# Сводки старой версии пересобираются из завершённых лобби при первом чтении.
+STATS_VERSION = 2
+# Сколько действует отметка пересборки сводки и сколько её ждут другие запросы, сек
+REBUILD_CLAIM_SECONDS = 300
+REBUILD_WAIT_SECONDS = 10
+
+# Группы точности, которые ведутся и в целом, и в дневных корзинах
+_GROUPS = ("categories", "pdd_sections")
+
+# Счётчики, которые ведутся и в целом, и в дневных корзинах
+_COUNTERS = (
+    "tests_count",
+    "total_score",
+    "passed_tests",
+    "exam_tests",
+    "practice_tests",
+    "total_questions",
+    "answered_questions",
+    "correct_answers",
+)
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    return value if isinstance(value, datetime) else None
+
+
+def _field_key(value) -> str:
+    """Ключ поддокумента: точки и ведущий $ в именах полей Mongo недопустимы."""
+    return str(value).replace(".", "_").lstrip("$") or "_"
+
+
+def day_key(value: datetime) -> str:
+    return value.strftime('%Y-%m-%d')
+
+
+def build_test_summary(lobby: dict, user_id: str) -> Optional[dict]:
+    """
+    Краткая запись о пройденном тесте для истории пользователя.
+    None, если пользователь не отвечал в этом лобби.
+    """
+    user_raw_answers = lobby.get("participants_raw_answers", {}).get(user_id, {})
+    user_answers = lobby.get("participants_answers", {}).get(user_id, {})
+    if not user_raw_answers or not user_answers:
+        return None
+
+    total_questions = len(lobby.get("question_ids", []))
+    answered_count = len(user_raw_answers)
+    correct_count = sum(1 for is_correct in user_answers.values() if is_correct)
+    percentage = round((correct_count / total_questions * 100), 2) if total_questions > 0 else 0
+
+    created_at = _as_datetime(lobby.get("created_at"))
+    finished_at = _as_datetime(lobby.get("finished_at"))
+    duration = 0
+    if created_at and finished_at:
+        duration = int((finished_at - created_at).total_seconds())
+
+    return {
+        "_id": str(lobby["_id"]),
+        "user_id": user_id,
+        "date": created_at or finished_at,
+        "finished_at": finished_at,
+        "type": "exam" if lobby.get("exam_mode", False) else "practice",
+        "categories": lobby.get("categories", []),
+        "sections": lobby.get("sections", []),
+        "total_questions": total_questions,
+        "answered_questions": answered_count,
+        "correct_answers": correct_count,
+        "percentage": percentage,
+        "passed": percentage >= PASS_PERCENTAGE,
+        "duration_seconds": duration,
+        "completion_rate": round((answered_count / total_questions * 100), 2) if total_questions > 0 else 0
+    }
+
+
+async def _question_tags(lobby: dict) -> Dict[str, Tuple[list, list]]:
+    """Категории и разделы ПДД каждого вопроса лобби: из пакета, иначе из кэша вопросов."""
+    question_ids = [str(qid) for qid in lobby.get("question_ids", [])]
+    pack = lobby.get("question_pack") or {}
+    tags = {}
+    missing = []
+    for question_id in question_ids:
+        entry = pack.get(question_id)
+        if entry:
+            tags[question_id] = (entry.get("categories", []), entry.get("pdd_section_uids", []))
+        else:
+            missing.append(question_id)
+    if missing:
+        questions = await question_cache.get_questions(missing)
+        for question_id, question in questions.items():
+            tags[question_id] = (question.get("categories", []), question.get("pdd_section_uids", []))
+    return tags
+
+
+def _rollup_increments(summary: dict, lobby: dict, tags: Dict[str, Tuple[list, list]]) -> dict:
+    is_exam = summary["type"] == "exam"
+    counters = {
+        "tests_count": 1,
+        "total_score": summary["percentage"],
+        "passed_tests": 1 if summary["passed"] else 0,
+        "exam_tests": 1 if is_exam else 0,
+        "practice_tests": 0 if is_exam else 1,
+        "total_questions": summary["total_questions"],
+        "answered_questions": summary["answered_questions"],
+        "correct_answers": summary["correct_answers"],
+    }
+    inc = dict(counters)
+    # Корзины, в которые попадает тест: за всё время и, если известна дата, за день
+    scopes = [""]
+    if summary["date"]:
+        day = day_key(summary["date"])
+        scopes.append(f"daily.{day}.")
+        for name, value in counters.items():
+            inc[f"daily.{day}.{name}"] = value
+
+    user_answers = lobby.get("participants_answers", {}).get(summary["user_id"], {})
+    for question_id, (categories, sections) in tags.items():
+        correct = 1 if user_answers.get(question_id) else 0
+        for group, keys in zip(_GROUPS, (categories, sections)):
+            for key in set(keys or []):
+                for scope in scopes:
+                    prefix = f"{scope}{group}.{_field_key(key)}"
+                    inc[f"{prefix}.total_questions"] = inc.get(f"{prefix}.total_questions", 0) + 1
+                    inc[f"{prefix}.correct_answers"] = inc.get(f"{prefix}.correct_answers", 0) + correct
+    return inc
+
+
+async def record_finished_lobby(lobby: dict) -> bool:
+    """
+    Учесть завершённое лобби в статистике хоста. Запись в user_test_history
+    с _id лобби служит отметкой: повторный вызов для того же лобби ничего не меняет.
+    Возвращает True, если статистика обновлена.
+    """
+    user_id = lobby.get("host_id")
+    if not user_id or lobby.get("status") != "finished" or user_id not in lobby.get("participants", []):
+        return False
+    summary = build_test_summary(lobby, user_id)
+    if summary is None:
+        return False
+
+    try:
+        await db.user_test_history.insert_one(summary)
+    except DuplicateKeyError:
+        return False
+
+    try:
+        tags = await _question_tags(lobby)
+        await db.user_stats.update_one(
+            {"_id": user_id},
+            {
+                "$inc": _rollup_increments(summary, lobby, tags),
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+    except Exception:
+        # Снимаем отметку, чтобы лобби учлось при следующей попытке
+        await db.user_test_history.delete_one({"_id": summary["_id"]})
+        raise
+    return True
+
+
+async def record_finished_lobby_safe(lobby_id: str, lobby: Optional[dict] = None) -> None:
+    """Обновить статистику после завершения лобби, не прерывая вызывающий код при ошибке."""
+    try:
+        if lobby is None:
+            lobby = await db.lobbies.find_one({"_id": lobby_id})
+        if lobby is not None:
+            await record_finished_lobby(lobby)
+    except Exception as e:
+        logger.error(
+            section=LogSection.USER,
+            subsection=LogSubsection.USER.PROFILE,
+            message=f"Не удалось обновить статистику пользователя по лобби {lobby_id}: {str(e)}"
+        )
+
+
+async def _claim_rebuild(user_id: str) -> Optional[datetime]:
+    """
+    Отметка rebuilding_at в сводке: пересборку выполняет один запрос.
+    Возвращает время отметки или None, если сводка актуальна или её
+    уже пересобирает другой запрос.
+    """
+    now = datetime.utcnow()
+    try:
+        await db.user_stats.find_one_and_update(
+            {
+                "_id": user_id,
+                "$nor": [{"backfilled": True, "version": STATS_VERSION}],
+                "$or": [
+                    {"rebuilding_at": {"$exists": False}},
+                    # Отметка упавшего запроса перестаёт действовать
+                    {"rebuilding_at": {"$lt": now - timedelta(seconds=REBUILD_CLAIM_SECONDS)}}
+                ]
+            },
+            {"$set": {"rebuilding_at": now}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Сводка есть, но условие не выполнено: она актуальна или уже пересобирается
+        return None
+    return now
+
+
+async def get_user_stats(user_id: str) -> dict:
+    """
+    Сводная статистика пользователя. При первом обращении в неё переносятся
+    лобби, завершённые до появления сводки; сводка старой версии
+    пересобирается заново вместе с историей тестов. Пересборку выполняет
+    один запрос, остальные ждут её окончания.
+    """
+    stats = await db.user_stats.find_one({"_id": user_id})
+    if stats and stats.get("backfilled") and stats.get("version") == STATS_VERSION:
+        return stats
+
+    claimed_at = await _claim_rebuild(user_id)
+    if claimed_at is None:
+        deadline = time.monotonic() + REBUILD_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.2)
+            stats = await db.user_stats.find_one({"_id": user_id})
+            if stats and stats.get("version") == STATS_VERSION:
+                break
+        return stats or {"_id": user_id}
+
+    if stats:
+        # Сводка старой версии: история пересобирается вместе с ней
+        await db.user_test_history.delete_many({"user_id": user_id})
+        await db.user_stats.replace_one({"_id": user_id}, {"rebuilding_at": claimed_at})
+
+    cursor = db.lobbies.find({
+        "host_id": user_id,
+        "status": "finished",
+        "participants": user_id
+    })
+    migrated = 0
+    try:
+        async for lobby in cursor:
+            if await record_finished_lobby(lobby):
+                migrated += 1
+    except Exception:
+        # Снимаем отметку, чтобы следующий запрос повторил пересборку
+        await db.user_stats.update_one({"_id": user_id}, {"$unset": {"rebuilding_at": ""}})
+        raise
+
+    stats = await db.user_stats.find_one_and_update(
+        {"_id": user_id},
+        {"$set": {"backfilled": True, "version": STATS_VERSION}, "$unset": {"rebuilding_at": ""}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    logger.info(
+        section=LogSection.USER,
+        subsection=LogSubsection.USER.PROFILE,
+        message=f"Сводная статистика пользователя {user_id} собрана из истории: учтено лобби {migrated}"
+    )
+    return stats
+
+
+async def get_user_test_history(
+    user_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = 0
+) -> List[dict]:
+    """Записи о пройденных тестах пользователя, новые первыми."""
+    query = {"user_id": user_id}
+    if start_date or end_date:
+        query["date"] = {}
+        if start_date:
+            query["date"]["$gte"] = start_date
+        if end_date:
+            query["date"]["$lte"] = end_date
+    cursor = db.user_test_history.find(query).sort("date", -1)
+    if limit:
+        cursor = cursor.limit(limit)
+    return await cursor.to_list(None)
+
+
+def period_totals(stats: dict, start_date: datetime, end_date: datetime) -> dict:
+    """Сумма дневных корзин за период [start_date, end_date]."""
+    totals = {name: 0 for name in _COUNTERS}
+    start_key, end_key = day_key(start_date), day_key(end_date)
+    for day, bucket in (stats.get("daily") or {}).items():
+        if start_key <= day <= end_key:
+            for name in _COUNTERS:
+                totals[name] += bucket.get(name, 0)
+    return totals
+
+
+def period_groups(stats: dict, group: str, start_date: datetime, end_date: datetime) -> Dict[str, dict]:
+    """Сумма счётчиков категорий или разделов ПДД (group) из дневных корзин за период."""
+    totals: Dict[str, dict] = {}
+    for bucket in daily_buckets(stats, start_date, end_date).values():
+        for key, counters in (bucket.get(group) or {}).items():
+            target = totals.setdefault(key, {"total_questions": 0, "correct_answers": 0})
+            target["total_questions"] += counters.get("total_questions", 0)
+            target["correct_answers"] += counters.get("correct_answers", 0)
+    return totals
+
+
+def daily_buckets(stats: dict, start_date: datetime, end_date: datetime) -> Dict[str, dict]:
+    start_key, end_key = day_key(start_date), day_key(end_date)
+    return {
+        day: bucket
+        for day, bucket in (stats.get("daily") or {}).items()
+        if start_key <= day <= end_key
+    }
+
+
+def accuracy_list(groups: Optional[dict], key_name: str) -> List[dict]:
+    """Точность по категориям или разделам ПДД, лучшие первыми."""
+    result = []
+    for key, group in (groups or {}).items():
+        total = group.get("total_questions", 0)
+        correct = group.get("correct_answers", 0)
+        result.append({
+            key_name: key,
+            "total_questions": total,
+            "correct_answers": correct,
+            "percentage": round((correct / total * 100), 2) if total > 0 else 0
+        })
+    result.sort(key=lambda item: item["percentage"], reverse=True)
+    return result
+
@@ -48,6 +48,19 @@ async def create_database_indexes(db):
                     subsection=LogSubsection.DATABASE.INDEXES_SUCCESS,
                     message="Индексы для коллекции lobbies созданы")
 
+        # -------------------------
+        # user_test_history (история тестов для профиля, _id - ID лобби)
+        # История читается по пользователю за период, новые первыми
+        if "history_by_user" in await db.user_test_history.index_information():
+            # Прежний индекс только по user_id: сортировку по date он не покрывал
+            await db.user_test_history.drop_index("history_by_user")
+        await db.user_test_history.create_indexes([
+            IndexModel([("user_id", 1), ("date", -1)], name="history_by_user_date"),
+        ])
+        logger.info(section=LogSection.DATABASE,
+                    subsection=LogSubsection.DATABASE.INDEXES_SUCCESS,
+                    message="Индексы для коллекции user_test_history созданы")
+
         # -------------------------
         # users (одиночные индексы + уникальность)
         await db.users.create_indexes([
@@ -74,6 +87,15 @@ async def create_database_indexes(db):
                 name="referred_by_only",
                 partialFilterExpression={"referred_by": {"$exists": True}}
             ),
+
+            # поиск в админке: $or использует индексы, только если индексирована каждая ветка
+            IndexModel(
+                [("referral_code", 1)],
+                name="referral_code_only",
+                partialFilterExpression={"referral_code": {"$exists": True}}
+            ),
+            # слова ФИО в нижнем регистре для поиска по префиксу (multikey)
+            IndexModel([("name_tokens", 1)], name="name_tokens"),
         ])
         logger.info(section=LogSection.DATABASE,
                     subsection=LogSubsection.DATABASE.INDEXES_SUCCESS,
@@ -90,6 +112,19 @@ async def create_database_indexes(db):
                     subsection=LogSubsection.DATABASE.INDEXES_SUCCESS,
                     message="Индексы для коллекции tokens созданы")
 
+        # -------------------------
+        # transactions (составные: постраничный журнал и экспорт в админке)
+        await db.transactions.create_indexes([
+            IndexModel([("created_at", -1), ("_id", -1)], name="tx_by_date"),
+            IndexModel([("user_id", 1), ("created_at", -1), ("_id", -1)], name="tx_by_user_date"),
+            IndexModel([("type", 1), ("created_at", -1), ("_id", -1)], name="tx_by_type_date"),
+            # Реферальные начисления по приглашённому пользователю
+            IndexModel([("type", 1), ("referred_user_id", 1), ("created_at", -1)], name="tx_referral"),
+        ])
+        logger.info(section=LogSection.DATABASE,
+                    subsection=LogSubsection.DATABASE.INDEXES_SUCCESS,
+                    message="Индексы для коллекции transactions созданы")
+
         # -------------------------
         # subscriptions (одиночные)
         await db.subscriptions.create_indexes([
@@ -100,6 +135,17 @@ async def create_database_indexes(db):
                     subsection=LogSubsection.DATABASE.INDEXES_SUCCESS,
                     message="Индексы для коллекции subscriptions созданы")
 
+        # -------------------------
+        # media_files (поиск дубликата по хешу, перенос из GridFS)
+        await db.media_files.create_indexes([
+            IndexModel([("file_hash", 1)], name="media_by_hash"),
+            # файлы, перенесённые из GridFS (multikey по старым ID)
+            IndexModel([("legacy_gridfs_ids", 1)], name="media_by_legacy_gridfs_id", sparse=True),
+        ])
+        logger.info(section=LogSection.DATABASE,
+                    subsection=LogSubsection.DATABASE.INDEXES_SUCCESS,
+                    message="Индексы для коллекции media_files созданы")
+
         logger.info(section=LogSection.DATABASE,
                     subsection=LogSubsection.DATABASE.INDEXES_SUCCESS,
                     message="Все индексы базы данных успешно созданы")
@@ -1,6 +1,6 @@
 # app/logging/__init__.py
 
-from .logger_setup import setup_application_logging, get_structured_logger, close_all_rabbitmq_connections
+from .logger_setup import setup_application_logging, get_structured_logger, close_all_rabbitmq_connections, get_logging_queue_stats, get_log_sampling_stats
 from .log_models import LogLevel, LogSection, LogSubsection
 from .rabbitmq_handler import get_rabbitmq_publisher, close_rabbitmq_publisher
 
@@ -16,5 +16,7 @@ __all__ = [
     'LogSubsection',
     'get_rabbitmq_publisher',
     'close_rabbitmq_publisher',
-    'close_all_rabbitmq_connections'
+    'close_all_rabbitmq_connections',
+    'get_logging_queue_stats',
+    'get_log_sampling_stats'
 ] 
\ No newline at end of file
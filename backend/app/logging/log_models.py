@@ -1,9 +1,13 @@
 from enum import Enum
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime
-import uuid
+import random
+import time
 import pytz
 
+# Timezone GMT+5 (Kazakhstan time); объект часового пояса создаётся один раз
+KZ_TIMEZONE = pytz.timezone('Asia/Almaty')
+
 
 class LogLevel(Enum):
     """Уровни серьезности логов"""
@@ -250,6 +254,7 @@ class LogSubsection:
         MEMORY = "memory"
         PERFORMANCE = "performance"
         SCRIPT_LOAD = "script_load"
+        CACHE = "cache"
 
 
 class StructuredLogEntry:
@@ -264,21 +269,45 @@ class StructuredLogEntry:
         extra_data: Optional[Dict[str, Any]] = None,
         user_id: Optional[str] = None,
         ip_address: Optional[str] = None,
-        user_agent: Optional[str] = None
+        user_agent: Optional[str] = None,
+        caller: Optional[Tuple[str, str, int]] = None
     ):
-        # Timezone GMT+5 (Kazakhstan time)
-        kz_timezone = pytz.timezone('Asia/Almaty')
-        
-        self.timestamp = datetime.now(kz_timezone).strftime('%Y-%m-%d %H:%M:%S %Z')
-        self.log_id = str(uuid.uuid4())[:8]  # Короткий уникальный ID
+        # На пути запроса фиксируются только время и место вызова; строка времени,
+        # имя файла и extra_data собираются при первом обращении (в потоке записи)
+        self.created = time.time()
+        self.log_id = "%08x" % random.getrandbits(32)  # Короткий уникальный ID
         self.level = level.value
         self.section = section.value
         self.subsection = subsection
         self.message = message
-        self.extra_data = extra_data or {}
         self.user_id = user_id
         self.ip_address = ip_address
         self.user_agent = user_agent
+        self._extra_data = dict(extra_data) if extra_data else None
+        self._caller = caller
+        self._timestamp: Optional[str] = None
+        self._extra_resolved = caller is None
+    
+    @property
+    def timestamp(self) -> str:
+        if self._timestamp is None:
+            self._timestamp = datetime.fromtimestamp(self.created, KZ_TIMEZONE).strftime('%Y-%m-%d %H:%M:%S %Z')
+        return self._timestamp
+    
+    @property
+    def extra_data(self) -> Dict[str, Any]:
+        if not self._extra_resolved:
+            filename, function_name, line_number = self._caller
+            self._extra_data = self._extra_data or {}
+            self._extra_data.update({
+                "source_file": filename.split('/')[-1].split('\\')[-1],
+                "source_function": function_name,
+                "source_line": line_number
+            })
+            self._extra_resolved = True
+        if self._extra_data is None:
+            self._extra_data = {}
+        return self._extra_data
     
     def to_dict(self) -> Dict[str, Any]:
         """Преобразование в словарь для логирования"""
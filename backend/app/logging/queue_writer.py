@@ -0,0 +1,162 @@
+# app/logging/queue_writer.py
+
+import atexit
+import logging
+import sys
+import threading
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List
+
+
+class QueueLogHandler(logging.Handler):
+    """
+    Хендлер, который только кладёт запись в ограниченную очередь в памяти.
+    Форматирование и запись на диск/в консоль выполняет отдельный поток
+    пачками: на пути запроса логирование не касается ввода-вывода.
+
+    При переполнении очереди новые записи отбрасываются и учитываются
+    в счётчике dropped; поток записи сообщает о потерях отдельной строкой.
+    """
+
+    def __init__(
+        self,
+        handlers: List[logging.Handler],
+        capacity: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+        name: str = "log-writer"
+    ):
+        super().__init__(logging.NOTSET)
+        self.name = name
+        self.handlers = handlers
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = deque()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._stats = {"enqueued": 0, "written": 0, "dropped": 0, "batches": 0}
+        self._reported_dropped = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # Переопределяем, чтобы не брать блокировку хендлера на каждую запись
+    def handle(self, record: logging.LogRecord) -> bool:
+        if not self.filter(record):
+            return False
+        self.emit(record)
+        return True
+
+    def emit(self, record: logging.LogRecord):
+        if len(self._queue) >= self.capacity:
+            self._stats["dropped"] += 1
+            return
+        self._queue.append(record)
+        self._stats["enqueued"] += 1
+        # Будим поток записи, только когда набралась пачка: остальное заберёт таймер
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "queued": len(self._queue)}
+
+    def _take_batch(self) -> List[logging.LogRecord]:
+        batch = []
+        queue = self._queue
+        while queue and len(batch) < self.batch_size:
+            batch.append(queue.popleft())
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        while self._queue:
+            batch = self._take_batch()
+            for handler in self.handlers:
+                _write_batch(handler, batch)
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+        dropped = self._stats["dropped"]
+        if dropped > self._reported_dropped:
+            lost = dropped - self._reported_dropped
+            self._reported_dropped = dropped
+            record = logging.LogRecord(
+                "logging.queue", logging.WARNING, "", 0,
+                f"Очередь логов переполнена: отброшено записей {lost} (всего {dropped})",
+                (), None
+            )
+            for handler in self.handlers:
+                _write_batch(handler, [record])
+
+    def close(self):
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._wakeup.set()
+            if self._thread.is_alive() and threading.current_thread() is not self._thread:
+                self._thread.join(timeout=5)
+            for handler in self.handlers:
+                handler.close()
+        super().close()
+
+
+def _write_batch(handler: logging.Handler, records: List[logging.LogRecord]):
+    """
+    Пишет пачку записей одним вызовом write/flush вместо записи на каждую строку.
+    Для RotatingFileHandler ротация проверяется по накопленному размеру.
+    """
+    if not isinstance(handler, logging.StreamHandler):
+        for record in records:
+            handler.handle(record)
+        return
+
+    lines = []
+    for record in records:
+        if record.levelno < handler.level or not handler.filter(record):
+            continue
+        try:
+            lines.append(handler.format(record))
+        except Exception:
+            handler.handleError(record)
+    if not lines:
+        return
+
+    terminator = getattr(handler, "terminator", "\n")
+    handler.acquire()
+    try:
+        if isinstance(handler, RotatingFileHandler):
+            _write_rotating(handler, lines, terminator)
+        else:
+            handler.stream.write(terminator.join(lines) + terminator)
+            handler.flush()
+    except Exception:
+        print(f"Error writing log batch: {sys.exc_info()[1]}", file=sys.stderr)
+    finally:
+        handler.release()
+
+
+def _write_rotating(handler: RotatingFileHandler, lines: List[str], terminator: str):
+    if handler.stream is None:
+        handler.stream = handler._open()
+    position = handler.stream.tell()
+    pending: List[str] = []
+    for line in lines:
+        chunk = line + terminator
+        size = len(chunk.encode(handler.encoding or "utf-8"))
+        if handler.maxBytes > 0 and position + size >= handler.maxBytes and (pending or position):
+            handler.stream.write("".join(pending))
+            pending = []
+            handler.doRollover()
+            position = 0
+        pending.append(chunk)
+        position += size
+    if pending:
+        handler.stream.write("".join(pending))
+    handler.flush()
+
@@ -0,0 +1,231 @@
+# app/logging/sampling.py
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .log_models import LogLevel
+
+# Правила по умолчанию для самых частых мест: успешные проверки доступа
+# и валидации в лобби, трассировка рейт лимитов
+DEFAULT_SAMPLE_RULES = "lobby.access:10,lobby.security:10,lobby.validation:20,security.rate_limit:100"
+
+# Семплирование касается только DEBUG и INFO: WARNING и выше сохраняются все
+_SAMPLED_LEVELS = {LogLevel.DEBUG, LogLevel.INFO}
+# Повторы подавляются до WARNING включительно; ERROR и CRITICAL не подавляются
+_SUPPRESSED_LEVELS = {LogLevel.DEBUG, LogLevel.INFO, LogLevel.WARNING}
+
+Caller = Tuple[str, str, int]
+
+
+def parse_sample_rules(value: str) -> Dict[str, int]:
+    """
+    Разбирает правила вида "lobby:5,lobby.access:20" (раздел или раздел.подраздел: N).
+    N - сохраняется одна запись из N для каждого места вызова.
+    """
+    rules = {}
+    for item in (value or "").split(","):
+        if ":" not in item:
+            continue
+        key, rate = item.rsplit(":", 1)
+        try:
+            rules[key.strip()] = max(1, int(rate))
+        except ValueError:
+            continue
+    return rules
+
+
+def parse_suppress_rules(value: str) -> Dict[str, Tuple[float, int]]:
+    """
+    Разбирает правила вида "security.rate_limit_exceeded:0.2/5"
+    (раздел или раздел.подраздел: сообщений в секунду/всплеск).
+    """
+    rules = {}
+    for item in (value or "").split(","):
+        if ":" not in item or "/" not in item:
+            continue
+        key, spec = item.rsplit(":", 1)
+        rate, burst = spec.split("/", 1)
+        try:
+            rules[key.strip()] = (float(rate), max(1, int(burst)))
+        except ValueError:
+            continue
+    return rules
+
+
+class _RepeatState:
+    """Token bucket для одного сообщения из одного места вызова"""
+    __slots__ = ("tokens", "updated", "suppressed", "first_suppressed", "level", "section", "subsection", "message", "caller")
+
+    def __init__(self, burst: int, now: float, level: LogLevel, section, subsection: str, message: str, caller: Caller):
+        self.tokens = float(burst)
+        self.updated = now
+        self.suppressed = 0
+        self.first_suppressed = 0.0
+        self.level = level
+        self.section = section
+        self.subsection = subsection
+        self.message = message
+        self.caller = caller
+
+
+class LogSampler:
+    """
+    Снижает объём логов от горячих мест вызова.
+
+    - Семплирование: для DEBUG/INFO из разделов с правилом N сохраняется
+      каждая N-я запись каждого места вызова (первая - всегда).
+    - Подавление повторов: одинаковые сообщения из одного места вызова
+      проходят через token bucket (rate сообщений в секунду, всплеск burst).
+      Отброшенные повторы считаются и затем выводятся одной сводной записью
+      "повторено N раз".
+
+    Правила задаются для раздела ("lobby") или подраздела ("lobby.access"),
+    подраздел имеет приоритет.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.configure()
+
+    def configure(
+        self,
+        sample_rules: Optional[Dict[str, int]] = None,
+        suppress_rules: Optional[Dict[str, Tuple[float, int]]] = None,
+        suppress_rate: float = 1.0,
+        suppress_burst: int = 10,
+        summary_interval: float = 60.0,
+        max_keys: int = 10000
+    ):
+        with self._lock:
+            self.sample_rules = sample_rules or {}
+            self.suppress_rules = suppress_rules or {}
+            self.suppress_rate = suppress_rate
+            self.suppress_burst = suppress_burst
+            self.summary_interval = summary_interval
+            self.max_keys = max_keys
+            self._sample_cache: Dict[Tuple[str, str], int] = {}
+            self._suppress_cache: Dict[Tuple[str, str], Tuple[float, int]] = {}
+            self._site_counters: Dict[Caller, int] = {}
+            self._repeats: Dict[Tuple[Caller, str], _RepeatState] = {}
+            self._next_sweep = time.monotonic() + summary_interval
+            self._stats: Dict[str, Dict[str, int]] = {}
+
+    # ---------- правила ----------
+
+    def _lookup(self, rules: dict, cache: dict, section: str, subsection: str, default):
+        key = (section, subsection)
+        if key not in cache:
+            cache[key] = rules.get(f"{section}.{subsection}", rules.get(section, default))
+        return cache[key]
+
+    def _count(self, section: str, subsection: str, counter: str, amount: int = 1):
+        stats = self._stats.setdefault(f"{section}.{subsection}", {"sampled_out": 0, "suppressed": 0, "summaries": 0})
+        stats[counter] += amount
+
+    # ---------- решение для одной записи ----------
+
+    def check(
+        self,
+        level: LogLevel,
+        section,
+        subsection: str,
+        message: str,
+        caller: Caller
+    ) -> Tuple[bool, Dict[str, int]]:
+        """
+        Решает, записывать ли лог.
+
+        Returns:
+            (записывать, дополнительные поля для extra_data):
+            sample_rate - запись представляет N записей этого места вызова;
+            repeated - сколько таких же сообщений было подавлено перед ней.
+        """
+        section_name = section.value
+        extra = {}
+        with self._lock:
+            if level in _SAMPLED_LEVELS:
+                rate = self._lookup(self.sample_rules, self._sample_cache, section_name, subsection, 1)
+                if rate > 1:
+                    seen = self._site_counters.get(caller, 0)
+                    self._site_counters[caller] = seen + 1
+                    if seen % rate:
+                        self._count(section_name, subsection, "sampled_out")
+                        return False, extra
+                    extra["sample_rate"] = rate
+
+            if level not in _SUPPRESSED_LEVELS:
+                return True, extra
+
+            rate, burst = self._lookup(
+                self.suppress_rules, self._suppress_cache, section_name, subsection,
+                (self.suppress_rate, self.suppress_burst)
+            )
+            now = time.monotonic()
+            key = (caller, message)
+            state = self._repeats.get(key)
+            if state is None:
+                if len(self._repeats) >= self.max_keys:
+                    # Слишком много разных сообщений: не отслеживаем новые
+                    return True, extra
+                state = _RepeatState(burst, now, level, section, subsection, message, caller)
+                self._repeats[key] = state
+            else:
+                state.tokens = min(float(burst), state.tokens + (now - state.updated) * rate)
+                state.updated = now
+
+            if state.tokens < 1:
+                if not state.suppressed:
+                    state.first_suppressed = now
+                state.suppressed += 1
+                self._count(section_name, subsection, "suppressed")
+                return False, extra
+
+            state.tokens -= 1
+            if state.suppressed:
+                extra["repeated"] = state.suppressed
+                state.suppressed = 0
+                self._count(section_name, subsection, "summaries")
+            return True, extra
+
+    def collect_summaries(self) -> List[_RepeatState]:
+        """
+        Раз в summary_interval возвращает сообщения, повторы которых были
+        подавлены и с тех пор не выводились, и забывает давно неактивные ключи.
+        Вызывается из StructuredLogger на пути логирования - отдельного таймера нет.
+        """
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return []
+        summaries = []
+        with self._lock:
+            if now < self._next_sweep:
+                return []
+            self._next_sweep = now + self.summary_interval
+            stale = []
+            for key, state in self._repeats.items():
+                if state.suppressed:
+                    if now - state.first_suppressed >= self.summary_interval:
+                        summaries.append(_pending_summary(state))
+                        self._count(state.section.value, state.subsection, "summaries")
+                        state.suppressed = 0
+                elif now - state.updated >= self.summary_interval:
+                    stale.append(key)
+            for key in stale:
+                del self._repeats[key]
+        return summaries
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Счётчики по подразделам: отброшено семплированием, подавлено повторов, сводок"""
+        with self._lock:
+            return {name: dict(counters) for name, counters in self._stats.items()}
+
+
+def _pending_summary(state: _RepeatState) -> _RepeatState:
+    summary = _RepeatState(0, state.updated, state.level, state.section, state.subsection, state.message, state.caller)
+    summary.suppressed = state.suppressed
+    return summary
+
+
+# Глобальный экземпляр (настраивается в setup_application_logging)
+log_sampler = LogSampler()
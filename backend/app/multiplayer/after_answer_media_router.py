@@ -1,14 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, Response, Request, Query
 from fastapi.responses import StreamingResponse
 from app.core.media_manager import media_manager
+from app.core.gridfs_utils import gridfs_media_response
 from app.db.database import get_database
-from bson import ObjectId, errors
+from bson import errors
 import base64
 from app.core.security import get_current_actor
 from app.core.response import success
 from app.logging import get_logger, LogSection, LogSubsection
 from app.core.config import settings
 from app.rate_limit import rate_limit_ip
+from app.core.question_cache import question_cache
 from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db
 
 router = APIRouter(tags=["Multiplayer After Answer Media"])
@@ -107,17 +109,7 @@ async def get_after_answer_media_multiplayer(
             raise HTTPException(status_code=403, detail="Хост еще не разрешил показывать ответы")
         
         # Находим вопрос в базе данных
-        question = None
-        try:
-            question = await db.questions.find_one({"_id": question_id})
-        except:
-            pass
-            
-        if not question:
-            try:
-                question = await db.questions.find_one({"_id": ObjectId(question_id)})
-            except:
-                pass
+        question = await question_cache.get_question(question_id)
         
         if not question:
             logger.error(
@@ -179,6 +171,12 @@ async def get_after_answer_media_multiplayer(
             # Проверяем существование файла в системе медиа
             file_info = await media_manager.get_media_file(str(after_answer_media_id), db)
             if not file_info:
+                # Старые файлы, ещё лежащие в GridFS, отдаются потоком частями
+                legacy_response = await gridfs_media_response(
+                    str(after_answer_media_id), db, request.headers.get("range")
+                )
+                if legacy_response is not None:
+                    return legacy_response
                 logger.error(
                     section=LogSection.FILES,
                     subsection=LogSubsection.FILES.GRIDFS,
@@ -1,15 +1,15 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
-from app.db.database import db
 from datetime import datetime, timedelta
 from app.core.security import get_current_actor
 from app.core.response import success
-from bson import ObjectId
 from pydantic import BaseModel, validator
 from app.logging import get_logger, LogSection, LogSubsection
 import asyncio
 from typing import Optional, List
 from app.rate_limit import rate_limit_ip
-from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db, get_user_subscription_from_db
+from app.core.question_pack import get_packed_question
+from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db, get_user_subscription_from_db, find_and_update_lobby
+from app.multiplayer.lobby_events import lobby_events, LobbyEventType
 from app.multiplayer.lobby_validator import check_active_session, validate_user_subscription
 import re
 
@@ -113,14 +113,8 @@ async def submit_answer(
             )
             raise HTTPException(status_code=400, detail="Можно отвечать только на текущий вопрос")
         
-        # Получаем вопрос из базы данных для проверки правильности
-        question = await db.questions.find_one({"_id": current_question_id})
-        if not question:
-            # Пробуем как ObjectId
-            try:
-                question = await db.questions.find_one({"_id": ObjectId(current_question_id)})
-            except:
-                pass
+        # Получаем вопрос из пакета лобби для проверки правильности
+        question = await get_packed_question(lobby, current_question_id)
         
         if not question:
             logger.error(
@@ -131,7 +125,7 @@ async def submit_answer(
             raise HTTPException(status_code=404, detail="Вопрос не найден")
         
         # Проверяем валидность индекса ответа
-        options = question.get("options", [])
+        options = question["answers"]
         if answer_index >= len(options):
             logger.warning(
                 section=LogSection.LOBBY,
@@ -141,21 +135,12 @@ async def submit_answer(
             raise HTTPException(status_code=400, detail="Неверный индекс ответа")
         
         # Проверяем правильность ответа
-        correct_answer_index = question.get("correct_answer_index", 0)
+        correct_answer_index = question["correct_answer_index"]
         is_correct = answer_index == correct_answer_index
         
-        # Получаем текущие ответы участников
-        participants_answers = lobby.get("participants_answers", {})
-        participants_raw_answers = lobby.get("participants_raw_answers", {})
-        
-        # Инициализируем структуры для текущего вопроса, если их нет
-        if current_question_id not in participants_answers:
-            participants_answers[current_question_id] = {}
-        if current_question_id not in participants_raw_answers:
-            participants_raw_answers[current_question_id] = {}
-        
-        # Проверяем, не отвечал ли пользователь уже на этот вопрос
-        if user_id in participants_answers[current_question_id]:
+        # Быстрая проверка по кэшу лобби, не отвечал ли пользователь уже на этот вопрос
+        question_answers = lobby.get("participants_answers", {}).get(current_question_id, {})
+        if user_id in question_answers:
             logger.warning(
                 section=LogSection.LOBBY,
                 subsection=LogSubsection.LOBBY.ANSWERS,
@@ -163,28 +148,35 @@ async def submit_answer(
             )
             raise HTTPException(status_code=400, detail="Вы уже отвечали на этот вопрос")
         
-        # Сохраняем ответ пользователя
-        participants_answers[current_question_id][user_id] = is_correct
-        participants_raw_answers[current_question_id][user_id] = answer_index
-        
-        # Обновляем лобби с новыми ответами
-        update_data = {
-            "participants_answers": participants_answers,
-            "participants_raw_answers": participants_raw_answers
-        }
-        
-        result = await db.lobbies.update_one(
-            {"_id": lobby_id},
-            {"$set": update_data}
+        # Атомарно сохраняем ответ: условия участия, текущего вопроса и
+        # отсутствия предыдущего ответа проверяются в самом фильтре
+        updated_lobby = await find_and_update_lobby(
+            lobby_id,
+            {"$set": {
+                f"participants_answers.{current_question_id}.{user_id}": is_correct,
+                f"participants_raw_answers.{current_question_id}.{user_id}": answer_index
+            }},
+            extra_filter={
+                "status": "in_progress",
+                "participants": user_id,
+                "current_index": current_index,
+                f"participants_answers.{current_question_id}.{user_id}": {"$exists": False}
+            },
+            # Ответу нужны только ответы на этот вопрос, участники и хост - не весь пакет вопросов
+            projection={
+                f"participants_answers.{current_question_id}": 1,
+                "participants": 1,
+                "host_id": 1
+            }
         )
         
-        if result.modified_count == 0:
+        if updated_lobby is None:
             logger.warning(
                 section=LogSection.LOBBY,
                 subsection=LogSubsection.LOBBY.ANSWERS,
-                message=f"Не удалось сохранить ответ в лобби {lobby_id}"
+                message=f"Ответ отклонён условием записи: пользователь {user_id}, вопрос {current_question_id}, лобби {lobby_id} (уже отвечал или вопрос сменился)"
             )
-            raise HTTPException(status_code=500, detail="Не удалось сохранить ответ")
+            raise HTTPException(status_code=409, detail="Ответ не принят: вы уже ответили или вопрос сменился")
         
         logger.info(
             section=LogSection.LOBBY,
@@ -192,10 +184,29 @@ async def submit_answer(
             message=f"Ответ сохранен: пользователь {user_id} ответил на вопрос {current_question_id} в лобби {lobby_id}, ответ: {answer_index}, правильный: {is_correct}"
         )
         
+        answered_count = len(updated_lobby.get("participants_answers", {}).get(current_question_id, {}))
+        
+        # Событие об ответе рассылает backend_ws одним emit на комнату;
+        # индекс ответа и его правильность получает только хост
+        answer_event = {
+            "user_id": user_id,
+            "question_id": current_question_id,
+            "answered_count": answered_count,
+            "total_participants": len(updated_lobby.get("participants", []))
+        }
+        asyncio.create_task(lobby_events.publish(
+            lobby_id,
+            LobbyEventType.ANSWER_RECEIVED,
+            answer_event,
+            host_id=updated_lobby.get("host_id"),
+            host_data={**answer_event, "answer_index": answer_index, "is_correct": is_correct}
+        ))
+        
         return success(data={
             "lobby_id": lobby_id,
             "question_id": current_question_id,
             "answer_index": answer_index,
+            "answered_count": answered_count,
             "message": "Ответ успешно сохранен"
         })
         
@@ -260,13 +271,8 @@ async def get_current_question_answers(
         participants_answers = lobby.get("participants_answers", {}).get(current_question_id, {})
         participants_raw_answers = lobby.get("participants_raw_answers", {}).get(current_question_id, {})
         
-        # Получаем информацию о вопросе
-        question = await db.questions.find_one({"_id": current_question_id})
-        if not question:
-            try:
-                question = await db.questions.find_one({"_id": ObjectId(current_question_id)})
-            except:
-                pass
+        # Получаем информацию о вопросе из пакета лобби
+        question = await get_packed_question(lobby, current_question_id)
         
         if not question:
             raise HTTPException(status_code=404, detail="Текущий вопрос не найден")
@@ -286,15 +292,6 @@ async def get_current_question_answers(
         # Получаем ответ пользователя на текущий вопрос
         user_answer_index = participants_raw_answers.get(user_id, None)
         
-        # Проверяем наличие дополнительного медиа
-        has_after_answer_media = question.get("has_after_answer_media", False)
-        after_answer_media_file_id = question.get("after_answer_media_file_id")
-        after_answer_media_id = question.get("after_answer_media_id")
-        
-        # Если есть ID файла, но флаг не установлен, устанавливаем его
-        if (after_answer_media_file_id or after_answer_media_id) and not has_after_answer_media:
-            has_after_answer_media = True
-        
         # Подготавливаем данные ответов
         answers_data = {
             "question_id": current_question_id,
@@ -305,14 +302,14 @@ async def get_current_question_answers(
             "total_participants": len(lobby.get("participants", [])),
             "answered_participants": len(participants_answers),
             "show_answers": show_answers,
-            "correct_answer_index": question.get("correct_answer_index", 0),
-            "explanation": question.get("explanation", ""),
+            "correct_answer_index": question["correct_answer_index"],
+            "explanation": question["explanation"],
             "user_answer_index": user_answer_index,  # null если пользователь не отвечал
             "user_is_correct": participants_answers.get(user_id, None),  # null если пользователь не отвечал
-            "has_after_answer_media": has_after_answer_media,
-            "after_answer_media_filename": question.get("after_answer_media_filename"),
-            "after_answer_media_file_id": after_answer_media_file_id,
-            "after_answer_media_id": after_answer_media_id
+            "has_after_answer_media": question["has_after_answer_media"],
+            "after_answer_media_filename": question["after_answer_media_filename"],
+            "after_answer_media_file_id": question["after_answer_media_file_id"],
+            "after_answer_media_id": question["after_answer_media_file_id"]
         }
         
         # Добавляем статистику ответов
@@ -323,7 +320,7 @@ async def get_current_question_answers(
         logger.info(
             section=LogSection.LOBBY,
             subsection=LogSubsection.LOBBY.ANSWERS,
-            message=f"Предоставлены ответы на текущий вопрос {current_question_id} в лобби {lobby_id}, участников ответило: {len(participants_answers)}, показать ответы: {show_answers}, has_after_answer_media: {question.get('has_after_answer_media', False)}"
+            message=f"Предоставлены ответы на текущий вопрос {current_question_id} в лобби {lobby_id}, участников ответило: {len(participants_answers)}, показать ответы: {show_answers}, has_after_answer_media: {question['has_after_answer_media']}"
         )
         
         return success(data=answers_data)
@@ -4,9 +4,8 @@ import asyncio
 
 from app.core.response import success
 from app.core.security import get_current_actor
-from app.db.database import db
 from app.logging import get_logger, LogSection, LogSubsection
-from app.multiplayer.lobby_utils import get_user_id
+from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db, update_lobby
 from app.rate_limit import rate_limit_ip
 from app.multiplayer.ws_utils import clear_ws_token
 
@@ -30,7 +29,7 @@ async def close_lobby(lobby_id: str, request: Request = None, current_user: dict
     )
     
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -59,8 +58,8 @@ async def close_lobby(lobby_id: str, request: Request = None, current_user: dict
                     message=f"Не удалось отозвать WS токен для участника {participant_id} при закрытии лобби {lobby_id}. Ошибка: {e}"
                 )
 
-        await db.lobbies.update_one(
-            {"_id": lobby_id},
+        await update_lobby(
+            lobby_id,
             {
                 "$set": {
                     "status": "closed",
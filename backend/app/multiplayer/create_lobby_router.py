@@ -4,6 +4,7 @@ from app.utils.id_generator import generate_unique_lobby_id
 from datetime import datetime, timedelta
 from app.core.security import get_current_actor
 from app.core.response import success
+from app.core.question_pack import build_question_pack
 from bson import ObjectId
 from pydantic import BaseModel
 from app.logging import get_logger, LogSection, LogSubsection
@@ -93,6 +94,7 @@ async def create_multiplayer_lobby(
             "mode": "multiplayer",
             "question_ids": question_ids,
             "correct_answers": correct_answers_map,
+            "question_pack": build_question_pack(questions),
             "participants": [user_id],
             "participants_answers": {user_id: {}},
             "current_index": 0,
@@ -7,7 +7,7 @@ from app.core.security import get_current_actor
 from app.db.database import db
 from app.logging import get_logger, LogSection, LogSubsection
 from app.rate_limit import rate_limit_ip
-from app.multiplayer.lobby_utils import get_user_id
+from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db, update_lobby
 from app.multiplayer.ws_utils import create_ws_token
 from app.multiplayer.lobby_validator import (
     check_active_session,
@@ -35,7 +35,7 @@ async def join_lobby(lobby_id: str, request: Request = None, current_user: dict
     )
 
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
 
@@ -100,8 +100,8 @@ async def join_lobby(lobby_id: str, request: Request = None, current_user: dict
         if current_participants >= max_participants:
             raise HTTPException(status_code=400, detail=f"Лобби заполнено ({current_participants}/{max_participants})")
 
-        await db.lobbies.update_one(
-            {"_id": lobby_id},
+        await update_lobby(
+            lobby_id,
             {"$addToSet": {"participants": user_id}}
         )
         
@@ -3,9 +3,8 @@ from bson import ObjectId
 
 from app.core.response import success
 from app.core.security import get_current_actor
-from app.db.database import db
 from app.logging import get_logger, LogSection, LogSubsection
-from app.multiplayer.lobby_utils import get_user_id
+from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db, update_lobby
 from app.rate_limit import rate_limit_ip
 from app.schemas.lobby_schemas import KickParticipantRequest
 from app.multiplayer.ws_utils import clear_ws_token
@@ -36,7 +35,7 @@ async def kick_participant(
     )
     
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -54,8 +53,8 @@ async def kick_participant(
         if target_user_id == user_id:
             raise HTTPException(status_code=400, detail="Хост не может исключить самого себя")
         
-        await db.lobbies.update_one(
-            {"_id": lobby_id},
+        await update_lobby(
+            lobby_id,
             {
                 "$pull": {"participants": target_user_id},
                 "$addToSet": {"blacklisted_users": target_user_id},
@@ -9,7 +9,7 @@ from app.core.redis_client import multiplayer_redis_client
 from app.core.response import success, error
 from app.logging import get_structured_logger, LogSection, LogSubsection
 
-from .lobby_utils import get_lobby_from_db, get_user_id
+from .lobby_utils import get_lobby_from_db, get_user_id, update_lobby
 
 router = APIRouter(prefix="/lobbies", tags=["multiplayer"])
 
@@ -105,8 +105,8 @@ async def leave_lobby(
             "updated_at": datetime.utcnow()
         }
         
-        await db.lobbies.update_one(
-            {"_id": lobby_id},
+        await update_lobby(
+            lobby_id,
             {"$set": update_data}
         )
         
@@ -0,0 +1,98 @@
+import json
+import zlib
+from datetime import datetime
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.core.redis_client import get_multiplayer_redis_connection
+from app.logging import get_logger, LogSection, LogSubsection
+
+logger = get_logger(__name__)
+
+
+class LobbyEventType:
+    """Типы событий лобби, которые рассылает WS-сервис."""
+    ANSWER_RECEIVED = "answer_received"
+    PARTICIPANT_ANSWERED = "participant_answered"
+    QUESTION_STATUS = "question_status"
+    TEST_FINISHED = "test_finished"
+
+
+class LobbyEventPublisher:
+    """
+    Публикует события лобби в Redis Stream мультиплеера.
+    backend_ws читает поток группой потребителей и делает один emit на комнату,
+    поэтому стоимость рассылки для API-воркера не зависит от числа участников.
+
+    Поток разбит на шарды "<stream>:<n>" по crc32(lobby_id): все события лобби
+    попадают в один шард, а каждый шард backend_ws читает одним воркером,
+    поэтому клиенты получают их в порядке публикации.
+    """
+
+    def __init__(self, stream: str, maxlen: int, shards: int):
+        self.stream = stream
+        self.maxlen = maxlen
+        self.shards = shards
+
+    def stream_for(self, lobby_id: str) -> str:
+        shard = zlib.crc32(str(lobby_id).encode("utf-8")) % self.shards
+        return f"{self.stream}:{shard}"
+
+    async def _publish(self, event: dict) -> bool:
+        try:
+            redis_conn = await get_multiplayer_redis_connection()
+            await redis_conn.xadd(
+                self.stream_for(event["lobby_id"]),
+                {"event": json.dumps(event, default=str)},
+                maxlen=self.maxlen,
+                approximate=True
+            )
+            return True
+        except Exception as e:
+            logger.error(
+                section=LogSection.WEBSOCKET,
+                subsection=LogSubsection.WEBSOCKET.ERROR,
+                message=f"Ошибка публикации события {event.get('type')} для лобби {event.get('lobby_id')}: {str(e)}"
+            )
+            return False
+
+    async def publish(
+        self,
+        lobby_id: str,
+        event_type: str,
+        data: Any,
+        host_id: Optional[str] = None,
+        host_data: Any = None
+    ) -> bool:
+        """
+        Событие для всей комнаты лобби.
+        Если передан host_data, хост получает его вместо data (например, с индексом ответа).
+        """
+        event = {
+            "lobby_id": lobby_id,
+            "type": event_type,
+            "data": data,
+            "published_at": datetime.utcnow().isoformat()
+        }
+        if host_data is not None and host_id:
+            event["host_id"] = host_id
+            event["host_data"] = host_data
+        return await self._publish(event)
+
+    async def publish_to_user(self, lobby_id: str, user_id: str, event_type: str, data: Any) -> bool:
+        """Событие только для одного пользователя лобби."""
+        return await self._publish({
+            "lobby_id": lobby_id,
+            "type": event_type,
+            "data": data,
+            "target_user_id": user_id,
+            "published_at": datetime.utcnow().isoformat()
+        })
+
+
+# Глобальный издатель событий лобби
+lobby_events = LobbyEventPublisher(
+    stream=settings.LOBBY_EVENTS_STREAM,
+    maxlen=settings.LOBBY_EVENTS_STREAM_MAXLEN,
+    shards=settings.LOBBY_EVENTS_SHARDS
+)
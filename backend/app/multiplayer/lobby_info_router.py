@@ -116,7 +116,7 @@ async def get_lobby_public_info(lobby_id: str, request: Request = None):
     Не требует аутентификации.
     """
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -0,0 +1,315 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.core.redis_client import get_multiplayer_redis_connection
+from app.db.database import db
+from app.logging import get_logger, LogSection, LogSubsection
+from app.multiplayer.lobby_events import lobby_events, LobbyEventType
+from app.multiplayer.lobby_utils import MAX_LOBBY_LIFETIME, invalidate_lobby_cache, on_lobby_finished
+
+logger = get_logger(__name__)
+
+# Sorted set дедлайнов: member - ID лобби, score - unix-время ближайшего дедлайна
+DEADLINES_KEY = "lobby_deadlines"
+# Ключ лидера: планировщик работает только в одном воркере API
+LEADER_KEY = "lobby_scheduler:leader"
+# Список-будильник: позволяет лидеру проснуться раньше при появлении более раннего дедлайна
+WAKEUP_KEY = "lobby_scheduler:wakeup"
+
+# Продлевает лидерство, только если ключ всё ещё принадлежит этому воркеру
+RENEW_LEADER_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def lobby_deadline(lobby: dict) -> Optional[datetime]:
+    """
+    Ближайший дедлайн лобби: истечение времени жизни или таймера экзамена.
+    """
+    deadlines = []
+    created_at = lobby.get("created_at")
+    if isinstance(created_at, datetime):
+        deadlines.append(created_at + timedelta(seconds=MAX_LOBBY_LIFETIME))
+    exam_expires_at = lobby.get("exam_timer_expires_at")
+    if lobby.get("exam_mode", False) and isinstance(exam_expires_at, datetime):
+        deadlines.append(exam_expires_at)
+    return min(deadlines) if deadlines else None
+
+
+def _timestamp(value: datetime) -> float:
+    # Даты в Mongo хранятся как наивный UTC
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+async def schedule_lobby(lobby: dict) -> None:
+    """
+    Поставить дедлайн лобби в планировщик. Вызывается при переводе лобби
+    в in_progress и при установке таймера экзамена. Более поздний дедлайн
+    не перезаписывает уже запланированный более ранний.
+    """
+    deadline = lobby_deadline(lobby)
+    if deadline is None:
+        return
+    try:
+        redis_conn = await get_multiplayer_redis_connection()
+        pipe = redis_conn.pipeline()
+        pipe.zadd(DEADLINES_KEY, {str(lobby["_id"]): _timestamp(deadline)}, lt=True)
+        pipe.rpush(WAKEUP_KEY, 1)
+        pipe.expire(WAKEUP_KEY, settings.LOBBY_SCHEDULER_LEADER_TTL_SECONDS)
+        await pipe.execute()
+    except Exception as e:
+        # Сверка в лидере всё равно подхватит лобби из MongoDB
+        logger.error(
+            section=LogSection.LOBBY,
+            subsection=LogSubsection.LOBBY.LIFECYCLE,
+            message=f"Не удалось запланировать дедлайн лобби {lobby.get('_id')}: {str(e)}"
+        )
+
+
+def _participant_scores(lobby: dict) -> Dict[str, int]:
+    """
+    Количество правильных ответов каждого участника.
+    В одиночных лобби ответы хранятся как [user_id][question_id],
+    в мультиплеерных - как [question_id][user_id].
+    """
+    answers = lobby.get("participants_answers", {}) or {}
+    participants = set(lobby.get("participants", []))
+    scores: Dict[str, int] = {}
+    if answers and not (set(answers) & participants):
+        for question_answers in answers.values():
+            for user_id, is_correct in question_answers.items():
+                scores[user_id] = scores.get(user_id, 0) + (1 if is_correct else 0)
+    else:
+        for user_id, user_answers in answers.items():
+            scores[user_id] = sum(1 for is_correct in user_answers.values() if is_correct)
+    return scores
+
+
+def _finish_reason(lobby: dict, now: datetime) -> str:
+    exam_expires_at = lobby.get("exam_timer_expires_at")
+    if lobby.get("exam_mode", False) and isinstance(exam_expires_at, datetime) and exam_expires_at <= now:
+        return "exam_timer_expired"
+    return "time_limit_exceeded"
+
+
+async def finish_due_lobbies(lobby_ids: List[str]) -> int:
+    """
+    Завершить пачку лобби с наступившим дедлайном: одно bulk_write на статусы
+    и одно insert_many на историю. Возвращает число завершённых лобби.
+    """
+    now = datetime.utcnow()
+    lobbies = await db.lobbies.find({"_id": {"$in": lobby_ids}, "status": "in_progress"}).to_list(None)
+
+    due = []
+    redis_conn = await get_multiplayer_redis_connection()
+    for lobby in lobbies:
+        deadline = lobby_deadline(lobby)
+        if deadline is not None and deadline > now:
+            # Дедлайн сдвинулся (например, таймер экзамена ещё не истёк) - переносим
+            await redis_conn.zadd(DEADLINES_KEY, {str(lobby["_id"]): _timestamp(deadline)})
+            continue
+        due.append(lobby)
+
+    if not due:
+        return 0
+
+    # Метка прогона: по ней узнаём, какие лобби завершил именно этот прогон,
+    # а не параллельный пользовательский запрос
+    run_id = uuid.uuid4().hex
+    operations = []
+    finish_info = {}
+    for lobby in due:
+        reason = _finish_reason(lobby, now)
+        duration = (now - lobby.get("created_at", now)).total_seconds()
+        finish_info[lobby["_id"]] = (reason, duration)
+        lobby_set = {
+            "status": "finished",
+            "finished_at": now,
+            "auto_finished": True,
+            "finish_reason": reason,
+            "auto_finish_run_id": run_id,
+            "duration_seconds": duration
+        }
+        operations.append(UpdateOne({"_id": lobby["_id"], "status": "in_progress"}, {"$set": lobby_set}))
+    await db.lobbies.bulk_write(operations, ordered=False)
+
+    finished_ids = set(await db.lobbies.distinct(
+        "_id",
+        {"_id": {"$in": list(finish_info)}, "auto_finish_run_id": run_id}
+    ))
+    finished = [lobby for lobby in due if lobby["_id"] in finished_ids]
+
+    history_records = []
+    for lobby in finished:
+        reason, duration = finish_info[lobby["_id"]]
+        total_questions = len(lobby.get("question_ids", []))
+        for participant_id, correct_count in _participant_scores(lobby).items():
+            history_records.append({
+                "user_id": participant_id,
+                "lobby_id": lobby["_id"],
+                "date": now,
+                "score": correct_count,
+                "total": total_questions,
+                "categories": lobby.get("categories", []),
+                "sections": lobby.get("sections", []),
+                "mode": lobby.get("mode", "solo"),
+                "pass_percentage": (correct_count / total_questions * 100) if total_questions > 0 else 0,
+                "duration_seconds": duration,
+                "is_passed": correct_count >= int(total_questions * 0.8),
+                "auto_finished": True,
+                "finish_reason": reason
+            })
+    if history_records:
+        await db.history.insert_many(history_records, ordered=False)
+
+    await asyncio.gather(*(invalidate_lobby_cache(lobby["_id"]) for lobby in finished))
+    for lobby in finished:
+        await on_lobby_finished(lobby["_id"], {**lobby, "status": "finished", "finished_at": now})
+    for lobby in finished:
+        reason, duration = finish_info[lobby["_id"]]
+        await lobby_events.publish(lobby["_id"], LobbyEventType.TEST_FINISHED, {
+            "auto_finished": True,
+            "reason": reason,
+            "duration_seconds": duration
+        })
+
+    logger.info(
+        section=LogSection.LOBBY,
+        subsection=LogSubsection.LOBBY.LIFECYCLE,
+        message=f"Планировщик завершил {len(finished)} лобби по дедлайну, записей истории: {len(history_records)}"
+    )
+    return len(finished)
+
+
+async def reconcile_deadlines() -> int:
+    """
+    Сверка с MongoDB: ставит в планировщик активные лобби, которых нет в sorted set
+    (созданные до запуска планировщика или потерянные при очистке Redis).
+    """
+    redis_conn = await get_multiplayer_redis_connection()
+    mapping = {}
+    cursor = db.lobbies.find(
+        {"status": "in_progress"},
+        {"_id": 1, "created_at": 1, "exam_mode": 1, "exam_timer_expires_at": 1}
+    )
+    async for lobby in cursor:
+        deadline = lobby_deadline(lobby)
+        if deadline is not None:
+            mapping[str(lobby["_id"])] = _timestamp(deadline)
+    if mapping:
+        await redis_conn.zadd(DEADLINES_KEY, mapping, lt=True)
+    return len(mapping)
+
+
+class LobbyScheduler:
+    """
+    Планировщик дедлайнов лобби. Во всех воркерах запускается одна и та же задача,
+    но работает только лидер (ключ в Redis с TTL). Лидер спит ровно до ближайшего
+    дедлайна из sorted set и завершает наступившие лобби пачками.
+    """
+
+    def __init__(self):
+        self.worker_id = _worker_id()
+        self.is_leader = False
+        self._last_reconcile = 0.0
+
+    async def _acquire_or_renew(self, redis_conn) -> bool:
+        ttl_ms = settings.LOBBY_SCHEDULER_LEADER_TTL_SECONDS * 1000
+        if self.is_leader:
+            renewed = await redis_conn.eval(RENEW_LEADER_SCRIPT, 1, LEADER_KEY, self.worker_id, ttl_ms)
+            self.is_leader = bool(renewed)
+        else:
+            acquired = await redis_conn.set(LEADER_KEY, self.worker_id, nx=True, px=ttl_ms)
+            if acquired:
+                self.is_leader = True
+                # Новый лидер сразу сверяет дедлайны с MongoDB
+                self._last_reconcile = 0.0
+                logger.info(
+                    section=LogSection.SYSTEM,
+                    subsection=LogSubsection.SYSTEM.MAINTENANCE,
+                    message=f"Воркер {self.worker_id} стал лидером планировщика лобби"
+                )
+        return self.is_leader
+
+    async def _tick(self, redis_conn) -> float:
+        """Один проход лидера. Возвращает, сколько секунд можно спать."""
+        if time.monotonic() - self._last_reconcile >= settings.LOBBY_SCHEDULER_RECONCILE_SECONDS:
+            await reconcile_deadlines()
+            self._last_reconcile = time.monotonic()
+
+        now_ts = time.time()
+        due_ids = await redis_conn.zrangebyscore(
+            DEADLINES_KEY, "-inf", now_ts, start=0, num=settings.LOBBY_SCHEDULER_BATCH_SIZE
+        )
+        if due_ids:
+            # Снимаем до обработки: перенесённые дедлайны finish_due_lobbies добавит заново,
+            # а при сбое лобби вернёт ближайшая сверка
+            await redis_conn.zrem(DEADLINES_KEY, *due_ids)
+            await finish_due_lobbies(due_ids)
+            if len(due_ids) == settings.LOBBY_SCHEDULER_BATCH_SIZE:
+                return 0
+
+        # Спим до ближайшего дедлайна, но не дольше интервала продления лидерства
+        max_sleep = settings.LOBBY_SCHEDULER_LEADER_TTL_SECONDS / 3
+        upcoming = await redis_conn.zrange(DEADLINES_KEY, 0, 0, withscores=True)
+        if not upcoming:
+            return max_sleep
+        return max(0.0, min(max_sleep, upcoming[0][1] - time.time()))
+
+    async def _sleep(self, redis_conn, seconds: float) -> None:
+        """Сон, который прерывается сигналом из schedule_lobby."""
+        if seconds <= 0:
+            return
+        if not self.is_leader:
+            await asyncio.sleep(seconds)
+            return
+        # BLPOP принимает целые секунды (0 - бесконечно), поэтому короткие паузы - обычным sleep
+        if seconds < 1:
+            await asyncio.sleep(seconds)
+            return
+        woke = await redis_conn.blpop(WAKEUP_KEY, timeout=int(seconds))
+        if woke:
+            await redis_conn.delete(WAKEUP_KEY)
+
+    async def run(self):
+        logger.info(
+            section=LogSection.SYSTEM,
+            subsection=LogSubsection.SYSTEM.MAINTENANCE,
+            message=f"Запуск планировщика дедлайнов лобби (воркер {self.worker_id})"
+        )
+        while True:
+            try:
+                redis_conn = await get_multiplayer_redis_connection()
+                if await self._acquire_or_renew(redis_conn):
+                    sleep_for = await self._tick(redis_conn)
+                else:
+                    sleep_for = settings.LOBBY_SCHEDULER_LEADER_TTL_SECONDS / 3
+                await self._sleep(redis_conn, sleep_for)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(
+                    section=LogSection.SYSTEM,
+                    subsection=LogSubsection.SYSTEM.ERROR,
+                    message=f"Ошибка в планировщике дедлайнов лобби: {str(e)}"
+                )
+                await asyncio.sleep(5)
+
+
+# Глобальный планировщик (один на процесс, активен только в лидере)
+lobby_scheduler = LobbyScheduler()
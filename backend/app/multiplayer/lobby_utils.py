@@ -1,9 +1,16 @@
 from datetime import datetime
 from typing import Dict, Optional
 from app.db.database import db
+from app.core.config import settings
+from app.core.redis_client import get_multiplayer_redis_connection
+from app.core.lobby_results import build_results_snapshot
+from app.core.question_pack import get_packed_questions
+from app.core.user_stats import record_finished_lobby_safe
 from app.logging import get_logger, LogSection, LogSubsection
-from bson import ObjectId
+from bson import ObjectId, json_util
 from bson.errors import InvalidId
+from bson.json_util import JSONOptions
+from pymongo import ReturnDocument
 
 
 logger = get_logger(__name__)
@@ -14,9 +21,192 @@ MAX_LOBBY_LIFETIME = 4 * 60 * 60
 # Exam mode timer (40 minutes in seconds)
 EXAM_TIMER_DURATION = 40 * 60
 
+# Префикс ключей кэша лобби в Redis мультиплеера
+LOBBY_CACHE_PREFIX = "lobby_cache:"
+
+# Даты в Mongo хранятся без таймзоны, кэш должен отдавать их в том же виде
+_LOBBY_JSON_OPTIONS = JSONOptions(tz_aware=False)
+
+
+# Поколение кэша лобби: увеличивается при каждой инвалидации
+LOBBY_CACHE_GEN_PREFIX = "lobby_cache_gen:"
+# Ключ поколения живёт заметно дольше любого чтения из MongoDB
+LOBBY_CACHE_GEN_TTL_SECONDS = 24 * 60 * 60
+
+# Записывает лобби в кэш, только если поколение не изменилось с момента чтения:
+# иначе документ мог устареть из-за параллельного update_lobby
+FILL_LOBBY_CACHE_SCRIPT = """
+local generation = redis.call('GET', KEYS[2]) or ''
+if generation == ARGV[1] then
+    return redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+end
+return 0
+"""
+
+INVALIDATE_LOBBY_CACHE_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return redis.call('DEL', KEYS[1])
+"""
+
+
+def _lobby_cache_key(lobby_id: str) -> str:
+    return f"{LOBBY_CACHE_PREFIX}{lobby_id}"
+
+
+def _lobby_cache_gen_key(lobby_id: str) -> str:
+    return f"{LOBBY_CACHE_GEN_PREFIX}{lobby_id}"
+
+
 async def get_lobby_from_db(lobby_id: str) -> Optional[dict]:
-    """Получить лобби напрямую из MongoDB."""
-    return await db.lobbies.find_one({"_id": lobby_id})
+    """
+    Получить лобби через кэш в Redis мультиплеера (read-through).
+    При промахе или недоступности Redis документ читается из MongoDB.
+    Кэш заполняется, только если с момента промаха лобби не инвалидировали.
+    """
+    redis_conn = None
+    generation = None
+    try:
+        redis_conn = await get_multiplayer_redis_connection()
+        cached, generation = await redis_conn.mget(_lobby_cache_key(lobby_id), _lobby_cache_gen_key(lobby_id))
+        if cached:
+            return json_util.loads(cached, json_options=_LOBBY_JSON_OPTIONS)
+    except Exception as e:
+        logger.warning(
+            section=LogSection.REDIS,
+            subsection=LogSubsection.REDIS.CACHE,
+            message=f"Не удалось прочитать лобби {lobby_id} из кэша Redis: {str(e)}"
+        )
+        redis_conn = None
+
+    lobby = await db.lobbies.find_one({"_id": lobby_id})
+    if lobby and redis_conn is not None:
+        try:
+            if isinstance(generation, bytes):
+                generation = generation.decode()
+            await redis_conn.eval(
+                FILL_LOBBY_CACHE_SCRIPT,
+                2,
+                _lobby_cache_key(lobby_id),
+                _lobby_cache_gen_key(lobby_id),
+                generation or "",
+                json_util.dumps(lobby, json_options=_LOBBY_JSON_OPTIONS),
+                settings.LOBBY_CACHE_TTL_SECONDS
+            )
+        except Exception as e:
+            logger.warning(
+                section=LogSection.REDIS,
+                subsection=LogSubsection.REDIS.CACHE,
+                message=f"Не удалось записать лобби {lobby_id} в кэш Redis: {str(e)}"
+            )
+    return lobby
+
+
+async def invalidate_lobby_cache(lobby_id: str) -> None:
+    """Сбросить кэш лобби после изменения документа в MongoDB."""
+    try:
+        redis_conn = await get_multiplayer_redis_connection()
+        await redis_conn.eval(
+            INVALIDATE_LOBBY_CACHE_SCRIPT,
+            2,
+            _lobby_cache_key(lobby_id),
+            _lobby_cache_gen_key(lobby_id),
+            LOBBY_CACHE_GEN_TTL_SECONDS
+        )
+    except Exception as e:
+        logger.error(
+            section=LogSection.REDIS,
+            subsection=LogSubsection.REDIS.CACHE,
+            message=f"Не удалось сбросить кэш лобби {lobby_id}: {str(e)}"
+        )
+
+
+def _finishes_lobby(update: dict) -> bool:
+    return (update.get("$set") or {}).get("status") == "finished"
+
+
+async def update_lobby(lobby_id: str, update: dict, extra_filter: Optional[dict] = None, **kwargs):
+    """
+    Изменить лобби в MongoDB и сбросить его кэш (write-through).
+    Все изменения документа лобби должны проходить через эту функцию:
+    при переводе в статус finished здесь же вызывается on_lobby_finished.
+    """
+    query = {"_id": lobby_id}
+    if extra_filter:
+        query.update(extra_filter)
+    result = await db.lobbies.update_one(query, update, **kwargs)
+    await invalidate_lobby_cache(lobby_id)
+    if result.modified_count and _finishes_lobby(update):
+        await on_lobby_finished(lobby_id)
+    return result
+
+
+async def find_and_update_lobby(
+    lobby_id: str,
+    update: dict,
+    extra_filter: Optional[dict] = None,
+    projection: Optional[dict] = None
+) -> Optional[dict]:
+    """
+    Атомарно изменить лобби, если документ удовлетворяет условиям extra_filter.
+    Возвращает документ после изменения (только поля projection, если она
+    задана) или None, если условия не выполнены.
+    """
+    query = {"_id": lobby_id}
+    if extra_filter:
+        query.update(extra_filter)
+    lobby = await db.lobbies.find_one_and_update(
+        query,
+        update,
+        projection=projection,
+        return_document=ReturnDocument.AFTER
+    )
+    if lobby is not None:
+        await invalidate_lobby_cache(lobby_id)
+        if _finishes_lobby(update):
+            # Неполный документ не годится для снимка результатов: лобби перечитается
+            await on_lobby_finished(lobby_id, None if projection else lobby)
+    return lobby
+
+
+async def get_results_snapshot(lobby: dict) -> dict:
+    """
+    Снимок результатов завершённого лобби. Обычно он уже сохранён при завершении;
+    для лобби, завершённых раньше, снимок строится и сохраняется при первом запросе.
+    Для незавершённого лобби снимок считается по текущим ответам и не сохраняется.
+    """
+    snapshot = lobby.get("results_snapshot")
+    if snapshot:
+        return snapshot
+    snapshot = build_results_snapshot(lobby, await get_packed_questions(lobby))
+    if lobby.get("status") == "finished":
+        lobby_id = lobby["_id"]
+        await db.lobbies.update_one(
+            {"_id": lobby_id, "status": "finished", "results_snapshot": {"$exists": False}},
+            {"$set": {"results_snapshot": snapshot}}
+        )
+        await invalidate_lobby_cache(lobby_id)
+    return snapshot
+
+
+async def on_lobby_finished(lobby_id: str, lobby: Optional[dict] = None) -> None:
+    """
+    Действия при переводе лобби в статус finished: снимок результатов
+    и обновление статистики хоста. Ошибки логируются и не прерывают завершение.
+    """
+    try:
+        if lobby is None:
+            lobby = await db.lobbies.find_one({"_id": lobby_id})
+        if lobby is None:
+            return
+        lobby["results_snapshot"] = await get_results_snapshot(lobby)
+    except Exception as e:
+        logger.error(
+            section=LogSection.LOBBY,
+            subsection=LogSubsection.LOBBY.RESULTS,
+            message=f"Не удалось сохранить снимок результатов лобби {lobby_id}: {str(e)}"
+        )
+    await record_finished_lobby_safe(lobby_id, lobby)
 
 async def get_user_subscription_from_db(user_id: str) -> Optional[dict]:
     """Получить активную подписку пользователя напрямую из MongoDB."""
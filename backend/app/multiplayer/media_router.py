@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Response, Request, Query
 from fastapi.responses import StreamingResponse
 from app.core.media_manager import media_manager
+from app.core.gridfs_utils import gridfs_media_response
 from app.db.database import get_database
 from bson import ObjectId, errors
 import base64
@@ -9,7 +10,8 @@ from app.core.response import success
 from app.logging import get_logger, LogSection, LogSubsection
 from app.core.config import settings
 from app.rate_limit import rate_limit_ip
-from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db
+from app.core.question_cache import question_cache, invalidate_question
+from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db, update_lobby
 
 router = APIRouter(tags=["Multiplayer Media"])
 logger = get_logger(__name__)
@@ -96,17 +98,7 @@ async def get_question_media_multiplayer(
             raise HTTPException(status_code=403, detail="Вопрос не входит в состав этого лобби")
         
         # Находим вопрос в базе данных
-        question = None
-        try:
-            question = await db.questions.find_one({"_id": question_id})
-        except:
-            pass
-            
-        if not question:
-            try:
-                question = await db.questions.find_one({"_id": ObjectId(question_id)})
-            except:
-                pass
+        question = await question_cache.get_question(question_id)
         
         if not question:
             logger.error(
@@ -155,6 +147,12 @@ async def get_question_media_multiplayer(
             # Проверяем существование файла в системе медиа
             file_info = await media_manager.get_media_file(str(media_file_id), db)
             if not file_info:
+                # Старые файлы, ещё лежащие в GridFS, отдаются потоком частями
+                legacy_response = await gridfs_media_response(
+                    str(media_file_id), db, request.headers.get("range")
+                )
+                if legacy_response is not None:
+                    return legacy_response
                 logger.error(
                     section=LogSection.FILES,
                     subsection=LogSubsection.FILES.GRIDFS,
@@ -210,11 +208,12 @@ async def get_question_media_multiplayer(
                         "media_type": "video" if is_video else "image"
                     }}
                 )
+                await invalidate_question(question["_id"])
                 
                 # Также обновляем кэшированную информацию в лобби
                 if lobby.get("questions_data") and lobby["questions_data"].get(question_id):
-                    await db.lobbies.update_one(
-                        {"_id": lobby["_id"]},
+                    await update_lobby(
+                        lobby["_id"],
                         {"$set": {
                             f"questions_data.{question_id}.has_media": True,
                             f"questions_data.{question_id}.media_type": "video" if is_video else "image"
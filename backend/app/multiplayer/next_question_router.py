@@ -1,5 +1,4 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
-from app.db.database import db
 from datetime import datetime, timedelta
 from app.core.security import get_current_actor
 from app.core.response import success
@@ -9,7 +8,7 @@ from app.logging import get_logger, LogSection, LogSubsection
 import asyncio
 from typing import Optional, List
 from app.rate_limit import rate_limit_ip
-from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db, get_user_subscription_from_db
+from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db, get_user_subscription_from_db, update_lobby
 from app.multiplayer.lobby_validator import check_active_session, validate_user_subscription
 import re
 
@@ -213,8 +212,8 @@ async def next_question(
         }
         
         # Выполняем обновление в базе данных
-        result = await db.lobbies.update_one(
-            {"_id": lobby["_id"]},
+        result = await update_lobby(
+            lobby["_id"],
             {"$set": update_data}
         )
         
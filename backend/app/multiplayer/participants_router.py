@@ -4,7 +4,7 @@ from bson import ObjectId
 from app.db.database import db
 from app.core.security import get_current_actor
 from app.core.response import success
-from app.multiplayer.lobby_utils import get_user_id
+from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db
 from app.logging import get_logger, LogSection, LogSubsection
 
 router = APIRouter()
@@ -29,7 +29,7 @@ async def get_lobby_participants(
 
     try:
         # Получаем лобби напрямую из базы данных, без кеша
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             logger.warning(
                 section=LogSection.LOBBY,
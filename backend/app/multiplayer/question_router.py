@@ -1,15 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
-from app.db.database import db
 from datetime import datetime, timedelta
 from app.core.security import get_current_actor
 from app.core.response import success
-from bson import ObjectId
 from pydantic import BaseModel, validator
 from app.logging import get_logger, LogSection, LogSubsection
 import asyncio
 from typing import Optional, List
 from app.rate_limit import rate_limit_ip
-from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db, get_user_subscription_from_db
+from app.core.question_pack import get_packed_question
+from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db, get_user_subscription_from_db, update_lobby
 from app.multiplayer.lobby_validator import check_active_session, validate_user_subscription
 import re
 
@@ -87,14 +86,8 @@ async def get_current_question(
         
         current_question_id = question_ids[current_index]
         
-        # Получаем вопрос из базы данных
-        question = await db.questions.find_one({"_id": current_question_id})
-        if not question:
-            # Пробуем как ObjectId
-            try:
-                question = await db.questions.find_one({"_id": ObjectId(current_question_id)})
-            except:
-                pass
+        # Получаем вопрос из пакета лобби
+        question = await get_packed_question(lobby, current_question_id)
         
         if not question:
             logger.error(
@@ -111,26 +104,17 @@ async def get_current_question(
         participants_raw_answers = lobby.get("participants_raw_answers", {})
         user_answer_index = participants_raw_answers.get(current_question_id, {}).get(user_id, None)
         
-        # Проверяем наличие дополнительного медиа
-        has_after_answer_media = question.get("has_after_answer_media", False)
-        after_answer_media_file_id = question.get("after_answer_media_file_id")
-        after_answer_media_id = question.get("after_answer_media_id")
-        
-        # Если есть ID файла, но флаг не установлен, устанавливаем его
-        if (after_answer_media_file_id or after_answer_media_id) and not has_after_answer_media:
-            has_after_answer_media = True
-        
         # Подготавливаем данные вопроса
         question_data = {
-            "_id": str(question["_id"]),
-            "question_text": question.get("question_text", {}),
-            "answers": [option["text"] for option in question.get("options", [])],
-            "has_media": question.get("has_media", False),
-            "media_filename": question.get("media_filename"),
-            "has_after_answer_media": has_after_answer_media,
-            "after_answer_media_filename": question.get("after_answer_media_filename"),
-            "after_answer_media_file_id": after_answer_media_file_id,
-            "after_answer_media_id": after_answer_media_id,
+            "_id": question["_id"],
+            "question_text": question["question_text"],
+            "answers": question["answers"],
+            "has_media": question["has_media"],
+            "media_filename": question["media_filename"],
+            "has_after_answer_media": question["has_after_answer_media"],
+            "after_answer_media_filename": question["after_answer_media_filename"],
+            "after_answer_media_file_id": question["after_answer_media_file_id"],
+            "after_answer_media_id": question["after_answer_media_file_id"],
             "current_index": current_index,
             "total_questions": len(question_ids),
             "lobby_id": lobby_id,
@@ -140,7 +124,7 @@ async def get_current_question(
         
         # Если ответы должны быть показаны, добавляем правильный ответ
         if show_answers:
-            question_data["correct_answer_index"] = question.get("correct_answer_index")
+            question_data["correct_answer_index"] = question["correct_answer_index"]
         
         # В режиме экзамена убираем чувствительные данные
         if lobby.get("exam_mode", False):
@@ -150,7 +134,7 @@ async def get_current_question(
         logger.info(
             section=LogSection.LOBBY,
             subsection=LogSubsection.LOBBY.QUESTIONS,
-            message=f"Предоставлен текущий вопрос {current_question_id} пользователю {user_id} в лобби {lobby_id}, индекс {current_index}, показывать ответы: {show_answers}, has_after_answer_media: {question.get('has_after_answer_media', False)}"
+            message=f"Предоставлен текущий вопрос {current_question_id} пользователю {user_id} в лобби {lobby_id}, индекс {current_index}, показывать ответы: {show_answers}, has_after_answer_media: {question['has_after_answer_media']}"
         )
         
         return success(data=question_data)
@@ -220,8 +204,8 @@ async def toggle_answers(
         new_show_answers = toggle_data.show_answers
         
         # Обновляем лобби
-        result = await db.lobbies.update_one(
-            {"_id": lobby_id},
+        result = await update_lobby(
+            lobby_id,
             {"$set": {"show_answers": new_show_answers}}
         )
         
@@ -300,14 +284,8 @@ async def get_specific_question(
             )
             raise HTTPException(status_code=403, detail="Вопрос не принадлежит этому лобби")
         
-        # Получаем вопрос из базы данных
-        question = await db.questions.find_one({"_id": question_id})
-        if not question:
-            # Пробуем как ObjectId
-            try:
-                question = await db.questions.find_one({"_id": ObjectId(question_id)})
-            except:
-                pass
+        # Получаем вопрос из пакета лобби
+        question = await get_packed_question(lobby, question_id)
         
         if not question:
             logger.error(
@@ -324,26 +302,17 @@ async def get_specific_question(
         participants_raw_answers = lobby.get("participants_raw_answers", {})
         user_answer_index = participants_raw_answers.get(question_id, {}).get(user_id, None)
         
-        # Проверяем наличие дополнительного медиа
-        has_after_answer_media = question.get("has_after_answer_media", False)
-        after_answer_media_file_id = question.get("after_answer_media_file_id")
-        after_answer_media_id = question.get("after_answer_media_id")
-        
-        # Если есть ID файла, но флаг не установлен, устанавливаем его
-        if (after_answer_media_file_id or after_answer_media_id) and not has_after_answer_media:
-            has_after_answer_media = True
-        
         # Подготавливаем данные вопроса
         question_data = {
-            "_id": str(question["_id"]),
-            "question_text": question.get("question_text", {}),
-            "answers": [option["text"] for option in question.get("options", [])],
-            "has_media": question.get("has_media", False),
-            "media_filename": question.get("media_filename"),
-            "has_after_answer_media": has_after_answer_media,
-            "after_answer_media_filename": question.get("after_answer_media_filename"),
-            "after_answer_media_file_id": after_answer_media_file_id,
-            "after_answer_media_id": after_answer_media_id,
+            "_id": question["_id"],
+            "question_text": question["question_text"],
+            "answers": question["answers"],
+            "has_media": question["has_media"],
+            "media_filename": question["media_filename"],
+            "has_after_answer_media": question["has_after_answer_media"],
+            "after_answer_media_filename": question["after_answer_media_filename"],
+            "after_answer_media_file_id": question["after_answer_media_file_id"],
+            "after_answer_media_id": question["after_answer_media_file_id"],
             "lobby_id": lobby_id,
             "show_answers": show_answers,  # Флаг показа ответов из лобби
             "user_answer_index": user_answer_index  # Индекс ответа пользователя (null если не отвечал)
@@ -351,7 +320,7 @@ async def get_specific_question(
         
         # Если ответы должны быть показаны, добавляем правильный ответ
         if show_answers:
-            question_data["correct_answer_index"] = question.get("correct_answer_index")
+            question_data["correct_answer_index"] = question["correct_answer_index"]
         
         # В режиме экзамена убираем чувствительные данные
         if lobby.get("exam_mode", False):
@@ -361,7 +330,7 @@ async def get_specific_question(
         logger.info(
             section=LogSection.LOBBY,
             subsection=LogSubsection.LOBBY.QUESTIONS,
-            message=f"Предоставлен конкретный вопрос {question_id} пользователю {user_id} в лобби {lobby_id}, показывать ответы: {show_answers}, has_after_answer_media: {question.get('has_after_answer_media', False)}"
+            message=f"Предоставлен конкретный вопрос {question_id} пользователю {user_id} в лобби {lobby_id}, показывать ответы: {show_answers}, has_after_answer_media: {question['has_after_answer_media']}"
         )
         
         return success(data=question_data)
@@ -9,7 +9,9 @@ from app.logging import get_logger, LogSection, LogSubsection
 import asyncio
 from typing import Optional, List
 from app.rate_limit import rate_limit_ip
-from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db, get_user_subscription_from_db
+from app.core.question_cache import question_cache
+from app.multiplayer.lobby_utils import get_user_id, get_lobby_from_db, get_user_subscription_from_db, update_lobby
+from app.multiplayer.lobby_scheduler import schedule_lobby
 from app.multiplayer.lobby_validator import check_active_session, validate_user_subscription
 import re
 
@@ -283,12 +285,10 @@ async def start_lobby(
             )
         
         # Атомарное обновление с проверкой статуса
-        result = await db.lobbies.update_one(
-            {
-                "_id": lobby_id,
-                "status": "waiting"  # Проверяем, что статус все еще waiting
-            },
-            {"$set": update_data}
+        result = await update_lobby(
+            lobby_id,
+            {"$set": update_data},
+            extra_filter={"status": "waiting"}  # Проверяем, что статус все еще waiting
         )
         
         if result.modified_count == 0:
@@ -299,6 +299,12 @@ async def start_lobby(
             )
             raise HTTPException(status_code=409, detail="Лобби уже было изменено. Попробуйте еще раз.")
         
+        # Ставим дедлайн лобби в планировщик (время жизни / таймер экзамена)
+        await schedule_lobby({**lobby, **update_data})
+        
+        # Прогреваем кэш вопросов лобби одним запросом $in
+        await question_cache.preload(lobby.get("question_ids", []))
+        
         logger.info(
             section=LogSection.LOBBY,
             subsection=LogSubsection.LOBBY.LIFECYCLE,
@@ -434,12 +440,10 @@ async def force_start_lobby(
             update_data["exam_timer_started_at"] = current_time
         
         # Атомарное обновление с проверкой статуса
-        result = await db.lobbies.update_one(
-            {
-                "_id": lobby_id,
-                "status": "waiting"  # Проверяем, что статус все еще waiting
-            },
-            {"$set": update_data}
+        result = await update_lobby(
+            lobby_id,
+            {"$set": update_data},
+            extra_filter={"status": "waiting"}  # Проверяем, что статус все еще waiting
         )
         
         if result.modified_count == 0:
@@ -450,6 +454,12 @@ async def force_start_lobby(
             )
             raise HTTPException(status_code=409, detail="Лобби уже было изменено. Попробуйте еще раз.")
         
+        # Ставим дедлайн лобби в планировщик (время жизни / таймер экзамена)
+        await schedule_lobby({**lobby, **update_data})
+        
+        # Прогреваем кэш вопросов лобби одним запросом $in
+        await question_cache.preload(lobby.get("question_ids", []))
+        
         logger.warning(
             section=LogSection.LOBBY,
             subsection=LogSubsection.LOBBY.LIFECYCLE,
@@ -10,6 +10,17 @@ from starlette.status import HTTP_429_TOO_MANY_REQUESTS
 from .rate_limiter import get_rate_limiter
 from .config import get_rate_limit_config, RateLimitType, RateLimitRule
 from .utils import get_client_ip, get_user_id_from_request
+from app.logging import get_logger, LogSection, LogSubsection
+
+logger = get_logger(__name__)
+
+
+def _log_skip(route: str, reason: str):
+    logger.debug(
+        section=LogSection.SECURITY,
+        subsection=LogSubsection.SECURITY.RATE_LIMIT,
+        message=f"Рейт лимит маршрута {route} пропущен: {reason}"
+    )
 
 
 def rate_limit(
@@ -33,17 +44,15 @@ def rate_limit(
             # Получаем объект Request — сначала из args, потом из kwargs
             request = next((a for a in args if isinstance(a, Request)), None) \
                       or kwargs.get('request')
-            
-            print(f"[Decorator] --- Проверка для маршрута: {route} ---")
 
             if not isinstance(request, Request):
                 # Если Request не найден, пропускаем лимит
-                print("[Decorator] Request не найден, пропускаю лимит.")
+                _log_skip(route, "Request не найден")
                 return await func(*args, **kwargs)
 
             if max_requests is None or window_seconds is None:
                 # Если параметры не переданы, пропускаем
-                print("[Decorator] Лимиты не заданы в декораторе, пропускаю.")
+                _log_skip(route, "лимиты не заданы в декораторе")
                 return await func(*args, **kwargs)
 
             rule = RateLimitRule(
@@ -51,7 +60,6 @@ def rate_limit(
                 window_seconds=window_seconds,
                 rate_limit_type=rate_limit_type or RateLimitType.IP
             )
-            print(f"[Decorator] Правило: {rule.max_requests} запросов / {rule.window_seconds} сек. Тип: {rule.rate_limit_type.value}")
             
             identifier = None
             # Определяем идентификатор в зависимости от типа лимита
@@ -59,7 +67,7 @@ def rate_limit(
                 identifier = get_client_ip(request)
                 if identifier is None:
                     # Если IP не найден, пропускаем
-                    print("[Decorator] IP не найден, пропускаю.")
+                    _log_skip(route, "IP не найден")
                     return await func(*args, **kwargs)
             elif rule.rate_limit_type == RateLimitType.USER:
                 user_id = get_user_id_from_request(request)
@@ -67,7 +75,7 @@ def rate_limit(
                     # Если user_id не найден, используем IP
                     identifier = get_client_ip(request)
                     if identifier is None:
-                        print("[Decorator] User ID и IP не найдены, пропускаю.")
+                        _log_skip(route, "User ID и IP не найдены")
                         return await func(*args, **kwargs)
                 else:
                     identifier = f"user_{user_id}"
@@ -75,7 +83,7 @@ def rate_limit(
                 user_id = get_user_id_from_request(request)
                 ip = get_client_ip(request)
                 if ip is None:
-                    print("[Decorator] IP не найден для комбинированного лимита, пропускаю.")
+                    _log_skip(route, "IP не найден для комбинированного лимита")
                     return await func(*args, **kwargs)
                 if user_id:
                     identifier = f"combined_{user_id}_{ip}"
@@ -83,11 +91,9 @@ def rate_limit(
                     identifier = f"ip_{ip}"
             
             if not identifier:
-                print("[Decorator] Не удалось определить идентификатор, пропускаю.")
+                _log_skip(route, "не удалось определить идентификатор")
                 return await func(*args, **kwargs)
 
-            print(f"[Decorator] Идентификатор для лимита: {identifier}")
-            
             # Проверяем лимит
             rate_limiter = get_rate_limiter()
             result = await rate_limiter.check_rate_limit(
@@ -109,7 +115,6 @@ def rate_limit(
             if not result.allowed:
                 # Если лимит превышен, возвращаем 429
                 headers["Retry-After"] = str(result.retry_after)
-                print(f"[Decorator] ЛИМИТ ПРЕВЫШЕН для {identifier} на маршруте {route}. Осталось {result.retry_after} сек.")
                 raise HTTPException(
                     status_code=HTTP_429_TOO_MANY_REQUESTS,
                     detail={
@@ -119,7 +124,11 @@ def rate_limit(
                     headers=headers
                 )
             
-            print(f"[Decorator] Лимит в порядке для {identifier}. Текущие запросы: {result.current_requests}/{result.max_requests}")
+            logger.info(
+                section=LogSection.SECURITY,
+                subsection=LogSubsection.SECURITY.RATE_LIMIT,
+                message=f"Лимит в порядке для {identifier} на маршруте {route}: {result.current_requests}/{result.max_requests} ({rule.rate_limit_type.value})"
+            )
             # Выполняем функцию и добавляем заголовки к ответу
             response = await func(*args, **kwargs)
             
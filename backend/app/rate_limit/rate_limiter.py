@@ -10,6 +10,9 @@ from redis.asyncio import Redis
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
+from app.logging import get_logger, LogSection, LogSubsection
+
+logger = get_logger(__name__)
 
 
 @dataclass
@@ -158,9 +161,12 @@ class RateLimiter:
         redis_conn = await self._get_redis_connection()
         
         if redis_conn is None:
-            print(f"[RateLimiter] Redis недоступен. Маршрут: {route}, Идентификатор: {identifier}")
             if self.fail_open:
-                print("[RateLimiter] Redis недоступен, разрешаю запрос (fail-open).")
+                logger.warning(
+                    section=LogSection.SECURITY,
+                    subsection=LogSubsection.SECURITY.RATE_LIMIT_FAIL_OPEN,
+                    message=f"Redis недоступен, запрос разрешён без проверки лимита (fail-open). Маршрут: {route}"
+                )
                 return RateLimitResult(
                     allowed=True,
                     current_requests=0,
@@ -170,7 +176,11 @@ class RateLimiter:
                     window_seconds=window_seconds
                 )
             else:
-                print("[RateLimiter] Redis недоступен, блокирую запрос (fail-safe).")
+                logger.warning(
+                    section=LogSection.SECURITY,
+                    subsection=LogSubsection.SECURITY.RATE_LIMIT_BLOCKED,
+                    message=f"Redis недоступен, запрос заблокирован (fail-safe). Маршрут: {route}"
+                )
                 return RateLimitResult(
                     allowed=False,
                     current_requests=max_requests,
@@ -183,9 +193,7 @@ class RateLimiter:
         try:
             key = self._get_key(route, identifier)
             current_time = int(time.time())
-            
-            print(f"[RateLimiter] Проверка ключа: {key}")
-            print(f"[RateLimiter] Параметры: max_requests={max_requests}, window_seconds={window_seconds}")
+
 
             # Выполняем Lua скрипт
             result = await redis_conn.evalsha(
@@ -202,11 +210,20 @@ class RateLimiter:
             ttl = int(result[2])      # оставшееся время жизни ключа
             allowed = bool(result[3])  # разрешено ли
             
-            print(f"[RateLimiter] Результат Redis: current={current}, limit={limit}, ttl={ttl}, allowed={allowed}")
+            logger.debug(
+                section=LogSection.SECURITY,
+                subsection=LogSubsection.SECURITY.RATE_LIMIT,
+                message=f"Проверка ключа {key}: current={current}, limit={limit}, ttl={ttl}, allowed={allowed}"
+            )
 
-            # Если лимит превышен, логируем предупреждение
+            # Если лимит превышен, логируем предупреждение (повторы сворачиваются в сводку)
             if not allowed:
-                print(f"[RateLimiter] ПРЕДУПРЕЖДЕНИЕ: Превышен лимит для {identifier} на маршруте {route}. Запросов: {current}/{limit}")
+                logger.warning(
+                    section=LogSection.SECURITY,
+                    subsection=LogSubsection.SECURITY.RATE_LIMIT_EXCEEDED,
+                    message=f"Превышен лимит для {identifier} на маршруте {route}: {current}/{limit} запросов за {window_seconds} сек",
+                    user_id=user_id
+                )
             
             return RateLimitResult(
                 allowed=allowed,
@@ -218,7 +235,11 @@ class RateLimiter:
             )
             
         except Exception as e:
-            print(f"[RateLimiter] Ошибка при проверке рейт лимита: {e}")
+            logger.error(
+                section=LogSection.SECURITY,
+                subsection=LogSubsection.SECURITY.RATE_LIMIT,
+                message=f"Ошибка при проверке рейт лимита для маршрута {route}: {str(e)}"
+            )
             if self.fail_open:
                 return RateLimitResult(
                     allowed=True,
@@ -5,11 +5,14 @@ from app.admin.permissions import is_super_admin, get_current_admin_user
 from fastapi.security import HTTPBearer
 from bson import ObjectId
 from datetime import datetime, timedelta
+import os
 from app.schemas.user_schemas import UserBanCreate, UserBanOut
 from app.core.response import success
 from fastapi.encoders import jsonable_encoder
-from app.logging import get_logger, LogSection, LogSubsection
+from app.logging import get_logger, LogSection, LogSubsection, get_logging_queue_stats, get_log_sampling_stats
 from app.rate_limit import rate_limit_ip
+from app.core.auth_cache import auth_cache
+from app.core.security import get_password_hash_stats
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -105,6 +108,43 @@ async def list_admins(request: Request, db=Depends(get_database)):
     )
     return result
 
+@router.get("/runtime-stats", response_model=dict)
+@rate_limit_ip("admin_runtime_stats", max_requests=30, window_seconds=60)
+async def get_runtime_stats(
+    request: Request,
+    current_user=Depends(get_current_admin_user)
+):
+    """
+    Счётчики процесса, обработавшего запрос: у каждого воркера они свои,
+    поэтому в ответе есть pid.
+    """
+    if current_user["role"] not in ["admin", "moderator"]:
+        logger.warning(
+            section=LogSection.SECURITY,
+            subsection=LogSubsection.SECURITY.ACCESS_DENIED,
+            message=f"Пользователь {current_user.get('full_name', 'неизвестен')} ({current_user['_id']}) с ролью {current_user['role']} пытается получить статистику процесса без достаточных прав"
+        )
+        raise HTTPException(
+            status_code=403,
+            detail={"message": "Недостаточно прав"}
+        )
+
+    stats = {
+        "pid": os.getpid(),
+        "password_hashing": get_password_hash_stats(),
+        # Очереди хендлеров логов и семплирование: сколько записей отброшено и подавлено
+        "logging": {
+            "queues": get_logging_queue_stats(),
+            "sampling": get_log_sampling_stats()
+        }
+    }
+    logger.info(
+        section=LogSection.ADMIN,
+        subsection=LogSubsection.ADMIN.MONITORING,
+        message=f"Статистика процесса {stats['pid']} запрошена пользователем {current_user.get('full_name', 'неизвестен')}: очередь bcrypt {stats['password_hashing']['queue_depth']}"
+    )
+    return success(data=stats)
+
 # User ban system
 @router.post("/ban", response_model=dict)
 @rate_limit_ip("user_ban", max_requests=15, window_seconds=300)
@@ -186,6 +226,7 @@ async def ban_user(
             {"user_id": ObjectId(ban_data.user_id)},
             {"$set": {"revoked": True}}
         )
+        await auth_cache.invalidate_user(ban_data.user_id)
         
         ban["_id"] = str(result.inserted_id)
         ban["user_id"] = str(ban["user_id"])
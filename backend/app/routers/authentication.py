@@ -11,13 +11,16 @@ from fastapi.responses import JSONResponse
 from app.schemas.user_schemas import UserCreate
 from app.schemas.auth_schemas import AuthRequest, TokenResponse
 from app.db.database import db
+from app.multiplayer.lobby_utils import get_lobby_from_db
 from app.core.security import (
-    hash_password,
-    verify_password,
+    hash_password_async,
+    verify_password_async,
     create_access_token,
     store_token_in_db
 )
 from app.core.config import settings
+from app.core.auth_cache import auth_cache
+from app.core.user_search import name_search_fields
 from fastapi.security import HTTPBearer
 from app.schemas.admin_schemas import AdminToken
 from app.admin.utils import create_token, get_ip, get_user_agent
@@ -159,7 +162,7 @@ async def unified_login(data: AuthRequest, request: Request):
     # БЕЗОПАСНЫЙ поиск админа (используем точное соответствие поля)
     admin = await db.admins.find_one({search_field: ident})
     if admin:
-        if not verify_password(data.password, admin["hashed_password"]):
+        if not await verify_password_async(data.password, admin["hashed_password"]):
             logger.warning(
                 section=LogSection.AUTH,
                 subsection=LogSubsection.AUTH.LOGIN_FAILED,
@@ -227,6 +230,8 @@ async def unified_login(data: AuthRequest, request: Request):
             "last_login": {"timestamp": now, "ip": ip, "user_agent": ua},
             "is_verified": True
         }})
+        # Новая сессия вытесняет старую: её токен больше не должен браться из кэша
+        await auth_cache.invalidate_user(admin["_id"])
 
         await db.login_logs.insert_one({"ident": ident, "timestamp": now, "success": True})
 
@@ -337,7 +342,7 @@ async def unified_login(data: AuthRequest, request: Request):
                         message=f"Автоматическая разблокировка пользователя {user.get('full_name', 'неизвестен')} ({user.get('email') or user.get('iin')}) с IP {ip} - срок временной блокировки истек"
                     )
 
-    if not verify_password(data.password, user["hashed_password"]):
+    if not await verify_password_async(data.password, user["hashed_password"]):
         logger.warning(
             section=LogSection.AUTH,
             subsection=LogSubsection.AUTH.LOGIN_FAILED,
@@ -486,10 +491,11 @@ async def register_user(user_data: UserCreate, request: Request):
             message=f"Пользователь {user_data.full_name} ({user_data.email}) использовал реферальный код {referred_by} при регистрации с IP {ip}"
         )
 
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password_async(user_data.password)
 
     new_user = {
         "full_name": user_data.full_name,
+        **name_search_fields(user_data.full_name),
         "iin": user_data.iin,
         "phone": user_data.phone,
         "email": user_data.email,  # уже приведен к lower() в validate_email
@@ -591,7 +597,7 @@ async def guest_register(data: dict, request: Request):
         )
 
     # Check if lobby exists and allows guests (School subscription)
-    lobby = await db.lobbies.find_one({"_id": lobby_id})
+    lobby = await get_lobby_from_db(lobby_id)
     if not lobby:
         logger.warning(
             section=LogSection.AUTH,
@@ -749,6 +755,7 @@ async def logout_user(request: Request):
             {"_id": token_doc["_id"]},
             {"$set": {"revoked": True}}
         )
+        await auth_cache.invalidate_token(token)
 
         # Для гостей также удаляем запись из коллекции guests
         if role == "guest":
@@ -789,6 +796,7 @@ async def logout_user(request: Request):
         {"_id": ObjectId(user_id)},
         {"$set": {"active_session": None}}
     )
+    await auth_cache.invalidate_user(user_id)
 
     logger.info(
         section=LogSection.AUTH,
@@ -1,5 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends, Request, Query
 from app.db.database import db
+from app.multiplayer.lobby_utils import update_lobby
+from app.multiplayer.lobby_scheduler import schedule_lobby
+from app.core.question_cache import question_cache
+from app.core.question_pack import build_question_pack
 from app.utils.id_generator import generate_unique_lobby_id
 from datetime import datetime, timedelta
 from app.core.security import get_current_actor
@@ -97,8 +101,8 @@ async def create_lobby(
             if active_lobby.get("created_at"):
                 lobby_age = (datetime.utcnow() - active_lobby["created_at"]).total_seconds()
                 if lobby_age > MAX_LOBBY_LIFETIME:
-                    await db.lobbies.update_one(
-                        {"_id": active_lobby["_id"]},
+                    await update_lobby(
+                        active_lobby["_id"],
                         {"$set": {
                             "status": "finished",
                             "finished_at": datetime.utcnow(),
@@ -249,6 +253,9 @@ async def create_lobby(
         questions = await questions_cursor.to_list(length=questions_count)
         question_ids = [str(q["_id"]) for q in questions]
         
+        # Соло-лобби стартует сразу, поэтому выборка сразу попадает в кэш вопросов
+        question_cache.put_many(questions)
+        
         logger.info(
             section=LogSection.LOBBY,
             subsection=LogSubsection.LOBBY.QUESTIONS,
@@ -314,6 +321,7 @@ async def create_lobby(
             "question_ids": question_ids,
             "correct_answers": correct_answers_map,
             "questions_data": questions_data,
+            "question_pack": build_question_pack(questions),
             "participants": [user_id],
             "participants_answers": {user_id: {}},  # для хранения правильности ответов (true/false)
             "participants_raw_answers": {user_id: {}},  # для хранения индексов выбранных ответов
@@ -341,6 +349,8 @@ async def create_lobby(
         
         try:
             await db.lobbies.insert_one(lobby_doc)
+            # Лобби сразу в in_progress: ставим дедлайн (время жизни / таймер экзамена)
+            await schedule_lobby(lobby_doc)
             logger.info(
                 section=LogSection.LOBBY,
                 subsection=LogSubsection.LOBBY.DATABASE,
@@ -409,8 +419,8 @@ async def get_user_active_lobby(request: Request, current_user: dict = Depends(g
         if active_lobby.get("created_at"):
             lobby_age = (datetime.utcnow() - active_lobby["created_at"]).total_seconds()
             if lobby_age > MAX_LOBBY_LIFETIME:
-                await db.lobbies.update_one(
-                    {"_id": active_lobby["_id"]},
+                await update_lobby(
+                    active_lobby["_id"],
                     {"$set": {
                         "status": "finished",
                         "finished_at": datetime.utcnow(),
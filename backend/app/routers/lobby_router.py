@@ -20,7 +20,19 @@ import string
 from typing import Optional, List, Dict, Any, Union
 import time
 from app.rate_limit import rate_limit_ip
-from app.multiplayer.lobby_utils import get_user_id
+from app.core.question_cache import question_cache
+from app.core.question_pack import build_question_pack, get_packed_question, get_packed_questions
+from app.multiplayer.lobby_utils import (
+    get_user_id,
+    get_lobby_from_db,
+    get_user_subscription_from_db,
+    invalidate_lobby_cache,
+    update_lobby,
+    find_and_update_lobby,
+    get_results_snapshot
+)
+from app.core.lobby_results import participant_snapshot, format_duration
+from app.multiplayer.lobby_events import lobby_events, LobbyEventType
 
 # Настройка логгера
 logger = get_logger(__name__)
@@ -74,90 +86,6 @@ MAX_LOBBY_LIFETIME = 4 * 60 * 60
 # Exam mode timer (40 minutes in seconds)
 EXAM_TIMER_DURATION = 40 * 60
 
-# Cache для горячих лобби и пользователей
-class LobbyCache:
-    def __init__(self):
-        self.lobbies: Dict[str, dict] = {}  # Кэш лобби
-        self.user_subscriptions: Dict[str, dict] = {}  # Кэш подписок
-        self.lobby_access_cache: Dict[str, dict] = {}  # Кэш доступа к лобби
-        logger.info(
-            section=LogSection.SYSTEM,
-            subsection=LogSubsection.SYSTEM.INITIALIZATION,
-            message="Кэш лобби инициализирован: создан LobbyCache с пустыми хэш-таблицами для лобби, подписок и доступа"
-        )
-    
-    async def get_lobby(self, lobby_id: str, force_refresh: bool = False):
-        """Получить лобби с кэшированием"""
-        if not force_refresh and lobby_id in self.lobbies:
-            cached_lobby = self.lobbies[lobby_id]
-            # Проверяем свежесть кэша (30 секунд для активных лобби)
-            if (datetime.utcnow() - cached_lobby.get("cached_at", datetime.min)).total_seconds() < 30:
-                return cached_lobby["data"]
-        
-        # Загружаем из MongoDB
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
-        if lobby:
-            self.lobbies[lobby_id] = {
-                "data": lobby,
-                "cached_at": datetime.utcnow()
-            }
-        return lobby
-    
-    async def get_user_subscription(self, user_id: str):
-        """Получить подписку пользователя с кэшированием"""
-        if user_id in self.user_subscriptions:
-            cached_sub = self.user_subscriptions[user_id]
-            # Кэш подписки на 5 минут
-            if (datetime.utcnow() - cached_sub.get("cached_at", datetime.min)).total_seconds() < 300:
-                return cached_sub["data"]
-        
-        # Для гостей подписки нет
-        if isinstance(user_id, str) and user_id.startswith("guest_"):
-            self.user_subscriptions[user_id] = {
-                "data": None,
-                "cached_at": datetime.utcnow()
-            }
-            return None
-        
-        # Загружаем из MongoDB для обычных пользователей
-        subscription = await db.subscriptions.find_one({
-            "user_id": ObjectId(user_id),
-            "is_active": True,
-            "expires_at": {"$gt": datetime.utcnow()}
-        })
-        
-        self.user_subscriptions[user_id] = {
-            "data": subscription,
-            "cached_at": datetime.utcnow()
-        }
-        return subscription
-    
-    def invalidate_lobby(self, lobby_id: str):
-        """Очистить кэш лобби"""
-        if lobby_id in self.lobbies:
-            del self.lobbies[lobby_id]
-    
-    def cleanup_old_cache(self):
-        """Очистка старого кэша (вызывается периодически)"""
-        current_time = datetime.utcnow()
-        # Удаляем лобби старше 5 минут
-        old_lobbies = [
-            lobby_id for lobby_id, data in self.lobbies.items()
-            if (current_time - data.get("cached_at", datetime.min)).total_seconds() > 300
-        ]
-        for lobby_id in old_lobbies:
-            del self.lobbies[lobby_id]
-        
-        # Удаляем подписки старше 10 минут
-        old_subs = [
-            user_id for user_id, data in self.user_subscriptions.items()
-            if (current_time - data.get("cached_at", datetime.min)).total_seconds() > 600
-        ]
-        for user_id in old_subs:
-            del self.user_subscriptions[user_id]
-
-# Глобальный кэш
-lobby_cache = LobbyCache()
 
 async def validate_lobby_access(lobby_id: str, user_id: str, required_status: str = None, is_guest: bool = False):
     """
@@ -170,8 +98,8 @@ async def validate_lobby_access(lobby_id: str, user_id: str, required_status: st
         message=f"Проверка доступа к лобби: пользователь {user_id}, лобби {lobby_id}, требуемый статус {required_status or 'любой'}, гость {is_guest}"
     )
     
-    # Получаем лобби из БД, без кэша
-    lobby = await db.lobbies.find_one({"_id": lobby_id})
+    # Получаем лобби через общий кэш Redis
+    lobby = await get_lobby_from_db(lobby_id)
     if not lobby:
         logger.warning(
             section=LogSection.LOBBY,
@@ -182,7 +110,9 @@ async def validate_lobby_access(lobby_id: str, user_id: str, required_status: st
     
     # Проверяем статус лобби
     if required_status and lobby["status"] != required_status:
-        lobby = await db.lobbies.find_one({"_id": lobby_id}) # Повторная проверка
+        # Повторная проверка мимо кэша
+        await invalidate_lobby_cache(lobby_id)
+        lobby = await get_lobby_from_db(lobby_id)
         if lobby and lobby["status"] != required_status:
             logger.warning(
                 section=LogSection.LOBBY,
@@ -292,604 +222,89 @@ def convert_answer_to_index(correct_answer_raw):
                 section=LogSection.LOBBY,
                 subsection=LogSubsection.LOBBY.VALIDATION,
                 message="Получен None при конвертации ответа, использован индекс 0 по умолчанию"
-            )
-            return 0
-        return correct_answer_raw
-
-def validate_object_id(id_string: str) -> bool:
-    """Проверка валидности ObjectId"""
-    try:
-        ObjectId(id_string)
-        return True
-    except (InvalidId, TypeError):
-        logger.warning(
-            section=LogSection.SECURITY,
-            subsection=LogSubsection.SECURITY.VALIDATION,
-            message=f"Попытка использования невалидного ObjectId: {id_string[:50] if id_string else 'None'}"
-        )
-        return False
-
-async def validate_answer_integrity(lobby_id: str, question_id: str, answer_index: int) -> bool:
-    """Проверка целостности данных ответа"""
-    try:
-        # Получаем лобби
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
-        if not lobby or question_id not in lobby.get("question_ids", []):
-            logger.error(
-                section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.SECURITY,
-                message=f"Нарушение целостности: вопрос {question_id} не принадлежит лобби {lobby_id}"
-            )
-            return False
-        
-        # Получаем вопрос напрямую из базы данных
-        question = await db.questions.find_one({"_id": ObjectId(question_id)})
-        if not question:
-            logger.error(
-                section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.SECURITY,
-                message=f"Нарушение целостности: вопрос {question_id} не найден в базе данных"
-            )
-            return False
-        
-        # Проверяем, что индекс ответа валиден
-        options_count = 0
-        if "options" in question:
-            options_count = len(question["options"])
-        elif "answers" in question:
-            options_count = len(question["answers"])
-        else:
-            logger.error(
-                section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.SECURITY,
-                message=f"Нарушение целостности: вопрос {question_id} не содержит вариантов ответов"
-            )
-            return False
-            
-        if answer_index < 0 or answer_index >= options_count:
-            logger.error(
-                section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.SECURITY,
-                message=f"Нарушение целостности: недопустимый индекс ответа {answer_index} для вопроса {question_id}, доступно вариантов {options_count}"
-            )
-            return False
-            
-        logger.info(
-            section=LogSection.LOBBY,
-            subsection=LogSubsection.LOBBY.VALIDATION,
-            message=f"Проверка целостности пройдена: вопрос {question_id}, индекс ответа {answer_index}, доступно вариантов {options_count}"
-        )
-        return True
-    except Exception as e:
-        logger.error(
-            section=LogSection.LOBBY,
-            subsection=LogSubsection.LOBBY.ERROR,
-            message=f"Ошибка проверки целостности ответа: лобби {lobby_id}, вопрос {question_id}, ошибка {str(e)}"
-        )
-        return False
-
-def get_user_id(current_user):
-    """
-    Извлекает ID пользователя из объекта, возвращаемого get_current_actor
-    Поддерживает как обычных пользователей, так и гостей
-    """
-    user_id = current_user["id"]
-    # Для гостей ID уже строка, для обычных пользователей - ObjectId
-    if isinstance(user_id, str):
-        return user_id
-    return str(user_id)
-
-async def auto_finish_expired_lobbies():
-    """
-    Background task to check and finish lobbies that have been active for more than 4 hours
-    Also checks exam mode timers and finishes tests when time runs out
-    Also performs cache cleanup every 5 minutes
-    """
-    cleanup_counter = 0
-    while True:
-        try:
-            current_time = datetime.utcnow()
-            
-            # Find lobbies that are older than 4 hours and still active
-            expiration_time = current_time - timedelta(seconds=MAX_LOBBY_LIFETIME)
-            expired_lobbies = await db.lobbies.find({
-                "status": "in_progress",
-                "created_at": {"$lt": expiration_time}
-            }).to_list(None)
-            
-            for lobby in expired_lobbies:
-                logger.info(
-                    section=LogSection.LOBBY,
-                    subsection=LogSubsection.LOBBY.LIFECYCLE,
-                    message=f"Автозакрытие просроченного лобби: лобби {lobby['_id']} создано {lobby['created_at']}, превышен лимит {MAX_LOBBY_LIFETIME} секунд"
-                )
-                
-                # Set the lobby as finished
-                await db.lobbies.update_one(
-                    {"_id": lobby["_id"]},
-                    {"$set": {
-                        "status": "finished",
-                        "finished_at": current_time,
-                        "auto_finished": True,
-                        "finish_reason": "time_limit_exceeded"
-                    }}
-                )
-                
-                # Инвалидируем кэш для истекшего лобби
-                lobby_cache.invalidate_lobby(lobby["_id"])
-                
-                # Notify all participants via WebSocket
-                try:
-                    await ws_manager.send_json_parallel(lobby["_id"], {
-                        "type": "test_finished",
-                        "data": {"auto_finished": True, "reason": "Time limit exceeded (4 hours)"}
-                    })
-                except Exception as e:
-                    logger.error(
-                        section=LogSection.WEBSOCKET,
-                        subsection=LogSubsection.WEBSOCKET.ERROR,
-                        message=f"Ошибка отправки WS уведомления об автозакрытии: лобби {lobby['_id']}, ошибка {str(e)}"
-                    )
-            
-            # Check exam mode timers
-            exam_lobbies = await db.lobbies.find({
-                "status": "in_progress",
-                "exam_mode": True,
-                "exam_timer_expires_at": {"$lt": current_time}
-            }).to_list(None)
-            
-            for lobby in exam_lobbies:
-                logger.info(
-                    section=LogSection.LOBBY,
-                    subsection=LogSubsection.LOBBY.EXAM,
-                    message=f"Автозакрытие экзаменационного лобби: лобби {lobby['_id']} завершён по истечении таймера экзамена"
-                )
-                
-                # Calculate duration
-                duration = (current_time - lobby.get("created_at", current_time)).total_seconds()
-                
-                # Set the lobby as finished
-                await db.lobbies.update_one(
-                    {"_id": lobby["_id"]},
-                    {"$set": {
-                        "status": "finished",
-                        "finished_at": current_time,
-                        "auto_finished": True,
-                        "finish_reason": "exam_timer_expired",
-                        "duration_seconds": duration
-                    }}
-                )
-                
-                # Инвалидируем кэш для истекшего лобби
-                lobby_cache.invalidate_lobby(lobby["_id"])
-                
-                # Save history for all participants
-                for participant_id, answers in lobby.get("participants_answers", {}).items():
-                    correct_count = sum(1 for is_corr in answers.values() if is_corr)
-                    total_questions = len(lobby.get("question_ids", []))
-                    
-                    history_record = {
-                        "user_id": participant_id,
-                        "lobby_id": lobby["_id"],
-                        "date": current_time,
-                        "score": correct_count,
-                        "total": total_questions,
-                        "categories": lobby.get("categories", []),
-                        "sections": lobby.get("sections", []),
-                        "mode": lobby.get("mode", "solo"),
-                        "pass_percentage": (correct_count / total_questions * 100) if total_questions > 0 else 0,
-                        "duration_seconds": duration,
-                        "is_passed": correct_count >= int(total_questions * 0.8),
-                        "auto_finished": True,
-                        "finish_reason": "exam_timer_expired"
-                    }
-                    await db.history.insert_one(history_record)
-                
-                # Notify all participants via WebSocket
-                try:
-                    await ws_manager.send_json_parallel(lobby["_id"], {
-                        "type": "test_finished",
-                        "data": {
-                            "auto_finished": True, 
-                            "reason": "Exam timer expired",
-                            "duration_seconds": duration
-                        }
-                    })
-                except Exception as e:
-                    logger.error(
-                        section=LogSection.WEBSOCKET,
-                        subsection=LogSubsection.WEBSOCKET.ERROR,
-                        message=f"Ошибка отправки WS уведомления об истечении таймера экзамена: лобби {lobby['_id']}, ошибка {str(e)}"
-                    )
-            
-            # Очистка кэша каждые 5 минут (300 секунд / 60 = 5 итераций)
-            cleanup_counter += 1
-            if cleanup_counter >= 5:
-                lobby_cache.cleanup_old_cache()
-                cleanup_counter = 0
-                logger.info(
-                    section=LogSection.SYSTEM,
-                    subsection=LogSubsection.SYSTEM.MAINTENANCE,
-                    message="Очистка кэша выполнена: удалены устаревшие записи лобби и подписок"
-                )
-            
-            # Check every minute
-            await asyncio.sleep(60)
-        except Exception as e:
-            logger.error(
-                section=LogSection.SYSTEM,
-                subsection=LogSubsection.SYSTEM.ERROR,
-                message=f"Ошибка в фоновой задаче автозакрытия лобби: {str(e)}"
-            )
-            await asyncio.sleep(60)  # Still wait before retrying
-
-# Create a function to start background tasks that will be registered in main.py
-async def start_background_tasks():
-    logger.info(
-        section=LogSection.SYSTEM,
-        subsection=LogSubsection.SYSTEM.INITIALIZATION,
-        message="Запуск фоновых задач: инициализация задачи автозавершения просроченных лобби"
-    )
-    asyncio.create_task(auto_finish_expired_lobbies())
-
-
-    """
-    Создает новое лобби для прохождения теста с учетом подписки пользователя.
-    
-    - Всегда используется 40 вопросов
-    - School подписка может выбирать разделы ПДД через pdd_section_uids
-    - Проверяется наличие активных тестов пользователя
-    - В solo режиме тест запускается автоматически
-    """
-    user_id = get_user_id(current_user)
-    logger.info(
-        section=LogSection.LOBBY,
-        subsection=LogSubsection.LOBBY.CREATION,
-        message=f"Запрос создания лобби: пользователь {user_id} создаёт {lobby_data.mode}-лобби на {lobby_data.questions_count} вопросов"
-    )
-    
-    try:
-        # Используем количество вопросов из запроса
-        questions_count = lobby_data.questions_count
-        
-        # Проверка активных тестов пользователя и получение подписки параллельно
-        active_lobby_task = db.lobbies.find_one({
-            "participants": user_id,
-            "status": {"$ne": "finished"}
-        })
-        subscription_task = lobby_cache.get_user_subscription(user_id)
-        
-        # Выполняем оба запроса параллельно
-        active_lobby, subscription = await asyncio.gather(active_lobby_task, subscription_task)
-        
-        if active_lobby:
-            # Check if the lobby is more than 6 hours old - if so, automatically finish it
-            if active_lobby.get("created_at"):
-                lobby_age = (datetime.utcnow() - active_lobby["created_at"]).total_seconds()
-                if lobby_age > MAX_LOBBY_LIFETIME:
-                    # Auto-finish the expired lobby
-                    await db.lobbies.update_one(
-                        {"_id": active_lobby["_id"]},
-                        {"$set": {
-                            "status": "finished",
-                            "finished_at": datetime.utcnow(),
-                            "auto_finished": True
-                        }}
-                    )
-                    logger.info(
-                        section=LogSection.LOBBY,
-                        subsection=LogSubsection.LOBBY.LIFECYCLE,
-                        message=f"Автозавершение просроченного лобби: лобби {active_lobby['_id']} пользователя {user_id} закрыто по таймауту {MAX_LOBBY_LIFETIME} секунд"
-                    )
-                else:
-                    # Lobby is still active and not expired
-                    logger.warning(
-                        section=LogSection.LOBBY,
-                        subsection=LogSubsection.LOBBY.SECURITY,
-                        message=f"Блокировка создания лобби: пользователь {user_id} имеет активное лобби {active_lobby['_id']}, осталось {MAX_LOBBY_LIFETIME - lobby_age:.0f} секунд"
-                    )
-                    remaining_seconds = MAX_LOBBY_LIFETIME - lobby_age
-                    raise HTTPException(
-                        status_code=400, 
-                        detail={
-                            "message": "У вас уже есть активный тест. Завершите его перед началом нового.",
-                            "active_lobby_id": active_lobby["_id"],
-                            "remaining_seconds": int(remaining_seconds)
-                        }
-                    )
-            else:
-                # If created_at is missing for some reason, just report the lobby as active
-                logger.warning(
-                    section=LogSection.LOBBY,
-                    subsection=LogSubsection.LOBBY.SECURITY,
-                    message=f"Блокировка создания лобби: пользователь {user_id} имеет активное лобби {active_lobby['_id']} без времени создания"
-                )
-                raise HTTPException(
-                    status_code=400, 
-                    detail={
-                        "message": "У вас уже есть активный тест. Завершите его перед началом нового.",
-                        "active_lobby_id": active_lobby["_id"]
-                    }
-                )
-        
-        if not subscription:
-            # Демо-режим или бесплатный доступ
-            subscription_type = "Demo"
-            logger.info(
-                section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.SUBSCRIPTION,
-                message=f"Подписка не найдена: пользователь {user_id} работает в Demo-режиме"
-            )
-        else:
-            subscription_type = subscription["subscription_type"]
-            logger.info(
-                section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.SUBSCRIPTION,
-                message=f"Подписка найдена: пользователь {user_id} имеет подписку {subscription_type}"
-            )
-        
-        # Проверка прав на создание лобби
-        if lobby_data.mode == "multi" and subscription_type not in ["Royal", "School"]:
-            logger.warning(
-                section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.SECURITY,
-                message=f"Отказ в мультиплеере: пользователь {user_id} с подпиской {subscription_type} не может создать multi-лобби, требуется Royal или School"
-            )
-            raise HTTPException(
-                status_code=403, 
-                detail="Для создания многопользовательского лобби требуется подписка Royal или School"
-            )
-        
-        # Обрабатываем разделы ПДД (доступно для VIP, Royal и School)
-        if lobby_data.pdd_section_uids is not None and subscription_type.lower() not in ["vip", "royal", "school"]:
-            logger.warning(
-                section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.SECURITY,
-                message=f"Отказ в выборе разделов ПДД: пользователь {user_id} с подпиской {subscription_type} не может выбирать разделы, требуется VIP/Royal/School"
-            )
-            raise HTTPException(
-                status_code=403,
-                detail="Выбор разделов ПДД доступен только для подписок VIP, Royal и School"
-            )
-        
-        # Ограничения по категориям в зависимости от подписки
-        if subscription_type == "Economy":
-            allowed_categories = ["A1", "A", "B1", "B", "BE"]
-            if lobby_data.categories and not all(cat in allowed_categories for cat in lobby_data.categories):
-                logger.warning(
-                    section=LogSection.LOBBY,
-                    subsection=LogSubsection.LOBBY.SECURITY,
-                    message=f"Отказ в выборе категорий: пользователь {user_id} с подпиской {subscription_type} пытался выбрать {lobby_data.categories}, разрешены {allowed_categories}"
-                )
-                raise HTTPException(status_code=403, detail="Ваша подписка не даёт доступа к выбранным категориям")
-            
-            # Для Economy нельзя выбирать разделы
-            lobby_data.pdd_section_uids = None
-            
-            # Определяем группу (мото или авто)
-            if lobby_data.categories and any(cat in ["A1", "A", "B1"] for cat in lobby_data.categories):
-                category_group = ["A1", "A", "B1"]
-            else:
-                category_group = ["B", "BE"]
-            
-            lobby_data.categories = category_group
-            logger.info(
-                section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.VALIDATION,
-                message=f"Автоматический выбор категорий: для подписки {subscription_type} установлены категории {lobby_data.categories}"
-            )
-            
-        elif subscription_type == "Vip":
-            # Vip может выбирать любые категории и разделы ПДД
-            logger.info(
-                section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.VALIDATION,
-                message=f"VIP подписка: пользователь {user_id} получил доступ ко всем категориям и разделам ПДД"
-            )
-            
-        # Построение фильтра для запроса вопросов
-        query = {"deleted": False}
-        
-        if lobby_data.categories:
-            query["categories"] = {"$in": lobby_data.categories}
-            
-        if lobby_data.pdd_section_uids and subscription_type.lower() in ["vip", "royal", "school"]:
-            query["pdd_section_uids"] = {"$in": lobby_data.pdd_section_uids}
-        
-        logger.info(
-            section=LogSection.LOBBY,
-            subsection=LogSubsection.LOBBY.QUESTIONS,
-            message=f"Фильтр для поиска вопросов: {query}"
-        )
-        
-        # Выбор случайных вопросов из коллекции вопросов
-        total_questions = await db.questions.count_documents(query)
-        if total_questions == 0:
-            logger.error(
-                section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.QUESTIONS,
-                message=f"Вопросы не найдены: для фильтра {query} не найдено ни одного вопроса"
-            )
-            raise HTTPException(
-                status_code=404, 
-                detail="Не найдено вопросов для выбранных категорий и разделов"
-            )
-        
-        # Ограничим количество запрашиваемых вопросов количеством доступных
-        questions_count = min(questions_count, total_questions)
-        
-        # Убедимся, что не больше 40 вопросов
-        questions_count = min(questions_count, 40)
-        
-        logger.info(
-            section=LogSection.LOBBY,
-            subsection=LogSubsection.LOBBY.QUESTIONS,
-            message=f"Выборка вопросов: будет выбрано {questions_count} вопросов из {total_questions} доступных"
-        )
-        
-        # Получаем случайную выборку вопросов из БД
-        questions_cursor = db.questions.aggregate([
-            {"$match": query}, 
-            {"$sample": {"size": questions_count}}
-        ])
-        questions = await questions_cursor.to_list(length=questions_count)
-        question_ids = [str(q["_id"]) for q in questions]
-        
-        logger.info(
-            section=LogSection.LOBBY,
-            subsection=LogSubsection.LOBBY.QUESTIONS,
-            message=f"Вопросы успешно выбраны: получено {len(question_ids)} вопросов для лобби"
-        )
-        
-        # Составляем словарь правильных ответов для выбранных вопросов
-        correct_answers_map = {}
-        questions_data = {}
-        
-        for q in questions:
-            correct_label = q["correct_label"]
-            correct_index = ord(correct_label) - ord('A')
-            correct_answers_map[str(q["_id"])] = correct_index
-            
-            # Determine media type safely with proper null checks
-            media_filename = q.get("media_filename")
-            after_answer_media_filename = q.get("after_answer_media_filename")
-            
-            # Check if filename exists and then check extension
-            is_video = False
-            if media_filename and isinstance(media_filename, str):
-                is_video = media_filename.lower().endswith((".mp4", ".webm", ".mov"))
-            
-            is_after_answer_video = False
-            if after_answer_media_filename and isinstance(after_answer_media_filename, str):
-                is_after_answer_video = after_answer_media_filename.lower().endswith((".mp4", ".webm", ".mov"))
-            
-            # Сохраняем информацию о типе медиа для каждого вопроса
-            questions_data[str(q["_id"])] = {
-                "has_media": q.get("has_media", False),
-                "media_type": "video" if is_video else "image",
-                "media_file_id": str(q.get("media_file_id", "")),
-                "has_after_answer_media": q.get("has_after_answer_media", False),
-                "after_answer_media_type": "video" if is_after_answer_video else "image",
-                "after_answer_media_id": str(q.get("after_answer_media_file_id", "")),
-                "categories": q.get("categories", []),
-                "pdd_section_uids": q.get("pdd_section_uids", [])
-            }
-
-        # Генерируем уникальный ID лобби
-        lobby_id = await generate_unique_lobby_id()
-        logger.info(
-            section=LogSection.LOBBY,
-            subsection=LogSubsection.LOBBY.CREATION,
-            message=f"ID лобби сгенерирован: создано уникальное лобби {lobby_id}"
-        )
-        
-        # Определяем начальный статус - для solo сразу in_progress, для multi/multiplayer - waiting
-        initial_status = "waiting" if lobby_data.mode in ["multi", "multiplayer"] else "in_progress"
-        logger.info(
-            section=LogSection.LOBBY,
-            subsection=LogSubsection.LOBBY.LIFECYCLE,
-            message=f"Статус лобби установлен: лобби {lobby_id} получило статус {initial_status} для режима {lobby_data.mode}"
-        )
-        
-        # Подготавливаем данные лобби
-        current_time = datetime.utcnow()
-        lobby_doc = {
-            "_id": lobby_id,
-            "host_id": user_id,
-            "status": initial_status,
-            "question_ids": question_ids,
-            "correct_answers": correct_answers_map,
-            "questions_data": questions_data,  # Сохраняем дополнительную информацию о вопросах
-            "participants": [user_id],
-            "participants_answers": {user_id: {}},
-            "current_index": 0,
-            "created_at": current_time,
-            "sections": lobby_data.pdd_section_uids or [],
-            "categories": lobby_data.categories or [],
-            "mode": lobby_data.mode,
-            "subscription_type": subscription_type,
-            "exam_mode": lobby_data.exam_mode,
-            "max_participants": lobby_data.max_participants,  # Максимальное количество участников
-            "questions_count": questions_count  # Сохраняем количество вопросов
-        }
+            )
+            return 0
+        return correct_answer_raw
+
+def validate_object_id(id_string: str) -> bool:
+    """Проверка валидности ObjectId"""
+    try:
+        ObjectId(id_string)
+        return True
+    except (InvalidId, TypeError):
+        logger.warning(
+            section=LogSection.SECURITY,
+            subsection=LogSubsection.SECURITY.VALIDATION,
+            message=f"Попытка использования невалидного ObjectId: {id_string[:50] if id_string else 'None'}"
+        )
+        return False
+
+async def validate_answer_integrity(lobby_id: str, question_id: str, answer_index: int) -> bool:
+    """Проверка целостности данных ответа"""
+    try:
+        # Получаем лобби
+        lobby = await get_lobby_from_db(lobby_id)
+        if not lobby or question_id not in lobby.get("question_ids", []):
+            logger.error(
+                section=LogSection.LOBBY,
+                subsection=LogSubsection.LOBBY.SECURITY,
+                message=f"Нарушение целостности: вопрос {question_id} не принадлежит лобби {lobby_id}"
+            )
+            return False
         
-        # Добавляем таймер экзамена, если включен режим экзамена
-        if lobby_data.exam_mode:
-            lobby_doc["exam_timer_duration"] = EXAM_TIMER_DURATION
-            lobby_doc["exam_timer_expires_at"] = current_time + timedelta(seconds=EXAM_TIMER_DURATION)
-            lobby_doc["exam_timer_started_at"] = current_time
-            logger.info(
+        # Получаем вопрос из пакета лобби
+        question = await get_packed_question(lobby, question_id)
+        if not question:
+            logger.error(
                 section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.EXAM,
-                message=f"Таймер экзамена установлен: лобби {lobby_id} получило таймер на {EXAM_TIMER_DURATION} секунд до {lobby_doc['exam_timer_expires_at']}"
+                subsection=LogSubsection.LOBBY.SECURITY,
+                message=f"Нарушение целостности: вопрос {question_id} не найден в базе данных"
             )
+            return False
         
-        try:
-            await db.lobbies.insert_one(lobby_doc)
-            logger.info(
+        # Проверяем, что индекс ответа валиден
+        options_count = len(question["answers"])
+        if not options_count:
+            logger.error(
                 section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.DATABASE,
-                message=f"Лобби сохранено в БД: лобби {lobby_id} успешно создано с {questions_count} вопросами в режиме {lobby_data.mode}"
+                subsection=LogSubsection.LOBBY.SECURITY,
+                message=f"Нарушение целостности: вопрос {question_id} не содержит вариантов ответов"
             )
+            return False
             
-            # Если solo режим, отправляем WebSocket сообщение о начале теста
-            if lobby_data.mode not in ["multi", "multiplayer"]:
-                first_question_id = question_ids[0] if question_ids else None
-                if first_question_id:
-                    try:
-                        # Отправляем событие START и ID первого вопроса
-                        logger.info(
-                            section=LogSection.WEBSOCKET,
-                            subsection=LogSubsection.WEBSOCKET.MESSAGE_SEND,
-                            message=f"Отправка WS старта: лобби {lobby_id} solo-режим, отправляется start с вопросом {first_question_id}"
-                        )
-                        await ws_manager.send_json(lobby_id, {
-                            "type": "start",
-                            "data": {"question_id": first_question_id}
-                        })
-
-                    except Exception as e:
-                        logger.error(
-                            section=LogSection.WEBSOCKET,
-                            subsection=LogSubsection.WEBSOCKET.ERROR,
-                            message=f"Ошибка отправки WS сообщения: лобби {lobby_id}, ошибка {str(e)}"
-                        )
-            
-            response_data = {
-                "lobby_id": lobby_id, 
-                "status": initial_status, 
-                "questions_count": questions_count,
-                "categories": lobby_data.categories,
-                "sections": lobby_data.pdd_section_uids,
-                "auto_started": lobby_data.mode not in ["multi", "multiplayer"],
-                "exam_mode": lobby_data.exam_mode
-            }
-            
-            # Добавляем информацию о таймере экзамена
-            if lobby_data.exam_mode:
-                response_data["exam_timer_duration"] = EXAM_TIMER_DURATION
-                response_data["exam_timer_expires_at"] = lobby_doc["exam_timer_expires_at"].isoformat()
-            
-            return success(data=response_data)
-        except Exception as e:
-            # Логируем ошибку
+        if answer_index < 0 or answer_index >= options_count:
             logger.error(
                 section=LogSection.LOBBY,
-                subsection=LogSubsection.LOBBY.DATABASE,
-                message=f"Ошибка сохранения лобби: лобби {lobby_id}, ошибка {str(e)}"
+                subsection=LogSubsection.LOBBY.SECURITY,
+                message=f"Нарушение целостности: недопустимый индекс ответа {answer_index} для вопроса {question_id}, доступно вариантов {options_count}"
             )
-            raise HTTPException(status_code=500, detail=f"Ошибка при создании лобби: {str(e)}")
-    except HTTPException:
-        # Пропускаем HTTP исключения дальше
-        raise
+            return False
+            
+        logger.info(
+            section=LogSection.LOBBY,
+            subsection=LogSubsection.LOBBY.VALIDATION,
+            message=f"Проверка целостности пройдена: вопрос {question_id}, индекс ответа {answer_index}, доступно вариантов {options_count}"
+        )
+        return True
     except Exception as e:
-        # Логируем и обрабатываем неожиданные ошибки
         logger.error(
             section=LogSection.LOBBY,
             subsection=LogSubsection.LOBBY.ERROR,
-            message=f"Критическая ошибка создания лобби: пользователь {user_id}, ошибка {str(e)}"
+            message=f"Ошибка проверки целостности ответа: лобби {lobby_id}, вопрос {question_id}, ошибка {str(e)}"
         )
-        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера: {str(e)}")
+        return False
+
+def get_user_id(current_user):
+    """
+    Извлекает ID пользователя из объекта, возвращаемого get_current_actor
+    Поддерживает как обычных пользователей, так и гостей
+    """
+    user_id = current_user["id"]
+    # Для гостей ID уже строка, для обычных пользователей - ObjectId
+    if isinstance(user_id, str):
+        return user_id
+    return str(user_id)
+
 
 @router.post("/lobbies/{lobby_id}/join", summary="Присоединиться к лобби")
 @rate_limit_ip("lobby_join", max_requests=20, window_seconds=300)
@@ -907,7 +322,7 @@ async def join_lobby(lobby_id: str, request: Request = None, current_user: dict
     
     try:
         # Получаем информацию о лобби
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             logger.warning(
                 section=LogSection.LOBBY,
@@ -996,14 +411,11 @@ async def join_lobby(lobby_id: str, request: Request = None, current_user: dict
                 )
         
         # Добавляем пользователя к участникам лобби
-        await db.lobbies.update_one(
-            {"_id": lobby_id},
+        await update_lobby(
+            lobby_id,
             {"$addToSet": {"participants": user_id}}
         )
         
-        # Инвалидируем кэш лобби
-        lobby_cache.invalidate_lobby(lobby_id)
-        
         logger.info(
             section=LogSection.LOBBY,
             subsection=LogSubsection.LOBBY.ACCESS,
@@ -1012,14 +424,11 @@ async def join_lobby(lobby_id: str, request: Request = None, current_user: dict
         
         # Отправляем WebSocket уведомление о присоединении пользователя
         try:
-            await ws_manager.send_json_parallel(lobby_id, {
-                "type": "user_joined",
-                "data": {
-                    "user_id": user_id,
-                    "user_name": user_name,
-                    "is_host": False,
-                    "is_guest": is_guest
-                }
+            await lobby_events.publish(lobby_id, "user_joined", {
+                "user_id": user_id,
+                "user_name": user_name,
+                "is_host": False,
+                "is_guest": is_guest
             })
         except Exception as e:
             logger.error(
@@ -1060,7 +469,7 @@ async def start_test(lobby_id: str, request: Request = None, current_user: dict
     )
     
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             logger.error(
                 section=LogSection.LOBBY,
@@ -1094,13 +503,13 @@ async def start_test(lobby_id: str, request: Request = None, current_user: dict
             raise HTTPException(status_code=400, detail="Необходимо минимум 2 участника для начала теста")
         
         # Обновляем статус лобби
-        await db.lobbies.update_one(
-            {"_id": lobby_id},
+        await update_lobby(
+            lobby_id,
             {"$set": {"status": "in_progress"}}
         )
         
-        # Инвалидируем кэш лобби после изменения статуса
-        lobby_cache.invalidate_lobby(lobby_id)
+        # Прогреваем кэш вопросов лобби одним запросом $in
+        await question_cache.preload(lobby.get("question_ids", []))
         
         logger.info(
             section=LogSection.LOBBY,
@@ -1110,12 +519,9 @@ async def start_test(lobby_id: str, request: Request = None, current_user: dict
         
         # Отправляем WebSocket сообщение о начале теста
         try:
-            await ws_manager.send_json(lobby_id, {
-                "type": "test_started",
-                "data": {
-                    "message": "Тест начат",
-                    "first_question": lobby["question_ids"][0] if lobby["question_ids"] else None
-                }
+            await lobby_events.publish(lobby_id, "test_started", {
+                "message": "Тест начат",
+                "first_question": lobby["question_ids"][0] if lobby["question_ids"] else None
             })
         except Exception as e:
             logger.error(
@@ -1195,8 +601,8 @@ async def get_question(lobby_id: str, question_id: str, request: Request = None,
                 )
                 raise HTTPException(status_code=403, detail="Доступ к этому вопросу пока не разрешен")
 
-        # Запрашиваем вопрос из коллекции вопросов
-        question = await db.questions.find_one({"_id": ObjectId(question_id)})
+        # Берём вопрос из пакета лобби
+        question = await get_packed_question(lobby, question_id)
         if not question:
             logger.error(
                 section=LogSection.LOBBY,
@@ -1215,9 +621,9 @@ async def get_question(lobby_id: str, question_id: str, request: Request = None,
         
         # Очищаем данные, не нужные клиенту
         question_out = {
-            "id": str(question["_id"]),
-            "question_text": question.get("question_text", {}),
-            "answers": [option["text"] for option in question.get("options", [])],
+            "id": question["_id"],
+            "question_text": question["question_text"],
+            "answers": question["answers"],
             "has_media": has_media,
             "media_type": media_type,
             "media_file_id": str(question.get("media_file_id")) if question.get("media_file_id") else None,
@@ -1276,7 +682,7 @@ async def get_correct_answer(
         await validate_lobby_access(lobby_id, user_id)
         
         # Получаем информацию о лобби
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -1318,7 +724,7 @@ async def get_correct_answer(
         # Если объяснения нет в лобби, получаем его из базы данных  
         question = None
         if not explanation:
-            question = await db.questions.find_one({"_id": ObjectId(question_id)})
+            question = await get_packed_question(lobby, question_id)
             if question:
                 explanation = question.get("explanation", {})
                 logger.info(
@@ -1335,7 +741,7 @@ async def get_correct_answer(
         
         # Если не нашли в данных лобби, проверяем в базе данных
         if not has_after_media and not question:
-            question = await db.questions.find_one({"_id": ObjectId(question_id)})
+            question = await get_packed_question(lobby, question_id)
         
         if question and not has_after_media:
             has_after_media = bool(
@@ -1428,7 +834,7 @@ async def submit_answer(
     
     try:
         # Получаем информацию о лобби
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             logger.warning(
                 section=LogSection.LOBBY,
@@ -1518,9 +924,9 @@ async def submit_answer(
             raise HTTPException(status_code=500, detail="Правильный ответ для данного вопроса не найден")
         
         # Проверяем валидность индекса ответа
-        question = await db.questions.find_one({"_id": ObjectId(question_id)})
-        if question and "options" in question:
-            options_count = len(question["options"])
+        question = await get_packed_question(lobby, question_id)
+        if question and question["answers"]:
+            options_count = len(question["answers"])
             if answer_index < 0 or answer_index >= options_count:
                 logger.warning(
                     section=LogSection.LOBBY,
@@ -1536,10 +942,44 @@ async def submit_answer(
             message=f"Ответ обработан: пользователь {user_id} ответил на вопрос {question_id} - {'правильно' if is_correct else 'неправильно'} (ответ {answer_index}, правильный {correct_answer})"
         )
         
-        # Получаем информацию о вопросе для ответа (нужно получить до формирования response_data)
-        question = await db.questions.find_one({"_id": ObjectId(question_id)})
+        # Объяснение берём из уже полученной записи пакета
         explanation = question.get("explanation", {}) if question else {}
         
+        # Атомарно сохраняем ответ: участие, статус, допустимость вопроса и
+        # отсутствие предыдущего ответа проверяются в фильтре самой записи
+        answer_filter = {
+            "status": "in_progress",
+            "participants": user_id,
+            f"participants_answers.{user_id}.{question_id}": {"$exists": False}
+        }
+        if not is_host:
+            answer_filter["current_index"] = {"$gte": question_index}
+        
+        try:
+            updated_lobby = await find_and_update_lobby(
+                lobby_id,
+                {"$set": {
+                    f"participants_answers.{user_id}.{question_id}": is_correct,  # true/false для правильности
+                    f"participants_raw_answers.{user_id}.{question_id}": answer_index  # индекс выбранного ответа
+                }},
+                extra_filter=answer_filter
+            )
+        except Exception as e:
+            logger.error(
+                section=LogSection.LOBBY,
+                subsection=LogSubsection.LOBBY.DATABASE,
+                message=f"Ошибка сохранения ответа в БД: лобби {lobby_id}, пользователь {user_id}, вопрос {question_id}, ошибка {str(e)}"
+            )
+            raise HTTPException(status_code=500, detail="Ошибка при сохранении ответа")
+        
+        if updated_lobby is None:
+            logger.warning(
+                section=LogSection.LOBBY,
+                subsection=LogSubsection.LOBBY.SECURITY,
+                message=f"Ответ отклонён условием записи: пользователь {user_id}, вопрос {question_id}, лобби {lobby_id} (повторный ответ или лобби изменилось)"
+            )
+            raise HTTPException(status_code=409, detail="Ответ не принят: вы уже ответили или лобби изменилось")
+        
         # Сохраняем ответ пользователя в коллекцию user_answers
         answer_doc = {
             "user_id": user_id,
@@ -1549,33 +989,14 @@ async def submit_answer(
             "is_correct": is_correct,
             "timestamp": datetime.utcnow()
         }
-        
-        # Batch операции для оптимизации производительности
         try:
-            # Выполняем обе операции записи параллельно
-            insert_task = db.user_answers.insert_one(answer_doc)
-            # Сохраняем оба типа ответов: правильность и выбранный вариант
-            update_task = db.lobbies.update_one(
-                {"_id": lobby_id},
-                {"$set": {
-                    f"participants_answers.{user_id}.{question_id}": is_correct,  # true/false для правильности
-                    f"participants_raw_answers.{user_id}.{question_id}": answer_index  # индекс выбранного ответа
-                }}
-            )
-            
-            # Ждем завершения обеих операций
-            await asyncio.gather(insert_task, update_task)
-            
-            # Инвалидируем кэш лобби после изменения
-            lobby_cache.invalidate_lobby(lobby_id)
-            
+            await db.user_answers.insert_one(answer_doc)
         except Exception as e:
             logger.error(
                 section=LogSection.LOBBY,
                 subsection=LogSubsection.LOBBY.DATABASE,
-                message=f"Ошибка сохранения ответа в БД: лобби {lobby_id}, пользователь {user_id}, вопрос {question_id}, ошибка {str(e)}"
+                message=f"Ошибка записи ответа в user_answers: лобби {lobby_id}, пользователь {user_id}, вопрос {question_id}, ошибка {str(e)}"
             )
-            raise HTTPException(status_code=500, detail="Ошибка при сохранении ответа")
 
         # Формируем ответ для пользователя
         response_data = {
@@ -1601,45 +1022,30 @@ async def submit_answer(
         # WebSocket уведомления отправляем в фоне для не блокирования ответа
         async def send_ws_notifications():
             try:
-                # Получаем информацию о лобби для определения хоста
-                current_lobby = await db.lobbies.find_one({"_id": lobby_id})
+                # Лобби после записи ответа уже получено атомарной операцией
+                current_lobby = updated_lobby
                 host_id = current_lobby.get("host_id") if current_lobby else None
                 
                 # Отправляем информацию о том, что участник ответил
-                # Хосту отправляем с деталями ответа, остальным - без
-                participants = current_lobby.get("participants", []) if current_lobby else []
-                
-                for participant_id in participants:
-                    if participant_id == host_id:
-                        # Хосту отправляем полную информацию
-                        await ws_manager.send_to_user(lobby_id, participant_id, {
-                            "type": "answer_received",
-                            "data": {
-                                "user_id": user_id,
-                                "question_id": question_id,
-                                "answer_index": answer_index,  # Только хост видит индекс ответа
-                                "is_correct": is_correct
-                            }
-                        })
-                    else:
-                        # Обычным участникам отправляем без деталей ответа
-                        await ws_manager.send_to_user(lobby_id, participant_id, {
-                            "type": "answer_received",
-                            "data": {
-                                "user_id": user_id,
-                                "question_id": question_id,
-                                "is_correct": is_correct  # Без answer_index
-                            }
-                        })
+                # Одно событие на комнату: хост получает детали ответа, остальные - без них
+                answer_data = {
+                    "user_id": user_id,
+                    "question_id": question_id,
+                    "is_correct": is_correct  # Без answer_index
+                }
+                await lobby_events.publish(
+                    lobby_id,
+                    LobbyEventType.ANSWER_RECEIVED,
+                    answer_data,
+                    host_id=host_id,
+                    host_data={**answer_data, "answer_index": answer_index}  # Только хост видит индекс ответа
+                )
                 
                 # Дополнительно отправляем уведомление о том, что участник ответил (всем)
-                await ws_manager.send_json_parallel(lobby_id, {
-                    "type": "participant_answered",
-                    "data": {
-                        "user_id": user_id,
-                        "question_id": question_id,
-                        "answered": True
-                    }
+                await lobby_events.publish(lobby_id, LobbyEventType.PARTICIPANT_ANSWERED, {
+                    "user_id": user_id,
+                    "question_id": question_id,
+                    "answered": True
                 })
             except Exception as e:
                 logger.error(
@@ -1654,11 +1060,6 @@ async def submit_answer(
         # Проверка завершения вопроса в фоне (не блокирует ответ пользователю)
         async def check_question_completion():
             try:
-                # Получаем свежие данные лобби
-                updated_lobby = await db.lobbies.find_one({"_id": lobby_id})
-                if not updated_lobby:
-                    return
-                    
                 current_index = updated_lobby.get("current_index", 0)
                 question_ids = updated_lobby.get("question_ids", [])
                 
@@ -1696,14 +1097,11 @@ async def submit_answer(
                 )
                 
                 # Уведомляем хоста о статусе ответов
-                await ws_manager.send_json_parallel(lobby_id, {
-                    "type": "question_status",
-                    "data": {
-                        "question_id": current_question_id,
-                        "answered_count": answered_count,
-                        "total_participants": len(participants),
-                        "can_advance": answered_count > 0  # Хост может перейти если хотя бы кто-то ответил
-                    }
+                await lobby_events.publish(lobby_id, LobbyEventType.QUESTION_STATUS, {
+                    "question_id": current_question_id,
+                    "answered_count": answered_count,
+                    "total_participants": len(participants),
+                    "can_advance": answered_count > 0  # Хост может перейти если хотя бы кто-то ответил
                 })
                 
 
@@ -1724,9 +1122,9 @@ async def submit_answer(
             
             # Определяем текст правильного варианта ответа
             correct_option_text = None
-            options = question.get("options", [])
+            options = question.get("answers", [])
             if options and 0 <= correct_answer < len(options):
-                correct_option_text = options[correct_answer].get("text", {})
+                correct_option_text = options[correct_answer]
         else:
             explanation = {}
             correct_option_text = None
@@ -1766,7 +1164,7 @@ async def skip_question(lobby_id: str, request: Request = None, current_user: di
         message=f"Запрос пропуска вопроса: хост {user_id} пропускает текущий вопрос в лобби {lobby_id}"
     )
     
-    lobby = await db.lobbies.find_one({"_id": lobby_id})
+    lobby = await get_lobby_from_db(lobby_id)
     if not lobby:
         logger.warning(
             section=LogSection.LOBBY,
@@ -1795,7 +1193,7 @@ async def skip_question(lobby_id: str, request: Request = None, current_user: di
     # Если текущий вопрос не последний и не достигнуто 40 вопросов, перейдем к следующему
     if current_index < total_questions - 1 and current_index < 39:  # 0-based index, 39 = 40 вопросов
         new_index = current_index + 1
-        await db.lobbies.update_one({"_id": lobby_id}, {"$set": {"current_index": new_index}})
+        await update_lobby(lobby_id, {"$set": {"current_index": new_index}})
         next_question_id = lobby["question_ids"][new_index]
         
         logger.info(
@@ -1805,10 +1203,7 @@ async def skip_question(lobby_id: str, request: Request = None, current_user: di
         )
         
         # Уведомляем всех по WebSocket о переходе к следующему вопросу
-        await ws_manager.send_json(lobby_id, {
-            "type": "skip_to",
-            "data": {"question_id": next_question_id}
-        })
+        await lobby_events.publish(lobby_id, "skip_to", {"question_id": next_question_id})
 
         return success(data={"message": "Вопрос пропущен, переход к следующему"})
     else:
@@ -1819,15 +1214,17 @@ async def skip_question(lobby_id: str, request: Request = None, current_user: di
             message=f"Тест завершён пропуском: лобби {lobby_id}, индекс {current_index}, всего вопросов {total_questions}"
         )
         
-        await db.lobbies.update_one(
-            {"_id": lobby_id}, 
+        await update_lobby(
+            lobby_id, 
             {"$set": {"status": "finished", "finished_at": datetime.utcnow()}}
         )
         
-        # Получаем финальные данные для подсчета результатов
+        # Результаты посчитаны один раз при завершении лобби (снимок результатов)
+        lobby = await get_lobby_from_db(lobby_id)
+        snapshot = await get_results_snapshot(lobby)
         results = {}
-        for participant_id, answers in lobby.get("participants_answers", {}).items():
-            correct_count = sum(1 for is_corr in answers.values() if is_corr)
+        for participant_id in lobby.get("participants_answers", {}):
+            correct_count = participant_snapshot(snapshot, participant_id)["correct_count"]
             results[participant_id] = {"correct": correct_count, "total": total_questions}
             
             # Сохраняем запись об истории прохождения
@@ -1845,10 +1242,7 @@ async def skip_question(lobby_id: str, request: Request = None, current_user: di
             await db.history.insert_one(history_record)
         
         # Отправляем уведомление о завершении теста
-        await ws_manager.send_json(lobby_id, {
-            "type": "test_finished",
-            "data": results
-        })
+        await lobby_events.publish(lobby_id, LobbyEventType.TEST_FINISHED, results)
 
         return success(data={"message": "Тест завершен", "results": results})
 
@@ -1871,7 +1265,7 @@ async def next_question_multiplayer(
     )
     
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -1886,38 +1280,29 @@ async def next_question_multiplayer(
         
         if current_index >= total_questions - 1:
             # Завершаем тест
-            await db.lobbies.update_one(
-                {"_id": lobby_id}, 
+            await update_lobby(
+                lobby_id, 
                 {"$set": {"status": "finished", "finished_at": datetime.utcnow()}}
             )
             
             # Отправляем уведомление о завершении теста
-            await ws_manager.send_json(lobby_id, {
-                "type": "test_finished",
-                "data": {"message": "Тест завершен"}
-            })
+            await lobby_events.publish(lobby_id, LobbyEventType.TEST_FINISHED, {"message": "Тест завершен"})
             
             return success(data={"message": "Тест завершен"})
         
         # Переходим к следующему вопросу
         new_index = current_index + 1
-        await db.lobbies.update_one(
-            {"_id": lobby_id}, 
+        await update_lobby(
+            lobby_id, 
             {"$set": {"current_index": new_index}}
         )
         
-        # Инвалидируем кэш лобби, чтобы участники получили обновленный current_index
-        lobby_cache.invalidate_lobby(lobby_id)
-        
         next_question_id = lobby["question_ids"][new_index]
         
         # Отправляем WebSocket уведомление о переходе к следующему вопросу
-        await ws_manager.send_json_parallel(lobby_id, {
-            "type": "next_question",
-            "data": {
-                "question_id": next_question_id,
-                "question_index": new_index
-            }
+        await lobby_events.publish(lobby_id, "next_question", {
+            "question_id": next_question_id,
+            "question_index": new_index
         })
         
         return success(data={"message": "Переход к следующему вопросу", "question_index": new_index})
@@ -1955,7 +1340,7 @@ async def kick_participant(
     
     try:
         # Получаем информацию о лобби
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -1988,8 +1373,8 @@ async def kick_participant(
             )
         
         # Убираем участника из лобби и добавляем в черный список
-        update_result = await db.lobbies.update_one(
-            {"_id": lobby_id},
+        update_result = await update_lobby(
+            lobby_id,
             {
                 "$pull": {"participants": target_user_id},
                 "$addToSet": {"blacklisted_users": target_user_id},  # Добавляем в черный список
@@ -2000,30 +1385,21 @@ async def kick_participant(
         if update_result.modified_count == 0:
             raise HTTPException(status_code=500, detail="Не удалось исключить участника")
         
-        # Инвалидируем кэш лобби
-        lobby_cache.invalidate_lobby(lobby_id)
-        
         # Отправляем WebSocket уведомления
         try:
             # Уведомляем исключенного пользователя
-            await ws_manager.send_json_to_user(target_user_id, {
-                "type": "user_kicked",
-                "data": {
-                    "lobby_id": lobby_id,
-                    "message": "Вы были исключены из лобби хостом",
-                    "kicked_by": user_id,
-                    "redirect": True
-                }
+            await lobby_events.publish_to_user(lobby_id, target_user_id, "user_kicked", {
+                "lobby_id": lobby_id,
+                "message": "Вы были исключены из лобби хостом",
+                "kicked_by": user_id,
+                "redirect": True
             })
             
             # Уведомляем всех остальных участников
-            await ws_manager.send_json_parallel(lobby_id, {
-                "type": "participant_kicked",
-                "data": {
-                    "user_id": target_user_id,
-                    "user_name": kicked_user_name,
-                    "kicked_by": user_id
-                }
+            await lobby_events.publish(lobby_id, "participant_kicked", {
+                "user_id": target_user_id,
+                "user_name": kicked_user_name,
+                "kicked_by": user_id
             })
             
         except Exception as e:
@@ -2064,7 +1440,7 @@ async def close_lobby(lobby_id: str, request: Request = None, current_user: dict
     )
     
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -2078,10 +1454,7 @@ async def close_lobby(lobby_id: str, request: Request = None, current_user: dict
         
         # Сначала оповещаем всех участников о закрытии лобби
         try:
-            await ws_manager.broadcast_to_lobby(lobby_id, {
-                "type": "lobby_closed",
-                "data": {"message": "Лобби было закрыто хостом", "redirect": True}
-            })
+            await lobby_events.publish(lobby_id, "lobby_closed", {"message": "Лобби было закрыто хостом", "redirect": True})
             logger.info(
                 section=LogSection.WEBSOCKET,
                 subsection=LogSubsection.WEBSOCKET.MESSAGE_SEND,
@@ -2098,8 +1471,8 @@ async def close_lobby(lobby_id: str, request: Request = None, current_user: dict
         await asyncio.sleep(1)
         
         # Помечаем лобби как закрытое вместо удаления
-        await db.lobbies.update_one(
-            {"_id": lobby_id},
+        await update_lobby(
+            lobby_id,
             {
                 "$set": {
                     "status": "closed",
@@ -2110,31 +1483,6 @@ async def close_lobby(lobby_id: str, request: Request = None, current_user: dict
             }
         )
         
-        # Инвалидируем кэш
-        lobby_cache.invalidate_lobby(lobby_id)
-        
-        # Закрываем все WebSocket соединения для этого лобби
-        try:
-            if lobby_id in ws_manager.connections:
-                connections_to_close = list(ws_manager.connections[lobby_id])
-                for conn in connections_to_close:
-                    try:
-                        await conn["websocket"].close(code=1000, reason="Lobby closed")
-                    except Exception as e:
-                        logger.error(
-                            section=LogSection.WEBSOCKET,
-                            subsection=LogSubsection.WEBSOCKET.ERROR,
-                            message=f"Ошибка закрытия WS соединения: пользователь {conn['user_id']}, ошибка {str(e)}"
-                        )
-                # Очищаем список соединений
-                del ws_manager.connections[lobby_id]
-        except Exception as e:
-            logger.error(
-                section=LogSection.WEBSOCKET,
-                subsection=LogSubsection.WEBSOCKET.ERROR,
-                message=f"Ошибка закрытия WS соединений: лобби {lobby_id}, ошибка {str(e)}"
-            )
-        
         logger.info(
             section=LogSection.LOBBY,
             subsection=LogSubsection.LOBBY.LIFECYCLE,
@@ -2165,7 +1513,7 @@ async def finish_lobby(lobby_id: str, request: Request = None, current_user: dic
     user_id = get_user_id(current_user)
     
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -2184,7 +1532,7 @@ async def finish_lobby(lobby_id: str, request: Request = None, current_user: dic
         finished_time = datetime.utcnow()
         duration = (finished_time - lobby.get("created_at", finished_time)).total_seconds()
         
-        await db.lobbies.update_one({"_id": lobby_id}, {
+        await update_lobby(lobby_id, {
             "$set": {
                 "status": "finished", 
                 "finished_at": finished_time,
@@ -2193,84 +1541,55 @@ async def finish_lobby(lobby_id: str, request: Request = None, current_user: dic
             }
         })
         
-        # Получаем финальные данные лобби для подсчета результатов
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        # Результаты посчитаны один раз при завершении лобби (снимок результатов)
+        lobby = await get_lobby_from_db(lobby_id)
+        snapshot = await get_results_snapshot(lobby)
+        questions_data = await get_packed_questions(lobby)
+        total_questions = snapshot["total_questions"]
         results = {}
         detailed_results = {}
-        total_questions = len(lobby.get("question_ids", []))
-        
-        # Получаем детальную информацию по всем вопросам одним запросом
-        questions_data = {}
-        question_ids = [ObjectId(q_id) for q_id in lobby.get("question_ids", [])]
-        if question_ids:
-            questions_cursor = db.questions.find({"_id": {"$in": question_ids}})
-            questions = await questions_cursor.to_list(length=len(question_ids))
-            
-            for question in questions:
-                q_id = str(question["_id"])
-                questions_data[q_id] = {
-                    "text": question.get("question_text", ""),
-                    "section": question.get("pdd_section", ""),
-                    "categories": question.get("categories", []),
-                    "pdd_section_uids": question.get("pdd_section_uids", []),
-                    "correct_answer": chr(ord('A') + lobby["correct_answers"].get(q_id, 0))
-                }
         
         for participant_id, answers in lobby.get("participants_answers", {}).items():
-            # Считаем количество правильных ответов участника
-            correct_count = sum(1 for is_corr in answers.values() if is_corr)
-            incorrect_count = sum(1 for is_corr in answers.values() if not is_corr)
-            answered_count = len(answers)
-            not_answered_count = total_questions - answered_count
+            participant = participant_snapshot(snapshot, participant_id)
+            correct_count = participant["correct_count"]
             
             # Базовые результаты
             results[participant_id] = {
                 "correct": correct_count, 
                 "total": total_questions,
-                "percentage": round((correct_count / total_questions * 100), 2) if total_questions > 0 else 0
+                "percentage": participant["percentage"]
             }
             
             # Детальные результаты с метриками
             detailed_results[participant_id] = {
                 "correct_count": correct_count,
-                "incorrect_count": incorrect_count,
-                "answered_count": answered_count,
-                "not_answered_count": not_answered_count,
+                "incorrect_count": participant["incorrect_count"],
+                "answered_count": participant["answered_count"],
+                "not_answered_count": participant["not_answered_count"],
                 "total_questions": total_questions,
-                "passing_score": correct_count >= int(total_questions * 0.8),  # 80% правильных для прохождения
-                "percentage": round((correct_count / total_questions * 100), 2) if total_questions > 0 else 0,
+                "passing_score": participant["passing_score"],
+                "percentage": participant["percentage"],
                 "duration_seconds": duration,
-                "duration_formatted": f"{int(duration // 60)}:{int(duration % 60):02d}",  # Формат мм:сс
-                "answers_by_section": {},
-                "detailed_answers": {}
-            }
-            
-            # Группируем ответы по разделам ПДД
-            section_stats = {}
-            for q_id, is_correct in answers.items():
-                if q_id in questions_data:
-                    q_section = questions_data[q_id].get("section", "Неизвестный раздел")
-                    
-                    if q_section not in section_stats:
-                        section_stats[q_section] = {"correct": 0, "total": 0}
-                    
-                    section_stats[q_section]["total"] += 1
-                    if is_correct:
-                        section_stats[q_section]["correct"] += 1
-                    
-                    # Детальная информация по каждому вопросу
-                    detailed_results[participant_id]["detailed_answers"][q_id] = {
+                "duration_formatted": format_duration(duration),
+                "answers_by_section": {
+                    stats["section"]: {
+                        "correct": stats["correct"],
+                        "total": stats["total"],
+                        "percentage": stats["percentage"]
+                    }
+                    for stats in participant["sections"]
+                },
+                "detailed_answers": {
+                    q_id: {
                         "is_correct": is_correct,
-                        "question_text": questions_data[q_id].get("text", ""),
-                        "section": q_section,
+                        "question_text": questions_data[q_id].get("question_text", ""),
+                        "section": questions_data[q_id].get("pdd_section", ""),
                         "categories": questions_data[q_id].get("category", [])
                     }
-            
-            # Добавляем процент правильных ответов по каждому разделу
-            for section, stats in section_stats.items():
-                stats["percentage"] = round((stats["correct"] / stats["total"] * 100), 2) if stats["total"] > 0 else 0
-            
-            detailed_results[participant_id]["answers_by_section"] = section_stats
+                    for q_id, is_correct in answers.items()
+                    if q_id in questions_data
+                }
+            }
             
             # Сохраняем запись об истории прохождения в коллекцию History
             try:
@@ -2285,7 +1604,7 @@ async def finish_lobby(lobby_id: str, request: Request = None, current_user: dic
                     "mode": lobby.get("mode", "solo"),
                     "pass_percentage": (correct_count / total_questions * 100) if total_questions > 0 else 0,
                     "duration_seconds": duration,
-                    "is_passed": correct_count >= int(total_questions * 0.8),  # 80% правильных для прохождения
+                    "is_passed": participant["passing_score"],
                     "detailed_results": detailed_results[participant_id],
                     "exam_mode": lobby.get("exam_mode", False),
                     "finish_reason": "manual"
@@ -2302,16 +1621,10 @@ async def finish_lobby(lobby_id: str, request: Request = None, current_user: dic
         # Оповещаем участников о завершении и сообщаем результаты
         try:
             # Отправляем базовые результаты через WebSocket
-            await ws_manager.send_json(lobby_id, {
-                "type": "finished",
-                "data": results
-            })
+            await lobby_events.publish(lobby_id, "finished", results)
 
             # Отправляем детальные результаты через отдельное WebSocket сообщение
-            await ws_manager.send_json(lobby_id, {
-                "type": "detailed_results",
-                "data": detailed_results
-            })
+            await lobby_events.publish(lobby_id, "detailed_results", detailed_results)
 
         except Exception as e:
             logger.error(
@@ -2347,7 +1660,7 @@ async def get_lobby_public_info(lobby_id: str, request: Request = None):
     Не требует аутентификации.
     """
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -2418,15 +1731,18 @@ async def get_lobby(
         # Принудительно обновляем кеш если есть параметры cache-busting
         force_refresh = bool(t or retry)
         
+        if force_refresh:
+            await invalidate_lobby_cache(lobby_id)
+        
         # Получаем лобби из кэша
-        lobby = await lobby_cache.get_lobby(lobby_id, force_refresh=force_refresh)
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
         is_host = user_id == lobby.get("host_id")
         
         # Получаем тип подписки хоста
-        host_subscription = await lobby_cache.get_user_subscription(lobby["host_id"])
+        host_subscription = await get_user_subscription_from_db(lobby["host_id"])
         host_subscription_type = host_subscription["subscription_type"] if host_subscription else "Demo"
         
         # Calculate remaining time if lobby is active
@@ -2522,7 +1838,7 @@ async def get_answered_users(lobby_id: str, request: Request = None, current_use
     user_id = get_user_id(current_user)
     
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -2592,7 +1908,7 @@ async def get_test_results(lobby_id: str, request: Request = None, current_user:
     user_id = get_user_id(current_user)
     
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -2604,108 +1920,55 @@ async def get_test_results(lobby_id: str, request: Request = None, current_user:
         if lobby["status"] != "finished":
             raise HTTPException(status_code=400, detail="Тест еще не завершен")
         
-        # Вычисляем продолжительность теста
-        start_time = lobby.get("created_at", datetime.utcnow())
-        end_time = lobby.get("finished_at", datetime.utcnow())
-        duration = (end_time - start_time).total_seconds()
-        
-        total_questions = len(lobby.get("question_ids", []))
-        
-        # Получаем информацию о всех вопросах одним запросом
-        questions_data = {}
-        question_ids = [ObjectId(q_id) for q_id in lobby.get("question_ids", [])]
-        if question_ids:
-            questions_cursor = db.questions.find({"_id": {"$in": question_ids}})
-            questions = await questions_cursor.to_list(length=len(question_ids))
-            
-            for question in questions:
-                q_id = str(question["_id"])
-                questions_data[q_id] = {
-                    "text": question.get("question_text", ""),
-                    "section": question.get("pdd_section", ""),
-                    "categories": question.get("categories", []),
-                    "pdd_section_uids": question.get("pdd_section_uids", []),
-                    "correct_answer": chr(ord('A') + lobby["correct_answers"].get(q_id, 0))
-                }
-        
-        # Собираем результаты пользователя
-        user_answers = lobby.get("participants_answers", {}).get(user_id, {})
-        correct_count = sum(1 for is_corr in user_answers.values() if is_corr)
-        incorrect_count = sum(1 for is_corr in user_answers.values() if not is_corr)
-        answered_count = len(user_answers)
-        not_answered_count = total_questions - answered_count
+        # Результаты посчитаны один раз при завершении лобби (снимок результатов)
+        snapshot = await get_results_snapshot(lobby)
+        questions_data = await get_packed_questions(lobby)
+        duration = snapshot["duration_seconds"]
+        total_questions = snapshot["total_questions"]
+        participant = participant_snapshot(snapshot, user_id)
         
         # Детальная статистика пользователя
         user_result = {
             "user_id": user_id,
             "is_host": user_id == lobby["host_id"],
-            "correct_count": correct_count,
-            "incorrect_count": incorrect_count,
-            "answered_count": answered_count,
-            "not_answered_count": not_answered_count,
+            "correct_count": participant["correct_count"],
+            "incorrect_count": participant["incorrect_count"],
+            "answered_count": participant["answered_count"],
+            "not_answered_count": participant["not_answered_count"],
             "total_questions": total_questions,
-            "passing_score": correct_count >= int(total_questions * 0.8),  # 80% правильных для прохождения
-            "percentage": round((correct_count / total_questions * 100), 2) if total_questions > 0 else 0,
+            "passing_score": participant["passing_score"],
+            "percentage": participant["percentage"],
             "duration_seconds": duration,
-            "duration_formatted": f"{int(duration // 60)}:{int(duration % 60):02d}",  # Формат мм:сс
+            "duration_formatted": format_duration(duration),
             "detailed_answers": []
         }
         
-        # Группируем ответы по разделам ПДД
-        section_stats = {}
+        # Детальная информация по каждому вопросу
+        user_answers = lobby.get("participants_answers", {}).get(user_id, {})
         for q_id, is_correct in user_answers.items():
             if q_id in questions_data:
-                q_section = questions_data[q_id].get("section", "Неизвестный раздел")
-                
-                if q_section not in section_stats:
-                    section_stats[q_section] = {"correct": 0, "total": 0, "questions": []}
-                
-                section_stats[q_section]["total"] += 1
-                if is_correct:
-                    section_stats[q_section]["correct"] += 1
-                
-                # Детальная информация по каждому вопросу
-                q_data = {
+                question = questions_data[q_id]
+                user_result["detailed_answers"].append({
                     "question_id": q_id,
-                    "question_text": questions_data[q_id].get("text", ""),
-                    "section": q_section,
-                    "categories": questions_data[q_id].get("category", []),
+                    "question_text": question.get("question_text", ""),
+                    "section": question.get("pdd_section", ""),
+                    "categories": question.get("category", []),
                     "is_correct": is_correct,
-                    "correct_answer": questions_data[q_id].get("correct_answer", "А")
-                }
-                
-                user_result["detailed_answers"].append(q_data)
-                section_stats[q_section]["questions"].append(q_id)
-        
-        # Добавляем процент правильных ответов по каждому разделу
-        sections_result = []
-        for section, stats in section_stats.items():
-            stats["percentage"] = round((stats["correct"] / stats["total"] * 100), 2) if stats["total"] > 0 else 0
-            sections_result.append({
-                "section": section,
-                "correct": stats["correct"],
-                "total": stats["total"],
-                "percentage": stats["percentage"],
-                "questions": stats["questions"]
-            })
+                    "correct_answer": chr(ord('A') + lobby["correct_answers"].get(q_id, 0))
+                })
         
+        sections_result = participant["sections"]
         user_result["sections"] = sections_result
         
-        # Собираем сводную статистику по всем участникам (только основные метрики)
-        all_participants = []
-        for p_id, p_answers in lobby.get("participants_answers", {}).items():
-            p_correct = sum(1 for is_corr in p_answers.values() if is_corr)
-            all_participants.append({
-                "user_id": p_id,
-                "is_host": p_id == lobby["host_id"],
-                "is_current_user": p_id == user_id,
-                "correct_count": p_correct,
-                "total": total_questions,
-                "percentage": round((p_correct / total_questions * 100), 2) if total_questions > 0 else 0
-            })
-        
-        # Сортируем участников по количеству правильных ответов
-        all_participants.sort(key=lambda x: x["correct_count"], reverse=True)
+        # Рейтинг участников отсортирован в снимке
+        all_participants = [
+            {
+                **entry,
+                "is_host": entry["user_id"] == lobby["host_id"],
+                "is_current_user": entry["user_id"] == user_id
+            }
+            for entry in snapshot["ranking"]
+        ]
         
         # Определяем место пользователя среди всех участников
         user_rank = next((idx + 1 for idx, p in enumerate(all_participants) if p["user_id"] == user_id), 0)
@@ -2773,8 +2036,8 @@ async def get_user_active_lobby(request: Request = None, current_user: dict = De
             lobby_age = (datetime.utcnow() - active_lobby["created_at"]).total_seconds()
             if lobby_age > MAX_LOBBY_LIFETIME:
                 # Автоматически завершаем просроченное лобби
-                await db.lobbies.update_one(
-                    {"_id": active_lobby["_id"]},
+                await update_lobby(
+                    active_lobby["_id"],
                     {"$set": {
                         "status": "finished",
                         "finished_at": datetime.utcnow(),
@@ -2980,7 +2243,7 @@ async def leave_lobby(lobby_id: str, request: Request = None, current_user: dict
     )
     
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -2990,14 +2253,11 @@ async def leave_lobby(lobby_id: str, request: Request = None, current_user: dict
         # Если выходит хост, закрываем лобби
         if lobby["host_id"] == user_id:
             # Уведомляем всех участников о закрытии лобби
-            await ws_manager.broadcast_to_lobby(lobby_id, {
-                "type": "lobby_closed",
-                "data": {"message": "Хост покинул лобби", "redirect": True}
-            })
+            await lobby_events.publish(lobby_id, "lobby_closed", {"message": "Хост покинул лобби", "redirect": True})
             
             # Помечаем лобби как закрытое
-            await db.lobbies.update_one(
-                {"_id": lobby_id},
+            await update_lobby(
+                lobby_id,
                 {
                     "$set": {
                         "status": "closed",
@@ -3009,19 +2269,13 @@ async def leave_lobby(lobby_id: str, request: Request = None, current_user: dict
             )
         else:
             # Обычный участник выходит
-            await db.lobbies.update_one(
-                {"_id": lobby_id},
+            await update_lobby(
+                lobby_id,
                 {"$pull": {"participants": user_id}}
             )
             
             # Уведомляем остальных участников
-            await ws_manager.broadcast_to_lobby(lobby_id, {
-                "type": "participant_left",
-                "data": {"user_id": user_id}
-            })
-        
-        # Инвалидируем кэш
-        lobby_cache.invalidate_lobby(lobby_id)
+            await lobby_events.publish(lobby_id, "participant_left", {"user_id": user_id})
         
         return success(data={"message": "Вы покинули лобби"})
         
@@ -3060,9 +2314,9 @@ async def show_correct_answer(
     
     try:
         # Инвалидируем кэш для получения актуального состояния лобби
-        lobby_cache.invalidate_lobby(lobby_id)
+        await invalidate_lobby_cache(lobby_id)
         
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -3106,7 +2360,7 @@ async def show_correct_answer(
         correct_answer_index = correct_answers.get(str(current_question_id), 0)
         
         # Получаем данные вопроса из базы данных для объяснения и медиа
-        question = await db.questions.find_one({"_id": ObjectId(current_question_id)})
+        question = await get_packed_question(lobby, current_question_id)
         explanation = question.get("explanation", "") if question else ""
         
         logger.info(
@@ -3139,19 +2393,14 @@ async def show_correct_answer(
             after_answer_media_file_id = question.get("after_answer_media_file_id") or question.get("after_answer_media_id")
         
         # Отправляем WebSocket уведомление всем участникам
-        from app.websocket.lobby_ws import ws_manager
-        
         websocket_data = {
-            "type": "show_correct_answer",
-            "data": {
-                "question_id": str(current_question_id),
-                "correct_answer_index": correct_answer_index,
-                "explanation": explanation,
-                "has_after_media": has_after_media,
-                "after_answer_media_type": after_answer_media_type,
-                "after_answer_media_file_id": str(after_answer_media_file_id) if after_answer_media_file_id else None,
-                "question_index": current_index  # Добавляем индекс для дополнительной проверки
-            }
+            "question_id": str(current_question_id),
+            "correct_answer_index": correct_answer_index,
+            "explanation": explanation,
+            "has_after_media": has_after_media,
+            "after_answer_media_type": after_answer_media_type,
+            "after_answer_media_file_id": str(after_answer_media_file_id) if after_answer_media_file_id else None,
+            "question_index": current_index  # Добавляем индекс для дополнительной проверки
         }
         
         logger.info(
@@ -3160,7 +2409,7 @@ async def show_correct_answer(
             message=f"Отправка WS сообщения show_correct_answer: вопрос {current_question_id}, индекс {current_index}, данные отправлены"
         )
         
-        await ws_manager.send_json_parallel(lobby_id, websocket_data)
+        await lobby_events.publish(lobby_id, "show_correct_answer", websocket_data)
         
         logger.info(
             section=LogSection.LOBBY,
@@ -3204,7 +2453,7 @@ async def toggle_participant_answers(
     )
     
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -3218,17 +2467,14 @@ async def toggle_participant_answers(
         current_visibility = lobby.get("show_participant_answers", False)
         new_visibility = not current_visibility
         
-        await db.lobbies.update_one(
-            {"_id": lobby_id},
+        await update_lobby(
+            lobby_id,
             {"$set": {"show_participant_answers": new_visibility}}
         )
         
         # Отправляем WebSocket уведомление всем участникам
-        await ws_manager.broadcast_to_lobby(lobby_id, {
-            "type": "toggle_participant_answers",
-            "data": {
-                "show_answers": new_visibility
-            }
+        await lobby_events.publish(lobby_id, "toggle_participant_answers", {
+            "show_answers": new_visibility
         })
         
         return success(data={
@@ -3265,7 +2511,7 @@ async def sync_lobby_state(
     )
     
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -3293,7 +2539,7 @@ async def sync_lobby_state(
                     correct_answer_index = correct_answers.get(str(current_question_id), 0)
                     
                     # Получаем объяснение из базы данных
-                    question = await db.questions.find_one({"_id": ObjectId(current_question_id)})
+                    question = await get_packed_question(lobby, current_question_id)
                     if question:
                         explanation = question.get("explanation", "")
                 except Exception as e:
@@ -3320,11 +2566,7 @@ async def sync_lobby_state(
             sync_data["explanation"] = explanation
         
         # Отправляем синхронизацию через WebSocket всем участникам
-        from app.websocket.lobby_ws import ws_manager
-        await ws_manager.send_json_parallel(lobby_id, {
-            "type": "sync_response",
-            "data": sync_data
-        })
+        await lobby_events.publish(lobby_id, "sync_response", sync_data)
         
         logger.info(
             section=LogSection.LOBBY,
@@ -3367,7 +2609,7 @@ async def debug_question_media_info(
     
     try:
         # Найти вопрос
-        question = await db.questions.find_one({"_id": ObjectId(question_id)})
+        question = await question_cache.get_question(question_id)
         if not question:
             return {"error": "Question not found", "question_id": question_id}
         
@@ -3461,7 +2703,7 @@ async def finish_test(
     )
     
     try:
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Лобби не найдено")
         
@@ -3472,8 +2714,8 @@ async def finish_test(
             raise HTTPException(status_code=400, detail="Тест не запущен или уже завершен")
         
         # Завершаем тест
-        await db.lobbies.update_one(
-            {"_id": lobby_id},
+        await update_lobby(
+            lobby_id,
             {
                 "$set": {
                     "status": "finished",
@@ -3482,19 +2724,20 @@ async def finish_test(
             }
         )
         
-        # Подсчитываем результаты
+        # Результаты посчитаны один раз при завершении лобби (снимок результатов)
+        lobby = await get_lobby_from_db(lobby_id)
+        snapshot = await get_results_snapshot(lobby)
         results = {}
-        participants_answers = lobby.get("participants_answers", {})
-        total_questions = len(lobby.get("question_ids", []))
         
         for participant_id in lobby.get("participants", []):
-            participant_answers = participants_answers.get(participant_id, {})
-            correct_count = sum(1 for is_correct in participant_answers.values() if is_correct)
+            participant = participant_snapshot(snapshot, participant_id)
+            correct_count = participant["correct_count"]
+            answered_count = participant["answered_count"]
             
             results[participant_id] = {
                 "correct": correct_count,
-                "total": len(participant_answers),
-                "percentage": round((correct_count / len(participant_answers) * 100) if len(participant_answers) > 0 else 0, 1)
+                "total": answered_count,
+                "percentage": round((correct_count / answered_count * 100) if answered_count > 0 else 0, 1)
             }
             
             # Сохраняем в историю
@@ -3503,24 +2746,18 @@ async def finish_test(
                 "lobby_id": lobby_id,
                 "date": datetime.utcnow(),
                 "score": correct_count,
-                "total": len(participant_answers),
+                "total": answered_count,
                 "categories": lobby.get("categories", []),
                 "sections": lobby.get("sections", []),
                 "mode": lobby.get("mode", "multiplayer"),
-                "pass_percentage": (correct_count / len(participant_answers) * 100) if len(participant_answers) > 0 else 0
+                "pass_percentage": (correct_count / answered_count * 100) if answered_count > 0 else 0
             }
             await db.history.insert_one(history_record)
         
-        # Инвалидируем кэш
-        lobby_cache.invalidate_lobby(lobby_id)
-        
         # Отправляем WebSocket уведомление о завершении теста
-        await ws_manager.broadcast_to_lobby(lobby_id, {
-            "type": "test_finished",
-            "data": {
-                "results": results,
-                "message": "Тест завершен хостом"
-            }
+        await lobby_events.publish(lobby_id, LobbyEventType.TEST_FINISHED, {
+            "results": results,
+            "message": "Тест завершен хостом"
         })
         
         return success(data={
@@ -3565,7 +2802,7 @@ async def create_lobby(lobby_data: LobbyCreate, request: Request = None, current
             "participants": user_id,
             "status": {"$ne": "finished"}
         })
-        subscription_task = lobby_cache.get_user_subscription(user_id)
+        subscription_task = get_user_subscription_from_db(user_id)
         
         # Выполняем оба запроса параллельно
         active_lobby, subscription = await asyncio.gather(active_lobby_task, subscription_task)
@@ -3576,8 +2813,8 @@ async def create_lobby(lobby_data: LobbyCreate, request: Request = None, current
                 lobby_age = (datetime.utcnow() - active_lobby["created_at"]).total_seconds()
                 if lobby_age > MAX_LOBBY_LIFETIME:
                     # Auto-finish the expired lobby
-                    await db.lobbies.update_one(
-                        {"_id": active_lobby["_id"]},
+                    await update_lobby(
+                        active_lobby["_id"],
                         {"$set": {
                             "status": "finished",
                             "finished_at": datetime.utcnow(),
@@ -3808,6 +3045,7 @@ async def create_lobby(lobby_data: LobbyCreate, request: Request = None, current
             "question_ids": question_ids,
             "correct_answers": correct_answers_map,
             "questions_data": questions_data,  # Сохраняем дополнительную информацию о вопросах
+            "question_pack": build_question_pack(questions),  # Неизменяемый пакет вопросов для вопросов и ответов
             "participants": [user_id],
             "participants_answers": {user_id: {}},
             "current_index": 0,
@@ -3851,10 +3089,7 @@ async def create_lobby(lobby_data: LobbyCreate, request: Request = None, current
                             subsection=LogSubsection.WEBSOCKET.MESSAGE_SEND,
                             message=f"Отправка WS старта: лобби {lobby_id} solo-режим, отправляется start с вопросом {first_question_id}"
                         )
-                        await ws_manager.send_json(lobby_id, {
-                            "type": "start",
-                            "data": {"question_id": first_question_id}
-                        })
+                        await lobby_events.publish(lobby_id, "start", {"question_id": first_question_id})
 
                     except Exception as e:
                         logger.error(
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, Request, status
+from fastapi import APIRouter, HTTPException, Depends, Request, Query, status
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
@@ -223,6 +223,8 @@ async def get_my_referral(request: Request, current_user = Depends(get_current_a
 @rate_limit_ip("referral_transactions_view", max_requests=20, window_seconds=60)
 async def get_referral_transactions(
     request: Request,
+    page: int = Query(1, ge=1, description="Номер страницы"),
+    page_size: int = Query(100, ge=1, le=500, description="Размер страницы"),
     current_user=Depends(get_current_actor),
 ):
     """
@@ -260,45 +262,70 @@ async def get_referral_transactions(
         )
     referral_code = referral["code"]
 
-    # Пользователи, зарегистрировавшиеся по коду
-    referred_users = await db.users.find(
-        {"referred_by": referral_code}
-    ).to_list(length=1000)
-
-    # Список ObjectId этих пользователей
-    referred_ids = [u["_id"] for u in referred_users]
-
-    # Транзакции типа "referral" именно для этих пользователей
-    transactions = await db.transactions.find({
-        "type": "referral",
-        "referred_user_id": {"$in": referred_ids}
-    }).sort("created_at", -1).to_list(length=1000)
-
-    # Общие метрики
-    total_earned    = sum(tx.get("amount", 0) for tx in transactions)
-    total_registered= len(referred_users)
-    total_purchased = sum(1 for u in referred_users if u.get("referred_use", False))
+    # Одна агрегация по пользователям, зарегистрировавшимся по коду:
+    # к каждому подтягиваются его реферальные транзакции (индекс tx_referral),
+    # в $facet считаются общие метрики и страница детального списка
+    pipeline = [
+        {"$match": {"referred_by": referral_code}},
+        {"$lookup": {
+            "from": "transactions",
+            "localField": "_id",
+            "foreignField": "referred_user_id",
+            "pipeline": [
+                {"$match": {"type": "referral"}},
+                {"$sort": {"amount": -1, "created_at": -1}},
+                {"$group": {
+                    "_id": None,
+                    "best_amount": {"$first": "$amount"},
+                    "best_date": {"$first": "$created_at"},
+                    "total_amount": {"$sum": "$amount"}
+                }}
+            ],
+            "as": "referral_tx"
+        }},
+        {"$set": {"referral_tx": {"$first": "$referral_tx"}}},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "total_earned": {"$sum": {"$ifNull": ["$referral_tx.total_amount", 0]}},
+                    "total_registered": {"$sum": 1},
+                    "total_purchased": {"$sum": {"$cond": [{"$eq": ["$referred_use", True]}, 1, 0]}}
+                }}
+            ],
+            "page": [
+                # Сортируем: сначала с транзакцией, потом по дате
+                {"$set": {
+                    "has_tx": {"$gt": ["$referral_tx.best_date", None]},
+                    "sort_date": {"$ifNull": ["$referral_tx.best_date", "$created_at"]}
+                }},
+                {"$sort": {"has_tx": -1, "sort_date": -1, "_id": -1}},
+                {"$skip": (page - 1) * page_size},
+                {"$limit": page_size},
+                {"$project": {
+                    "iin": 1,
+                    "full_name": 1,
+                    "created_at": 1,
+                    "referred_use": 1,
+                    "referral_tx": 1
+                }}
+            ]
+        }}
+    ]
+    aggregated = (await db.users.aggregate(pipeline).to_list(length=1))[0]
+    totals = aggregated["totals"][0] if aggregated["totals"] else {}
+    total_earned     = totals.get("total_earned", 0)
+    total_registered = totals.get("total_registered", 0)
+    total_purchased  = totals.get("total_purchased", 0)
 
     # Формируем детальный список
     result_transactions = []
-    for user in referred_users:
-        uid = str(user["_id"])
-        # Все транзакции, где referred_user_id == uid
-        user_tx = [
-            tx for tx in transactions
-            if str(tx.get("referred_user_id")) == uid
-        ]
-
-        amount  = None
-        tx_date = None
-        if user_tx:
-            best   = max(user_tx, key=lambda t: t.get("amount", 0))
-            amount = best.get("amount")
-            tx_date = best.get("created_at")
-
+    for user in aggregated["page"]:
+        referral_tx = user.get("referral_tx") or {}
+        tx_date = referral_tx.get("best_date")
         reg_date = user.get("created_at")
         result_transactions.append({
-            "id":                 uid,
+            "id":                 str(user["_id"]),
             "user_iin":           user.get("iin", ""),
             "user_name":          user.get("full_name", ""),
             "registration_date":  (
@@ -307,7 +334,8 @@ async def get_referral_transactions(
                 else str(reg_date)
             ),
             "has_purchased":      user.get("referred_use", False),
-            "amount":             amount,
+            "amount":             referral_tx.get("best_amount"),
+            "total_amount":       referral_tx.get("total_amount", 0),
             "transaction_date":   (
                 tx_date.isoformat()
                 if isinstance(tx_date, datetime)
@@ -315,15 +343,6 @@ async def get_referral_transactions(
             )
         })
 
-    # Сортируем: сначала с транзакцией, потом по дате
-    result_transactions.sort(
-        key=lambda x: (
-            x["transaction_date"] is not None,
-            x["transaction_date"] or x["registration_date"]
-        ),
-        reverse=True
-    )
-
     logger.info(
         section=LogSection.USER,
         subsection=LogSubsection.USER.REFERRAL,
@@ -337,7 +356,13 @@ async def get_referral_transactions(
             "totalRegistered":  total_registered,
             "totalPurchased":   total_purchased
         },
-        message="Данные по реферальным транзакциям получены"
+        message="Данные по реферальным транзакциям получены",
+        pagination={
+            "page": page,
+            "page_size": page_size,
+            "total": total_registered,
+            "has_more": page * page_size < total_registered
+        }
     )
 
 @router.get("/", summary="Получить список реферальных кодов (админ/модератор)")
@@ -8,7 +8,7 @@ from pydantic import EmailStr
 
 from app.db.database import db
 from app.schemas.auth_schemas import PasswordResetRequest, PasswordResetConfirm
-from app.core.security import hash_password
+from app.core.security import hash_password_async
 from app.core.response import success
 from app.logging import get_logger, LogSection, LogSubsection
 from app.utils.twofa_client import twofa_client
@@ -91,7 +91,7 @@ async def confirm_password_reset(data: PasswordResetConfirm, request: Request):
             detail={"message": "Пользователь не найден"}
         )
 
-    hashed_pass = hash_password(new_password)
+    hashed_pass = await hash_password_async(new_password)
 
     await db.users.update_one(
         {"_id": user["_id"]},
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Response, Request, Query
 from fastapi.responses import StreamingResponse
 from app.core.media_manager import media_manager
+from app.core.gridfs_utils import gridfs_media_response
 from app.db.database import get_database
 from bson import ObjectId, errors
 import base64
@@ -8,6 +9,8 @@ from app.core.security import get_current_actor
 from app.core.response import success
 from app.logging import get_logger, LogSection, LogSubsection
 from app.core.config import settings
+from app.core.question_cache import question_cache, invalidate_question
+from app.multiplayer.lobby_utils import get_lobby_from_db, update_lobby
 from app.rate_limit import rate_limit_ip
 
 router = APIRouter(tags=["Solo Files"])
@@ -71,17 +74,7 @@ async def get_question_media_secure(
     
     try:
         # Находим вопрос в базе данных - пробуем сначала как строку, потом как ObjectId
-        question = None
-        try:
-            question = await db.questions.find_one({"_id": question_id})
-        except:
-            pass
-            
-        if not question:
-            try:
-                question = await db.questions.find_one({"_id": ObjectId(question_id)})
-            except:
-                pass
+        question = await question_cache.get_question(question_id)
         
         if not question:
             logger.error(
@@ -220,6 +213,12 @@ async def get_question_media_secure(
             # Проверяем существование файла в новой системе медиа
             file_info = await media_manager.get_media_file(str(media_file_id), db)
             if not file_info:
+                # Старые файлы, ещё лежащие в GridFS, отдаются потоком частями
+                legacy_response = await gridfs_media_response(
+                    str(media_file_id), db, request.headers.get("range")
+                )
+                if legacy_response is not None:
+                    return legacy_response
                 logger.error(
                     section=LogSection.FILES,
                     subsection=LogSubsection.FILES.GRIDFS,
@@ -279,12 +278,13 @@ async def get_question_media_secure(
                         "media_type": "video" if is_video else "image"
                     }}
                 )
+                await invalidate_question(question["_id"])
                 
                 # Также обновляем кэшированную информацию в лобби
                 if active_lobby and active_lobby.get("questions_data") and active_lobby["questions_data"].get(question_id):
 
-                    await db.lobbies.update_one(
-                        {"_id": active_lobby["_id"]},
+                    await update_lobby(
+                        active_lobby["_id"],
                         {"$set": {
                             f"questions_data.{question_id}.has_media": True,
                             f"questions_data.{question_id}.media_type": "video" if is_video else "image"
@@ -368,17 +368,7 @@ async def get_after_answer_media_secure(
     
     try:
         # Находим вопрос в базе данных - пробуем сначала как строку, потом как ObjectId
-        question = None
-        try:
-            question = await db.questions.find_one({"_id": question_id})
-        except:
-            pass
-            
-        if not question:
-            try:
-                question = await db.questions.find_one({"_id": ObjectId(question_id)})
-            except:
-                pass
+        question = await question_cache.get_question(question_id)
         
         if not question:
             logger.warning(
@@ -485,7 +475,7 @@ async def get_after_answer_media_secure(
         
         # Дополнительная проверка для экзаменационного режима
         if lobby_id:
-            lobby = await db.lobbies.find_one({"_id": lobby_id})
+            lobby = await get_lobby_from_db(lobby_id)
             if lobby and lobby.get("exam_mode", False) and lobby["status"] != "finished":
                 logger.warning(
                     section=LogSection.FILES,
@@ -508,6 +498,12 @@ async def get_after_answer_media_secure(
             # Проверяем существование файла в новой системе медиа
             file_info = await media_manager.get_media_file(str(after_answer_media_id), db)
             if not file_info:
+                # Старые файлы, ещё лежащие в GridFS, отдаются потоком частями
+                legacy_response = await gridfs_media_response(
+                    str(after_answer_media_id), db, request.headers.get("range")
+                )
+                if legacy_response is not None:
+                    return legacy_response
                 logger.error(
                     section=LogSection.FILES,
                     subsection=LogSubsection.FILES.GRIDFS,
@@ -2,12 +2,15 @@ from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from app.db.database import db
 from app.core.security import get_current_actor
 from app.core.response import success
+from app.core.question_pack import get_packed_question, get_packed_questions
+from app.core.lobby_results import participant_snapshot, answer_is_correct
+from app.multiplayer.lobby_utils import get_lobby_from_db, update_lobby, get_results_snapshot
+from app.multiplayer.lobby_scheduler import schedule_lobby
 
 from datetime import datetime, timedelta
 from typing import Dict, Any
 import json
 import time
-from bson import ObjectId
 from app.logging import get_logger, LogSection, LogSubsection
 from app.rate_limit import rate_limit_ip
 
@@ -126,7 +129,7 @@ async def get_secure_lobby(
             raise HTTPException(status_code=429, detail="Too many requests")
         
         # Get lobby
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Lobby not found")
         
@@ -242,7 +245,7 @@ async def get_secure_question(
             user_answers_dict = {}
         
         # Get lobby and validate access
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Lobby not found")
         
@@ -256,14 +259,8 @@ async def get_secure_question(
             )
             raise HTTPException(status_code=403, detail=reason)
         
-        # Get question - try both string and ObjectId
-        question = await db.questions.find_one({"_id": question_id})
-        if not question:
-            try:
-                # Try as ObjectId if string search failed
-                question = await db.questions.find_one({"_id": ObjectId(question_id)})
-            except:
-                pass
+        # Get question from the lobby question pack
+        question = await get_packed_question(lobby, question_id)
         
         if not question:
             raise HTTPException(status_code=404, detail="Question not found")
@@ -272,13 +269,13 @@ async def get_secure_question(
         
         # Prepare question data
         question_data = {
-            "_id": str(question["_id"]),
-            "question_text": question.get("question_text", {}),
-            "answers": [option["text"] for option in question.get("options", [])],
-            "has_media": question.get("has_media", False),
-            "media_filename": question.get("media_filename"),
-            "has_after_answer_media": question.get("has_after_answer_media", False),
-            "after_answer_media_filename": question.get("after_answer_media_filename")
+            "_id": question["_id"],
+            "question_text": question["question_text"],
+            "answers": question["answers"],
+            "has_media": question["has_media"],
+            "media_filename": question["media_filename"],
+            "has_after_answer_media": question["has_after_answer_media"],
+            "after_answer_media_filename": question["after_answer_media_filename"]
         }
         
         # Security: Control media access
@@ -342,7 +339,7 @@ async def submit_secure_answer(
             raise HTTPException(status_code=400, detail="Missing question_id or answer_index")
         
         # Get lobby
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Lobby not found")
         
@@ -369,8 +366,8 @@ async def submit_secure_answer(
                 )
                 raise HTTPException(status_code=400, detail="Exam time has expired")
         
-        # Получаем вопрос для проверки правильности ответа
-        question = await db.questions.find_one({"_id": ObjectId(question_id)})
+        # Получаем вопрос из пакета лобби для проверки правильности ответа
+        question = await get_packed_question(lobby, question_id)
         if not question:
             raise HTTPException(status_code=404, detail="Вопрос не найден")
 
@@ -385,8 +382,8 @@ async def submit_secure_answer(
             raise HTTPException(status_code=500, detail="Правильный ответ для данного вопроса не найден")
 
         # Проверяем валидность индекса ответа
-        if "options" in question:
-            options_count = len(question["options"])
+        if question["answers"]:
+            options_count = len(question["answers"])
             if answer_index < 0 or answer_index >= options_count:
                 logger.warning(
                     section=LogSection.LOBBY,
@@ -398,8 +395,8 @@ async def submit_secure_answer(
         is_correct = answer_index == correct_answer
 
         # Сохраняем оба типа ответов
-        await db.lobbies.update_one(
-            {"_id": lobby_id},
+        await update_lobby(
+            lobby_id,
             {
                 "$set": {
                     f"participants_raw_answers.{user_id}.{question_id}": answer_index,  # сохраняем выбранный ответ
@@ -480,7 +477,7 @@ async def get_secure_correct_answer(
             user_answers_dict = {}
         
         # Get lobby to check saved answers
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Lobby not found")
         
@@ -505,14 +502,8 @@ async def get_secure_correct_answer(
         correct_answers = lobby.get("correct_answers", {})
         correct_index = correct_answers.get(question_id, 0)
         
-        # Get question for explanation and media info
-        question = await db.questions.find_one({"_id": question_id})
-        if not question:
-            try:
-                # Try as ObjectId if string search failed
-                question = await db.questions.find_one({"_id": ObjectId(question_id)})
-            except:
-                pass
+        # Get question for explanation and media info from the lobby question pack
+        question = await get_packed_question(lobby, question_id)
         
         # Get user's answer (prefer saved data from DB, fallback to URL params)
         user_answer = user_saved_answers.get(question_id)
@@ -588,7 +579,7 @@ async def check_secure_after_media_access(
         
         # Check if user has answered this question (check both URL params and saved data)
         # Get lobby to check saved answers
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Lobby not found")
         
@@ -647,7 +638,7 @@ async def get_secure_exam_timer(
             raise HTTPException(status_code=429, detail="Too many requests")
         
         # Get lobby
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Lobby not found")
         
@@ -669,19 +660,20 @@ async def get_secure_exam_timer(
             time_left = duration
             
             # Update lobby with timer info
-            await db.lobbies.update_one(
-                {"_id": lobby_id},
+            await update_lobby(
+                lobby_id,
                 {"$set": {
                     "exam_timer_expires_at": expires_at,
                     "exam_timer_started_at": current_time,
                     "exam_timer_duration": duration
                 }}
             )
+            await schedule_lobby({**lobby, "exam_timer_expires_at": expires_at})
         
         # Auto-close if time expired
         if time_left <= 0:
-            await db.lobbies.update_one(
-                {"_id": lobby_id},
+            await update_lobby(
+                lobby_id,
                 {"$set": {"status": "finished", "finished_at": datetime.utcnow()}}
             )
             logger.warning(
@@ -728,8 +720,8 @@ async def update_secure_exam_timer(
             raise HTTPException(status_code=429, detail="Too many requests")
         
         # Update timer
-        await db.lobbies.update_one(
-            {"_id": lobby_id},
+        await update_lobby(
+            lobby_id,
             {"$set": {"exam_timer.time_left": time_left, "exam_timer.updated_at": datetime.utcnow()}}
         )
         
@@ -757,8 +749,8 @@ async def auto_close_expired_exam(
         user_id = str(current_user.get('id'))
         
         # Close lobby
-        await db.lobbies.update_one(
-            {"_id": lobby_id},
+        await update_lobby(
+            lobby_id,
             {"$set": {"status": "finished", "finished_at": datetime.utcnow()}}
         )
         
@@ -800,8 +792,8 @@ async def finish_secure_test(
             raise HTTPException(status_code=429, detail="Too many requests")
         
         # Update lobby status
-        await db.lobbies.update_one(
-            {"_id": lobby_id},
+        await update_lobby(
+            lobby_id,
             {"$set": {"status": "finished", "finished_at": datetime.utcnow()}}
         )
         
@@ -852,7 +844,7 @@ async def get_secure_test_results(
             raise HTTPException(status_code=429, detail="Too many requests")
         
         # Get lobby data
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Lobby not found")
         
@@ -928,101 +920,43 @@ async def get_secure_test_results(
         
         # Get correct answers from lobby (already converted to indices)
         correct_answers = lobby.get("correct_answers", {})
-        participants_answers = lobby.get("participants_answers", {}).get(user_id, {})
 
-        # Debug log for answers data
-        logger.info(
-            section=LogSection.LOBBY,
-            subsection=LogSubsection.LOBBY.VALIDATION,
-            message=f"Начало проверки ответов для лобби {lobby_id}. Всего вопросов: {len(question_ids)}, Отвечено: {len(user_answers)}"
-        )
+        # Итоги посчитаны один раз при завершении лобби (снимок результатов)
+        snapshot = await get_results_snapshot(lobby)
+        participant = participant_snapshot(snapshot, user_id)
+        correct_count = participant["review_correct_count"]
+        answered_count = participant["review_answered_count"]
+        category_stats = {
+            stats["category"]: {"correct": stats["correct"], "total": stats["total"]}
+            for stats in participant["categories"]
+        }
 
-        # Initialize category stats and detailed answers list
-        category_stats = {}
-        for category in lobby.get('categories', []):
-            category_stats[category] = {"correct": 0, "total": 0}
+        # Все вопросы лобби одним пакетом
+        questions = await get_packed_questions(lobby, question_ids)
 
         detailed_answers = []
-        correct_count = 0
-        answered_count = 0
-
         for i, question_id in enumerate(question_ids):
             question_id_str = str(question_id)
-            
-            # Get correct answer from lobby
             correct_answer_index = correct_answers.get(question_id_str)
-            
-            # Get user's answer
             user_answer = user_answers.get(question_id_str)
-            
-            # Get question for category tracking and details
-            question = await db.questions.find_one({"_id": question_id})
-            if not question:
-                try:
-                    question = await db.questions.find_one({"_id": ObjectId(question_id)})
-                except:
-                    question = None
-            
-            # Track category stats if question exists
-            question_category = None
-            if question:
-                question_category = question.get('category')
-                if question_category in category_stats:
-                    category_stats[question_category]["total"] += 1
-            
-            # Check if question was answered
+            question = questions.get(question_id_str)
             is_answered = user_answer is not None
-            if is_answered:
-                answered_count += 1
-            
-            # Initialize answer details
+
             answer_details = {
                 "question_id": question_id_str,
                 "question_number": i + 1,
-                "category": question_category,
+                "category": question.get('category') if question else None,
                 "is_answered": is_answered,
                 "user_answer": user_answer if is_answered else None,
                 "correct_answer": correct_answer_index,
-                "is_correct": False,
+                "is_correct": answer_is_correct(user_answer, correct_answer_index),
                 "time_spent": None  # Можно добавить, если есть данные о времени
             }
             
-            # Compare answers only if question was answered
-            if is_answered and correct_answer_index is not None:
-                try:
-                    # Convert both values to integers for comparison
-                    user_answer_int = int(user_answer)
-                    correct_answer_int = int(correct_answer_index)
-                    
-                    is_correct = user_answer_int == correct_answer_int
-                    answer_details["is_correct"] = is_correct
-                    
-                    if is_correct:
-                        correct_count += 1
-                        # Update category stats for correct answers
-                        if question_category in category_stats:
-                            category_stats[question_category]["correct"] += 1
-            
-                    # Log comparison result
-                    logger.info(
-                        section=LogSection.LOBBY,
-                        subsection=LogSubsection.LOBBY.VALIDATION,
-                        message=f"Сравнение ответов: вопрос {i+1}, правильный={correct_answer_int}, ответ пользователя={user_answer_int}, результат={'верно' if is_correct else 'неверно'}"
-                    )
-                    
-                except (ValueError, TypeError) as e:
-                    logger.warning(
-                        section=LogSection.LOBBY,
-                        subsection=LogSubsection.LOBBY.VALIDATION,
-                        message=f"Ошибка сравнения ответов для вопроса {question_id_str}: {str(e)}"
-                    )
-                    answer_details["error"] = str(e)
-            
             # Add question text if available
             if question:
                 answer_details["question_text"] = question.get("question_text", {})
             
-            # Add to detailed answers list
             detailed_answers.append(answer_details)
 
         # Log final results
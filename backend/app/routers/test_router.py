@@ -2,11 +2,11 @@ import os
 import random
 import string
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from fastapi.encoders import jsonable_encoder
 from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 import json
@@ -20,13 +20,14 @@ from app.schemas.test_schemas import (
 from app.admin.permissions import get_current_admin_user
 from app.db.database import get_database
 from app.core.media_manager import media_manager
+from app.core.question_cache import get_questions_version, invalidate_question
 import base64
 from app.core.config import settings
 from app.core.response import success
 from app.logging import get_logger, LogSection, LogSubsection
 import time
 from app.rate_limit import rate_limit_ip
-from fastapi import Request
+from fastapi import Request, Query
 
 
 load_dotenv()
@@ -305,6 +306,7 @@ async def create_question(
     try:
         result = await db.questions.insert_one(question_dict)
         question_dict["id"] = str(result.inserted_id)
+        await invalidate_question(result.inserted_id)
         
         logger.info(
             section=LogSection.TEST,
@@ -591,6 +593,7 @@ async def edit_question(
         {"uid": payload_data.question_id},
         {"$set": update_fields}
     )
+    await invalidate_question(existing_question["_id"])
     if result.modified_count == 0:
         logger.error(
             section=LogSection.DATABASE,
@@ -765,6 +768,7 @@ async def delete_question(
             {"uid": existing_question["uid"]},
             {"$set": update_fields}
         )
+    await invalidate_question(existing_question.get("_id"))
     
     if result.modified_count == 0:
         logger.error(
@@ -895,16 +899,119 @@ async def get_question_by_uid(
 
     return success(data=jsonable_encoder(question))
 
+# Поля вопроса, которые нужны списку вопросов в админке
+QUESTION_LIST_PROJECTION = {
+    "question_text": 1,
+    "options": 1,
+    "correct_label": 1,
+    "categories": 1,
+    "pdd_section_uids": 1,
+    "explanation": 1,
+    "uid": 1,
+    "created_by_name": 1,
+    "created_by_iin": 1,
+    "modified_by": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "deleted": 1,
+    "media_file_id": 1,
+    "media_filename": 1,
+    "after_answer_media_file_id": 1,
+    "after_answer_media_filename": 1,
+}
+
+
+def normalize_question_for_list(q: dict) -> dict:
+    """Приводит документ вопроса к формату списка: строковые ID, признаки медиа, MultilingualText."""
+    q["id"] = str(q["_id"])
+    del q["_id"]
+    # Convert media_file_id to string if it exists
+    if q.get("media_file_id"):
+        q["media_file_id"] = str(q["media_file_id"])
+    if q.get("after_answer_media_file_id"):
+        q["after_answer_media_file_id"] = str(q["after_answer_media_file_id"])
+        # Добавляем дополнительный ключ для совместимости
+        q["after_answer_media_id"] = str(q["after_answer_media_file_id"])
+        
+    # Добавляем признаки наличия медиа
+    q["has_media"] = bool(q.get("media_file_id") and q.get("media_filename"))
+    q["has_after_answer_media"] = bool(q.get("after_answer_media_file_id") and q.get("after_answer_media_filename"))
+    # Добавляем дополнительный ключ для совместимости
+    q["has_after_media"] = q["has_after_answer_media"]
+
+    # Преобразование данных из БД к модели MultilingualText
+    # Если данные старые (до обновления) и хранятся как строка
+    if isinstance(q.get("question_text"), str):
+        q["question_text"] = {
+            "ru": q["question_text"],
+            "kz": q["question_text"], 
+            "en": q["question_text"]
+        }
+    
+    if isinstance(q.get("explanation"), str):
+        q["explanation"] = {
+            "ru": q["explanation"],
+            "kz": q["explanation"],
+            "en": q["explanation"]
+        }
+    
+    # Обработка вариантов ответа
+    if "options" in q:
+        for option in q["options"]:
+            if isinstance(option.get("text"), str):
+                option["text"] = {
+                    "ru": option["text"],
+                    "kz": option["text"],
+                    "en": option["text"]
+                }
+
+    # Очищаем тяжелые поля, но оставляем ID медиафайлов для фронтенда
+    q.pop("media_filename", None)
+    q.pop("after_answer_media_filename", None)
+    return q
+
+
+def _encode_question_cursor(question_id) -> str:
+    """Курсор с типом BSON: "o:<hex>" для ObjectId, "s:<строка>" для строковых _id."""
+    if isinstance(question_id, ObjectId):
+        return f"o:{question_id}"
+    return f"s:{question_id}"
+
+
+def _question_cursor_condition(after: str) -> dict:
+    """
+    Условие "после курсора" в порядке сортировки BSON по _id: строки идут
+    раньше ObjectId, а $gt сравнивает только значения одного типа. Поэтому
+    после строкового курсора нужны и оставшиеся строки, и все ObjectId.
+    Курсор без префикса - старый формат (ObjectId).
+    """
+    kind, _, value = after.partition(":")
+    if not value:
+        kind, value = "o", after
+    if kind == "o":
+        if not ObjectId.is_valid(value):
+            raise HTTPException(status_code=400, detail="Некорректный курсор")
+        return {"_id": {"$gt": ObjectId(value)}}
+    if kind == "s":
+        return {"$or": [{"_id": {"$gt": value}}, {"_id": {"$type": "objectId"}}]}
+    raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
 @router.get("/all", response_model=list[dict])
 @rate_limit_ip("test_questions_list", max_requests=120, window_seconds=30)
 async def get_all_questions(
     request: Request,
+    limit: int = Query(200, ge=1, le=500, description="Размер страницы"),
+    after: Optional[str] = Query(None, description="Курсор из meta.pagination.next_cursor предыдущей страницы"),
+    category: Optional[str] = Query(None, description="Фильтр по категориям (через запятую)"),
+    section: Optional[str] = Query(None, description="Фильтр по uid разделов ПДД (через запятую)"),
     current_user: dict = Depends(get_current_admin_user),
     db=Depends(get_database)
 ):
     """
-    Возвращает все активные вопросы (без base64-медиа),
-    но с информацией о наличии медиа.
+    Возвращает страницу активных вопросов (без base64-медиа),
+    но с информацией о наличии медиа. Пагинация по _id (строковые
+    и ObjectId): следующий курсор в meta.pagination.next_cursor. Неизменившаяся страница отдаётся как 304 по ETag.
     Доступ для admin, moderator и tests_creator.
     """
     if "role" not in current_user or current_user["role"] not in {"admin", "moderator", "tests_creator"}:
@@ -915,61 +1022,35 @@ async def get_all_questions(
         )
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
+    query = {"deleted": False}
+    if after:
+        query.update(_question_cursor_condition(after))
+    # Фильтры совпадают с частичными индексами by_cat_active и by_section_active
+    for field, value in (("categories", category), ("pdd_section_uids", section)):
+        values = [item.strip() for item in (value or "").split(",") if item.strip()]
+        if values:
+            query[field] = values[0] if len(values) == 1 else {"$in": values}
+
+    # ETag: версия банка вопросов + параметры страницы
+    version = await get_questions_version()
+    etag = None
+    if version is not None:
+        etag = f'W/"q{version}-{limit}-{after or ""}-{category or ""}-{section or ""}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+
     logger.info(
         section=LogSection.TEST,
         subsection=LogSubsection.TEST.QUESTION_LOAD,
-        message=f"Пользователь {current_user.get('full_name', 'неизвестен')} (IIN: {current_user.get('iin', 'неизвестен')}) запрашивает список всех вопросов"
+        message=f"Пользователь {current_user.get('full_name', 'неизвестен')} (IIN: {current_user.get('iin', 'неизвестен')}) запрашивает страницу вопросов (после {after or 'начала'}, категория {category or 'любая'}, раздел {section or 'любой'})"
     )
 
-    cursor = db.questions.find({"deleted": False})
-    questions = []
-    async for q in cursor:
-        q["id"] = str(q["_id"])
-        del q["_id"]
-        # Convert media_file_id to string if it exists
-        if q.get("media_file_id"):
-            q["media_file_id"] = str(q["media_file_id"])
-        if q.get("after_answer_media_file_id"):
-            q["after_answer_media_file_id"] = str(q["after_answer_media_file_id"])
-            # Добавляем дополнительный ключ для совместимости
-            q["after_answer_media_id"] = str(q["after_answer_media_file_id"])
-            
-        # Добавляем признаки наличия медиа
-        q["has_media"] = bool(q.get("media_file_id") and q.get("media_filename"))
-        q["has_after_answer_media"] = bool(q.get("after_answer_media_file_id") and q.get("after_answer_media_filename"))
-        # Добавляем дополнительный ключ для совместимости
-        q["has_after_media"] = q["has_after_answer_media"]
-
-        # Преобразование данных из БД к модели MultilingualText
-        # Если данные старые (до обновления) и хранятся как строка
-        if isinstance(q.get("question_text"), str):
-            q["question_text"] = {
-                "ru": q["question_text"],
-                "kz": q["question_text"], 
-                "en": q["question_text"]
-            }
-        
-        if isinstance(q.get("explanation"), str):
-            q["explanation"] = {
-                "ru": q["explanation"],
-                "kz": q["explanation"],
-                "en": q["explanation"]
-            }
-        
-        # Обработка вариантов ответа
-        if "options" in q:
-            for option in q["options"]:
-                if isinstance(option.get("text"), str):
-                    option["text"] = {
-                        "ru": option["text"],
-                        "kz": option["text"],
-                        "en": option["text"]
-                    }
-
-        # Очищаем тяжелые поля, но оставляем ID медиафайлов для фронтенда
-        q.pop("media_filename", None)
-        q.pop("after_answer_media_filename", None)
-        questions.append(q)
+    cursor = db.questions.find(query, QUESTION_LIST_PROJECTION).sort("_id", 1).limit(limit + 1)
+    documents = await cursor.to_list(length=limit + 1)
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+    next_cursor = _encode_question_cursor(documents[-1]["_id"]) if has_more else None
+    questions = [normalize_question_for_list(q) for q in documents]
 
     logger.info(
         section=LogSection.TEST,
@@ -977,7 +1058,17 @@ async def get_all_questions(
         message=f"Возвращено {len(questions)} вопросов пользователю {current_user.get('full_name', 'неизвестен')} (IIN: {current_user.get('iin', 'неизвестен')})"
     )
 
-    return success(data=jsonable_encoder(questions))
+    response = success(
+        data=jsonable_encoder(questions),
+        pagination={
+            "limit": limit,
+            "has_more": has_more,
+            "next_cursor": next_cursor
+        }
+    )
+    if etag:
+        response.headers["ETag"] = etag
+    return response
 
 @router.get("/media/{media_id}", response_model=dict)
 @rate_limit_ip("media_download", max_requests=100, window_seconds=60)
@@ -1,10 +1,16 @@
 from fastapi import APIRouter, HTTPException, Depends, Request, Query
-from typing import Optional, List, Dict, Any
+from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 from bson import ObjectId
 from app.db.database import db
+from app.multiplayer.lobby_utils import get_lobby_from_db, get_results_snapshot
+from app.core.lobby_results import participant_snapshot, answer_is_correct
 from app.core.security import get_current_actor
 from app.core.response import success
+from app.core.question_pack import get_packed_questions
+from app.core.user_stats import (
+    get_user_stats, get_user_test_history, period_totals, period_groups, daily_buckets, accuracy_list
+)
 from app.admin.permissions import get_current_admin_user
 from app.logging import get_logger, LogSection, LogSubsection
 from app.rate_limit import rate_limit_ip
@@ -22,13 +28,23 @@ def serialize_datetime(obj):
         return [serialize_datetime(item) for item in obj]
     return obj
 
-def convert_answer_to_index(correct_answer_raw):
-    """Convert letter answer (A, B, C, D) to numeric index (0, 1, 2, 3)"""
-    if isinstance(correct_answer_raw, str):
-        letter_to_index = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
-        return letter_to_index.get(correct_answer_raw.upper(), 0)
-    else:
-        return correct_answer_raw if correct_answer_raw is not None else 0
+def _history_test_info(test: dict) -> dict:
+    """Запись истории в формате списка тестов пользователя"""
+    return {
+        "lobby_id": test["_id"],
+        "date": test.get("date"),
+        "finished_at": test.get("finished_at"),
+        "type": test["type"],
+        "categories": test.get("categories", []),
+        "sections": test.get("sections", []),
+        "total_questions": test["total_questions"],
+        "answered_questions": test["answered_questions"],
+        "correct_answers": test["correct_answers"],
+        "percentage": test["percentage"],
+        "passed": test["passed"],
+        "duration_seconds": test["duration_seconds"],
+        "completion_rate": test["completion_rate"]
+    }
 
 @router.get("/user/{user_id}/simple-stats")
 @rate_limit_ip("user_stats_simple", max_requests=120, window_seconds=30)
@@ -73,40 +89,12 @@ async def get_user_simple_stats(
             )
             raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-        # Получаем все завершенные лобби пользователя
-        user_lobbies = await db.lobbies.find({
-            "host_id": user_id,
-            "status": "finished",  # Только завершенные тесты
-            "participants": user_id  # Пользователь должен быть участником
-        }).sort("created_at", -1).to_list(None)
-        
-        # Подсчитываем статистику используя оба поля ответов
-        completed_tests = 0
-        total_score = 0
-        questions_processed = 0
-
-        for lobby in user_lobbies:
-            # Получаем ответы из обоих полей
-            user_raw_answers = lobby.get("participants_raw_answers", {}).get(user_id, {})
-            user_answers = lobby.get("participants_answers", {}).get(user_id, {})
-            
-            if user_raw_answers and user_answers:
-                completed_tests += 1
-                
-                # Получаем вопросы лобби
-                question_ids = lobby.get("question_ids", [])
-                total_questions = len(question_ids)
-                questions_processed += total_questions
-                
-                # Подсчитываем правильные ответы используя participants_answers
-                correct_count = sum(1 for is_correct in user_answers.values() if is_correct)
-                
-                # Подсчитываем процент
-                percentage = round((correct_count / total_questions * 100), 2) if total_questions > 0 else 0
-                total_score += percentage
+        # Сводная статистика ведётся при завершении лобби
+        stats = await get_user_stats(user_id)
+        completed_tests = stats.get("tests_count", 0)
 
         # Средний балл за все тесты
-        average_score = round(total_score / completed_tests, 2) if completed_tests > 0 else 0
+        average_score = round(stats.get("total_score", 0) / completed_tests, 2) if completed_tests > 0 else 0
 
         result_data = {
             "completed_tests": completed_tests,  # Завершено тестов в общем у юзера (цифры)
@@ -155,57 +143,30 @@ async def get_user_recent_tests(
             )
             raise HTTPException(status_code=403, detail="Нет доступа к статистике другого пользователя")
 
-        # Получаем все завершенные лобби пользователя за последнюю неделю
+        # Недавние тесты пользователя за последнюю неделю
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=7)
         
-        recent_lobbies = await db.lobbies.find({
-            "host_id": user_id,
-            "status": "finished",  # Только завершенные тесты
-            "participants": user_id,  # Пользователь должен быть участником
-            "created_at": {"$gte": start_date, "$lte": end_date}
-        }).sort("created_at", -1).to_list(None)
+        await get_user_stats(user_id)
+        history = await get_user_test_history(user_id, start_date, end_date)
 
-        recent_tests = []
-        
-        for lobby in recent_lobbies:
-            # Получаем ответы из обоих полей
-            user_raw_answers = lobby.get("participants_raw_answers", {}).get(user_id, {})
-            user_answers = lobby.get("participants_answers", {}).get(user_id, {})
-            
-            if user_raw_answers and user_answers:
-                lobby_id = lobby["_id"]
-                total_questions = len(lobby.get("question_ids", []))
-                answered_count = len(user_raw_answers)
-                correct_count = sum(1 for is_correct in user_answers.values() if is_correct)
-                
-                # Подсчитываем длительность
-                test_duration = 0
-                if lobby.get('created_at') and lobby.get('finished_at'):
-                    start_time = lobby['created_at']
-                    end_time = lobby['finished_at']
-                    if isinstance(start_time, str):
-                        start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                    if isinstance(end_time, str):
-                        end_time = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
-                    test_duration = int((end_time - start_time).total_seconds())
-                
-                percentage = round((correct_count / total_questions * 100), 2) if total_questions > 0 else 0
-                
-                recent_tests.append({
-                    "lobby_id": str(lobby_id),
-                    "completed_at": lobby.get('finished_at') or lobby.get('created_at'),
-                    "score": percentage,
-                    "duration": test_duration,
-                    "correct_answers": correct_count,
-                    "total_questions": total_questions,
-                    "type": "exam" if lobby.get("exam_mode", False) else "practice",
-                    "categories": lobby.get('categories', []),
-                    "sections": lobby.get('sections', []),
-                    "answered_questions": answered_count,
-                    "passed": percentage >= 70,
-                    "completion_rate": round((answered_count / total_questions * 100), 2) if total_questions > 0 else 0
-                })
+        recent_tests = [
+            {
+                "lobby_id": test["_id"],
+                "completed_at": test.get("finished_at") or test.get("date"),
+                "score": test["percentage"],
+                "duration": test["duration_seconds"],
+                "correct_answers": test["correct_answers"],
+                "total_questions": test["total_questions"],
+                "type": test["type"],
+                "categories": test.get("categories", []),
+                "sections": test.get("sections", []),
+                "answered_questions": test["answered_questions"],
+                "passed": test["passed"],
+                "completion_rate": test["completion_rate"]
+            }
+            for test in history
+        ]
 
         result_data = serialize_datetime(recent_tests)
 
@@ -251,58 +212,12 @@ async def get_user_all_tests(
             )
             raise HTTPException(status_code=403, detail="Нет доступа к статистике другого пользователя")
 
-        # Получаем только завершенные лобби пользователя
-        all_lobbies = await db.lobbies.find({
-            "host_id": user_id,
-            "status": "finished",  # Только завершенные тесты
-            "participants": user_id,  # Пользователь должен быть участником
-            "finished_at": {"$exists": True}  # Убедимся, что тест действительно завершен
-        }).sort("created_at", -1).to_list(None)
-
-        all_tests = []
-
-        for lobby in all_lobbies:
-            lobby_id = lobby["_id"]
-            
-            # Получаем ответы из обоих полей
-            user_raw_answers = lobby.get("participants_raw_answers", {}).get(user_id, {})
-            user_answers = lobby.get("participants_answers", {}).get(user_id, {})
-            
-            if user_raw_answers and user_answers:  # Проверяем наличие ответов
-                total_questions = len(lobby.get("question_ids", []))
-                answered_count = len(user_raw_answers)
-                correct_count = sum(1 for is_correct in user_answers.values() if is_correct)
-                
-                # Подсчитываем длительность
-                test_duration = 0
-                if lobby.get('created_at') and lobby.get('finished_at'):
-                    start_time = lobby['created_at']
-                    end_time = lobby['finished_at']
-                    if isinstance(start_time, str):
-                        start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                    if isinstance(end_time, str):
-                        end_time = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
-                    test_duration = int((end_time - start_time).total_seconds())
-                
-                percentage = round((correct_count / total_questions * 100), 2) if total_questions > 0 else 0
-                
-                test_info = {
-                    "lobby_id": str(lobby_id),
-                    "date": lobby.get('created_at'),
-                    "finished_at": lobby.get('finished_at'),
-                    "type": "exam" if lobby.get("exam_mode", False) else "practice",
-                    "categories": lobby.get('categories', []),
-                    "sections": lobby.get('sections', []),
-                    "total_questions": total_questions,
-                    "answered_questions": answered_count,
-                    "correct_answers": correct_count,
-                    "percentage": percentage,
-                    "passed": percentage >= 70,
-                    "duration_seconds": test_duration,
-                    "completion_rate": round((answered_count / total_questions * 100), 2) if total_questions > 0 else 0
-                }
-                
-                all_tests.append(test_info)
+        # История пройденных тестов ведётся при завершении лобби
+        await get_user_stats(user_id)
+        all_tests = [
+            _history_test_info(test)
+            for test in await get_user_test_history(user_id)
+        ]
 
         result_data = {
             "all_tests": serialize_datetime(all_tests),
@@ -343,7 +258,7 @@ async def get_secure_test_results(
         user_id = str(current_user.get('id'))
         
         # Get lobby data
-        lobby = await db.lobbies.find_one({"_id": lobby_id})
+        lobby = await get_lobby_from_db(lobby_id)
         if not lobby:
             logger.warning(
                 section=LogSection.LOBBY,
@@ -392,83 +307,44 @@ async def get_secure_test_results(
             message=f"Начало проверки ответов для лобби {lobby_id}. Всего вопросов: {len(question_ids)}, Отвечено: {len(user_raw_answers)}"
         )
 
-        answered_count = len(user_raw_answers)  # Используем raw_answers для подсчета отвеченных вопросов
+        # Итоги посчитаны один раз при завершении лобби (снимок результатов)
+        snapshot = await get_results_snapshot(lobby)
+        participant = participant_snapshot(snapshot, user_id)
+        answered_count = participant["review_answered_count"]  # Используем raw_answers для подсчета отвеченных вопросов
+        correct_count = participant["review_correct_count"]
+        category_stats = {
+            stats["category"]: {"total": stats["total"], "correct": stats["correct"]}
+            for stats in participant["categories"]
+        }
+
+        # Все вопросы лобби одним пакетом
+        questions = await get_packed_questions(lobby, question_ids)
 
         # Detailed answer analysis
         detailed_answers = []
-        correct_count = 0
-        category_stats = {}
-
         for i, question_id in enumerate(question_ids):
             question_id_str = str(question_id)
-            
-            # Get correct answer from lobby
-            correct_answer_index = correct_answers.get(question_id_str)
-            
-            # Get question details
-            question = await db.questions.find_one({"_id": question_id})
+            question = questions.get(question_id_str)
             if not question:
-                try:
-                    question = await db.questions.find_one({"_id": ObjectId(question_id)})
-                except:
-                    pass
+                continue
             
-            # Get user's answer from raw_answers
+            correct_answer_index = correct_answers.get(question_id_str)
             user_answer = user_raw_answers.get(question_id_str)
-            is_answered = user_answer is not None
-            
-            # Compare answers only if question was answered
-            is_correct = False
-            if is_answered and correct_answer_index is not None:
-                try:
-                    # Convert both values to integers for comparison
-                    user_answer_int = int(user_answer)
-                    correct_answer_int = int(correct_answer_index)
-                    is_correct = user_answer_int == correct_answer_int
-                    
-                    if is_correct:
-                        correct_count += 1
-                        
-                    # Log comparison result
-                    logger.info(
-                        section=LogSection.LOBBY,
-                        subsection=LogSubsection.LOBBY.VALIDATION,
-                        message=f"Сравнение ответов: вопрос {i+1}, правильный={correct_answer_int}, ответ пользователя={user_answer_int}, результат={'верно' if is_correct else 'неверно'}"
-                    )
-                    
-                except (ValueError, TypeError) as e:
-                    logger.warning(
-                        section=LogSection.LOBBY,
-                        subsection=LogSubsection.LOBBY.VALIDATION,
-                        message=f"Ошибка сравнения ответов для вопроса {question_id_str}: {str(e)}"
-                    )
             
-            if question:
-                # Category analysis
-                question_categories = question.get('categories', [])
-                for cat in question_categories:
-                    if cat not in category_stats:
-                        category_stats[cat] = {"total": 0, "correct": 0}
-                    category_stats[cat]["total"] += 1
-                    if is_correct:
-                        category_stats[cat]["correct"] += 1
-                
-                # Question details
-                question_detail = {
-                    "question_number": i + 1,
-                    "question_id": question_id_str,
-                    "question_text": question.get('question_text', {}),
-                    "options": [opt.get('text', {}) for opt in question.get('options', [])],
-                    "correct_answer_index": correct_answer_index,  # Use correct answer from lobby
-                    "user_answer_index": user_answer,
-                    "is_answered": is_answered,
-                    "is_correct": is_correct,
-                    "categories": question_categories,
-                    "explanation": question.get('explanation', {}),
-                    "has_media": question.get('has_media', False),
-                    "has_after_answer_media": question.get('has_after_answer_media', False)
-                }
-                detailed_answers.append(question_detail)
+            detailed_answers.append({
+                "question_number": i + 1,
+                "question_id": question_id_str,
+                "question_text": question.get('question_text', {}),
+                "options": question.get('answers', []),
+                "correct_answer_index": correct_answer_index,  # Use correct answer from lobby
+                "user_answer_index": user_answer,
+                "is_answered": user_answer is not None,
+                "is_correct": answer_is_correct(user_answer, correct_answer_index),
+                "categories": question.get('categories', []),
+                "explanation": question.get('explanation', {}),
+                "has_media": question.get('has_media', False),
+                "has_after_answer_media": question.get('has_after_answer_media', False)
+            })
 
         # Log final results
         logger.info(
@@ -744,132 +620,31 @@ async def get_user_test_stats(
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
 
-        # Получаем только завершенные лобби пользователя
-        user_lobbies = await db.lobbies.find({
-            "host_id": user_id,
-            "status": "finished",  # Только завершенные тесты
-            "participants": user_id,  # Пользователь должен быть участником
-            "created_at": {"$gte": start_date, "$lte": end_date}
-        }).sort("created_at", -1).to_list(None)
-
-        # Инициализация статистики
-        total_tests = len(user_lobbies)
-        completed_tests = total_tests  # Все тесты завершены
-        total_score = 0
-        total_questions_answered = 0
-        total_questions_total = 0
-        exam_tests = 0
-        practice_tests = 0
-        passed_tests = 0
-        
-        # Статистика по категориям
-        category_stats = {}
-        
-        # Недавние тесты (последние 10)
-        recent_tests = []
-        
-        # Статистика по дням
-        daily_stats = {}
-
-        # Обрабатываем каждое лобби
-        for lobby in user_lobbies:
-            lobby_id = lobby["_id"]
-            is_exam = lobby.get("exam_mode", False)
-            
-            if is_exam:
-                exam_tests += 1
-            else:
-                practice_tests += 1
-                
-            # Получаем ответы из обоих полей
-            user_raw_answers = lobby.get("participants_raw_answers", {}).get(user_id, {})
-            user_answers = lobby.get("participants_answers", {}).get(user_id, {})
-            
-            if user_raw_answers and user_answers:
-                # Получаем вопросы лобби
-                total_questions = len(lobby.get("question_ids", []))
-                answered_count = len(user_raw_answers)
-                correct_count = sum(1 for is_correct in user_answers.values() if is_correct)
-                
-                total_questions_answered += answered_count
-                total_questions_total += total_questions
-                
-                # Подсчитываем процент
-                percentage = round((correct_count / total_questions * 100), 2) if total_questions > 0 else 0
-                total_score += percentage
-                
-                if percentage >= 70:
-                    passed_tests += 1
-                
-                # Добавляем в недавние тесты
-                if len(recent_tests) < 10:
-                    test_duration = 0
-                    if lobby.get('created_at') and lobby.get('finished_at'):
-                        start_time = lobby['created_at']
-                        end_time = lobby['finished_at']
-                        if isinstance(start_time, str):
-                            start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                        if isinstance(end_time, str):
-                            end_time = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
-                        test_duration = int((end_time - start_time).total_seconds())
-                    
-                    recent_tests.append({
-                        "lobby_id": str(lobby_id),
-                        "date": lobby.get('created_at'),
-                        "finished_at": lobby.get('finished_at'),
-                        "type": "exam" if is_exam else "practice",
-                        "categories": lobby.get('categories', []),
-                        "sections": lobby.get('sections', []),
-                        "total_questions": total_questions,
-                        "answered_questions": answered_count,
-                        "correct_answers": correct_count,
-                        "percentage": percentage,
-                        "passed": percentage >= 70,
-                        "duration_seconds": test_duration,
-                        "completion_rate": round((answered_count / total_questions * 100), 2) if total_questions > 0 else 0
-                    })
-                
-                # Статистика по дням
-                test_date = lobby.get('created_at')
-                if test_date:
-                    if isinstance(test_date, str):
-                        test_date = datetime.fromisoformat(test_date.replace('Z', '+00:00'))
-                    date_key = test_date.strftime('%Y-%m-%d')
-                    
-                    if date_key not in daily_stats:
-                        daily_stats[date_key] = {
-                            "tests_count": 0,
-                            "total_score": 0,
-                            "completed_tests": 0,
-                            "passed_tests": 0
-                        }
-                    
-                    daily_stats[date_key]["tests_count"] += 1
-                    daily_stats[date_key]["total_score"] += percentage
-                    daily_stats[date_key]["completed_tests"] += 1
-                    if percentage >= 70:
-                        daily_stats[date_key]["passed_tests"] += 1
+        # Сводная статистика ведётся при завершении лобби: период считается по дневным корзинам
+        stats = await get_user_stats(user_id)
+        totals = period_totals(stats, start_date, end_date)
 
-        # Финализируем статистику по категориям
-        for cat in category_stats:
-            if category_stats[cat]["total_questions"] > 0:
-                category_stats[cat]["percentage"] = round(
-                    (category_stats[cat]["correct_answers"] / category_stats[cat]["total_questions"] * 100), 2
-                )
-            else:
-                category_stats[cat]["percentage"] = 0
+        completed_tests = totals["tests_count"]
+        total_tests = completed_tests  # Все тесты завершены
+        passed_tests = totals["passed_tests"]
+        total_questions_answered = totals["answered_questions"]
 
         # Средний балл за все тесты
-        average_score = round(total_score / completed_tests, 2) if completed_tests > 0 else 0
-        
+        average_score = round(totals["total_score"] / completed_tests, 2) if completed_tests > 0 else 0
+
         # Общий процент правильных ответов
         overall_accuracy = 0
         if total_questions_answered > 0:
-            total_correct = sum(test["correct_answers"] for test in recent_tests)
-            overall_accuracy = round((total_correct / total_questions_answered * 100), 2)
+            overall_accuracy = round((totals["correct_answers"] / total_questions_answered * 100), 2)
+
+        # Недавние тесты (последние 10)
+        recent_tests = [
+            _history_test_info(test)
+            for test in await get_user_test_history(user_id, start_date, end_date, limit=10)
+        ]
 
         # Статистика прогресса
-        progress_stats = await calculate_progress_stats(user_id, end_date)
+        progress_stats = calculate_progress_stats(user_id, stats, end_date)
 
         # Формируем результат
         result_data = {
@@ -892,31 +667,25 @@ async def get_user_test_stats(
                 "pass_rate": round((passed_tests / completed_tests * 100), 2) if completed_tests > 0 else 0,
                 "average_score": average_score,
                 "overall_accuracy": overall_accuracy,
-                "exam_tests": exam_tests,
-                "practice_tests": practice_tests,
+                "exam_tests": totals["exam_tests"],
+                "practice_tests": totals["practice_tests"],
                 "total_questions_answered": total_questions_answered,
-                "total_questions_available": total_questions_total
+                "total_questions_available": totals["total_questions"]
             },
-            "category_performance": [
-                {
-                    "category": cat,
-                    "total_questions": stats["total_questions"],
-                    "correct_answers": stats["correct_answers"],
-                    "percentage": stats["percentage"]
-                }
-                for cat, stats in sorted(category_stats.items(), key=lambda x: x[1]["percentage"], reverse=True)
-            ],
+            # Точность по категориям и разделам ПДД за тот же период
+            "category_performance": accuracy_list(period_groups(stats, "categories", start_date, end_date), "category"),
+            "pdd_section_performance": accuracy_list(period_groups(stats, "pdd_sections", start_date, end_date), "section"),
             "recent_tests": serialize_datetime(recent_tests),
             "daily_stats": [
                 {
                     "date": date,
-                    "tests_count": stats["tests_count"],
-                    "average_score": round(stats["total_score"] / stats["completed_tests"], 2) if stats["completed_tests"] > 0 else 0,
-                    "completed_tests": stats["completed_tests"],
-                    "passed_tests": stats["passed_tests"],
-                    "pass_rate": round((stats["passed_tests"] / stats["completed_tests"] * 100), 2) if stats["completed_tests"] > 0 else 0
+                    "tests_count": bucket["tests_count"],
+                    "average_score": round(bucket["total_score"] / bucket["tests_count"], 2) if bucket["tests_count"] > 0 else 0,
+                    "completed_tests": bucket["tests_count"],
+                    "passed_tests": bucket["passed_tests"],
+                    "pass_rate": round((bucket["passed_tests"] / bucket["tests_count"] * 100), 2) if bucket["tests_count"] > 0 else 0
                 }
-                for date, stats in sorted(daily_stats.items(), reverse=True)
+                for date, bucket in sorted(daily_buckets(stats, start_date, end_date).items(), reverse=True)
             ],
             "progress": progress_stats
         }
@@ -942,31 +711,19 @@ async def get_user_test_stats(
         )
         raise HTTPException(status_code=500, detail="Ошибка получения статистики")
 
-async def calculate_progress_stats(user_id: str, current_date: datetime) -> Dict[str, Any]:
-    """Подсчет статистики прогресса пользователя за последние 2 недели"""
+def calculate_progress_stats(user_id: str, stats: dict, current_date: datetime) -> Dict[str, Any]:
+    """Подсчет статистики прогресса пользователя за последние 2 недели по дневным корзинам сводки"""
     try:
-        # Последние 7 дней
-        recent_start = current_date - timedelta(days=7)
+        # Последние 7 дней (включая текущий)
+        recent_start = current_date - timedelta(days=6)
         recent_end = current_date
-        
-        # Предыдущие 7 дней
-        previous_start = current_date - timedelta(days=14)
-        previous_end = recent_start
 
-        # Получаем лобби за оба периода
-        recent_lobbies = await db.lobbies.find({
-            "creator_id": user_id,
-            "created_at": {"$gte": recent_start, "$lte": recent_end}
-        }).to_list(None)
-
-        previous_lobbies = await db.lobbies.find({
-            "creator_id": user_id,
-            "created_at": {"$gte": previous_start, "$lte": previous_end}
-        }).to_list(None)
+        # Предыдущие 7 дней
+        previous_start = current_date - timedelta(days=13)
+        previous_end = current_date - timedelta(days=7)
 
-        # Подсчитываем статистику для каждого периода
-        recent_stats = await calculate_period_stats(user_id, recent_lobbies)
-        previous_stats = await calculate_period_stats(user_id, previous_lobbies)
+        recent_stats = calculate_period_stats(period_totals(stats, recent_start, recent_end))
+        previous_stats = calculate_period_stats(period_totals(stats, previous_start, previous_end))
 
         # Подсчитываем изменения в процентах
         def calculate_change(current, previous):
@@ -1007,68 +764,16 @@ async def calculate_progress_stats(user_id: str, current_date: datetime) -> Dict
             "changes": {"tests_completed_change": 0, "average_score_change": 0, "questions_answered_change": 0, "passed_tests_change": 0}
         }
 
-async def calculate_period_stats(user_id: str, lobbies: List[Dict]) -> Dict[str, float]:
-    """Подсчет статистики за определенный период"""
-    if not lobbies:
-        return {"completed": 0, "avg_score": 0, "total_questions": 0, "passed": 0}
-
-    # Получаем ответы пользователя для этих лобби
-    lobby_ids = [lobby["_id"] for lobby in lobbies]
-    user_answers = await db.user_answers.find({
-        "user_id": user_id,
-        "lobby_id": {"$in": lobby_ids}
-    }).to_list(None)
-
-    answers_by_lobby = {ans["lobby_id"]: ans for ans in user_answers}
-
-    completed_tests = 0
-    total_score = 0
-    total_questions = 0
-    passed_tests = 0
-
-    for lobby in lobbies:
-        lobby_id = lobby["_id"]
-        lobby_answers = answers_by_lobby.get(lobby_id)
-        
-        if lobby_answers:
-            completed_tests += 1
-            
-            question_ids = lobby.get("question_ids", [])
-            answers = lobby_answers.get("answers", {})
-            total_questions += len(answers)
-            
-            correct_count = 0
-            
-            for question_id in question_ids:
-                question_id_str = str(question_id)
-                
-                question = await db.questions.find_one({"_id": question_id})
-                if not question:
-                    try:
-                        question = await db.questions.find_one({"_id": ObjectId(question_id)})
-                    except:
-                        continue
-                
-                if question:
-                    correct_answer_index = convert_answer_to_index(question.get('correct_answer', 'A'))
-                    user_answer = answers.get(question_id_str)
-                    
-                    if user_answer == correct_answer_index:
-                        correct_count += 1
-            
-            percentage = round((correct_count / len(question_ids) * 100), 2) if question_ids else 0
-            total_score += percentage
-            
-            if percentage >= 70:
-                passed_tests += 1
-
-    avg_score = round(total_score / completed_tests, 2) if completed_tests > 0 else 0
+def calculate_period_stats(totals: Dict[str, float]) -> Dict[str, float]:
+    """Подсчет статистики за определенный период из суммы дневных корзин"""
+    completed_tests = totals["tests_count"]
+    avg_score = round(totals["total_score"] / completed_tests, 2) if completed_tests > 0 else 0
 
     return {
         "completed": completed_tests,
         "avg_score": avg_score,
-        "total_questions": total_questions,
-        "passed": passed_tests
+        "total_questions": totals["answered_questions"],
+        "passed": totals["passed_tests"]
     }
 
 @router.get("/admin/global-stats")
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi.responses import StreamingResponse
 from app.core.security import get_current_actor
 from app.db.database import get_database
 from app.core.response import success
@@ -6,9 +7,13 @@ from app.logging import get_logger, LogSection, LogSubsection
 from app.core.finance import get_user_balance, credit_user_balance, debit_user_balance
 from bson import ObjectId
 from datetime import datetime
+from typing import AsyncIterator, Optional
 from app.rate_limit import rate_limit_ip
 import traceback
 import sys
+import csv
+import io
+import json
 
 router = APIRouter()
 logger = get_logger(__name__)
@@ -125,10 +130,102 @@ async def get_balance(
         )
 
 # 📊 Просмотр всех транзакций
+# Порядок журнала: новые первыми; _id различает транзакции с одинаковым временем
+TRANSACTION_SORT = [("created_at", -1), ("_id", -1)]
+CSV_COLUMNS = [
+    "_id", "created_at", "user_id", "type", "amount", "description",
+    "referred_user_id", "subscription_type", "promo_code"
+]
+EXPORT_BATCH_SIZE = 1000
+
+
+def serialize_transaction(transaction: dict) -> dict:
+    """ObjectId и datetime транзакции - в строки для JSON."""
+    for key, value in transaction.items():
+        if isinstance(value, ObjectId):
+            transaction[key] = str(value)
+        elif isinstance(value, datetime):
+            transaction[key] = value.isoformat()
+    return transaction
+
+
+def build_transactions_query(
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    transaction_type: Optional[str],
+    user_id: Optional[str]
+) -> dict:
+    query = {}
+    if date_from or date_to:
+        query["created_at"] = {}
+        if date_from:
+            query["created_at"]["$gte"] = date_from
+        if date_to:
+            query["created_at"]["$lte"] = date_to
+    if transaction_type:
+        query["type"] = transaction_type
+    if user_id:
+        if not ObjectId.is_valid(user_id):
+            raise HTTPException(status_code=400, detail={"message": "Неверный ID пользователя"})
+        query["user_id"] = ObjectId(user_id)
+    return query
+
+
+def encode_keyset_cursor(transaction: dict) -> str:
+    """Курсор по сериализованной транзакции; без created_at - '_<_id>'."""
+    return f"{transaction.get('created_at') or ''}_{transaction['_id']}"
+
+
+def keyset_condition(cursor: str) -> dict:
+    """
+    Курсор '<created_at ISO>_<_id>' последней транзакции предыдущей страницы.
+    Транзакции без created_at при сортировке по убыванию идут последними,
+    поэтому после любой даты в выборку входят и они.
+    """
+    try:
+        created_at_raw, transaction_id = cursor.rsplit("_", 1)
+        created_at = datetime.fromisoformat(created_at_raw) if created_at_raw else None
+        transaction_oid = ObjectId(transaction_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail={"message": "Некорректный курсор"})
+    if created_at is None:
+        return {"created_at": None, "_id": {"$lt": transaction_oid}}
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": transaction_oid}},
+        {"created_at": None}
+    ]}
+
+
+async def stream_transactions_ndjson(rows) -> AsyncIterator[bytes]:
+    async for transaction in rows:
+        yield (json.dumps(serialize_transaction(transaction), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def stream_transactions_csv(rows) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    async for transaction in rows:
+        writer.writerow(serialize_transaction(transaction))
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
 @router.get("/transactions", response_model=list)
 @rate_limit_ip("transactions_list", max_requests=30, window_seconds=60)
 async def get_all_transactions(
     request: Request,
+    limit: int = Query(100, ge=1, le=1000, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из meta.pagination.next_cursor"),
+    date_from: Optional[datetime] = Query(None, description="Начало периода (created_at)"),
+    date_to: Optional[datetime] = Query(None, description="Конец периода (created_at)"),
+    type: Optional[str] = Query(None, description="Тип транзакции"),
+    user_id: Optional[str] = Query(None, description="ID пользователя"),
+    format: str = Query("json", pattern="^(json|ndjson|csv)$", description="json - страница, ndjson/csv - потоковый экспорт"),
     db=Depends(get_database),
     current_user=Depends(get_current_actor)
 ):
@@ -174,27 +271,33 @@ async def get_all_transactions(
             message=f"Запрос списка всех транзакций администратором {current_user.get('full_name', current_user.get('id'))} с IP {request.client.host}"
         )
 
-        transactions = []
-        try:
-            async for transaction in db.transactions.find():
-                try:
-                    transaction["_id"] = str(transaction["_id"])
-                    transaction["user_id"] = str(transaction["user_id"])
-                    
-                    # Преобразование всех объектов datetime в строки
-                    for key, value in transaction.items():
-                        if isinstance(value, datetime):
-                            transaction[key] = value.isoformat()
-
-                    transactions.append(transaction)
-                except Exception as e:
-                    logger.warning(
-                        section=LogSection.SYSTEM,
-                        subsection=LogSubsection.SYSTEM.DATA_PROCESSING,
-                        message=f"Ошибка обработки транзакции {transaction.get('_id', 'Unknown')}: {str(e)}"
-                    )
-                    continue
+        query = build_transactions_query(date_from, date_to, type, user_id)
+        if cursor:
+            query = {"$and": [query, keyset_condition(cursor)]}
+
+        # Экспорт: строки пишутся по мере чтения курсора, память не зависит от размера журнала
+        if format in {"ndjson", "csv"}:
+            rows = db.transactions.find(query).sort(TRANSACTION_SORT).batch_size(EXPORT_BATCH_SIZE)
+            logger.info(
+                section=LogSection.ADMIN,
+                subsection=LogSubsection.ADMIN.LIST_ACCESS,
+                message=f"Экспорт транзакций в {format} администратором {current_user.get('full_name', current_user.get('id'))}"
+            )
+            if format == "csv":
+                return StreamingResponse(
+                    stream_transactions_csv(rows),
+                    media_type="text/csv; charset=utf-8",
+                    headers={"Content-Disposition": 'attachment; filename="transactions.csv"'}
+                )
+            return StreamingResponse(
+                stream_transactions_ndjson(rows),
+                media_type="application/x-ndjson",
+                headers={"Content-Disposition": 'attachment; filename="transactions.ndjson"'}
+            )
 
+        try:
+            rows = db.transactions.find(query).sort(TRANSACTION_SORT).limit(limit + 1)
+            transactions = [serialize_transaction(transaction) async for transaction in rows]
         except Exception as e:
             logger.error(
                 section=LogSection.SYSTEM,
@@ -206,12 +309,21 @@ async def get_all_transactions(
                 detail={"message": "Ошибка при получении данных"}
             )
 
+        has_more = len(transactions) > limit
+        transactions = transactions[:limit]
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_keyset_cursor(transactions[-1])
+
         logger.info(
             section=LogSection.ADMIN,
             subsection=LogSubsection.ADMIN.LIST_ACCESS,
-            message=f"Получен список всех транзакций администратором {current_user.get('full_name', current_user.get('id'))}: найдено {len(transactions)} транзакций"
+            message=f"Получена страница транзакций администратором {current_user.get('full_name', current_user.get('id'))}: {len(transactions)} транзакций"
+        )
+        return success(
+            data=transactions,
+            pagination={"limit": limit, "has_more": has_more, "next_cursor": next_cursor}
         )
-        return success(data=transactions)
 
     except HTTPException:
         raise
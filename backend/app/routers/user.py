@@ -13,10 +13,11 @@ from fastapi.security import HTTPBearer
 from app.db.database import db
 from app.schemas.user_schemas import UserOut, UserUpdate
 from app.core.security import get_current_actor
+from app.core.auth_cache import auth_cache
+from app.core.user_search import build_user_search_filters, rank_user, SEARCH_CANDIDATES
 from app.db.database import get_database
 from datetime import datetime, timedelta
 from app.core.response import success
-import re
 from fastapi.encoders import jsonable_encoder
 from app.schemas.subscription_schemas import SubscriptionCreate, GiftSubscriptionCreate, IssuedBy, PaymentInfo
 from app.schemas.promo_code_schemas import PromoCodeActivate, PromoCodeCreate, PromoCodeOut, PromoCodeAdminUpdate
@@ -316,33 +317,9 @@ async def search_users_by_query(
             detail={"message": "Поисковый запрос не может быть пустым"}
         )
     
-    # Безопасно проверяем, является ли запрос ObjectId
-    is_valid_object_id = False
-    try:
-        if ObjectId.is_valid(sanitized_query):
-            is_valid_object_id = True
-    except Exception:
-        is_valid_object_id = False
-    
-    # Строим безопасный поисковый фильтр
-    filters = []
-    
-    # Добавляем безопасные поисковые условия
-    if is_valid_object_id:
-        filters.append({"_id": ObjectId(sanitized_query)})
-    
-    # Эскейпим регулярные выражения для предотвращения ReDoS атак
-    regex_pattern = re.escape(sanitized_query)
-    
-    # Безопасно добавляем остальные фильтры
-    filters.extend([
-        {"iin": sanitized_query},
-        {"email": sanitized_query},
-        {"phone": sanitized_query},
-        {"full_name": {"$regex": regex_pattern, "$options": "i"}},
-        {"referred_by": sanitized_query},
-        {"referral_code": sanitized_query}  # Добавляем поиск по реферальному коду
-    ])
+    # Только точные совпадения и префиксы с якорем ^ (регулярные выражения
+    # экранированы): каждая ветка $or обслуживается индексом
+    filters = build_user_search_filters(sanitized_query)
     
     logger.info(
         section=LogSection.ADMIN,
@@ -352,14 +329,16 @@ async def search_users_by_query(
     
     try:
         # Ограничиваем выборку и устанавливаем таймаут для защиты от DoS
-        cursor = db.users.find({"$or": filters}).limit(50).max_time_ms(5000)
+        candidates = await db.users.find({"$or": filters}).limit(SEARCH_CANDIDATES).max_time_ms(5000).to_list(None)
+        # Ранжирование: точные совпадения, затем префиксы ИИН/телефона/email, затем ФИО
+        candidates.sort(key=lambda user: rank_user(user, sanitized_query), reverse=True)
         results = []
         
         now = datetime.utcnow()
         user_cache = {}
         
         # Оптимизированный сбор данных пользователей
-        async for user in cursor:
+        for user in candidates[:50]:
             user_id = user.pop("_id", None)
             user_id_str = str(user_id) if user_id else None
             
@@ -912,6 +891,10 @@ async def purchase_subscription(
                     transaction_doc["subscription_id"] = subscription_id
                     await db.transactions.insert_one(transaction_doc, session=session)
 
+        if sub_data.use_balance:
+            # Баланс хранится в закэшированном principal
+            await auth_cache.invalidate_user(user_id)
+
         # Реферальный бонус
         background_tasks.add_task(
             process_referral,
@@ -1152,6 +1135,7 @@ async def purchase_gift_subscription(
                 }
                 
                 await db.transactions.insert_one(transaction, session=session)
+        await auth_cache.invalidate_user(user_id)
         
         # Обработка реферальной системы через finance.process_referral
         description = f"Реферальный бонус за покупку подарочной подписки {gift_data.subscription_type}"
@@ -1292,6 +1276,7 @@ async def purchase_promo_code(
                     "promo_code":  code
                 }
                 await db.transactions.insert_one(txn, session=session)
+        await auth_cache.invalidate_user(user_id)
 
         logger.info(
             section=LogSection.PAYMENT,
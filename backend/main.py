@@ -15,7 +15,6 @@ from starlette.status import (
     HTTP_500_INTERNAL_SERVER_ERROR,
 )
 from aiogram import Dispatcher
-from datetime import datetime, timedelta
 
 from app.logging import setup_application_logging, get_logger, LogSection, LogSubsection, close_all_rabbitmq_connections
 from app.core.security import security_background_tasks
@@ -51,6 +50,10 @@ from app.multiplayer import (
     next_question_router,
     leave_router
 )
+from app.multiplayer.lobby_scheduler import lobby_scheduler
+from app.core.auth_cache import auth_cache, activity_recorder
+from app.core.user_search import backfill_name_search_fields
+from app.core.media_migration import media_migrator
 from app.db.database import db, create_database_indexes
 
 # Инициализация новой структурированной системы логирования
@@ -207,103 +210,6 @@ async def general_exception_handler(request: Request, exc: Exception):
     return error(code=500, message="Internal Server Error", details=str(exc))
 
 
-async def check_stalled_lobbies():
-    """Автоматически завершает зависшие тесты"""
-    logger.info(
-        section=LogSection.SYSTEM,
-        subsection=LogSubsection.SYSTEM.MAINTENANCE,
-        message="Запуск задачи проверки зависших лобби"
-    )
-    while True:
-        try:
-            # Ищем лобби, которые в статусе in_progress более 2 часов
-            two_hours_ago = datetime.utcnow() - timedelta(hours=2)
-            
-            stalled_lobbies = await db.lobbies.find({
-                "status": "in_progress",
-                "created_at": {"$lt": two_hours_ago}
-            }).to_list(length=100)
-            
-            for lobby in stalled_lobbies:
-                lobby_id = lobby["_id"]
-                
-                logger.info(
-                    section=LogSection.SYSTEM,
-                    subsection=LogSubsection.SYSTEM.CLEANUP,
-                    message=f"Автоматическое завершение зависшего лобби {lobby_id}"
-                )
-                
-                # Подсчитываем результаты
-                results = {}
-                total_questions = len(lobby.get("question_ids", []))
-                for participant_id, answers in lobby.get("participants_answers", {}).items():
-                    correct_count = sum(1 for is_corr in answers.values() if is_corr)
-                    results[participant_id] = {"correct": correct_count, "total": total_questions}
-                    
-                    # Сохраняем историю
-                    history_record = {
-                        "user_id": participant_id,
-                        "lobby_id": lobby_id,
-                        "date": datetime.utcnow(),
-                        "score": correct_count,
-                        "total": total_questions,
-                        "categories": lobby.get("categories", []),
-                        "sections": lobby.get("sections", []),
-                        "mode": lobby.get("mode", "solo"),
-                        "pass_percentage": (correct_count / total_questions * 100) if total_questions > 0 else 0,
-                        "auto_finished": True
-                    }
-                    await db.history.insert_one(history_record)
-                
-                # Отмечаем лобби как завершенное
-                await db.lobbies.update_one(
-                    {"_id": lobby_id},
-                    {"$set": {
-                        "status": "finished",
-                        "finished_at": datetime.utcnow(),
-                        "auto_finished": True
-                    }}
-                )
-                
-                logger.info(
-                    section=LogSection.SYSTEM,
-                    subsection=LogSubsection.SYSTEM.CLEANUP,
-                    message=f"Лобби {lobby_id} отмечено как автоматически завершенное"
-                )
-
-                # Формируем JSON-сообщение о завершении
-                finish_payload = {
-                    "type": "test_finished",
-                    "data": {
-                        "results": results,
-                        "auto_finished": True,
-                        "reason": "stalled_lobby_timeout"
-                    }
-                }
-
-                # Рассылаем JSON всем участникам (любой режим)
-                try:
-                    # The original code had ws_manager.broadcast_to_lobby(lobby_id, finish_payload)
-                    # ws_manager is no longer imported, so this line is removed.
-                    # If WebSocket communication is still needed, it must be re-implemented.
-                    pass # Placeholder for future WebSocket communication
-                except Exception as ws_err:
-                    logger.error(
-                        section=LogSection.WEBSOCKET,
-                        subsection=LogSubsection.WEBSOCKET.ERROR,
-                        message=f"Ошибка WebSocket рассылки для зависшего лобби {lobby_id}: {str(ws_err)}"
-                    )
-
-        except Exception as e:
-            logger.error(
-                section=LogSection.SYSTEM,
-                subsection=LogSubsection.SYSTEM.CLEANUP,
-                message=f"Ошибка проверки зависших лобби: {str(e)}"
-            )
-        
-        # Проверяем раз в 30 минут
-        await asyncio.sleep(1800)
-
 @app.on_event("startup")
 async def startup_event():
     """Запускается при старте приложения"""
@@ -354,7 +260,15 @@ async def startup_event():
     
     # Запускаем фоновые задачи
     asyncio.create_task(security_background_tasks())
-    asyncio.create_task(check_stalled_lobbies())
+    # Планировщик дедлайнов лобби: запускается в каждом воркере, работает только в лидере
+    asyncio.create_task(lobby_scheduler.run())
+    # Сброс кэша авторизации из других воркеров и пакетная запись меток активности
+    asyncio.create_task(auth_cache.listen_invalidations())
+    asyncio.create_task(activity_recorder.run())
+    # Поля поиска по ФИО для пользователей, зарегистрированных до их появления
+    asyncio.create_task(backfill_name_search_fields())
+    # Перенос старых медиафайлов из GridFS в хранилище, которое отдаёт nginx
+    asyncio.create_task(media_migrator.run())
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -364,6 +278,9 @@ async def shutdown_event():
         message="Завершение работы приложения Royal API"
     )
     
+    # Дописываем накопленные метки активности токенов
+    await activity_recorder.flush()
+    
     # Закрываем RabbitMQ соединения
     try:
         await close_all_rabbitmq_connections()
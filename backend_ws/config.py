@@ -17,6 +17,22 @@ class Settings:
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
     REDIS_PASSWORD: str = os.getenv("REDIS_PASSWORD", "Royal_Redis_1337")
     REDIS_MULTIPLAYER_DB: int = int(os.getenv("REDIS_MULTIPLAYER_DB", 2))
+    # Канал Redis для синхронизации комнат и emit между воркерами Socket.IO
+    SOCKETIO_REDIS_CHANNEL: str = os.getenv("SOCKETIO_REDIS_CHANNEL", "royal_socketio")
+    # Redis Stream событий лобби, которые публикует backend, и группа потребителей WS-сервиса
+    LOBBY_EVENTS_STREAM: str = os.getenv("LOBBY_EVENTS_STREAM", "lobby_events")
+    LOBBY_EVENTS_GROUP: str = os.getenv("LOBBY_EVENTS_GROUP", "backend_ws")
+    # Поток делится на шарды по lobby_id (должно совпадать с backend); каждый шард
+    # читает один воркер, поэтому события одного лобби рассылаются по порядку
+    LOBBY_EVENTS_SHARDS: int = int(os.getenv("LOBBY_EVENTS_SHARDS", 8))
+    # Срок аренды шарда воркером (мс): после падения воркера шард переходит другому
+    LOBBY_EVENTS_LEASE_MS: int = int(os.getenv("LOBBY_EVENTS_LEASE_MS", 10000))
+    
+    # Logging settings
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    # Логи Socket.IO/Engine.IO пишут строку на каждый пакет и ping; включать только для отладки
+    SOCKETIO_LOGGER: bool = os.getenv("SOCKETIO_LOGGER", "false").lower() == "true"
+    ENGINEIO_LOGGER: bool = os.getenv("ENGINEIO_LOGGER", "false").lower() == "true"
     
     # Security settings
     SECRET_KEY: str = os.getenv("SECRET_KEY")
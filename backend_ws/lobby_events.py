@@ -0,0 +1,204 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+
+import redis.asyncio as redis
+from config import settings
+from redis_client import redis_client
+from socket_manager import sio, presence_key
+
+NAMESPACE = '/ws'
+# Сколько событий забирать за одно чтение и сколько ждать новых (мс)
+READ_COUNT = 100
+READ_BLOCK_MS = 5000
+# Пауза перед повтором после ошибки Redis (сек)
+RETRY_DELAY_SECONDS = 2
+# События, после которых комната лобби больше не нужна
+ROOM_CLOSING_EVENTS = ('lobby_closed',)
+
+logger = logging.getLogger("ws.lobby_events")
+
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def shard_stream(shard: int) -> str:
+    return f"{settings.LOBBY_EVENTS_STREAM}:{shard}"
+
+
+def _lease_key(shard: int) -> str:
+    return f"{settings.LOBBY_EVENTS_STREAM}:lease:{shard}"
+
+
+def _workers_key() -> str:
+    return f"{settings.LOBBY_EVENTS_STREAM}:workers"
+
+
+def _worker_id() -> str:
+    """Уникальный идентификатор процесса воркера: владелец аренды шардов."""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+async def _ensure_group(redis_conn: redis.Redis, stream: str):
+    """Создает группу потребителей (и сам поток), если их ещё нет."""
+    try:
+        await redis_conn.xgroup_create(stream, settings.LOBBY_EVENTS_GROUP, id='$', mkstream=True)
+    except redis.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+async def dispatch_event(event: dict):
+    """
+    Рассылает одно событие лобби. Каждое событие читает ровно один воркер группы,
+    а emit через Redis-менеджер доходит до клиентов на всех воркерах.
+    """
+    lobby_id = event.get('lobby_id')
+    event_type = event.get('type')
+    data = event.get('data')
+    if not lobby_id or not event_type:
+        return
+
+    redis_conn = await redis_client.get_connection()
+
+    target_user_id = event.get('target_user_id')
+    if target_user_id:
+        target_sid = await redis_conn.hget(presence_key(lobby_id), target_user_id)
+        if target_sid:
+            await sio.emit(event_type, data, to=target_sid, namespace=NAMESPACE)
+        return
+
+    host_id = event.get('host_id')
+    host_sid = await redis_conn.hget(presence_key(lobby_id), host_id) if host_id else None
+    if host_sid:
+        # Хост получает расширенную версию события, остальные - общую
+        await sio.emit(event_type, data, room=lobby_id, skip_sid=host_sid, namespace=NAMESPACE)
+        await sio.emit(event_type, event.get('host_data'), to=host_sid, namespace=NAMESPACE)
+    else:
+        await sio.emit(event_type, data, room=lobby_id, namespace=NAMESPACE)
+
+    if event_type in ROOM_CLOSING_EVENTS:
+        await sio.close_room(lobby_id, namespace=NAMESPACE)
+        await redis_conn.delete(presence_key(lobby_id))
+
+
+async def _consume_shard(shard: int):
+    """
+    Читает один шард потока событий. Шард читает только воркер, владеющий
+    его арендой, и рассылает события по одному - поэтому события одного
+    лобби уходят клиентам в порядке публикации. Имя потребителя зависит
+    только от шарда: новый владелец сначала дочитывает события, которые
+    прежний владелец прочитал, но не подтвердил.
+    """
+    stream = shard_stream(shard)
+    group = settings.LOBBY_EVENTS_GROUP
+    consumer = f"shard-{shard}"
+    last_id = '0'
+
+    while True:
+        try:
+            redis_conn = await redis_client.get_connection()
+            await _ensure_group(redis_conn, stream)
+            response = await redis_conn.xreadgroup(
+                group, consumer, {stream: last_id}, count=READ_COUNT, block=READ_BLOCK_MS
+            )
+            entries = response[0][1] if response else []
+            if last_id == '0' and not entries:
+                last_id = '>'
+                continue
+
+            for message_id, fields in entries:
+                try:
+                    await dispatch_event(json.loads(fields.get('event', '{}')))
+                except Exception:
+                    logger.exception(f"Error dispatching lobby event {message_id} from {stream}")
+                # Подтверждаем даже неудачную рассылку, чтобы событие не зациклилось
+                await redis_conn.xack(stream, group, message_id)
+        except asyncio.CancelledError:
+            break
+        except Exception:
+            logger.exception(f"Error reading lobby events stream {stream}")
+            await asyncio.sleep(RETRY_DELAY_SECONDS)
+
+
+async def _stop_shard(tasks: dict, shard: int):
+    task = tasks.pop(shard)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def consume_lobby_events():
+    """
+    Фоновая задача: распределяет шарды потока событий лобби между воркерами.
+    Каждый воркер отмечается в общем списке и держит аренду примерно на
+    равную долю шардов; аренда продлевается каждую треть срока. Если воркер
+    пропал, его аренды истекают и шарды забирают оставшиеся воркеры.
+    """
+    worker_id = _worker_id()
+    lease_ms = settings.LOBBY_EVENTS_LEASE_MS
+    shards = settings.LOBBY_EVENTS_SHARDS
+    tasks = {}
+
+    try:
+        while True:
+            try:
+                redis_conn = await redis_client.get_connection()
+                now_ms = int(time.time() * 1000)
+                await redis_conn.zadd(_workers_key(), {worker_id: now_ms})
+                await redis_conn.zremrangebyscore(_workers_key(), 0, now_ms - 2 * lease_ms)
+                workers = max(1, await redis_conn.zcard(_workers_key()))
+                target = math.ceil(shards / workers)
+
+                for shard in list(tasks):
+                    renewed = await redis_conn.eval(RENEW_LEASE_SCRIPT, 1, _lease_key(shard), worker_id, lease_ms)
+                    if not renewed:
+                        logger.warning(f"Lost lease on lobby events shard {shard}")
+                        await _stop_shard(tasks, shard)
+
+                # Лишние шарды отдаём, чтобы их взял новый воркер
+                while len(tasks) > target:
+                    shard = max(tasks)
+                    await _stop_shard(tasks, shard)
+                    await redis_conn.eval(RELEASE_LEASE_SCRIPT, 1, _lease_key(shard), worker_id)
+
+                for shard in range(shards):
+                    if len(tasks) >= target:
+                        break
+                    if shard in tasks:
+                        continue
+                    if await redis_conn.set(_lease_key(shard), worker_id, nx=True, px=lease_ms):
+                        tasks[shard] = asyncio.create_task(_consume_shard(shard))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error balancing lobby events shards")
+            await asyncio.sleep(lease_ms / 3000)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        # Освобождаем аренды сразу, не дожидаясь их истечения
+        for shard in list(tasks):
+            await _stop_shard(tasks, shard)
+        try:
+            redis_conn = await redis_client.get_connection()
+            for shard in range(shards):
+                await redis_conn.eval(RELEASE_LEASE_SCRIPT, 1, _lease_key(shard), worker_id)
+            await redis_conn.zrem(_workers_key(), worker_id)
+        except Exception:
+            logger.exception("Error releasing lobby events shard leases")
@@ -1,3 +1,5 @@
+import asyncio
+import logging
 import uvicorn
 from fastapi import FastAPI
 import socketio
@@ -7,6 +9,13 @@ from socket_manager import sio_app, sio
 # Импортируем экземпляр db_client, а не класс DBClient
 from db_client import db_client
 from redis_client import redis_client
+from lobby_events import consume_lobby_events
+from config import settings
+
+logging.basicConfig(
+    level=settings.LOG_LEVEL,
+    format="%(levelname)s:     %(name)s: %(message)s"
+)
 
 # Создаем приложение FastAPI
 app = FastAPI()
@@ -33,12 +42,18 @@ async def startup():
     except Exception as e:
         print(f"ERROR:    Redis connection verification failed: {e}")
 
+    # Рассылка событий лобби, которые публикует backend
+    app.state.lobby_events_task = asyncio.create_task(consume_lobby_events())
+
     print("INFO:     Application startup complete.")
 
 
 @app.on_event("shutdown")
 async def shutdown():
     """Действия при остановке сервера."""
+    lobby_events_task = getattr(app.state, "lobby_events_task", None)
+    if lobby_events_task:
+        lobby_events_task.cancel()
     await db_client.close()
     await redis_client.disconnect()
     print("INFO:     Application shutdown complete.")
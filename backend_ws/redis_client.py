@@ -1,7 +1,18 @@
 import redis.asyncio as redis
 from typing import Optional
+from urllib.parse import quote
 from config import settings
 
+
+def get_redis_url() -> str:
+    """
+    Возвращает URL того же Redis (хост, пароль, БД мультиплеера),
+    к которому подключается RedisClient. Нужен для менеджера Socket.IO.
+    """
+    auth = f":{quote(settings.REDIS_PASSWORD, safe='')}@" if settings.REDIS_PASSWORD else ""
+    return f"redis://{auth}{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_MULTIPLAYER_DB}"
+
+
 class RedisClient:
     """
     Асинхронный клиент Redis для WebSocket сервера.
@@ -1,23 +1,53 @@
 import socketio
 import json
 import hashlib
+import logging
 from redis.asyncio import Redis
 from config import settings
-from redis_client import redis_client
+from redis_client import redis_client, get_redis_url
 from db_client import get_lobby_by_id, get_user_by_id
 import datetime
 
+logger = logging.getLogger("ws.multiplayer")
+
+# Менеджер на Redis: комнаты и emit(room=...) работают между всеми воркерами
+# и контейнерами WS-сервиса (за nginx со sticky sessions)
+client_manager = socketio.AsyncRedisManager(
+    get_redis_url(),
+    channel=settings.SOCKETIO_REDIS_CHANNEL
+)
+
 # Создаем экземпляр Socket.IO сервера
 sio = socketio.AsyncServer(
     async_mode="asgi",
+    client_manager=client_manager,
     cors_allowed_origins="*",
-    logger=True,
-    engineio_logger=True,
+    # Трассировка каждого пакета Socket.IO/Engine.IO - только для отладки
+    logger=settings.SOCKETIO_LOGGER,
+    engineio_logger=settings.ENGINEIO_LOGGER,
     # Увеличиваем пинг-таймаут для стабильности
     ping_timeout=15, 
     ping_interval=10
 )
 
+# Хэш присутствия лобби: user_id -> sid
+PRESENCE_KEY_PREFIX = "lobby_presence:"
+# Время жизни хэша присутствия (больше максимального времени жизни лобби)
+PRESENCE_TTL_SECONDS = 6 * 60 * 60
+
+# Удаляет поле, только если оно всё ещё указывает на переданный SID
+REMOVE_PRESENCE_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+def presence_key(lobby_id: str) -> str:
+    return f"{PRESENCE_KEY_PREFIX}{lobby_id}"
+
+
 def hash_token(token: str) -> str:
     """Хэширует токен для безопасного сравнения."""
     return hashlib.sha256(token.encode()).hexdigest()
@@ -29,37 +59,31 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
     """
     
     async def _get_user_sid(self, lobby_id: str, user_id: str) -> str | None:
-        """Находит SID пользователя по его ID в конкретной комнате."""
-        participants = sio.manager.get_participants(self.namespace, lobby_id)
-        for sid_tuple in participants:
-            sid = sid_tuple[0]
-            try:
-                session = await self.get_session(sid)
-                if session and session.get('user_id') == user_id:
-                    return sid
-            except Exception:
-                # Сессия может быть недоступна, если пользователь уже отключается
-                continue
-        return None
+        """Находит SID пользователя в лобби по хэшу присутствия."""
+        redis_conn = await redis_client.get_connection()
+        return await redis_conn.hget(presence_key(lobby_id), user_id)
 
     async def _get_online_user_ids(self, lobby_id: str):
-        """Собирает ID всех онлайн-пользователей в комнате."""
-        online_ids = []
-        participants = list(sio.manager.get_participants(self.namespace, lobby_id))
-        print(f"[DEBUG] Getting online users for lobby {lobby_id}, participants count: {len(participants)}")
-        for sid_tuple in participants:
-            sid = sid_tuple[0]
-            try:
-                session = await self.get_session(sid)
-                if session and session.get('user_id'):
-                    user_id = session.get('user_id')
-                    online_ids.append(user_id)
-                    print(f"[DEBUG] Found online user: {user_id} (SID: {sid})")
-            except Exception as e:
-                print(f"[DEBUG] Error getting session for SID {sid}: {e}")
-                continue
-        print(f"[DEBUG] Final online users for lobby {lobby_id}: {online_ids}")
-        return online_ids
+        """Возвращает ID всех онлайн-пользователей лобби из хэша присутствия."""
+        redis_conn = await redis_client.get_connection()
+        return list(await redis_conn.hkeys(presence_key(lobby_id)))
+
+    async def _set_presence(self, lobby_id: str, user_id: str, sid: str):
+        """Отмечает пользователя онлайн в лобби."""
+        redis_conn = await redis_client.get_connection()
+        key = presence_key(lobby_id)
+        pipe = redis_conn.pipeline()
+        pipe.hset(key, user_id, sid)
+        pipe.expire(key, PRESENCE_TTL_SECONDS)
+        await pipe.execute()
+
+    async def _remove_presence(self, lobby_id: str, user_id: str, sid: str):
+        """
+        Убирает пользователя из хэша присутствия, только если запись
+        принадлежит этому SID (пользователь мог уже переподключиться).
+        """
+        redis_conn = await redis_client.get_connection()
+        await redis_conn.eval(REMOVE_PRESENCE_SCRIPT, 1, presence_key(lobby_id), user_id, sid)
 
     async def _broadcast_online_status(self, lobby_id: str):
         """Рассылает всем в лобби обновленный список онлайн-пользователей."""
@@ -71,7 +95,7 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
 
     async def on_connect(self, sid, environ, auth):
         """Аутентификация пользователя при подключении."""
-        print(f"[{sid}] Auth attempt for namespace {self.namespace}")
+        logger.debug(f"[{sid}] Auth attempt for namespace {self.namespace}")
         token = auth.get("token")
         if not token:
             raise socketio.exceptions.ConnectionRefusedError("Auth failed: token missing")
@@ -85,7 +109,7 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
 
         user_info = json.loads(user_info_raw)
         await self.save_session(sid, user_info)
-        print(f"[{sid}] User {user_info.get('user_id')} authenticated successfully.")
+        logger.info(f"[{sid}] User {user_info.get('user_id')} authenticated successfully.")
 
     async def on_join_lobby(self, sid, data):
         """Присоединение аутентифицированного пользователя к комнате лобби."""
@@ -97,13 +121,14 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
             return
 
         user_id = session.get('user_id')
-        print(f"[{sid}] User {user_id} attempting to join lobby {lobby_id}")
+        logger.debug(f"[{sid}] User {user_id} attempting to join lobby {lobby_id}")
 
         await self.enter_room(sid, lobby_id)
         session['lobby_id'] = lobby_id
         await self.save_session(sid, session)
+        await self._set_presence(lobby_id, user_id, sid)
         
-        print(f"[{sid}] User {user_id} joined lobby {lobby_id}. Notifying room.")
+        logger.info(f"[{sid}] User {user_id} joined lobby {lobby_id}. Notifying room.")
         # 1. Уведомляем всех, КРОМЕ СЕБЯ, что зашел новый юзер
         await self.emit('user_joined', {'user_id': user_id}, room=lobby_id, skip_sid=sid)
         # 2. Рассылаем ВСЕМ (включая себя) обновленный статус онлайн
@@ -118,22 +143,16 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
 
         lobby_id = session.get('lobby_id')
         user_id = session.get('user_id')
-        print(f"[{sid}] User {user_id} disconnected from lobby {lobby_id}")
+        logger.info(f"[{sid}] User {user_id} disconnected from lobby {lobby_id}")
         
         if lobby_id:
+            await self._remove_presence(lobby_id, user_id, sid)
+            
             # Уведомляем всех, КРОМЕ отключившегося пользователя, что пользователь вышел
             await self.emit('user_left', {'user_id': user_id}, room=lobby_id, skip_sid=sid)
             
-            # Получаем список онлайн пользователей и вручную исключаем отключившегося
-            online_users = await self._get_online_user_ids(lobby_id)
-            if user_id in online_users:
-                online_users.remove(user_id)
-                print(f"[DEBUG] Manually removed {user_id} from online users")
-            
             # Отправляем обновленный список онлайн пользователей
-            await self.emit('online_status_update', {
-                'online_users': online_users
-            }, room=lobby_id)
+            await self._broadcast_online_status(lobby_id)
         
     # --- Host Actions ---
 
@@ -144,27 +163,27 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
         lobby_id = data.get('lobby_id')
 
         if not lobby_id:
-            print(f"[{sid}] Start test failed: Missing lobby_id")
+            logger.warning(f"[{sid}] Start test failed: Missing lobby_id")
             return await self.emit('error', {'message': 'Missing lobby_id'}, to=sid)
 
         try:
             lobby = await get_lobby_by_id(lobby_id)
             if not lobby:
-                print(f"[{sid}] Start test failed: Lobby {lobby_id} not found")
+                logger.warning(f"[{sid}] Start test failed: Lobby {lobby_id} not found")
                 return await self.emit('error', {'message': 'Lobby not found'}, to=sid)
                 
             if str(lobby.get('host_id')) != host_id:
-                print(f"[{sid}] Start test permission denied: User {host_id} is not host of lobby {lobby_id} (host: {lobby.get('host_id')})")
+                logger.warning(f"[{sid}] Start test permission denied: User {host_id} is not host of lobby {lobby_id} (host: {lobby.get('host_id')})")
                 return await self.emit('error', {'message': 'Permission denied: Only host can start the test'}, to=sid)
             
             # Проверяем статус лобби
             lobby_status = lobby.get('status')
             if lobby_status == 'waiting':
-                print(f"[{sid}] Host {host_id} successfully starting test for lobby {lobby_id}")
+                logger.info(f"[{sid}] Host {host_id} successfully starting test for lobby {lobby_id}")
             elif lobby_status == 'in_progress':
-                print(f"[{sid}] Host {host_id} requesting test start for already started lobby {lobby_id}")
+                logger.info(f"[{sid}] Host {host_id} requesting test start for already started lobby {lobby_id}")
             else:
-                print(f"[{sid}] Start test failed: Lobby {lobby_id} status is '{lobby_status}', not 'waiting' or 'in_progress'")
+                logger.warning(f"[{sid}] Start test failed: Lobby {lobby_id} status is '{lobby_status}', not 'waiting' or 'in_progress'")
                 return await self.emit('error', {'message': 'Lobby is already closed or finished'}, to=sid)
             
             # Уведомляем всех участников о начале теста (или переходе к уже запущенному тесту)
@@ -175,7 +194,7 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
             }, room=lobby_id)
 
         except Exception as e:
-            print(f"Error during start_test: {e}")
+            logger.error(f"Error during start_test: {e}")
             await self.emit('error', {'message': 'An internal error occurred'}, to=sid)
 
     async def on_kick_user(self, sid, data):
@@ -186,28 +205,28 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
         target_user_id = data.get('target_user_id')
 
         if not all([lobby_id, target_user_id]):
-            print(f"[{sid}] Kick failed: Missing required data")
+            logger.warning(f"[{sid}] Kick failed: Missing required data")
             return await self.emit('error', {'message': 'Missing data for kick'}, to=sid)
 
         try:
             lobby = await get_lobby_by_id(lobby_id)
             if not lobby:
-                print(f"[{sid}] Kick failed: Lobby {lobby_id} not found")
+                logger.warning(f"[{sid}] Kick failed: Lobby {lobby_id} not found")
                 return await self.emit('error', {'message': 'Lobby not found'}, to=sid)
                 
             if str(lobby.get('host_id')) != host_id:
-                print(f"[{sid}] Kick permission denied: User {host_id} is not host of lobby {lobby_id} (host: {lobby.get('host_id')})")
+                logger.warning(f"[{sid}] Kick permission denied: User {host_id} is not host of lobby {lobby_id} (host: {lobby.get('host_id')})")
                 return await self.emit('error', {'message': 'Permission denied: Only host can kick users'}, to=sid)
 
             # Проверяем, что пользователь находится в комнате (онлайн)
             target_sid = await self._get_user_sid(lobby_id, target_user_id)
             if not target_sid:
-                print(f"[{sid}] Kick failed: Target user {target_user_id} not found in lobby {lobby_id} (user may have already left)")
+                logger.warning(f"[{sid}] Kick failed: Target user {target_user_id} not found in lobby {lobby_id} (user may have already left)")
                 # Не возвращаем ошибку, так как пользователь мог уже выйти
                 # Просто уведомляем хоста, что кик не нужен
                 return await self.emit('kick_success', {'message': 'User already left the lobby'}, to=sid)
             
-            print(f"[{sid}] Host {host_id} successfully kicking {target_user_id} (SID: {target_sid}) from lobby {lobby_id}")
+            logger.info(f"[{sid}] Host {host_id} successfully kicking {target_user_id} (SID: {target_sid}) from lobby {lobby_id}")
             
             # Отправляем кикнутому игроку персональное событие и принудительно отключаем его
             await self.emit('kicked', {'reason': 'You have been kicked by the host.'}, to=target_sid)
@@ -220,7 +239,7 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
             }, room=lobby_id, skip_sid=target_sid)
 
         except Exception as e:
-            print(f"Error during kick_user: {e}")
+            logger.error(f"Error during kick_user: {e}")
             await self.emit('error', {'message': 'An internal error occurred'}, to=sid)
 
     async def on_close_lobby(self, sid, data):
@@ -230,27 +249,29 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
         lobby_id = data.get('lobby_id')
 
         if not lobby_id:
-            print(f"[{sid}] Close lobby failed: Missing lobby_id")
+            logger.warning(f"[{sid}] Close lobby failed: Missing lobby_id")
             return await self.emit('error', {'message': 'Missing lobby_id'}, to=sid)
 
         try:
             lobby = await get_lobby_by_id(lobby_id)
             if not lobby:
-                print(f"[{sid}] Close lobby failed: Lobby {lobby_id} not found")
+                logger.warning(f"[{sid}] Close lobby failed: Lobby {lobby_id} not found")
                 return await self.emit('error', {'message': 'Lobby not found'}, to=sid)
                 
             if str(lobby.get('host_id')) != host_id:
-                print(f"[{sid}] Close lobby permission denied: User {host_id} is not host of lobby {lobby_id} (host: {lobby.get('host_id')})")
+                logger.warning(f"[{sid}] Close lobby permission denied: User {host_id} is not host of lobby {lobby_id} (host: {lobby.get('host_id')})")
                 return await self.emit('error', {'message': 'Permission denied: Only host can close the lobby'}, to=sid)
 
-            print(f"[{sid}] Host {host_id} successfully closing lobby {lobby_id}")
+            logger.info(f"[{sid}] Host {host_id} successfully closing lobby {lobby_id}")
 
             # Уведомляем всех в комнате о закрытии и закрываем комнату
             await self.emit('lobby_closed', {'reason': 'The host has closed the lobby.'}, room=lobby_id)
             await self.close_room(lobby_id)
+            redis_conn = await redis_client.get_connection()
+            await redis_conn.delete(presence_key(lobby_id))
 
         except Exception as e:
-            print(f"Error during close_lobby: {e}")
+            logger.error(f"Error during close_lobby: {e}")
             await self.emit('error', {'message': 'An internal error occurred'}, to=sid)
 
     # --- Participant Actions ---
@@ -264,21 +285,21 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
         answer_index = data.get('answer_index')
 
         if not all([lobby_id, question_id, answer_index is not None]):
-            print(f"[{sid}] Participant answered failed: Missing required data")
+            logger.warning(f"[{sid}] Participant answered failed: Missing required data")
             return await self.emit('error', {'message': 'Missing data for answer'}, to=sid)
 
         try:
             lobby = await get_lobby_by_id(lobby_id)
             if not lobby:
-                print(f"[{sid}] Participant answered failed: Lobby {lobby_id} not found")
+                logger.warning(f"[{sid}] Participant answered failed: Lobby {lobby_id} not found")
                 return await self.emit('error', {'message': 'Lobby not found'}, to=sid)
             
             # Проверяем, что пользователь является участником лобби
             if user_id not in lobby.get('participants', []):
-                print(f"[{sid}] Participant answered failed: User {user_id} is not participant of lobby {lobby_id}")
+                logger.warning(f"[{sid}] Participant answered failed: User {user_id} is not participant of lobby {lobby_id}")
                 return await self.emit('error', {'message': 'You are not a participant of this lobby'}, to=sid)
 
-            print(f"[{sid}] Participant {user_id} answered question {question_id} with answer {answer_index} in lobby {lobby_id}")
+            logger.debug(f"[{sid}] Participant {user_id} answered question {question_id} with answer {answer_index} in lobby {lobby_id}")
             
             # Отправляем детальную информацию хосту о том, на какой вариант ответил участник
             host_sid = await self._get_user_sid(lobby_id, str(lobby.get('host_id')))
@@ -298,7 +319,7 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
             }, room=lobby_id, skip_sid=sid)
 
         except Exception as e:
-            print(f"Error during participant_answered: {e}")
+            logger.error(f"Error during participant_answered: {e}")
             await self.emit('error', {'message': 'An internal error occurred'}, to=sid)
 
     async def on_participant_answer_details(self, sid, data):
@@ -311,21 +332,21 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
         is_host = data.get('is_host', False)
 
         if not all([lobby_id, question_id, answer_index is not None]):
-            print(f"[{sid}] Participant answer details failed: Missing required data")
+            logger.warning(f"[{sid}] Participant answer details failed: Missing required data")
             return await self.emit('error', {'message': 'Missing data for answer'}, to=sid)
 
         try:
             lobby = await get_lobby_by_id(lobby_id)
             if not lobby:
-                print(f"[{sid}] Participant answer details failed: Lobby {lobby_id} not found")
+                logger.warning(f"[{sid}] Participant answer details failed: Lobby {lobby_id} not found")
                 return await self.emit('error', {'message': 'Lobby not found'}, to=sid)
             
             # Проверяем, что пользователь является участником лобби
             if user_id not in lobby.get('participants', []):
-                print(f"[{sid}] Participant answer details failed: User {user_id} is not participant of lobby {lobby_id}")
+                logger.warning(f"[{sid}] Participant answer details failed: User {user_id} is not participant of lobby {lobby_id}")
                 return await self.emit('error', {'message': 'You are not a participant of this lobby'}, to=sid)
 
-            print(f"[{sid}] Participant {user_id} sending answer details for question {question_id} with answer {answer_index} in lobby {lobby_id}")
+            logger.debug(f"[{sid}] Participant {user_id} sending answer details for question {question_id} with answer {answer_index} in lobby {lobby_id}")
             
             if is_host:
                 # Если это хост, отправляем детали всем участникам
@@ -349,7 +370,7 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
                     }, to=host_sid)
 
         except Exception as e:
-            print(f"Error during participant_answer_details: {e}")
+            logger.error(f"Error during participant_answer_details: {e}")
             await self.emit('error', {'message': 'An internal error occurred'}, to=sid)
 
     async def on_show_correct_answer(self, sid, data):
@@ -360,20 +381,20 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
         question_id = data.get('question_id')
 
         if not all([lobby_id, question_id]):
-            print(f"[{sid}] Show correct answer failed: Missing required data")
+            logger.warning(f"[{sid}] Show correct answer failed: Missing required data")
             return await self.emit('error', {'message': 'Missing data for show answer'}, to=sid)
 
         try:
             lobby = await get_lobby_by_id(lobby_id)
             if not lobby:
-                print(f"[{sid}] Show correct answer failed: Lobby {lobby_id} not found")
+                logger.warning(f"[{sid}] Show correct answer failed: Lobby {lobby_id} not found")
                 return await self.emit('error', {'message': 'Lobby not found'}, to=sid)
                 
             if str(lobby.get('host_id')) != host_id:
-                print(f"[{sid}] Show correct answer permission denied: User {host_id} is not host of lobby {lobby_id}")
+                logger.warning(f"[{sid}] Show correct answer permission denied: User {host_id} is not host of lobby {lobby_id}")
                 return await self.emit('error', {'message': 'Permission denied: Only host can show answers'}, to=sid)
 
-            print(f"[{sid}] Host {host_id} showing correct answer for question {question_id} in lobby {lobby_id}")
+            logger.debug(f"[{sid}] Host {host_id} showing correct answer for question {question_id} in lobby {lobby_id}")
             
             # Уведомляем всех участников о показе правильного ответа
             await self.emit('correct_answer_shown', {
@@ -383,7 +404,7 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
             }, room=lobby_id)
 
         except Exception as e:
-            print(f"Error during show_correct_answer: {e}")
+            logger.error(f"Error during show_correct_answer: {e}")
             await self.emit('error', {'message': 'An internal error occurred'}, to=sid)
 
     async def on_next_question(self, sid, data):
@@ -394,20 +415,20 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
         question_index = data.get('question_index')
 
         if not all([lobby_id, question_index is not None]):
-            print(f"[{sid}] Next question failed: Missing required data")
+            logger.warning(f"[{sid}] Next question failed: Missing required data")
             return await self.emit('error', {'message': 'Missing data for next question'}, to=sid)
 
         try:
             lobby = await get_lobby_by_id(lobby_id)
             if not lobby:
-                print(f"[{sid}] Next question failed: Lobby {lobby_id} not found")
+                logger.warning(f"[{sid}] Next question failed: Lobby {lobby_id} not found")
                 return await self.emit('error', {'message': 'Lobby not found'}, to=sid)
                 
             if str(lobby.get('host_id')) != host_id:
-                print(f"[{sid}] Next question permission denied: User {host_id} is not host of lobby {lobby_id}")
+                logger.warning(f"[{sid}] Next question permission denied: User {host_id} is not host of lobby {lobby_id}")
                 return await self.emit('error', {'message': 'Permission denied: Only host can move to next question'}, to=sid)
 
-            print(f"[{sid}] Host {host_id} moving to next question {question_index} in lobby {lobby_id}")
+            logger.debug(f"[{sid}] Host {host_id} moving to next question {question_index} in lobby {lobby_id}")
             
             # Уведомляем всех участников о переходе к следующему вопросу
             await self.emit('next_question', {
@@ -417,7 +438,7 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
             }, room=lobby_id)
 
         except Exception as e:
-            print(f"Error during next_question: {e}")
+            logger.error(f"Error during next_question: {e}")
             await self.emit('error', {'message': 'An internal error occurred'}, to=sid)
 
     async def on_test_finished(self, sid, data):
@@ -427,20 +448,20 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
         lobby_id = data.get('lobby_id')
 
         if not lobby_id:
-            print(f"[{sid}] Test finished failed: Missing lobby_id")
+            logger.warning(f"[{sid}] Test finished failed: Missing lobby_id")
             return await self.emit('error', {'message': 'Missing lobby_id'}, to=sid)
 
         try:
             lobby = await get_lobby_by_id(lobby_id)
             if not lobby:
-                print(f"[{sid}] Test finished failed: Lobby {lobby_id} not found")
+                logger.warning(f"[{sid}] Test finished failed: Lobby {lobby_id} not found")
                 return await self.emit('error', {'message': 'Lobby not found'}, to=sid)
                 
             if str(lobby.get('host_id')) != host_id:
-                print(f"[{sid}] Test finished permission denied: User {host_id} is not host of lobby {lobby_id}")
+                logger.warning(f"[{sid}] Test finished permission denied: User {host_id} is not host of lobby {lobby_id}")
                 return await self.emit('error', {'message': 'Permission denied: Only host can finish the test'}, to=sid)
 
-            print(f"[{sid}] Host {host_id} finishing test for lobby {lobby_id}")
+            logger.info(f"[{sid}] Host {host_id} finishing test for lobby {lobby_id}")
             
             # Уведомляем всех участников о завершении теста
             await self.emit('test_finished', {
@@ -450,7 +471,7 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
             }, room=lobby_id)
 
         except Exception as e:
-            print(f"Error during test_finished: {e}")
+            logger.error(f"Error during test_finished: {e}")
             await self.emit('error', {'message': 'An internal error occurred'}, to=sid)
 
     async def on_leave_lobby(self, sid, data):
@@ -460,26 +481,26 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
         lobby_id = data.get('lobby_id')
 
         if not lobby_id:
-            print(f"[{sid}] Leave lobby failed: Missing lobby_id")
+            logger.warning(f"[{sid}] Leave lobby failed: Missing lobby_id")
             return await self.emit('error', {'message': 'Missing lobby_id'}, to=sid)
 
         try:
             lobby = await get_lobby_by_id(lobby_id)
             if not lobby:
-                print(f"[{sid}] Leave lobby failed: Lobby {lobby_id} not found")
+                logger.warning(f"[{sid}] Leave lobby failed: Lobby {lobby_id} not found")
                 return await self.emit('error', {'message': 'Lobby not found'}, to=sid)
             
             # Проверяем, что пользователь является участником лобби
             if user_id not in lobby.get('participants', []):
-                print(f"[{sid}] Leave lobby failed: User {user_id} is not participant of lobby {lobby_id}")
+                logger.warning(f"[{sid}] Leave lobby failed: User {user_id} is not participant of lobby {lobby_id}")
                 return await self.emit('error', {'message': 'You are not a participant of this lobby'}, to=sid)
             
             # Проверяем, что пользователь не является хостом
             if str(lobby.get('host_id')) == user_id:
-                print(f"[{sid}] Leave lobby failed: Host {user_id} cannot leave lobby {lobby_id}")
+                logger.warning(f"[{sid}] Leave lobby failed: Host {user_id} cannot leave lobby {lobby_id}")
                 return await self.emit('error', {'message': 'Host cannot leave lobby. Use close lobby instead.'}, to=sid)
 
-            print(f"[{sid}] User {user_id} leaving lobby {lobby_id}")
+            logger.info(f"[{sid}] User {user_id} leaving lobby {lobby_id}")
             
             # Уведомляем всех участников (кроме выходящего) о выходе пользователя
             await self.emit('user_left', {
@@ -489,13 +510,14 @@ class MultiplayerNamespace(socketio.AsyncNamespace):
             }, room=lobby_id, skip_sid=sid)
             
             # Обновляем статус онлайн для всех участников
+            await self._remove_presence(lobby_id, user_id, sid)
             await self._broadcast_online_status(lobby_id)
             
             # Отключаем пользователя от комнаты
             await self.leave_room(sid, lobby_id)
 
         except Exception as e:
-            print(f"Error during leave_lobby: {e}")
+            logger.error(f"Error during leave_lobby: {e}")
             await self.emit('error', {'message': 'An internal error occurred'}, to=sid)
 
 # Регистрируем Namespace с путем /ws, как ожидает клиент
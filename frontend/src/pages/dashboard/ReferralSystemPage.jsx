@@ -13,6 +13,9 @@ const ReferralSystemPage = () => {
   const [loading, setLoading] = useState(true);
   const [referralCode, setReferralCode] = useState(null);
   const [transactions, setTransactions] = useState([]);
+  const [transactionsPage, setTransactionsPage] = useState(1);
+  const [hasMoreTransactions, setHasMoreTransactions] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [description, setDescription] = useState('');
   const [createModalVisible, setCreateModalVisible] = useState(false);
   const [subscription, setSubscription] = useState(null);
@@ -26,6 +29,40 @@ const ReferralSystemPage = () => {
     fetchData();
   }, []);
 
+  // Сервер отдаёт приглашённых постранично (meta.pagination), следующие страницы дописываются в конец
+  const fetchTransactions = async (page) => {
+    const transactionsResponse = await fetch(`/api/referrals/transactions?page=${page}`, {
+      credentials: 'include'
+    });
+
+    if (transactionsResponse.ok) {
+      const transResult = await transactionsResponse.json();
+      if (transResult.status === "ok" && transResult.data) {
+        const pageTransactions = transResult.data.transactions || [];
+        setTransactions((prev) => (page === 1 ? pageTransactions : [...prev, ...pageTransactions]));
+        setTransactionsPage(page);
+        setHasMoreTransactions(Boolean(transResult.meta?.pagination?.has_more));
+        setStatistics({
+          totalEarned: transResult.data.totalEarned || 0,
+          totalRegistered: transResult.data.totalRegistered || 0,
+          totalPurchased: transResult.data.totalPurchased || 0,
+        });
+      }
+    }
+  };
+
+  const loadMoreTransactions = async () => {
+    setLoadingMore(true);
+    try {
+      await fetchTransactions(transactionsPage + 1);
+    } catch (error) {
+      console.error('Error fetching referral transactions:', error);
+      toast.error(t.failedToLoadReferralData || 'Не удалось загрузить данные реферальной системы');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const fetchData = async () => {
     setLoading(true);
     try {
@@ -58,21 +95,7 @@ const ReferralSystemPage = () => {
             setReferralCode(result.data);
             
             // Fetch referral transactions
-            const transactionsResponse = await fetch('/api/referrals/transactions', {
-              credentials: 'include'
-            });
-            
-            if (transactionsResponse.ok) {
-              const transResult = await transactionsResponse.json();
-              if (transResult.status === "ok" && transResult.data) {
-                setTransactions(transResult.data.transactions || []);
-                setStatistics({
-                  totalEarned: transResult.data.totalEarned || 0,
-                  totalRegistered: transResult.data.totalRegistered || 0,
-                  totalPurchased: transResult.data.totalPurchased || 0,
-                });
-              }
-            }
+            await fetchTransactions(1);
           }
         } else if (referralResponse.status === 404) {
           // No referral code exists yet
@@ -375,6 +398,18 @@ const ReferralSystemPage = () => {
                       </tbody>
                     </table>
                   </div>
+
+                  {hasMoreTransactions && (
+                    <div className="mt-4 flex justify-center">
+                      <button
+                        onClick={loadMoreTransactions}
+                        disabled={loadingMore}
+                        className="px-4 py-2 bg-yellow-500 hover:bg-yellow-600 text-gray-900 rounded-lg transition-colors disabled:opacity-50"
+                      >
+                        {loadingMore ? (t.loading || 'Загрузка...') : (t.loadMore || 'Показать ещё')}
+                      </button>
+                    </div>
+                  )}
                 </div>
               </div>
             </>
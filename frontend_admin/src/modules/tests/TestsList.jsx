@@ -19,28 +19,31 @@ const TestsList = () => {
   const [mediaFilter, setMediaFilter] = useState('all');
   const [loadingProgress, setLoadingProgress] = useState(0);
   const [initialLoading, setInitialLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [modalInfo, setModalInfo] = useState(null);
   const [detailsLoading, setDetailsLoading] = useState(false);
   const [language, setLanguage] = useState('ru');
   const abortControllerRef = useRef(null);
   const navigate = useNavigate();
 
+  // Фильтры по разделам и категориям применяет сервер (через запятую)
+  const buildListParams = (cursor) => {
+    const params = {};
+    if (cursor) params.after = cursor;
+    if (selectedCategories.length) params.category = selectedCategories.join(',');
+    if (selectedSections.length) params.section = selectedSections.join(',');
+    return params;
+  };
+
+  // Первая страница списка; следующие подгружаются кнопкой "Загрузить ещё"
   const fetchTests = async () => {
     setLoading(true);
-    setInitialLoading(true);
     setLoadingProgress(0);
     try {
-      const response = await axios.get('/api/tests/all', {
-        onDownloadProgress: (progressEvent) => {
-          if (progressEvent.total) {
-            const percentCompleted = Math.round(
-              (progressEvent.loaded * 100) / progressEvent.total
-            );
-            setLoadingProgress(percentCompleted);
-          }
-        }
-      });
+      const response = await axios.get('/api/tests/all', { params: buildListParams(null) });
       setTests(response.data.data);
+      setNextCursor(response.data.meta?.pagination?.next_cursor || null);
       
       setLoadingProgress(100);
       
@@ -56,9 +59,26 @@ const TestsList = () => {
     }
   };
 
+  const loadMoreTests = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await axios.get('/api/tests/all', { params: buildListParams(nextCursor) });
+      setTests((prev) => [...prev, ...response.data.data]);
+      setNextCursor(response.data.meta?.pagination?.next_cursor || null);
+    } catch (error) {
+      message.error('Ошибка при загрузке тестов');
+      console.error('Error fetching tests:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchTests();
-    
+  }, [selectedSections, selectedCategories]);
+
+  useEffect(() => {
     const isDarkMode = document.body.classList.contains('dark-theme');
     if (isDarkMode) {
       document.querySelector('.tests-list-container')?.classList.add('dark-theme-support');
@@ -115,16 +135,11 @@ const TestsList = () => {
 
   const sectionMap = Object.fromEntries(PDD_SECTIONS.map(s => [s.uid, s.title]));
 
+  // Поиск и фильтр по медиа - по уже загруженным страницам
   const filteredTests = tests.filter(test => {
     const matchesSearch = searchText === '' || 
       test.question_text[language]?.toLowerCase().includes(searchText.toLowerCase());
     
-    const matchesSection = selectedSections.length === 0 ||
-      test.pdd_section_uids.some(section => selectedSections.includes(section));
-    
-    const matchesCategory = selectedCategories.length === 0 ||
-      test.categories.some(cat => selectedCategories.includes(cat));
-    
     const matchesMedia = 
       mediaFilter === 'all' ||
       (mediaFilter === 'with' && test.has_media) ||
@@ -132,7 +147,7 @@ const TestsList = () => {
       (mediaFilter === 'main-video' && test.media_filename && test.media_filename.endsWith('.mp4')) ||
       (mediaFilter === 'additional-video' && test.after_answer_media_filename && test.after_answer_media_filename.endsWith('.mp4'));
     
-    return matchesSearch && matchesSection && matchesCategory && matchesMedia;
+    return matchesSearch && matchesMedia;
   });
 
   const showDeleteConfirm = (uid) => {
@@ -850,7 +865,7 @@ const TestsList = () => {
               pageSize: 10,
               showSizeChanger: true,
               pageSizeOptions: ['10', '20', '50', '100'],
-              showTotal: (total) => `Всего ${total} вопросов`,
+              showTotal: (total) => (nextCursor ? `Загружено ${total} вопросов` : `Всего ${total} вопросов`),
             }}
             scroll={{ x: true }}
             rowClassName={(record) => record.has_media ? 'has-media-row' : ''}
@@ -860,6 +875,14 @@ const TestsList = () => {
             className="data-table"
           />
 
+          {nextCursor && (
+            <div style={{ textAlign: 'center', marginTop: 16 }}>
+              <Button onClick={loadMoreTests} loading={loadingMore}>
+                Загрузить ещё
+              </Button>
+            </div>
+          )}
+
           {renderModal()}
         </>
       )}
@@ -1,22 +1,41 @@
 import asyncio
 import json
 import os
+import time
 from datetime import datetime
 import pytz
 import aio_pika
-from typing import Dict, Any
+from typing import Dict, Any, List
+
+from dedup import RecentKeys, log_key
+from log_store import LogStore, log_to_document
 
 # Настройки RabbitMQ
 RABBITMQ_URL = os.getenv("RABBITMQ_URL")
 EXCHANGE_NAME = os.getenv("RABBITMQ_EXCHANGE")
 
-# Поддерживаемые routing keys для разных сервисов
+# Режим работы: print - вывод в консоль, store - запись в MongoDB пачками
+CONSUMER_MODE = os.getenv("CONSUMER_MODE", "print").lower()
+
+# Поддерживаемые routing keys для разных сервисов (можно переопределить через RABBITMQ_ROUTING_KEYS)
 ROUTING_KEYS = [
+    key.strip() for key in os.getenv("RABBITMQ_ROUTING_KEYS", "").split(",") if key.strip()
+] or ([
+    "#",                     # Хранилище получает все логи exchange
+] if CONSUMER_MODE == "store" else [
     "logs.info.*",           # Все информационные логи
     "logs.error.*",          # Все логи ошибок
-]
+])
+
+# Сколько неподтверждённых сообщений брокер отдаёт потребителю
+PREFETCH_COUNT = int(os.getenv("CONSUMER_PREFETCH", "5000"))
+# Режим store: размер пачки и максимальная задержка записи
+BATCH_SIZE = int(os.getenv("LOG_STORE_BATCH_SIZE", "1000"))
+FLUSH_INTERVAL = float(os.getenv("LOG_STORE_FLUSH_INTERVAL", "1.0"))
+STATS_INTERVAL = 60
 
-QUEUE_NAME = os.getenv("RABBITMQ_QUEUE")
+# В режиме store своя очередь: сообщения не делятся с другими потребителями
+QUEUE_NAME = os.getenv("LOG_STORE_QUEUE", "log_store_queue") if CONSUMER_MODE == "store" else os.getenv("RABBITMQ_QUEUE")
 
 # Timezone для форматирования времени
 KZ_TIMEZONE = pytz.timezone('Asia/Almaty')
@@ -27,6 +46,14 @@ class LogProcessor:
         self.channel = None
         self.queue = None
         self._running = False
+        # Режим store: сообщения ждут записи пачкой, ack - после записи в MongoDB
+        self.store = None
+        self._pending: List[aio_pika.IncomingMessage] = []
+        self._flush_event = asyncio.Event()
+        self._flush_task = None
+        # Уже записанные логи: повторные доставки и replay не дублируются в MongoDB
+        self._stored_keys = RecentKeys()
+        self._stats = {"stored": 0, "invalid": 0, "duplicates": 0, "batches": 0, "failed_batches": 0}
     
     async def initialize(self):
         """Инициализация подключения к RabbitMQ"""
@@ -36,8 +63,9 @@ class LogProcessor:
             # Создаем соединение
             self.connection = await aio_pika.connect_robust(RABBITMQ_URL)
             self.channel = await self.connection.channel()
+            await self.channel.set_qos(prefetch_count=PREFETCH_COUNT)
             
-            print("[CONSUMER] Подключение установлено")
+            print(f"[CONSUMER] Подключение установлено, режим {CONSUMER_MODE}, prefetch {PREFETCH_COUNT}")
             
             # Объявляем exchange
             exchange = await self.channel.declare_exchange(
@@ -163,6 +191,85 @@ class LogProcessor:
             except Exception as e:
                 print(f"[CONSUMER] Ошибка обработки сообщения: {e}")
     
+    # ---------- режим store ----------
+    
+    async def store_message_handler(self, message: aio_pika.IncomingMessage):
+        """Копит сообщения до пачки; ack отправляется после записи в MongoDB"""
+        self._pending.append(message)
+        if len(self._pending) >= BATCH_SIZE:
+            self._flush_event.set()
+    
+    async def _flush_batch(self) -> bool:
+        """Записывает одну пачку и подтверждает её одним ack(multiple=True)"""
+        batch = self._pending[:BATCH_SIZE]
+        del self._pending[:BATCH_SIZE]
+        
+        documents = []
+        batch_keys = set()
+        for message in batch:
+            try:
+                log_data = json.loads(message.body.decode('utf-8'))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                # Повторная доставка не поможет: подтверждаем вместе с пачкой
+                self._stats["invalid"] += 1
+                continue
+            key = log_key(log_data)
+            if key is not None:
+                if key in self._stored_keys or key in batch_keys:
+                    # Повтор уже записанного лога: подтверждаем без записи
+                    self._stats["duplicates"] += 1
+                    continue
+                batch_keys.add(key)
+            documents.append(log_to_document(log_data))
+        
+        try:
+            await self.store.insert_batch(documents)
+        except Exception as e:
+            print(f"[CONSUMER] Ошибка записи пачки из {len(documents)} логов в MongoDB: {e}")
+            self._stats["failed_batches"] += 1
+            try:
+                # Вся пачка вернётся в очередь
+                await batch[-1].nack(multiple=True, requeue=True)
+            except Exception as nack_error:
+                print(f"[CONSUMER] Не удалось вернуть пачку в очередь: {nack_error}")
+            return False
+        
+        try:
+            # Подтверждает это сообщение и все предыдущие неподтверждённые на канале
+            await batch[-1].ack(multiple=True)
+        except Exception as e:
+            # Канал переоткрыт: брокер доставит эти сообщения повторно
+            print(f"[CONSUMER] Не удалось подтвердить пачку: {e}")
+        for key in batch_keys:
+            self._stored_keys.add(key)
+        self._stats["stored"] += len(documents)
+        self._stats["batches"] += 1
+        return True
+    
+    async def _flush_loop(self):
+        """Пишет пачки по заполнению или раз в FLUSH_INTERVAL"""
+        backoff = 1.0
+        last_stats = time.monotonic()
+        while self._running or self._pending:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            
+            while self._pending:
+                if not await self._flush_batch():
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    break
+                backoff = 1.0
+            
+            if time.monotonic() - last_stats >= STATS_INTERVAL:
+                last_stats = time.monotonic()
+                print(f"[CONSUMER] Статистика записи: {self._stats}, ожидают {len(self._pending)}")
+            if not self._running:
+                break
+    
     async def start_consuming(self):
         """Запуск приема сообщений"""
         try:
@@ -170,7 +277,13 @@ class LogProcessor:
             
             # Начинаем прослушивание очереди
             self._running = True
-            await self.queue.consume(self.message_handler)
+            if CONSUMER_MODE == "store":
+                self.store = LogStore()
+                await self.store.initialize()
+                self._flush_task = asyncio.create_task(self._flush_loop())
+                await self.queue.consume(self.store_message_handler)
+            else:
+                await self.queue.consume(self.message_handler)
             
             print(f"[CONSUMER] Ожидаем сообщения в очереди {QUEUE_NAME}")
             
@@ -185,6 +298,12 @@ class LogProcessor:
     async def stop(self):
         """Остановка потребителя"""
         self._running = False
+        if self._flush_task:
+            # Дописываем накопленное, пока канал ещё открыт
+            self._flush_event.set()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        if self.store:
+            self.store.close()
         if self.connection:
             await self.connection.close()
             print("[CONSUMER] Соединение с RabbitMQ закрыто")
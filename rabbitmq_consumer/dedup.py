@@ -0,0 +1,43 @@
+"""
+Отсев повторно доставленных логов.
+
+Издатель отправляет сообщение повторно, если брокер не подтвердил его или
+replay spill-файла был прерван, а брокер - если ack не дошёл. Лог
+однозначно определяется парой (log_id, created): log_id - короткий
+случайный идентификатор, created - время записи в секундах epoch.
+"""
+
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+LogKey = Tuple[str, Any]
+
+
+def log_key(log_data: Dict[str, Any]) -> Optional[LogKey]:
+    """Ключ лога; None, если у сообщения нет log_id и отсеивать его не по чему"""
+    log_id = log_data.get("log_id")
+    if not log_id:
+        return None
+    return str(log_id), log_data.get("created")
+
+
+class RecentKeys:
+    """Последние max_keys увиденных ключей, старые вытесняются первыми"""
+
+    def __init__(self, max_keys: Optional[int] = None):
+        # Переменная окружения читается здесь: бот загружает .env после импортов
+        self.max_keys = max_keys or int(os.getenv("LOG_DEDUP_MAX_KEYS", "100000"))
+        self._keys: "OrderedDict[LogKey, None]" = OrderedDict()
+
+    def __contains__(self, key: LogKey) -> bool:
+        return key in self._keys
+
+    def add(self, key: LogKey):
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        while len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._keys)
@@ -0,0 +1,184 @@
+"""
+Хранилище логов в MongoDB.
+
+Логи пишутся в time-series коллекцию: MongoDB сама раскладывает документы
+по временным бакетам, а старые бакеты удаляются по expireAfterSeconds (TTL).
+Вторичные индексы позволяют искать по уровню, разделу и пользователю.
+
+Поиск из консоли:
+    python log_store.py --level ERROR --section lobby --hours 6
+    python log_store.py --user 64f0c1... --text "лимит"
+"""
+
+import argparse
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import CollectionInvalid
+from pymongo.write_concern import WriteConcern
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+LOG_STORE_DB = os.getenv("LOG_STORE_DB", "royal_logs")
+LOG_STORE_COLLECTION = os.getenv("LOG_STORE_COLLECTION", "logs")
+LOG_STORE_RETENTION_DAYS = int(os.getenv("LOG_STORE_RETENTION_DAYS", "30"))
+
+# Поля, которые попадают в metaField: по ним MongoDB группирует бакеты
+_META_FIELDS = ("level", "section", "subsection", "source")
+
+
+def _created_at(log_data: Dict[str, Any]) -> datetime:
+    """Время лога: epoch из поля created, иначе строка timestamp, иначе текущее время"""
+    created = log_data.get("created")
+    if isinstance(created, (int, float)):
+        return datetime.fromtimestamp(created, timezone.utc)
+    timestamp = log_data.get("timestamp")
+    if timestamp:
+        for fmt in ("%Y-%m-%d %H:%M:%S %z", "%Y-%m-%d %H:%M:%S"):
+            try:
+                # "+05" -> "+0500" для %z
+                value = timestamp + "00" if re.search(r"[+-]\d{2}$", timestamp) else timestamp
+                return datetime.strptime(value, fmt).astimezone(timezone.utc)
+            except ValueError:
+                continue
+    return datetime.now(timezone.utc)
+
+
+def log_to_document(log_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Документ для time-series коллекции из сообщения RabbitMQ"""
+    return {
+        "created_at": _created_at(log_data),
+        "meta": {field: log_data.get(field) for field in _META_FIELDS},
+        "log_id": log_data.get("log_id"),
+        "message": log_data.get("message", ""),
+        "extra_data": log_data.get("extra_data") or {},
+        "user_id": log_data.get("user_id"),
+        "ip_address": log_data.get("ip_address"),
+        "user_agent": log_data.get("user_agent"),
+    }
+
+
+class LogStore:
+    """Запись логов пачками и поиск по ним"""
+
+    def __init__(
+        self,
+        mongo_uri: str = MONGO_URI,
+        db_name: str = LOG_STORE_DB,
+        collection_name: str = LOG_STORE_COLLECTION,
+        retention_days: int = LOG_STORE_RETENTION_DAYS
+    ):
+        self.client = AsyncIOMotorClient(mongo_uri)
+        self.db = self.client[db_name]
+        self.collection_name = collection_name
+        self.retention_seconds = retention_days * 24 * 60 * 60
+        # Подтверждение записи большинством реплик и журналом: после этого можно ack
+        self.collection = self.db.get_collection(
+            collection_name,
+            write_concern=WriteConcern(w="majority", j=True)
+        )
+
+    async def initialize(self):
+        """Создаёт time-series коллекцию с TTL и индексы (идемпотентно)"""
+        try:
+            await self.db.create_collection(
+                self.collection_name,
+                timeseries={"timeField": "created_at", "metaField": "meta", "granularity": "seconds"},
+                expireAfterSeconds=self.retention_seconds
+            )
+            print(f"[LOG_STORE] Коллекция {self.collection_name} создана, хранение {self.retention_seconds // 86400} дн.")
+        except CollectionInvalid:
+            # Коллекция уже есть: приводим срок хранения к текущей настройке
+            await self.db.command({"collMod": self.collection_name, "expireAfterSeconds": self.retention_seconds})
+
+        await self.collection.create_index([("meta.level", ASCENDING), ("created_at", DESCENDING)], name="by_level")
+        await self.collection.create_index(
+            [("meta.section", ASCENDING), ("meta.subsection", ASCENDING), ("created_at", DESCENDING)],
+            name="by_section"
+        )
+        await self.collection.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)], name="by_user")
+
+    async def insert_batch(self, documents: List[Dict[str, Any]]) -> int:
+        """Записывает пачку одним insert_many. Исключение - запись не подтверждена."""
+        if not documents:
+            return 0
+        result = await self.collection.insert_many(documents, ordered=False)
+        return len(result.inserted_ids)
+
+    async def search(
+        self,
+        level: Optional[str] = None,
+        section: Optional[str] = None,
+        subsection: Optional[str] = None,
+        user_id: Optional[str] = None,
+        text: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Поиск логов, новые первыми"""
+        query: Dict[str, Any] = {}
+        if level:
+            query["meta.level"] = level.upper()
+        if section:
+            query["meta.section"] = section
+        if subsection:
+            query["meta.subsection"] = subsection
+        if user_id:
+            query["user_id"] = user_id
+        if since or until:
+            query["created_at"] = {}
+            if since:
+                query["created_at"]["$gte"] = since
+            if until:
+                query["created_at"]["$lt"] = until
+        if text:
+            # Подстрока без индекса: используйте вместе с фильтрами и периодом
+            query["message"] = {"$regex": re.escape(text), "$options": "i"}
+        cursor = self.collection.find(query, {"_id": 0}).sort("created_at", DESCENDING).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    def close(self):
+        self.client.close()
+
+
+async def _search_cli():
+    parser = argparse.ArgumentParser(description="Поиск логов в MongoDB")
+    parser.add_argument("--level")
+    parser.add_argument("--section")
+    parser.add_argument("--subsection")
+    parser.add_argument("--user")
+    parser.add_argument("--text")
+    parser.add_argument("--hours", type=float, default=24, help="за сколько последних часов")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    store = LogStore()
+    try:
+        logs = await store.search(
+            level=args.level,
+            section=args.section,
+            subsection=args.subsection,
+            user_id=args.user,
+            text=args.text,
+            since=datetime.now(timezone.utc) - timedelta(hours=args.hours),
+            limit=args.limit
+        )
+        for log in logs:
+            meta = log.get("meta", {})
+            print(
+                f"{log['created_at']:%Y-%m-%d %H:%M:%S} {meta.get('level')} "
+                f"{meta.get('section')}/{meta.get('subsection')} [{log.get('log_id')}] "
+                f"user={log.get('user_id')} {log.get('message')}"
+            )
+        print(f"Найдено: {len(logs)}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_search_cli())
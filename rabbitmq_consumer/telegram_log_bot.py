@@ -14,17 +14,33 @@
 
 RabbitMQ параметры берутся так же, как в log_consumer.py:
   RABBITMQ_URL, RABBITMQ_EXCHANGE, RABBITMQ_ROUTING_KEY, RABBITMQ_QUEUE
+
+Одинаковые алерты (уровень, раздел, подраздел, отпечаток сообщения) копятся
+в течение окна агрегации и уходят одним дайджестом с количеством и временем
+первого/последнего появления. Отправка идёт из отдельной задачи с общим
+бюджетом сообщений в минуту, поэтому при лимитах Telegram чтение очереди
+не останавливается:
+
+  TELEGRAM_AGGREGATION_WINDOW — окно агрегации, секунды (по умолчанию 30)
+  TELEGRAM_SEND_BUDGET        — сообщений в минуту на весь бот (по умолчанию 20)
+  TELEGRAM_OUTBOX_LIMIT       — максимум подготовленных, но не отправленных сообщений
+  TELEGRAM_PREFETCH           — prefetch канала RabbitMQ
 """
 
 from __future__ import annotations
 
 import os
+import re
 import json
+import html
+import time
 import asyncio
+import hashlib
 import signal
 import sys
-from datetime import datetime
-from typing import Optional
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
 from pathlib import Path
 
 import aio_pika
@@ -32,6 +48,8 @@ from aiogram import Bot
 from aiogram.enums import ParseMode
 from aiogram.exceptions import TelegramRetryAfter, TelegramAPIError
 
+from dedup import RecentKeys, log_key
+
 try:
     from dotenv import load_dotenv
     # Пытаемся загрузить .env файл из текущей директории или родительской
@@ -62,6 +80,84 @@ QUEUE_NAME = os.getenv("RABBITMQ_QUEUE", "telegram_logs")
 MAX_RECONNECT_ATTEMPTS = 5
 RECONNECT_DELAY = 5  # секунд
 RETRY_BASE_DELAY = 1  # базовая задержка для повторных попыток
+MAX_API_RETRIES = 3  # попыток для ошибок Telegram API, кроме RetryAfter
+
+# Агрегация и бюджет отправки
+AGGREGATION_WINDOW = float(os.getenv("TELEGRAM_AGGREGATION_WINDOW", "30"))
+SEND_BUDGET_PER_MINUTE = int(os.getenv("TELEGRAM_SEND_BUDGET", "20"))
+OUTBOX_LIMIT = int(os.getenv("TELEGRAM_OUTBOX_LIMIT", "20"))
+PREFETCH_COUNT = int(os.getenv("TELEGRAM_PREFETCH", "1000"))
+TELEGRAM_TEXT_LIMIT = 4000  # лимит Telegram - 4096 символов
+
+LEVEL_PRIORITY = {"CRITICAL": 0, "ERROR": 1, "WARNING": 2}
+
+LEVEL_EMOJI = {
+    "DEBUG": "🔍",
+    "INFO": "ℹ️",
+    "WARNING": "⚠️",
+    "ERROR": "❌",
+    "CRITICAL": "🔥"
+}
+
+SOURCE_EMOJI = {
+    "2fa": "🔐",
+    "application": "📱",
+    "auth": "🔑",
+    "security": "🛡️",
+    "system": "⚙️",
+    "websocket": "🔌",
+    "files": "📁",
+    "lobby": "🎮",
+    "test": "📝",
+    "payment": "💰",
+    "database": "💾",
+    "redis": "📦",
+    "api": "🌐"
+}
+
+SOURCE_FIELDS = ("source_file", "source_function", "source_line")
+
+# Изменяемые части сообщения: ObjectId/хеши, UUID, IP, числа
+_FINGERPRINT_PATTERNS = [
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<uuid>"),
+    (re.compile(r"\b[0-9a-fA-F]{16,}\b"), "<id>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b"), "<ip>"),
+    (re.compile(r"\d+"), "<n>"),
+]
+
+
+def message_fingerprint(message: str, extra_data: Dict[str, Any]) -> str:
+    """Отпечаток сообщения без изменяемых частей (ID, числа, IP) и с местом вызова"""
+    normalized = message
+    for pattern, placeholder in _FINGERPRINT_PATTERNS:
+        normalized = pattern.sub(placeholder, normalized)
+    location = f"{extra_data.get('source_file')}:{extra_data.get('source_line')}"
+    return hashlib.sha1(f"{normalized}|{location}".encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass
+class AlertGroup:
+    """Одинаковые алерты за окно агрегации"""
+    sample: Dict[str, Any]
+    count: int = 0
+    first_seen: str = ""
+    last_seen: str = ""
+    last_log_id: Optional[str] = None
+    users: set = field(default_factory=set)
+
+    def add(self, data: Dict[str, Any]):
+        # Сводка "повторено N раз" от бэкенда учитывается как N+1 событий
+        repeated = (data.get("extra_data") or {}).get("repeated")
+        self.count += 1 + (repeated if isinstance(repeated, int) else 0)
+        timestamp = data.get("timestamp", "")
+        if not self.first_seen:
+            self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.last_log_id = data.get("log_id", self.last_log_id)
+        user_id = data.get("user_id")
+        if user_id and len(self.users) < 100:
+            self.users.add(user_id)
+
 
 class TelegramLogBot:
     def __init__(self):
@@ -79,6 +175,16 @@ class TelegramLogBot:
         self.exchange = None
         self.queue = None
         self.should_stop = False
+        # Алерты текущего окна: (level, section, subsection, fingerprint) -> группа
+        self.groups: Dict[Tuple[str, str, str, str], AlertGroup] = {}
+        # Готовые к отправке сообщения: (уровень, текст)
+        self.outbox: Deque[Tuple[str, str]] = deque()
+        self._outbox_event = asyncio.Event()
+        self._tokens = float(SEND_BUDGET_PER_MINUTE)
+        self._tokens_updated = time.monotonic()
+        # Уже учтённые логи: повторная доставка не увеличивает счётчик алерта
+        self._seen_keys = RecentKeys()
+        self._stats = {"received": 0, "duplicates": 0, "digests": 0, "sent": 0, "dropped": 0, "rate_limited": 0}
         
     async def start(self):
         """Инициализация бота при старте"""
@@ -93,6 +199,7 @@ class TelegramLogBot:
                     
                 self.connection = await aio_pika.connect_robust(RABBITMQ_URL)
                 self.channel = await self.connection.channel()
+                await self.channel.set_qos(prefetch_count=PREFETCH_COUNT)
                 
                 # Объявляем exchange
                 self.exchange = await self.channel.declare_exchange(
@@ -152,159 +259,267 @@ class TelegramLogBot:
             print(f"❌ Ошибка настройки очереди: {e}")
             return False
             
-    async def send_telegram_message(self, text: str, level: str = "INFO", retry_count: int = 0) -> bool:
-        """Отправляет сообщение в Telegram с обработкой ошибок и экспоненциальной задержкой"""
-        try:
-            # Определяем topic_id на основе уровня лога
-            topic_id = None
-            if level in ["WARNING"]:
-                topic_id = int(self.warning_topic) if self.warning_topic else None
-            elif level in ["ERROR", "CRITICAL"]:
-                topic_id = int(self.error_topic) if self.error_topic else None
-            
-            print(f"[TELEGRAM BOT] Отправка сообщения уровня {level}" + 
-                  (f" в топик {topic_id}" if topic_id else ""))
-            
-            await self.bot.send_message(
-                chat_id=self.chat_id,
-                text=text,
-                parse_mode=ParseMode.HTML,
-                disable_web_page_preview=True,
-                message_thread_id=topic_id
+    def _topic_for_level(self, level: str) -> Optional[int]:
+        """Определяет topic_id на основе уровня лога"""
+        if level in ["WARNING"]:
+            return int(self.warning_topic) if self.warning_topic else None
+        if level in ["ERROR", "CRITICAL"]:
+            return int(self.error_topic) if self.error_topic else None
+        return None
+
+    async def send_telegram_message(self, text: str, level: str = "INFO") -> Optional[float]:
+        """
+        Отправляет одно сообщение в Telegram.
+
+        Returns:
+            None - сообщение отправлено или отброшено после ошибок API;
+            число - Telegram просит подождать столько секунд (TelegramRetryAfter).
+        """
+        topic_id = self._topic_for_level(level)
+        for attempt in range(MAX_API_RETRIES):
+            try:
+                await self.bot.send_message(
+                    chat_id=self.chat_id,
+                    text=text,
+                    parse_mode=ParseMode.HTML,
+                    disable_web_page_preview=True,
+                    message_thread_id=topic_id
+                )
+                self._stats["sent"] += 1
+                return None
+            except TelegramRetryAfter as e:
+                # Получаем значение retry_after из разных возможных атрибутов
+                return float(getattr(e, 'retry_after', None) or getattr(e, 'value', None) or RETRY_BASE_DELAY)
+            except TelegramAPIError as e:
+                print(f"❌ Ошибка Telegram API: {e}")
+                await asyncio.sleep(RETRY_BASE_DELAY * (2 ** attempt))
+            except Exception as e:
+                print(f"❌ Неожиданная ошибка при отправке в Telegram: {e}")
+                break
+        self._stats["dropped"] += 1
+        return None
+
+    async def _take_send_token(self):
+        """Общий бюджет отправки: SEND_BUDGET_PER_MINUTE сообщений в минуту"""
+        rate = SEND_BUDGET_PER_MINUTE / 60.0
+        while True:
+            now = time.monotonic()
+            self._tokens = min(float(SEND_BUDGET_PER_MINUTE), self._tokens + (now - self._tokens_updated) * rate)
+            self._tokens_updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / rate)
+
+    async def sender_loop(self) -> None:
+        """Отправляет сообщения из outbox; ожидание лимитов не блокирует чтение очереди"""
+        while not self.should_stop or self.outbox:
+            if not self.outbox:
+                self._outbox_event.clear()
+                try:
+                    await asyncio.wait_for(self._outbox_event.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._take_send_token()
+            level, text = self.outbox[0]
+            retry_after = await self.send_telegram_message(text, level)
+            if retry_after is None:
+                self.outbox.popleft()
+                continue
+
+            # Сообщение остаётся первым в outbox; новые алерты тем временем копятся в группах
+            self._stats["rate_limited"] += 1
+            print(f"⚠️ Превышен лимит сообщений Telegram, пауза {retry_after} секунд")
+            if self.should_stop:
+                break
+            await asyncio.sleep(retry_after)
+
+    # ---------- агрегация ----------
+
+    def add_alert(self, data: Dict[str, Any]) -> None:
+        """Добавляет лог в группу одинаковых алертов текущего окна"""
+        dedup_key = log_key(data)
+        if dedup_key is not None:
+            if dedup_key in self._seen_keys:
+                self._stats["duplicates"] += 1
+                return
+            self._seen_keys.add(dedup_key)
+        level = data.get("level", "UNKNOWN")
+        section = data.get("section", "unknown")
+        subsection = data.get("subsection", "unknown")
+        extra_data = data.get("extra_data") or {}
+        key = (level, section, subsection, message_fingerprint(data.get("message", ""), extra_data))
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = AlertGroup(sample=data)
+        group.add(data)
+        self._stats["received"] += 1
+
+    def flush_groups(self) -> None:
+        """
+        Превращает группы окна в сообщения outbox. Если outbox почти заполнен,
+        оставшиеся группы сворачиваются в один общий дайджест; если заполнен
+        полностью - группы остаются и продолжают копить счётчики.
+        """
+        if not self.groups:
+            return
+        free_slots = OUTBOX_LIMIT - len(self.outbox)
+        if free_slots <= 0:
+            return
+
+        groups = sorted(
+            self.groups.values(),
+            key=lambda group: (LEVEL_PRIORITY.get(group.sample.get("level"), 3), -group.count)
+        )
+        self.groups = {}
+
+        if len(groups) <= free_slots:
+            individual, overflow = groups, []
+        else:
+            individual, overflow = groups[:free_slots - 1], groups[free_slots - 1:]
+
+        for group in individual:
+            self.outbox.append((group.sample.get("level", "UNKNOWN"), self.format_group(group)))
+        if overflow:
+            level = overflow[0].sample.get("level", "UNKNOWN")
+            self.outbox.append((level, self.format_overflow(overflow)))
+
+        self._stats["digests"] += len(groups)
+        self._outbox_event.set()
+
+    async def aggregation_loop(self) -> None:
+        """Раз в окно агрегации отправляет накопленные группы в outbox"""
+        reported = 0
+        while not self.should_stop:
+            await asyncio.sleep(AGGREGATION_WINDOW)
+            self.flush_groups()
+            if self._stats["received"] != reported:
+                reported = self._stats["received"]
+                print(f"[TELEGRAM BOT] Статистика: {self._stats}, в outbox {len(self.outbox)}")
+
+    # ---------- форматирование ----------
+
+    def format_alert(self, data: Dict[str, Any]) -> str:
+        """Подробное сообщение об одном логе"""
+        level = str(data.get("level", "UNKNOWN"))
+        section = str(data.get("section", "unknown"))
+        subsection = data.get("subsection", "unknown")
+        msg = _escape(data.get("message", "Нет сообщения"), 1500)
+        source = data.get("source", "unknown")
+
+        # Получаем дополнительную информацию
+        extra_data = data.get("extra_data") or {}
+        user_id = data.get("user_id") or "N/A"
+        ip_address = data.get("ip_address") or "N/A"
+
+        # Формируем текст сообщения
+        text = (
+            f"{LEVEL_EMOJI.get(level, '❓')} <b>{_escape(level, 20)}</b> от {_escape(source, 50)}\n"
+            f"{SOURCE_EMOJI.get(section.lower(), '📋')} <b>Раздел:</b> {_escape(section, 50)}/{_escape(subsection, 50)}\n"
+            f"📝 <b>Сообщение:</b> {msg}\n"
+        )
+
+        # Добавляем информацию об источнике для WARNING, ERROR и CRITICAL
+        if level in ["WARNING", "ERROR", "CRITICAL"]:
+            text += (
+                f"\n📍 <b>Источник:</b>\n"
+                f"Файл: {_escape(extra_data.get('source_file', 'unknown'), 200)}\n"
+                f"Функция: {_escape(extra_data.get('source_function', 'unknown'), 100)}\n"
+                f"Строка: {_escape(extra_data.get('source_line', '?'), 10)}\n"
             )
-            print(f"[TELEGRAM BOT] ✅ Сообщение успешно отправлено")
-            return True
-        except TelegramRetryAfter as e:
-            # Получаем значение retry_after из разных возможных атрибутов
-            retry_after = getattr(e, 'retry_after', None) or getattr(e, 'value', None) or RETRY_BASE_DELAY
-            retry_delay = retry_after * (2 ** retry_count)  # Экспоненциальная задержка
-            print(f"⚠️ Превышен лимит сообщений, ожидание {retry_delay} секунд")
-            await asyncio.sleep(retry_delay)
-            # Повторная попытка с увеличенным счетчиком
-            return await self.send_telegram_message(text, level, retry_count + 1)
-        except TelegramAPIError as e:
-            print(f"❌ Ошибка Telegram API: {e}")
-            if retry_count < 3:  # Максимум 3 попытки для других ошибок API
-                await asyncio.sleep(RETRY_BASE_DELAY * (2 ** retry_count))
-                return await self.send_telegram_message(text, level, retry_count + 1)
-            return False
-        except Exception as e:
-            print(f"❌ Неожиданная ошибка при отправке в Telegram: {e}")
-            return False
-            
+
+        # Добавляем информацию о пользователе если есть
+        if user_id != "N/A" or ip_address != "N/A":
+            text += (
+                f"\n👤 <b>Инициатор:</b>\n"
+                f"ID: {_escape(user_id, 50)}\n"
+                f"IP: {_escape(ip_address, 50)}\n"
+            )
+
+        # Подвал с временем и ID лога
+        footer = ""
+        if "timestamp" in data:
+            footer += f"\n🕒 <b>Время:</b> {_escape(data['timestamp'], 50)}"
+        if "log_id" in data:
+            footer += f"\n🔑 <b>ID лога:</b> {_escape(data['log_id'], 50)}"
+
+        # Дополнительные данные - пока помещаются в лимит вместе с подвалом
+        other_data = {k: v for k, v in extra_data.items() if k not in SOURCE_FIELDS}
+        if other_data:
+            text += "\n🔍 <b>Дополнительно:</b>\n"
+            budget = TELEGRAM_TEXT_LIMIT - len(footer) - len("…\n")
+            for key, value in other_data.items():
+                line = f"{_escape(key, 50)}: {_escape(value, 300)}\n"
+                if len(text) + len(line) > budget:
+                    text += "…\n"
+                    break
+                text += line
+
+        return text + footer
+
+    def format_group(self, group: AlertGroup) -> str:
+        """Одиночный алерт - как есть, повторяющийся - дайджест со счётчиком"""
+        if group.count == 1:
+            return self.format_alert(group.sample)
+
+        data = group.sample
+        level = str(data.get("level", "UNKNOWN"))
+        section = str(data.get("section", "unknown"))
+        subsection = data.get("subsection", "unknown")
+        extra_data = data.get("extra_data") or {}
+        text = (
+            f"{LEVEL_EMOJI.get(level, '❓')} <b>{_escape(level, 20)}</b> ×{group.count} от {_escape(data.get('source', 'unknown'), 50)}\n"
+            f"{SOURCE_EMOJI.get(section.lower(), '📋')} <b>Раздел:</b> {_escape(section, 50)}/{_escape(subsection, 50)}\n"
+            f"📝 <b>Сообщение (первое):</b> {_escape(data.get('message', 'Нет сообщения'), 1500)}\n"
+            f"\n📊 <b>Повторений:</b> {group.count}"
+        )
+        if group.users:
+            text += f", пользователей: {len(group.users)}"
+        text += (
+            f"\n🕒 <b>Первое:</b> {_escape(group.first_seen, 50)}\n"
+            f"🕒 <b>Последнее:</b> {_escape(group.last_seen, 50)}\n"
+            f"\n📍 <b>Источник:</b> {_escape(extra_data.get('source_file', 'unknown'), 200)}:{_escape(extra_data.get('source_line', '?'), 10)} "
+            f"({_escape(extra_data.get('source_function', 'unknown'), 100)})"
+        )
+        if group.last_log_id:
+            text += f"\n🔑 <b>ID последнего лога:</b> {_escape(group.last_log_id, 50)}"
+        return text
+
+    def format_overflow(self, groups: List[AlertGroup]) -> str:
+        """Общий дайджест для групп, на которые не хватило бюджета отправки"""
+        total = sum(group.count for group in groups)
+        lines = [f"📚 <b>Дайджест:</b> ещё {len(groups)} групп алертов, всего {total} событий\n"]
+        length = len(lines[0])
+        for index, group in enumerate(groups):
+            data = group.sample
+            line = (
+                f"{LEVEL_EMOJI.get(data.get('level'), '❓')} ×{group.count} "
+                f"{_escape(data.get('section'), 50)}/{_escape(data.get('subsection'), 50)}: {_escape(data.get('message', ''), 120)} "
+                f"({_escape(group.first_seen, 50)} — {_escape(group.last_seen, 50)})"
+            )
+            if length + len(line) > TELEGRAM_TEXT_LIMIT - 100:
+                lines.append(f"… и ещё {len(groups) - index} групп")
+                break
+            lines.append(line)
+            length += len(line) + 1
+        return "\n".join(lines)
+
     async def process_message(self, message: aio_pika.IncomingMessage) -> None:
-        """Обрабатывает входящее сообщение"""
+        """Обрабатывает входящее сообщение: только разбор и добавление в группу"""
         try:
             async with message.process():
-                print(f"[TELEGRAM BOT] 📨 Получено новое сообщение:")
-                print(f"[TELEGRAM BOT] 🔑 Routing key: {message.routing_key}")
-                print(f"[TELEGRAM BOT] 📦 Exchange: {message.exchange}")
-                
-                body = message.body.decode()
-                print(f"[TELEGRAM BOT] 📄 Тело сообщения: {body}")
-                
-                data = json.loads(body)
-                
-                # Форматируем сообщение для Telegram
-                level = data.get("level", "UNKNOWN")
-                section = data.get("section", "unknown")
-                subsection = data.get("subsection", "unknown")
-                msg = data.get("message", "Нет сообщения")
-                source = data.get("source", "unknown")
-                
-                print(f"[TELEGRAM BOT] 📝 Обработка сообщения:")
-                print(f"[TELEGRAM BOT] - Уровень: {level}")
-                print(f"[TELEGRAM BOT] - Раздел: {section}/{subsection}")
-                print(f"[TELEGRAM BOT] - Источник: {source}")
-                
-                # Получаем дополнительную информацию
-                extra_data = data.get("extra_data", {})
-                source_file = extra_data.get("source_file", "unknown")
-                source_function = extra_data.get("source_function", "unknown")
-                source_line = extra_data.get("source_line", "?")
-                user_id = data.get("user_id", "N/A")
-                ip_address = data.get("ip_address", "N/A")
-                
-                # Определяем эмодзи для уровня
-                level_emoji = {
-                    "DEBUG": "🔍",
-                    "INFO": "ℹ️",
-                    "WARNING": "⚠️",
-                    "ERROR": "❌",
-                    "CRITICAL": "🔥"
-                }.get(level, "❓")
-                
-                # Определяем эмодзи для источника
-                source_emoji = {
-                    "2fa": "🔐",
-                    "application": "📱",
-                    "auth": "🔑",
-                    "security": "🛡️",
-                    "system": "⚙️",
-                    "websocket": "🔌",
-                    "files": "📁",
-                    "lobby": "🎮",
-                    "test": "📝",
-                    "payment": "💰",
-                    "database": "💾",
-                    "redis": "📦",
-                    "api": "🌐"
-                }.get(section.lower(), "📋")
-                
-                # Формируем текст сообщения
-                text = (
-                    f"{level_emoji} <b>{level}</b> от {source}\n"
-                    f"{source_emoji} <b>Раздел:</b> {section}/{subsection}\n"
-                    f"📝 <b>Сообщение:</b> {msg}\n"
-                )
-                
-                # Добавляем информацию об источнике для WARNING, ERROR и CRITICAL
-                if level in ["WARNING", "ERROR", "CRITICAL"]:
-                    text += (
-                        f"\n📍 <b>Источник:</b>\n"
-                        f"Файл: {source_file}\n"
-                        f"Функция: {source_function}\n"
-                        f"Строка: {source_line}\n"
-                    )
-                
-                # Добавляем информацию о пользователе если есть
-                if user_id != "N/A" or ip_address != "N/A":
-                    text += (
-                        f"\n👤 <b>Инициатор:</b>\n"
-                        f"ID: {user_id}\n"
-                        f"IP: {ip_address}\n"
-                    )
-                
-                # Добавляем дополнительные данные если есть
-                if extra_data and extra_data != {"source_file": source_file, "source_function": source_function, "source_line": source_line}:
-                    other_data = {k: v for k, v in extra_data.items() 
-                                if k not in ["source_file", "source_function", "source_line"]}
-                    if other_data:
-                        text += f"\n🔍 <b>Дополнительно:</b>\n"
-                        for key, value in other_data.items():
-                            text += f"{key}: {value}\n"
-                
-                # Добавляем timestamp если есть
-                if "timestamp" in data:
-                    text += f"\n🕒 <b>Время:</b> {data['timestamp']}"
-                
-                # Добавляем ID лога если есть
-                if "log_id" in data:
-                    text += f"\n🔑 <b>ID лога:</b> {data['log_id']}"
-                
-                print(f"[TELEGRAM BOT] 📤 Подготовлено сообщение для отправки в Telegram")
-                
-                # Отправляем сообщение
-                await self.send_telegram_message(text, level)
-                
+                self.add_alert(json.loads(message.body.decode()))
         except json.JSONDecodeError as e:
             print(f"[TELEGRAM BOT] ❌ Ошибка декодирования JSON: {e}")
             print(f"[TELEGRAM BOT] Сырое сообщение: {message.body}")
         except Exception as e:
             print(f"[TELEGRAM BOT] ❌ Ошибка обработки сообщения: {e}")
-            
+
     async def run(self) -> None:
         """Основной цикл работы бота"""
+        tasks = []
         try:
             await self.start()
             
@@ -317,6 +532,10 @@ class TelegramLogBot:
                 return
                 
             print("✅ Бот запущен и готов к работе")
+            tasks = [
+                asyncio.create_task(self.aggregation_loop()),
+                asyncio.create_task(self.sender_loop())
+            ]
             
             async with self.queue.iterator() as queue_iter:
                 async for message in queue_iter:
@@ -327,6 +546,13 @@ class TelegramLogBot:
         except Exception as e:
             print(f"❌ Ошибка в основном цикле: {e}")
         finally:
+            self.should_stop = True
+            # Отдаём накопленное и даём отправителю немного времени
+            self.flush_groups()
+            if tasks:
+                await asyncio.wait(tasks, timeout=10)
+                for task in tasks:
+                    task.cancel()
             await self.cleanup()
             
     async def cleanup(self) -> None:
@@ -336,6 +562,27 @@ class TelegramLogBot:
         if self.bot:
             await self.bot.session.close()
 
+def _escape(value: Any, limit: int) -> str:
+    """
+    Значение для HTML-разметки Telegram не длиннее limit символов. Обрезается
+    исходный текст, а не результат экранирования, поэтому теги и сущности
+    вроде &amp; не разрываются.
+    """
+    text = str(value)
+    escaped = html.escape(text)
+    if len(escaped) <= limit:
+        return escaped
+    parts = []
+    length = 0
+    for char in text:
+        piece = html.escape(char)
+        if length + len(piece) > limit - 1:
+            break
+        parts.append(piece)
+        length += len(piece)
+    return "".join(parts) + "…"
+
+
 async def main() -> None:
     """Основная функция"""
     bot = TelegramLogBot()